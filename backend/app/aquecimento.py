@@ -0,0 +1,340 @@
+"""Aquecimento do cache de resultados no startup e a cada nova versão dos dados.
+
+Sem aquecimento, o primeiro usuário depois de um deploy ou de uma carga paga as consultas
+pesadas (ex.: /api/internacoes/cid-cap sem filtros, com timeout de 180 s). Uma tarefa em
+segundo plano acompanha a versão dos dados (cache.versao_dados) e, quando ela muda (ou no
+boot), pré-calcula em ordem de prioridade:
+
+1. as visões nacionais (sem filtros) de todos os endpoints registrados;
+2. cada UF, nos endpoints que aceitam `uf`;
+3. os AQUECER_MUNICIPIOS municípios mais pedidos, nos endpoints que aceitam `id_localidade`.
+
+As chamadas passam pelo próprio cache_resultado dos endpoints (mesmas chaves das
+requisições, já com os valores padrão de cada parâmetro) com no máximo AQUECER_CONCORRENCIA
+ao mesmo tempo, para não tomar o pool das requisições. O total fica limitado à metade de
+CACHE_MAX_ITENS, para o aquecimento não expulsar o resto do cache.
+
+Os municípios mais pedidos vêm da tabela `acessos_localidade`: a API soma nela os pedidos com
+id_localidade a cada poucos minutos, e logs de acesso antigos podem ser importados:
+
+    python -m app.aquecimento importar-log /var/log/sims/access.log [...]
+    python -m app.aquecimento mais-pedidos [--limite 20]
+    python -m app.aquecimento executar          # aquece uma vez (útil com CACHE_BACKEND compartilhado)
+
+O andamento fica em /api/debug/aquecimento (com a taxa de acerto do cache) e em /metrics.
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import logging
+import re
+import sys
+import time
+from collections import Counter
+from urllib.parse import parse_qs
+
+from starlette.concurrency import run_in_threadpool
+
+from . import cache, config, db, db_async, dimensoes
+from .db import get_connection
+
+logger = logging.getLogger(__name__)
+
+TABELA = "acessos_localidade"
+# Intervalo (s) entre gravações dos acessos acumulados em memória
+INTERVALO_GRAVACAO = 300
+
+_endpoints = []  # (nome, função com cache, {parâmetro: valor padrão})
+_tarefa = None
+_execucao = None
+_gravado_em = 0.0
+_estado = {
+    "estado": "ocioso",
+    "versao": None,
+    "total": 0,
+    "concluidos": 0,
+    "falhas": 0,
+    "ufs": 0,
+    "municipios": [],
+    "iniciado_em": None,
+    "duracao_s": None,
+    "erro": None,
+}
+
+
+def _padroes(func):
+    padroes = {}
+    for nome, parametro in inspect.signature(func).parameters.items():
+        # Query(5000, ...) guarda o valor padrão em .default
+        padrao = getattr(parametro.default, "default", parametro.default)
+        padroes[nome] = None if padrao is inspect.Parameter.empty else padrao
+    return padroes
+
+
+def registrar(*endpoints):
+    """Endpoints (decorados com json_rapido e cache_resultado) que o aquecimento pré-calcula."""
+    for endpoint in endpoints:
+        func = getattr(endpoint, "dados", endpoint)
+        _endpoints.append((endpoint.__name__, func, _padroes(func)))
+
+
+# --- acessos por município ---------------------------------------------------
+
+def _criar_tabela(cur):
+    cur.execute(f'''
+        CREATE TABLE IF NOT EXISTS {TABELA} (
+            id_localidade integer PRIMARY KEY,
+            acessos bigint NOT NULL,
+            atualizado_em timestamptz NOT NULL DEFAULT now()
+        )
+    ''')
+
+
+def _somar_acessos(contagens):
+    ids = list(contagens)
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            _criar_tabela(cur)
+            cur.execute(
+                f'''
+                INSERT INTO {TABELA} (id_localidade, acessos)
+                SELECT * FROM unnest(%s::integer[], %s::bigint[])
+                ON CONFLICT (id_localidade) DO UPDATE
+                SET acessos = {TABELA}.acessos + EXCLUDED.acessos, atualizado_em = now()
+                ''',
+                (ids, [contagens[i] for i in ids]),
+            )
+
+
+def _ler_mais_pedidos(limite):
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL AS existe", (TABELA,))
+            if not cur.fetchone()["existe"]:
+                return []
+            cur.execute(
+                f"SELECT id_localidade, acessos FROM {TABELA} ORDER BY acessos DESC, id_localidade LIMIT %s",
+                (limite,),
+            )
+            return [(row["id_localidade"], row["acessos"]) for row in cur.fetchall()]
+
+
+async def gravar_acessos():
+    """Soma na tabela os acessos acumulados em memória desde a última gravação."""
+    global _gravado_em
+    _gravado_em = time.monotonic()
+    pendentes = Counter(cache.acessos_localidade)
+    if not pendentes:
+        return
+    cache.acessos_localidade.clear()
+    try:
+        await run_in_threadpool(_somar_acessos, pendentes)
+    except Exception:
+        # Devolve as contagens para a próxima tentativa
+        cache.acessos_localidade.update(pendentes)
+        raise
+
+
+async def mais_pedidos(limite):
+    """ids dos `limite` municípios mais pedidos (tabela + acessos ainda não gravados)."""
+    contagens = Counter(dict(await run_in_threadpool(_ler_mais_pedidos, limite * 2)))
+    contagens.update(cache.acessos_localidade)
+    return [i for i, _ in contagens.most_common() if i in dimensoes.localidades][:limite]
+
+
+# --- aquecimento ---------------------------------------------------------------
+
+def _tarefas(ufs, municipios):
+    tarefas = [(nome, func, padroes) for nome, func, padroes in _endpoints]
+    for uf in ufs:
+        tarefas += [(nome, func, {**padroes, "uf": uf}) for nome, func, padroes in _endpoints if "uf" in padroes]
+    for id_localidade in municipios:
+        tarefas += [
+            (nome, func, {**padroes, "id_localidade": id_localidade})
+            for nome, func, padroes in _endpoints if "id_localidade" in padroes
+        ]
+    return tarefas[:max(1, config.CACHE_MAX_ITENS // 2)]
+
+
+async def aquecer(versao=None):
+    """Pré-calcula as visões nacionais, por UF e dos municípios mais pedidos."""
+    inicio = time.monotonic()
+    _estado.update(
+        estado="aquecendo", versao=versao, total=0, concluidos=0, falhas=0, ufs=0, municipios=[],
+        iniciado_em=time.time(), duracao_s=None, erro=None,
+    )
+    try:
+        await dimensoes.garantir()
+        ufs = []
+        if any("uf" in padroes for _, _, padroes in _endpoints):
+            ufs = sorted({uf.strip().upper() for _, uf in dimensoes.localidades.values() if uf})
+        try:
+            municipios = await mais_pedidos(config.AQUECER_MUNICIPIOS) if config.AQUECER_MUNICIPIOS > 0 else []
+        except Exception:
+            logger.exception("Falha ao ler os municípios mais pedidos; aquecendo só as visões nacionais e por UF")
+            municipios = []
+        tarefas = _tarefas(ufs, municipios)
+        _estado.update(total=len(tarefas), ufs=len(ufs), municipios=municipios)
+
+        semaforo = asyncio.Semaphore(max(1, config.AQUECER_CONCORRENCIA))
+
+        async def executar(nome, func, params):
+            async with semaforo:
+                try:
+                    await func(**params)
+                except Exception:
+                    _estado["falhas"] += 1
+                    logger.warning("Aquecimento de %s %s falhou", nome, params, exc_info=True)
+                finally:
+                    _estado["concluidos"] += 1
+
+        # As tarefas herdam o contexto: nada do aquecimento conta como acesso de usuário
+        token = cache.aquecendo.set(True)
+        try:
+            await asyncio.gather(*(executar(*tarefa) for tarefa in tarefas))
+        finally:
+            cache.aquecendo.reset(token)
+    except asyncio.CancelledError:
+        _estado["estado"] = "cancelado"
+        raise
+    except Exception as e:
+        logger.exception("Aquecimento do cache falhou")
+        _estado.update(estado="erro", erro=str(e))
+    else:
+        _estado["estado"] = "concluido"
+        logger.info(
+            "Cache aquecido (versão %s): %d consultas, %d falhas em %.1f s",
+            versao, _estado["total"], _estado["falhas"], time.monotonic() - inicio,
+        )
+    finally:
+        _estado["duracao_s"] = round(time.monotonic() - inicio, 2)
+
+
+def disparar(versao=None):
+    """Inicia um aquecimento em segundo plano, se nenhum estiver em andamento."""
+    global _execucao
+    if _execucao is None or _execucao.done():
+        _execucao = asyncio.get_running_loop().create_task(aquecer(versao))
+    return _execucao
+
+
+async def _vigiar():
+    aquecida = None
+    while True:
+        try:
+            versao = await cache.versao_dados()
+            # None: banco fora do ar ou tabela fato ausente; tenta de novo na próxima volta
+            if versao is not None and versao != aquecida:
+                await disparar(versao)
+                aquecida = versao
+            if time.monotonic() - _gravado_em >= INTERVALO_GRAVACAO:
+                await gravar_acessos()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Falha no ciclo de aquecimento do cache")
+        await asyncio.sleep(config.CACHE_CHECK_VERSAO)
+
+
+def iniciar():
+    global _tarefa
+    if _tarefa is None and config.AQUECER:
+        _tarefa = asyncio.get_running_loop().create_task(_vigiar())
+
+
+async def parar():
+    global _tarefa
+    for tarefa in (_tarefa, _execucao):
+        if tarefa is not None and not tarefa.done():
+            tarefa.cancel()
+            try:
+                await tarefa
+            except asyncio.CancelledError:
+                pass
+    _tarefa = None
+    try:
+        await gravar_acessos()
+    except Exception:
+        logger.exception("Falha ao gravar os acessos por município no encerramento")
+
+
+def status():
+    total = _estado["total"]
+    return {
+        **_estado,
+        "ativo": config.AQUECER,
+        "progresso": round(_estado["concluidos"] / total, 4) if total else None,
+        "acessos_pendentes": sum(cache.acessos_localidade.values()),
+    }
+
+
+# --- logs de acesso ------------------------------------------------------------
+
+# Linha de acesso do uvicorn/gunicorn: ... "GET /api/...?a=1&b=2 HTTP/1.1" 200 ...
+_LINHA_ACESSO = re.compile(r'"GET /api/[^ ?"]*\?([^ "]*) HTTP/[\d.]+" (\d{3})')
+
+
+def contar_log(linhas):
+    """Pedidos bem-sucedidos (200/304) com id_localidade, por município, em linhas de log de acesso."""
+    contagens = Counter()
+    for linha in linhas:
+        encontrado = _LINHA_ACESSO.search(linha)
+        if not encontrado or encontrado.group(2) not in ("200", "304"):
+            continue
+        for valor in parse_qs(encontrado.group(1)).get("id_localidade", []):
+            if valor.isdigit():
+                contagens[int(valor)] += 1
+    return contagens
+
+
+def _importar_logs(arquivos):
+    contagens = Counter()
+    for arquivo in arquivos:
+        with open(arquivo, encoding="utf-8", errors="replace") as f:
+            contagens.update(contar_log(f))
+    if contagens:
+        _somar_acessos(contagens)
+    return contagens
+
+
+async def _executar_cli():
+    try:
+        await aquecer(await cache.versao_dados())
+        return {"aquecimento": status(), "cache": cache.stats()}
+    finally:
+        await db_async.close_pool()
+        db.close_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aquecimento do cache de resultados")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p = sub.add_parser("importar-log", help="soma os pedidos por município de logs de acesso")
+    p.add_argument("arquivos", nargs="+")
+    p = sub.add_parser("mais-pedidos")
+    p.add_argument("--limite", type=int, default=config.AQUECER_MUNICIPIOS)
+    sub.add_parser("executar", help="aquece uma vez (o cache em memória some com o processo)")
+    args = parser.parse_args()
+
+    if args.comando == "importar-log":
+        contagens = _importar_logs(args.arquivos)
+        print(f"{sum(contagens.values())} pedidos de {len(contagens)} municípios importados para {TABELA}")
+        db.close_pool()
+    elif args.comando == "mais-pedidos":
+        for id_localidade, acessos in _ler_mais_pedidos(args.limite):
+            print(f"{id_localidade}\t{acessos}")
+        db.close_pool()
+    else:
+        if config.CACHE_BACKEND in ("", "memoria"):
+            print("AVISO: CACHE_BACKEND=memoria; o resultado só vale para este processo", file=sys.stderr)
+        from . import main as _api  # noqa: F401 (registra os endpoints)
+
+        resultado = asyncio.run(_executar_cli())
+        print(json.dumps(resultado, indent=2, ensure_ascii=False, default=str))
+        if resultado["aquecimento"]["estado"] != "concluido" or resultado["aquecimento"]["falhas"]:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
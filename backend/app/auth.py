@@ -0,0 +1,170 @@
+"""Verificação local dos JWT emitidos pelo Supabase Auth.
+
+O token é validado aqui mesmo: assinatura (segredo HS256 do projeto ou chave pública do
+JWKS, baixado uma vez e guardado em memória), expiração, audiência e emissor. Um token já
+verificado fica em cache até expirar, então as rotas autenticadas não fazem chamada de rede.
+
+Em testes, usar_chave_local() troca a verificação por uma chave local e emitir_token() gera
+tokens assinados com ela (ver tests/test_auth.py).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import secrets
+import time
+import urllib.request
+from collections import OrderedDict
+from typing import Optional
+
+from jose import jwt
+from jose.exceptions import JOSEError
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+ALGORITMOS_ASSIMETRICOS = ["RS256", "ES256"]
+# Intervalo mínimo (s) entre recargas do JWKS provocadas por kid desconhecido
+_JWKS_INTERVALO_MIN = 30.0
+
+
+class TokenInvalido(Exception):
+    pass
+
+
+class Usuario(BaseModel):
+    id: str
+    email: Optional[str] = None
+    role: Optional[str] = None
+    user_metadata: dict = {}
+    app_metadata: dict = {}
+    exp: int
+
+
+_chave_local = None
+_jwks = {}                  # kid -> JWK
+_jwks_em = float("-inf")
+_jwks_lock = asyncio.Lock()
+_verificados = OrderedDict()  # sha256(token) -> Usuario
+_stats = {"hits": 0, "verificacoes": 0, "falhas": 0, "jwks_recargas": 0}
+
+
+def usar_chave_local(segredo=None):
+    """Passa a verificar tokens só com uma chave HS256 local (para testes). Retorna a chave."""
+    global _chave_local
+    _chave_local = segredo or secrets.token_urlsafe(32)
+    _verificados.clear()
+    return _chave_local
+
+
+def emitir_token(id, email=None, expira_em=3600, **claims):
+    """Gera um token no formato do Supabase assinado com a chave local."""
+    if _chave_local is None:
+        raise RuntimeError("Chave local não configurada; chame usar_chave_local() antes")
+    agora = int(time.time())
+    payload = {
+        "sub": id,
+        "email": email,
+        "role": "authenticated",
+        "aud": config.AUTH_AUDIENCE,
+        "iat": agora,
+        "exp": agora + expira_em,
+    }
+    if config.AUTH_ISSUER:
+        payload["iss"] = config.AUTH_ISSUER
+    payload.update(claims)
+    return jwt.encode(payload, _chave_local, algorithm="HS256")
+
+
+def _baixar_jwks():
+    with urllib.request.urlopen(config.AUTH_JWKS_URL, timeout=10) as resp:
+        return json.load(resp)
+
+
+async def _chave_publica(kid):
+    global _jwks, _jwks_em
+    if kid in _jwks and time.monotonic() - _jwks_em <= config.AUTH_JWKS_TTL:
+        return _jwks[kid]
+    async with _jwks_lock:
+        idade = time.monotonic() - _jwks_em
+        if idade > config.AUTH_JWKS_TTL or (kid not in _jwks and idade > _JWKS_INTERVALO_MIN):
+            if not config.AUTH_JWKS_URL:
+                raise TokenInvalido("SUPABASE_URL/SUPABASE_JWKS_URL não configurados para buscar o JWKS")
+            try:
+                dados = await run_in_threadpool(_baixar_jwks)
+                _jwks = {chave.get("kid"): chave for chave in dados.get("keys", [])}
+                _stats["jwks_recargas"] += 1
+            except Exception:
+                logger.exception("Falha ao baixar o JWKS; mantendo as chaves anteriores")
+            # Mesmo em falha, só tenta de novo depois do intervalo mínimo
+            _jwks_em = time.monotonic()
+    chave = _jwks.get(kid)
+    if chave is None:
+        raise TokenInvalido(f"Chave de assinatura desconhecida: {kid}")
+    return chave
+
+
+async def _chave(cabecalho):
+    alg = cabecalho.get("alg")
+    if _chave_local is not None:
+        return _chave_local, ["HS256"]
+    if alg == "HS256":
+        if not config.AUTH_JWT_SECRET:
+            raise TokenInvalido("SUPABASE_JWT_SECRET não configurado")
+        return config.AUTH_JWT_SECRET, ["HS256"]
+    if alg in ALGORITMOS_ASSIMETRICOS:
+        return await _chave_publica(cabecalho.get("kid")), [alg]
+    raise TokenInvalido(f"Algoritmo de assinatura não suportado: {alg}")
+
+
+async def verificar(token):
+    """Valida o token e retorna o Usuario; levanta TokenInvalido se não for aceito."""
+    chave_cache = hashlib.sha256(token.encode()).hexdigest()
+    usuario = _verificados.get(chave_cache)
+    if usuario is not None:
+        if usuario.exp + config.AUTH_LEEWAY > time.time():
+            _verificados.move_to_end(chave_cache)
+            _stats["hits"] += 1
+            return usuario
+        _verificados.pop(chave_cache, None)
+
+    _stats["verificacoes"] += 1
+    try:
+        chave, algoritmos = await _chave(jwt.get_unverified_header(token))
+        claims = jwt.decode(
+            token,
+            chave,
+            algorithms=algoritmos,
+            audience=config.AUTH_AUDIENCE,
+            issuer=config.AUTH_ISSUER,
+            options={"leeway": config.AUTH_LEEWAY, "require_exp": True, "require_sub": True},
+        )
+    except (JOSEError, TokenInvalido) as e:
+        _stats["falhas"] += 1
+        raise TokenInvalido(str(e)) from e
+
+    usuario = Usuario(
+        id=claims["sub"],
+        email=claims.get("email"),
+        role=claims.get("role"),
+        user_metadata=claims.get("user_metadata") or {},
+        app_metadata=claims.get("app_metadata") or {},
+        exp=claims["exp"],
+    )
+    _verificados[chave_cache] = usuario
+    while len(_verificados) > config.AUTH_CACHE_MAX:
+        _verificados.popitem(last=False)
+    return usuario
+
+
+def stats():
+    if _chave_local is not None:
+        modo = "local"
+    elif config.AUTH_JWT_SECRET:
+        modo = "hs256+jwks"
+    else:
+        modo = "jwks"
+    return {"modo": modo, "tokens_em_cache": len(_verificados), "chaves_jwks": len(_jwks), **_stats}
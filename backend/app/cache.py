@@ -0,0 +1,252 @@
+import asyncio
+import contextvars
+import functools
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from . import cache_compartilhado, config, dimensoes
+from .db_async import fetch_one
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """Cache LRU limitado por quantidade de itens, com TTL por item. Thread-safe."""
+
+    def __init__(self, max_items, ttl):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._data = OrderedDict()  # chave -> (expira_em, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return False, None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "itens": len(self._data),
+                "max_itens": self.max_items,
+                "ttl_s": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+resultados = ResultCache(config.CACHE_MAX_ITENS, config.CACHE_TTL)
+# Segundo nível entre workers (None com CACHE_BACKEND=memoria)
+compartilhado = cache_compartilhado.criar()
+
+_versao = None
+_versao_verificada_em = 0.0
+# Momento (epoch) em que este processo viu a versão atual pela primeira vez
+_versao_desde = None
+_versao_lock = asyncio.Lock()
+_em_andamento = {}
+
+# Municípios pedidos pelos usuários desde a última gravação (ver aquecimento.py); as
+# chamadas do próprio aquecimento rodam com `aquecendo` ligado e não entram na conta
+acessos_localidade = Counter()
+aquecendo = contextvars.ContextVar("cache_aquecendo", default=False)
+
+
+# Contadores cumulativos de escrita: mudam a cada carga e custam uma leitura em memória no servidor.
+# Somados sobre a árvore de partições (particoes.py): a tabela particionada não tem contadores próprios;
+# pg_partition_tree não devolve linhas para tabela comum, por isso a própria tabela entra no UNION.
+# Depois da primeira carga pelo app.carga, vale o marcador de versão gravado por ela (`marcador`).
+SQL_VERSAO = '''
+    SELECT
+        SUM(s.n_tup_ins) AS n_tup_ins,
+        SUM(s.n_tup_upd) AS n_tup_upd,
+        SUM(s.n_tup_del) AS n_tup_del,
+        to_regclass('carga_versao') IS NOT NULL AS marcador
+    FROM (
+        SELECT relid FROM pg_partition_tree(to_regclass('fato_saude_mensal'))
+        UNION SELECT to_regclass('fato_saude_mensal')
+    ) p
+    JOIN pg_stat_user_tables s ON s.relid = p.relid
+    HAVING COUNT(*) > 0;
+'''
+
+# Marcador transacional da carga (ver carga.py): só muda no commit de uma carga que alterou dados
+SQL_MARCADOR = "SELECT versao FROM carga_versao WHERE tabela = 'fato_saude_mensal';"
+
+
+def formatar_versao(row, marcador=None):
+    if marcador:
+        return f"carga-{marcador['versao']}"
+    if not row:
+        return None
+    return f"{row['n_tup_ins']}-{row['n_tup_upd']}-{row['n_tup_del']}"
+
+
+def versao_cursor(cur):
+    """Versão atual dos dados lida num cursor psycopg2 (dict) já aberto: CLIs e gravações de controle."""
+    cur.execute(SQL_VERSAO)
+    row = cur.fetchone()
+    marcador = None
+    if row and row["marcador"]:
+        cur.execute(SQL_MARCADOR)
+        marcador = cur.fetchone()
+    return formatar_versao(row, marcador)
+
+
+async def _consultar_versao():
+    row = await fetch_one(SQL_VERSAO)
+    marcador = await fetch_one(SQL_MARCADOR) if row and row["marcador"] else None
+    return formatar_versao(row, marcador)
+
+
+async def versao_dados():
+    """Versão atual dos dados da tabela fato, verificada no banco no máximo a cada CACHE_CHECK_VERSAO s.
+
+    Quando a versão muda, o cache de resultados inteiro é invalidado.
+    """
+    global _versao, _versao_verificada_em, _versao_desde
+    if time.monotonic() - _versao_verificada_em < config.CACHE_CHECK_VERSAO:
+        return _versao
+    async with _versao_lock:
+        if time.monotonic() - _versao_verificada_em < config.CACHE_CHECK_VERSAO:
+            return _versao
+        try:
+            nova = await _consultar_versao()
+        except Exception:
+            # Banco indisponível: mantém a última versão conhecida e tenta de novo depois
+            nova = _versao
+        if nova != _versao:
+            if _versao is not None:
+                # Carga nova pode trazer meses (dim_tempo) ou municípios novos: as dimensões
+                # em memória precisam estar em dia antes de recalcular qualquer resultado
+                try:
+                    await dimensoes.carregar()
+                except Exception:
+                    logger.exception("Falha ao recarregar dimensões na mudança de versão dos dados")
+            resultados.clear()
+            _versao = nova
+            _versao_desde = time.time()
+        _versao_verificada_em = time.monotonic()
+    return _versao
+
+
+def versao_desde():
+    """Epoch da última mudança de versão observada (usado como Last-Modified)."""
+    return _versao_desde
+
+
+def invalidar():
+    """Força nova verificação de versão e descarta todos os resultados em cache."""
+    global _versao_verificada_em
+    _versao_verificada_em = 0.0
+    resultados.clear()
+
+
+def chave(nome, params):
+    # Parâmetros ausentes (None) não entram na chave: /x e /x?ano= resultam no mesmo item
+    return (nome, tuple(sorted((k, v) for k, v in params.items() if v is not None)))
+
+
+async def limpar_compartilhado():
+    if compartilhado is not None:
+        await compartilhado.clear()
+
+
+def stats():
+    return {**resultados.stats(), "compartilhado": compartilhado.stats() if compartilhado is not None else None}
+
+
+async def _calcular(key, func, kwargs):
+    if compartilhado is None:
+        return await func(**kwargs)
+    # Versão dos dados e assinatura das dimensões fazem parte da chave: itens antigos só expiram pelo TTL
+    texto = f"{key[2]}:{hashlib.sha1(repr(key).encode()).hexdigest()}"
+    return await cache_compartilhado.obter_ou_calcular(compartilhado, texto, lambda: func(**kwargs))
+
+
+class _Abandonado(Exception):
+    """Quem calculava foi cancelado (ex.: cliente desconectou); quem esperava assume o cálculo."""
+
+
+def cache_resultado(nome):
+    """Decorator para endpoints async de agregação: cacheia o resultado por endpoint + parâmetros.
+
+    Requisições idênticas simultâneas esperam pela mesma consulta em vez de repeti-la; se quem
+    calcula for cancelado, uma das que esperavam assume. Com CACHE_BACKEND compartilhado, o
+    mesmo vale entre workers (ver cache_compartilhado.py).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(**kwargs):
+            if kwargs.get("id_localidade") and not aquecendo.get():
+                acessos_localidade[kwargs["id_localidade"]] += 1
+            versao = await versao_dados()
+            # Descrições vêm das dimensões em memória: uma recarga que as muda invalida o resultado
+            key = (versao, dimensoes.assinatura()) + chave(nome, kwargs)
+            while True:
+                hit, valor = resultados.get(key)
+                if hit:
+                    return valor
+                pendente = _em_andamento.get(key)
+                if pendente is None:
+                    break
+                try:
+                    return await asyncio.shield(pendente)
+                except _Abandonado:
+                    # O primeiro a voltar ao laço vira quem calcula; os outros passam a esperar por ele
+                    continue
+
+            futuro = asyncio.get_running_loop().create_future()
+            _em_andamento[key] = futuro
+            try:
+                valor = await _calcular(key, func, kwargs)
+            except Exception as e:
+                futuro.set_exception(e)
+                # Evita "exception was never retrieved" quando ninguém estava esperando
+                futuro.exception()
+                raise
+            except BaseException:
+                # Cancelar o futuro derrubaria com CancelledError quem espera, com a própria
+                # requisição ainda viva
+                futuro.set_exception(_Abandonado())
+                futuro.exception()
+                raise
+            else:
+                resultados.set(key, valor)
+                futuro.set_result(valor)
+                return valor
+            finally:
+                _em_andamento.pop(key, None)
+        return wrapper
+    return decorator
@@ -0,0 +1,278 @@
+"""Segundo nível do cache de resultados, compartilhado entre os workers.
+
+Com vários processos (gunicorn.conf.py), cada worker tem o seu ResultCache em memória; sem
+um nível comum, N workers recalculariam o mesmo agregado N vezes, cada um com as suas
+conexões. CACHE_BACKEND escolhe onde fica o nível comum:
+
+- "disco": arquivo SQLite local (CACHE_DISCO), para workers na mesma máquina;
+- "redis": servidor Redis (ou compatível) em CACHE_REDIS_URL; requer `pip install redis`.
+
+Os valores são gravados com orjson (já são o que vai ser respondido em JSON). A trava por
+chave faz com que só um worker calcule cada resultado; os outros esperam o valor aparecer
+(ou a trava sumir, se o líder falhar).
+Falhas do backend nunca derrubam a requisição: viram miss e o resultado é calculado.
+"""
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+
+import orjson
+from starlette.concurrency import run_in_threadpool
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+
+class _Base:
+    nome = ""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.erros = 0
+        self.esperas = 0
+
+    def _falha(self, operacao):
+        self.erros += 1
+        # Só o primeiro erro com traceback: um Redis fora do ar geraria um por requisição
+        if self.erros == 1:
+            logger.exception("Cache compartilhado (%s) falhou em %s; seguindo sem ele", self.nome, operacao)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "backend": self.nome,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "esperas_por_outro_worker": self.esperas,
+            "erros": self.erros,
+        }
+
+
+class CacheDisco(_Base):
+    """Itens e travas numa base SQLite em modo WAL (leituras concorrentes entre processos)."""
+
+    nome = "disco"
+
+    def __init__(self, caminho, ttl, max_itens):
+        super().__init__(ttl)
+        self.caminho = caminho
+        self.max_itens = max_itens
+        self._lock = threading.Lock()
+        self._conn = None
+        self._escritas = 0
+
+    def _conexao(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=5, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("CREATE TABLE IF NOT EXISTS itens (chave TEXT PRIMARY KEY, expira REAL NOT NULL, valor BLOB NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS travas (chave TEXT PRIMARY KEY, expira REAL NOT NULL)")
+            self._conn = conn
+        return self._conn
+
+    # As chamadas ao SQLite bloqueiam (trava entre processos, timeout=5): rodam no threadpool,
+    # nunca no event loop
+    def _ler(self, chave):
+        with self._lock:
+            return self._conexao().execute("SELECT expira, valor FROM itens WHERE chave = ?", (chave,)).fetchone()
+
+    async def get(self, chave, contar=True):
+        try:
+            row = await run_in_threadpool(self._ler, chave)
+        except sqlite3.Error:
+            self._falha("get")
+            return False, None
+        if row is None or row[0] < time.time():
+            self.misses += contar
+            return False, None
+        self.hits += contar
+        return True, orjson.loads(row[1])
+
+    def _gravar(self, chave, corpo):
+        with self._lock:
+            conn = self._conexao()
+            conn.execute("INSERT OR REPLACE INTO itens VALUES (?, ?, ?)", (chave, time.time() + self.ttl, corpo))
+            self._escritas += 1
+            if self._escritas % 100 == 0:
+                self._podar(conn)
+
+    async def set(self, chave, valor):
+        try:
+            await run_in_threadpool(self._gravar, chave, orjson.dumps(valor))
+        except (sqlite3.Error, TypeError):
+            self._falha("set")
+
+    def _podar(self, conn):
+        conn.execute("DELETE FROM itens WHERE expira < ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM itens WHERE chave IN (SELECT chave FROM itens ORDER BY expira DESC LIMIT -1 OFFSET ?)",
+            (self.max_itens,),
+        )
+
+    def _travar(self, chave, segundos):
+        with self._lock:
+            conn = self._conexao()
+            agora = time.time()
+            conn.execute("DELETE FROM travas WHERE chave = ? AND expira < ?", (chave, agora))
+            return conn.execute("INSERT OR IGNORE INTO travas VALUES (?, ?)", (chave, agora + segundos)).rowcount == 1
+
+    async def travar(self, chave, segundos):
+        try:
+            return await run_in_threadpool(self._travar, chave, segundos)
+        except sqlite3.Error:
+            self._falha("travar")
+            return True
+
+    def _executar(self, sql, params=()):
+        with self._lock:
+            self._conexao().execute(sql, params)
+
+    async def renovar(self, chave, segundos):
+        try:
+            await run_in_threadpool(
+                self._executar, "UPDATE travas SET expira = ? WHERE chave = ?", (time.time() + segundos, chave),
+            )
+        except sqlite3.Error:
+            self._falha("renovar")
+
+    async def liberar(self, chave):
+        try:
+            await run_in_threadpool(self._executar, "DELETE FROM travas WHERE chave = ?", (chave,))
+        except sqlite3.Error:
+            self._falha("liberar")
+
+    async def clear(self):
+        try:
+            await run_in_threadpool(self._executar, "DELETE FROM itens")
+        except sqlite3.Error:
+            self._falha("clear")
+
+    def stats(self):
+        itens = None
+        try:
+            with self._lock:
+                itens = self._conexao().execute("SELECT COUNT(*) FROM itens").fetchone()[0]
+        except sqlite3.Error:
+            pass
+        return {**super().stats(), "arquivo": self.caminho, "itens": itens, "max_itens": self.max_itens}
+
+
+class CacheRedis(_Base):
+    nome = "redis"
+    PREFIXO = "sims:resultado:"
+
+    def __init__(self, url, ttl):
+        super().__init__(ttl)
+        import redis.asyncio
+        self._redis = redis.asyncio.from_url(url)
+
+    async def get(self, chave, contar=True):
+        try:
+            corpo = await self._redis.get(self.PREFIXO + chave)
+        except Exception:
+            self._falha("get")
+            return False, None
+        if corpo is None:
+            self.misses += contar
+            return False, None
+        self.hits += contar
+        return True, orjson.loads(corpo)
+
+    async def set(self, chave, valor):
+        try:
+            await self._redis.set(self.PREFIXO + chave, orjson.dumps(valor), ex=max(1, int(self.ttl)))
+        except Exception:
+            self._falha("set")
+
+    async def travar(self, chave, segundos):
+        try:
+            return bool(await self._redis.set(f"{self.PREFIXO}trava:{chave}", b"1", nx=True, ex=max(1, int(segundos))))
+        except Exception:
+            self._falha("travar")
+            return True
+
+    async def renovar(self, chave, segundos):
+        try:
+            await self._redis.expire(f"{self.PREFIXO}trava:{chave}", max(1, int(segundos)))
+        except Exception:
+            self._falha("renovar")
+
+    async def liberar(self, chave):
+        try:
+            await self._redis.delete(f"{self.PREFIXO}trava:{chave}")
+        except Exception:
+            self._falha("liberar")
+
+    async def clear(self):
+        try:
+            async for chave in self._redis.scan_iter(match=f"{self.PREFIXO}*", count=500):
+                await self._redis.delete(chave)
+        except Exception:
+            self._falha("clear")
+
+
+def criar():
+    backend = config.CACHE_BACKEND
+    if backend in ("", "memoria"):
+        return None
+    if backend == "disco":
+        return CacheDisco(config.CACHE_DISCO, config.CACHE_TTL, config.CACHE_MAX_ITENS)
+    if backend == "redis":
+        if not config.CACHE_REDIS_URL:
+            raise RuntimeError("CACHE_BACKEND=redis requer CACHE_REDIS_URL (ou REDIS_URL)")
+        return CacheRedis(config.CACHE_REDIS_URL, config.CACHE_TTL)
+    raise RuntimeError(f"CACHE_BACKEND inválido: {backend!r} (use memoria, disco ou redis)")
+
+
+async def _renovar(backend, chave):
+    # A trava vale CACHE_TRAVA s e é renovada enquanto o líder calcula: consultas mais longas
+    # que a validade (CID-10, até 180 s) não a deixam vencer, e um worker que morrer no meio
+    # a deixa expirar logo
+    while True:
+        await asyncio.sleep(config.CACHE_TRAVA / 3)
+        await backend.renovar(chave, config.CACHE_TRAVA)
+
+
+async def _calcular_com_trava(backend, chave, calcular):
+    renovacao = asyncio.create_task(_renovar(backend, chave))
+    try:
+        valor = await calcular()
+        await backend.set(chave, valor)
+        return valor
+    finally:
+        renovacao.cancel()
+        await backend.liberar(chave)
+
+
+async def obter_ou_calcular(backend, chave, calcular):
+    """Valor de `chave` no backend ou calculado por `calcular()`; só um worker calcula cada chave."""
+    hit, valor = await backend.get(chave)
+    if hit:
+        return valor
+    if await backend.travar(chave, config.CACHE_TRAVA):
+        return await _calcular_com_trava(backend, chave, calcular)
+
+    # Outro worker está calculando: espera o valor aparecer. Se a trava sumir sem valor (o
+    # líder falhou ou morreu e ela venceu), o primeiro a pegá-la de novo calcula
+    backend.esperas += 1
+    espera = 0.02
+    while True:
+        await asyncio.sleep(espera)
+        espera = min(espera * 2, 0.5)
+        hit, valor = await backend.get(chave, contar=False)
+        if hit:
+            return valor
+        if await backend.travar(chave, config.CACHE_TRAVA):
+            # O líder pode ter gravado o valor e liberado a trava entre a leitura acima e esta
+            hit, valor = await backend.get(chave, contar=False)
+            if hit:
+                await backend.liberar(chave)
+                return valor
+            return await _calcular_com_trava(backend, chave, calcular)
@@ -0,0 +1,573 @@
+"""Carga incremental de fato_saude_mensal a partir de extratos mensais do SIH/SIM.
+
+Os extratos são CSV (ou CSV.gz; separador `;` ou `,`) com uma linha por agregado:
+
+- tipo de evento: `id_tipo_evento` (ou `tipo_evento`);
+- mês: `competencia` (AAAAMM) ou `ano` + `mes`;
+- município: `id_localidade` (ou `cod_municipio`/`codmun`), com 6 ou 7 dígitos;
+- membro da quebra, pelo id (`id_sexo`, `id_faixa`, ...) ou pela descrição (`sexo`,
+  `faixa_etaria`, `raca_cor`, `estado_civil`, `local_ocorrencia`, `capitulo_cod`);
+- medidas: `qtd_internacoes` e/ou `qtd_obitos`.
+
+O arquivo é lido em fluxo e vai direto para uma tabela temporária via COPY: as chaves são
+resolvidas contra as dimensões lidas uma vez no início da carga (sem JOIN por linha) e só
+uma linha fica em memória por vez. Meses que ainda não existem em dim_tempo são criados
+depois do COPY, com o id gerado pela própria tabela (sequência/identity), no formato AAAAMM
+se os ids existentes seguem esse formato, ou o próximo depois do maior.
+
+Cada (tipo de evento, mês) é uma partição da carga. A assinatura de cada partição do
+extrato (linhas e soma dos hashes das linhas) é comparada com a da mesma partição na
+tabela fato: partições iguais são ignoradas, novas e alteradas são substituídas inteiras
+(DELETE + INSERT), tudo numa transação. Se algo mudou, a versão em `carga_versao` é
+incrementada no mesmo commit; a API usa esse marcador como versão dos dados (ver
+cache.versao_dados), então o cache de resultados é invalidado só quando a carga termina.
+
+    python -m app.carga carregar sih_2024_01.csv.gz sim_2024_01.csv.gz [--simular] [--rollups]
+    python -m app.carga status
+    python -m app.carga marcar      # depois de alterar a tabela fato fora deste módulo
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import sys
+import time
+import unicodedata
+from collections import Counter
+from datetime import date
+
+from . import esquema, particoes, rollups
+from .db import get_connection
+
+TABELA = "fato_saude_mensal"
+TABELA_VERSAO = "carga_versao"
+TABELA_HISTORICO = "carga_historico"
+
+COLUNAS = ["id_tipo_evento", "id_tempo", "id_localidade", *rollups.COLUNAS_MEMBRO, "qtd_internacoes", "qtd_obitos"]
+
+# coluna da fato -> nomes aceitos no cabeçalho do extrato
+ENTRADA = {
+    "id_tipo_evento": ("id_tipo_evento", "tipo_evento"),
+    "id_localidade": ("id_localidade", "cod_municipio", "codmun", "municipio_cod"),
+    "competencia": ("competencia", "ano_mes", "anomes"),
+    "ano": ("ano",),
+    "mes": ("mes",),
+    "qtd_internacoes": ("qtd_internacoes", "internacoes"),
+    "qtd_obitos": ("qtd_obitos", "obitos"),
+}
+
+# coluna de membro -> (dimensão, colunas de descrição aceitas no extrato)
+MEMBROS = {
+    "id_sexo": ("dim_sexo", ("sexo",)),
+    "id_faixa": ("dim_faixa_etaria", ("faixa_etaria", "faixa")),
+    "id_raca_cor": ("dim_raca_cor", ("raca_cor", "raca")),
+    "id_estado_civil": ("dim_estado_civil", ("estado_civil",)),
+    "id_local_ocor": ("dim_local_ocorrencia", ("local_ocorrencia", "local_ocor")),
+    "id_capitulo": ("dim_cid10_capitulo", ("capitulo_cod", "capitulo")),
+}
+
+# Exemplos de linhas rejeitadas guardados no relatório
+MAX_EXEMPLOS = 10
+
+
+def _hash_linha(alias):
+    # 60 bits do md5 da linha; a soma por partição não depende da ordem das linhas
+    colunas = ", ".join(f"{alias}.{c}" for c in COLUNAS)
+    return f"('x' || left(md5(ROW({colunas})::text), 15))::bit(60)::bigint"
+
+
+def _normalizar(texto):
+    sem_acento = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode()
+    return " ".join(sem_acento.casefold().split())
+
+
+class Rejeitada(ValueError):
+    """Linha do extrato cuja chave não foi resolvida nas dimensões."""
+
+
+NOMES_MESES = ["janeiro", "fevereiro", "março", "abril", "maio", "junho", "julho", "agosto", "setembro",
+               "outubro", "novembro", "dezembro"]
+
+# Colunas de dim_tempo além de (id_tempo, ano, mes) que a carga sabe preencher num mês novo:
+# coluna -> f(ano, mes, texto), `texto` se a coluna for de um tipo textual
+DERIVADAS_TEMPO = {
+    "trimestre": lambda ano, mes, texto: (mes - 1) // 3 + 1,
+    "semestre": lambda ano, mes, texto: (mes - 1) // 6 + 1,
+    "ano_mes": lambda ano, mes, texto: f"{ano}-{mes:02d}" if texto else ano * 100 + mes,
+    "competencia": lambda ano, mes, texto: f"{ano}{mes:02d}" if texto else ano * 100 + mes,
+    "data": lambda ano, mes, texto: date(ano, mes, 1).isoformat() if texto else date(ano, mes, 1),
+    "nome_mes": lambda ano, mes, texto: NOMES_MESES[mes - 1],
+}
+
+
+class Dimensoes:
+    """Chaves das dimensões lidas uma vez por carga, para resolver as linhas em memória."""
+
+    def __init__(self, cur):
+        cur.execute("SELECT id_tempo, ano, mes FROM dim_tempo WHERE id_tempo IS NOT NULL AND id_tempo != 0")
+        linhas = cur.fetchall()
+        self.tempo = {(r["ano"], r["mes"]): r["id_tempo"] for r in linhas}
+        # Ids no formato AAAAMM (202401) em vez de sequenciais
+        self._tempo_aaaamm = bool(linhas) and all(r["id_tempo"] == r["ano"] * 100 + r["mes"] for r in linhas)
+        # Meses novos recebem ids provisórios negativos durante o COPY; inserir_meses() troca pelos definitivos
+        self.meses_novos = []  # (id provisório, ano, mes)
+
+        cur.execute(
+            '''
+            SELECT
+                column_name,
+                is_nullable = 'YES' AS anulavel,
+                column_default IS NOT NULL OR is_identity = 'YES' OR is_generated = 'ALWAYS' AS automatica,
+                data_type IN ('text', 'character varying', 'character') AS texto
+            FROM information_schema.columns
+            WHERE table_schema = ANY(current_schemas(false)) AND table_name = 'dim_tempo'
+            '''
+        )
+        colunas_tempo = {r["column_name"]: r for r in cur.fetchall()}
+        self._id_automatico = "id_tempo" in colunas_tempo and colunas_tempo["id_tempo"]["automatica"]
+        self._derivadas = {
+            c: r["texto"] for c, r in colunas_tempo.items() if c in DERIVADAS_TEMPO and not r["automatica"]
+        }
+        # Obrigatórias sem default que a carga não sabe preencher: só impedem a carga se houver mês novo
+        self._sem_valor = sorted(
+            c for c, r in colunas_tempo.items()
+            if not r["anulavel"] and not r["automatica"] and c not in ("id_tempo", "ano", "mes", *DERIVADAS_TEMPO)
+        )
+
+        cur.execute("SELECT id_localidade FROM dim_localidade")
+        self.localidades = {r["id_localidade"] for r in cur.fetchall()}
+        # Códigos IBGE de 7 dígitos também aceitos sem o dígito verificador (padrão DATASUS)
+        self._por_prefixo = {i // 10: i for i in self.localidades if i >= 1_000_000}
+
+        cur.execute(
+            '''
+            SELECT table_name, column_name
+            FROM information_schema.columns
+            WHERE table_schema = ANY(current_schemas(false)) AND table_name = ANY(%s)
+            ''',
+            ([tabela for tabela, _ in MEMBROS.values()],),
+        )
+        existentes = {}
+        for r in cur.fetchall():
+            existentes.setdefault(r["table_name"], set()).add(r["column_name"])
+
+        self.membros = {}  # coluna -> (ids, {descrição normalizada: id})
+        for coluna, (tabela, _) in MEMBROS.items():
+            textos = [c for c in esquema.DIMENSOES[tabela]["rotulo"] if c in existentes.get(tabela, ())]
+            if tabela == "dim_cid10_capitulo" and "capitulo_cod" in existentes.get(tabela, ()):
+                textos.append("capitulo_cod")
+            cur.execute(f"SELECT {', '.join([coluna, *textos])} FROM {tabela}")
+            ids, por_texto = set(), {}
+            for r in cur.fetchall():
+                ids.add(r[coluna])
+                for texto in textos:
+                    if r[texto] is not None:
+                        por_texto.setdefault(_normalizar(str(r[texto])), r[coluna])
+            self.membros[coluna] = (ids, por_texto)
+
+    def id_tempo(self, ano, mes):
+        if not 1 <= mes <= 12 or not 1900 <= ano <= 2100:
+            raise Rejeitada("competência inválida")
+        chave = (ano, mes)
+        if chave not in self.tempo:
+            provisorio = -(len(self.meses_novos) + 1)
+            self.tempo[chave] = provisorio
+            self.meses_novos.append((provisorio, ano, mes))
+        return self.tempo[chave]
+
+    def inserir_meses(self, cur):
+        """Cria os meses novos em dim_tempo e troca, em _carga, os ids provisórios pelos definitivos."""
+        if not self.meses_novos:
+            return
+        if self._sem_valor:
+            meses = ", ".join(f"{ano}-{mes:02d}" for _, ano, mes in self.meses_novos)
+            raise RuntimeError(
+                f"dim_tempo tem colunas obrigatórias sem default que a carga não sabe preencher "
+                f"({', '.join(self._sem_valor)}); crie antes os meses {meses}"
+            )
+        colunas = ["ano", "mes", *self._derivadas]
+        if not self._id_automatico:
+            colunas.insert(0, "id_tempo")
+            cur.execute("SELECT COALESCE(MAX(id_tempo), 0) AS maximo FROM dim_tempo")
+            proximo = cur.fetchone()["maximo"] + 1
+        sql = (f"INSERT INTO dim_tempo ({', '.join(colunas)}) VALUES ({', '.join(['%s'] * len(colunas))}) "
+               f"RETURNING id_tempo")
+        provisorios, definitivos = [], []
+        for provisorio, ano, mes in self.meses_novos:
+            valores = [ano, mes, *(DERIVADAS_TEMPO[c](ano, mes, texto) for c, texto in self._derivadas.items())]
+            if not self._id_automatico:
+                if self._tempo_aaaamm:
+                    valores.insert(0, ano * 100 + mes)
+                else:
+                    valores.insert(0, proximo)
+                    proximo += 1
+            cur.execute(sql, valores)
+            self.tempo[(ano, mes)] = cur.fetchone()["id_tempo"]
+            provisorios.append(provisorio)
+            definitivos.append(self.tempo[(ano, mes)])
+        cur.execute(
+            '''
+            UPDATE _carga c SET id_tempo = m.definitivo
+            FROM unnest(%s::int[], %s::int[]) AS m(provisorio, definitivo)
+            WHERE c.id_tempo = m.provisorio
+            ''',
+            (provisorios, definitivos),
+        )
+
+    def id_localidade(self, codigo):
+        if codigo in self.localidades:
+            return codigo
+        if codigo >= 1_000_000 and codigo // 10 in self.localidades:
+            return codigo // 10
+        if codigo in self._por_prefixo:
+            return self._por_prefixo[codigo]
+        raise Rejeitada("município desconhecido")
+
+    def id_membro(self, coluna, id_valor, texto):
+        ids, por_texto = self.membros[coluna]
+        if id_valor is not None:
+            if id_valor not in ids:
+                raise Rejeitada(f"{coluna} desconhecido")
+            return id_valor
+        if texto:
+            encontrado = por_texto.get(_normalizar(texto))
+            if encontrado is None:
+                raise Rejeitada(f"{MEMBROS[coluna][0]}: descrição desconhecida")
+            return encontrado
+        return None
+
+
+def _abrir(caminho, encoding):
+    if caminho == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding=encoding, newline="")
+    if caminho.endswith(".gz"):
+        return gzip.open(caminho, "rt", encoding=encoding, newline="")
+    return open(caminho, encoding=encoding, newline="")
+
+
+def _inteiro(valor):
+    valor = (valor or "").strip()
+    if not valor:
+        return None
+    try:
+        return int(valor)
+    except ValueError:
+        raise Rejeitada("número inválido")
+
+
+def _mapear(cabecalho, caminho):
+    nomes = {nome.strip().lower(): nome for nome in cabecalho}
+
+    def achar(opcoes):
+        return next((nomes[o] for o in opcoes if o in nomes), None)
+
+    campos = {coluna: achar(opcoes) for coluna, opcoes in ENTRADA.items()}
+    faltando = [c for c in ("id_tipo_evento", "id_localidade") if campos[c] is None]
+    if not campos["competencia"] and not (campos["ano"] and campos["mes"]):
+        faltando.append("competencia (ou ano e mes)")
+    if not campos["qtd_internacoes"] and not campos["qtd_obitos"]:
+        faltando.append("qtd_internacoes ou qtd_obitos")
+    if faltando:
+        raise RuntimeError(f"{caminho}: colunas obrigatórias ausentes: {', '.join(faltando)}")
+    membros = {coluna: (nomes.get(coluna), achar(textos)) for coluna, (_, textos) in MEMBROS.items()}
+    return campos, membros
+
+
+def _resolver(linha, campos, membros, dims):
+    competencia = _inteiro(linha[campos["competencia"]]) if campos["competencia"] else None
+    if competencia is not None:
+        ano, mes = divmod(competencia, 100)
+    else:
+        ano, mes = _inteiro(linha[campos["ano"]]), _inteiro(linha[campos["mes"]])
+    tipo = _inteiro(linha[campos["id_tipo_evento"]])
+    codigo = _inteiro(linha[campos["id_localidade"]])
+    if tipo is None or ano is None or mes is None or codigo is None:
+        raise Rejeitada("chave vazia")
+    valores = [tipo, dims.id_tempo(ano, mes), dims.id_localidade(codigo)]
+    for coluna, (campo_id, campo_texto) in membros.items():
+        id_valor = _inteiro(linha[campo_id]) if campo_id else None
+        texto = linha[campo_texto] if campo_texto else None
+        valores.append(dims.id_membro(coluna, id_valor, texto))
+    for medida in ("qtd_internacoes", "qtd_obitos"):
+        valores.append(_inteiro(linha[campos[medida]]) if campos[medida] else None)
+    return valores
+
+
+def _linhas_copy(arquivos, encoding, dims, relatorio):
+    """Linhas no formato texto do COPY, resolvidas uma a uma a partir dos extratos."""
+    for caminho in arquivos:
+        with _abrir(caminho, encoding) as arquivo:
+            cabecalho = arquivo.readline()
+            separador = ";" if cabecalho.count(";") > cabecalho.count(",") else ","
+            leitor = csv.reader(arquivo, delimiter=separador)
+            nomes = next(csv.reader([cabecalho], delimiter=separador), [])
+            campos, membros = _mapear(nomes, caminho)
+            for numero, valores in enumerate(leitor, start=2):
+                if not any(v.strip() for v in valores):
+                    continue
+                relatorio["linhas_lidas"] += 1
+                try:
+                    linha = _resolver(dict(zip(nomes, valores)), campos, membros, dims)
+                except Rejeitada as e:
+                    relatorio["rejeitadas"][str(e)] += 1
+                    if len(relatorio["exemplos_rejeitadas"]) < MAX_EXEMPLOS:
+                        relatorio["exemplos_rejeitadas"].append(f"{caminho}:{numero}: {e}")
+                    continue
+                yield "\t".join(r"\N" if v is None else str(v) for v in linha) + "\n"
+
+
+class _Fluxo:
+    """Objeto-arquivo sobre um gerador de linhas, para o copy_expert ler em blocos."""
+
+    def __init__(self, linhas):
+        self._linhas = linhas
+        self._resto = ""
+
+    def read(self, tamanho=-1):
+        partes, total = [self._resto], len(self._resto)
+        while tamanho < 0 or total < tamanho:
+            linha = next(self._linhas, None)
+            if linha is None:
+                break
+            partes.append(linha)
+            total += len(linha)
+        texto = "".join(partes)
+        if tamanho < 0:
+            self._resto = ""
+            return texto
+        self._resto = texto[tamanho:]
+        return texto[:tamanho]
+
+
+def _criar_tabelas(cur):
+    cur.execute(f'''
+        CREATE TABLE IF NOT EXISTS {TABELA_VERSAO} (
+            tabela text PRIMARY KEY,
+            versao bigint NOT NULL,
+            atualizado_em timestamptz NOT NULL DEFAULT now()
+        )
+    ''')
+    cur.execute(f'''
+        CREATE TABLE IF NOT EXISTS {TABELA_HISTORICO} (
+            id bigserial PRIMARY KEY,
+            arquivos text[] NOT NULL,
+            linhas bigint NOT NULL,
+            rejeitadas bigint NOT NULL,
+            particoes_novas int NOT NULL,
+            particoes_alteradas int NOT NULL,
+            particoes_iguais int NOT NULL,
+            meses_novos int NOT NULL,
+            versao bigint,
+            segundos real NOT NULL,
+            carregado_em timestamptz NOT NULL DEFAULT now()
+        )
+    ''')
+
+
+def _incrementar_versao(cur):
+    cur.execute(
+        f'''
+        INSERT INTO {TABELA_VERSAO} (tabela, versao, atualizado_em)
+        VALUES (%s, 1, now())
+        ON CONFLICT (tabela) DO UPDATE
+        SET versao = {TABELA_VERSAO}.versao + 1, atualizado_em = now()
+        RETURNING versao
+        ''',
+        (TABELA,),
+    )
+    return cur.fetchone()["versao"]
+
+
+def _comparar(cur):
+    """Classifica as partições do extrato em nova, alterada ou igual à tabela fato."""
+    cur.execute("SELECT array_agg(DISTINCT id_tipo_evento) AS tipos, array_agg(DISTINCT id_tempo) AS tempos FROM _carga")
+    row = cur.fetchone()
+    # Os filtros redundantes por tipo/id_tempo deixam o planejador usar índices (e podar partições)
+    cur.execute(
+        f'''
+        CREATE TEMP TABLE _particoes ON COMMIT DROP AS
+        WITH novo AS (
+            SELECT c.id_tipo_evento, c.id_tempo, COUNT(*) AS linhas, SUM({_hash_linha('c')}) AS assinatura
+            FROM _carga c
+            GROUP BY c.id_tipo_evento, c.id_tempo
+        ),
+        atual AS (
+            SELECT f.id_tipo_evento, f.id_tempo, COUNT(*) AS linhas, SUM({_hash_linha('f')}) AS assinatura
+            FROM {TABELA} f
+            WHERE f.id_tipo_evento = ANY(%s) AND f.id_tempo = ANY(%s)
+            GROUP BY f.id_tipo_evento, f.id_tempo
+        )
+        SELECT
+            n.id_tipo_evento, n.id_tempo, n.linhas, a.linhas AS linhas_anteriores,
+            CASE
+                WHEN a.linhas IS NULL THEN 'nova'
+                WHEN a.linhas = n.linhas AND a.assinatura = n.assinatura THEN 'igual'
+                ELSE 'alterada'
+            END AS situacao
+        FROM novo n
+        LEFT JOIN atual a USING (id_tipo_evento, id_tempo)
+        ''',
+        (row["tipos"] or [], row["tempos"] or []),
+    )
+    cur.execute("SELECT * FROM _particoes ORDER BY id_tempo, id_tipo_evento")
+    return row, cur.fetchall()
+
+
+def carregar(arquivos, encoding="utf-8-sig", simular=False, max_rejeitadas=0):
+    """Carrega os extratos numa transação e devolve o relatório da carga.
+
+    Aborta (sem alterar nada) se mais de `max_rejeitadas` linhas não tiverem as chaves
+    resolvidas. Com `simular`, faz a comparação e desfaz tudo no fim.
+    """
+    inicio = time.monotonic()
+    relatorio = {
+        "arquivos": list(arquivos),
+        "linhas_lidas": 0,
+        "rejeitadas": Counter(),
+        "exemplos_rejeitadas": [],
+    }
+    colunas = ", ".join(COLUNAS)
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL statement_timeout = 0")
+            # Duas cargas (ou carga e migração de particoes.py) simultâneas esperam uma pela outra
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (particoes.TRAVA,))
+            _criar_tabelas(cur)
+            dims = Dimensoes(cur)
+
+            cur.execute(f"CREATE TEMP TABLE _carga ON COMMIT DROP AS SELECT {colunas} FROM {TABELA} WITH NO DATA")
+            fluxo = _Fluxo(_linhas_copy(arquivos, encoding, dims, relatorio))
+            cur.copy_expert(f"COPY _carga ({colunas}) FROM STDIN", fluxo, size=1 << 16)
+
+            rejeitadas = sum(relatorio["rejeitadas"].values())
+            if rejeitadas > max_rejeitadas:
+                conn.rollback()
+                raise RuntimeError(
+                    f"{rejeitadas} linhas rejeitadas (máximo {max_rejeitadas}): "
+                    f"{dict(relatorio['rejeitadas'])}; exemplos: {relatorio['exemplos_rejeitadas']}"
+                )
+            criadas = []
+            if dims.meses_novos:
+                dims.inserir_meses(cur)
+                # Tabela fato particionada: partição de cada ano novo antes de inserir as linhas dele
+                criadas = particoes.garantir_anos(cur)
+
+            filtros, comparadas = _comparar(cur)
+            situacoes = Counter(p["situacao"] for p in comparadas)
+            versao = None
+            if situacoes["nova"] or situacoes["alterada"]:
+                cur.execute(
+                    f'''
+                    DELETE FROM {TABELA} f
+                    USING _particoes p
+                    WHERE p.situacao = 'alterada'
+                      AND f.id_tipo_evento = p.id_tipo_evento AND f.id_tempo = p.id_tempo
+                      AND f.id_tipo_evento = ANY(%s) AND f.id_tempo = ANY(%s)
+                    ''',
+                    (filtros["tipos"], filtros["tempos"]),
+                )
+                removidas = cur.rowcount
+                cur.execute(f'''
+                    INSERT INTO {TABELA} ({colunas})
+                    SELECT {', '.join(f'c.{c}' for c in COLUNAS)}
+                    FROM _carga c
+                    JOIN _particoes p USING (id_tipo_evento, id_tempo)
+                    WHERE p.situacao <> 'igual'
+                ''')
+                inseridas = cur.rowcount
+                versao = _incrementar_versao(cur)
+            else:
+                removidas = inseridas = 0
+
+            segundos = round(time.monotonic() - inicio, 1)
+            cur.execute(
+                f'''
+                INSERT INTO {TABELA_HISTORICO} (arquivos, linhas, rejeitadas, particoes_novas, particoes_alteradas,
+                                                particoes_iguais, meses_novos, versao, segundos)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ''',
+                (list(arquivos), relatorio["linhas_lidas"], rejeitadas, situacoes["nova"], situacoes["alterada"],
+                 situacoes["igual"], len(dims.meses_novos), versao, segundos),
+            )
+            meses = {id_tempo: chave for chave, id_tempo in dims.tempo.items()}
+            relatorio.update(
+                rejeitadas=dict(relatorio["rejeitadas"]),
+                meses_novos=[f"{ano}-{mes:02d}" for _, ano, mes in dims.meses_novos],
+                particoes_criadas=criadas,
+                particoes={situacao: situacoes[situacao] for situacao in ("nova", "alterada", "igual")},
+                mudancas=[
+                    {
+                        "id_tipo_evento": p["id_tipo_evento"],
+                        "competencia": "{}-{:02d}".format(*meses[p["id_tempo"]]),
+                        "situacao": p["situacao"],
+                        "linhas": p["linhas"],
+                        "linhas_anteriores": p["linhas_anteriores"],
+                    }
+                    for p in comparadas if p["situacao"] != "igual"
+                ],
+                linhas_removidas=removidas,
+                linhas_inseridas=inseridas,
+                versao=versao,
+                simulacao=simular,
+                segundos=segundos,
+            )
+            if simular:
+                conn.rollback()
+    return relatorio
+
+
+def marcar():
+    """Incrementa o marcador de versão (invalida o cache da API) sem carregar nada."""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            _criar_tabelas(cur)
+            return {"versao": _incrementar_versao(cur)}
+
+
+def status(limite=10):
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL AS existe", (TABELA_HISTORICO,))
+            if not cur.fetchone()["existe"]:
+                return {"versao": None, "cargas": []}
+            cur.execute(f"SELECT versao, atualizado_em FROM {TABELA_VERSAO} WHERE tabela = %s", (TABELA,))
+            marcador = cur.fetchone()
+            cur.execute(f"SELECT * FROM {TABELA_HISTORICO} ORDER BY id DESC LIMIT %s", (limite,))
+            cargas = [dict(r, carregado_em=r["carregado_em"].isoformat()) for r in cur.fetchall()]
+    return {
+        "versao": marcador["versao"] if marcador else None,
+        "atualizado_em": marcador["atualizado_em"].isoformat() if marcador else None,
+        "cargas": cargas,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga incremental de fato_saude_mensal")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p = sub.add_parser("carregar", help="carrega extratos mensais (CSV ou CSV.gz; '-' lê da entrada padrão)")
+    p.add_argument("arquivos", nargs="+")
+    p.add_argument("--encoding", default="utf-8-sig", help="codificação dos extratos (ex.: latin-1)")
+    p.add_argument("--max-rejeitadas", type=int, default=0,
+                   help="linhas com chave não resolvida toleradas antes de abortar a carga")
+    p.add_argument("--simular", action="store_true", help="só compara as partições; não grava nada")
+    p.add_argument("--rollups", action="store_true", help="reconstrói os rollups se a carga alterou dados")
+    p = sub.add_parser("status", help="versão atual e últimas cargas")
+    p.add_argument("--limite", type=int, default=10)
+    sub.add_parser("marcar", help="incrementa a versão dos dados sem carregar")
+    args = parser.parse_args()
+
+    if args.comando == "carregar":
+        relatorio = carregar(args.arquivos, args.encoding, args.simular, args.max_rejeitadas)
+        if args.rollups and relatorio["versao"] is not None and not args.simular:
+            relatorio["rollups"] = rollups.atualizar()
+        resultado = relatorio
+    elif args.comando == "status":
+        resultado = status(args.limite)
+    else:
+        resultado = marcar()
+    print(json.dumps(resultado, indent=2, ensure_ascii=False, default=str))
+
+
+if __name__ == "__main__":
+    main()
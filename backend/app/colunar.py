@@ -0,0 +1,402 @@
+"""Snapshot colunar (Parquet) da tabela fato e das dimensões, consultado em processo com DuckDB.
+
+Com MOTOR_CONSULTAS=duckdb, consultas.consultar() roda o mesmo SQL dos endpoints sobre um
+snapshot local, num motor vetorizado dentro do próprio worker: sem ida ao banco e sem
+disputar o pool. O PostgreSQL continua a fonte da verdade. O snapshot guarda a versão dos
+dados (cache.versao_dados) em que foi exportado e só atende enquanto ela for a atual; depois
+de uma carga, as consultas voltam ao PostgreSQL (com os rollups) até uma tarefa em segundo
+plano exportar o snapshot novo e trocar para ele.
+
+Layout em SNAPSHOT_DIR: um diretório por versão (<tabela>.parquet + manifesto.json) e o
+atual.json apontando o snapshot em uso. Os dois mais recentes ficam no disco, porque outro
+worker pode ainda estar lendo o anterior. A tabela fato é gravada ordenada por
+(id_tipo_evento, id_tempo), então as estatísticas dos row groups descartam o que está fora
+do filtro, como as partições no banco. Com vários workers, uma trava de arquivo deixa só um
+exportar; os outros abrem o snapshot pronto.
+
+    python -m app.colunar exportar [--forcar]   # ex.: logo depois de python -m app.carga carregar
+    python -m app.colunar status
+
+Requer pip install -r requirements-colunar.txt (duckdb e pyarrow; o deploy instala quando
+MOTOR_CONSULTAS=duckdb). A paridade com o PostgreSQL é verificada por tests/test_colunar.py
+(pytest, com TEST_DATABASE_URL) e a latência dos dois motores é medida por bench/colunar.py.
+"""
+import argparse
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+
+import psycopg2.extensions
+from starlette.concurrency import run_in_threadpool
+
+from . import cache, config, esquema, metricas
+from .db import get_connection
+
+logger = logging.getLogger(__name__)
+
+FATO = "fato_saude_mensal"
+TABELAS = [FATO, "dim_tempo", "dim_localidade", *esquema.DIMENSOES]
+# Ordem de gravação: row groups contíguos por tipo de evento e período
+ORDEM = {FATO: "id_tipo_evento, id_tempo"}
+ATUAL = "atual.json"
+MANIFESTO = "manifesto.json"
+TRAVA = ".trava"
+MANTER = 2
+# Linhas por lote do cursor e por row group (o tamanho de row group padrão do DuckDB)
+LOTE = 122880
+
+# OID do PostgreSQL -> tipo Arrow; os demais tipos vão como texto
+_TIPOS = {16: "bool_", 20: "int64", 21: "int16", 23: "int32", 700: "float32", 701: "float64", 1700: "float64",
+          1082: "date32", 1114: "timestamp"}
+
+_motor = {"versao": None, "caminho": None, "con": None, "geracao": 0, "manifesto": None, "aberto_em": None}
+_motor_lock = threading.Lock()
+# geracao -> conexão, cursores criados nela e consultas em andamento; a de um snapshot
+# substituído é fechada quando a última consulta dela termina
+_geracoes = {}
+_local = threading.local()
+_traduzidas = {}
+_tarefa = None
+_estado = {"estado": "ocioso", "exportado_em": None, "duracao_s": None, "erro": None}
+
+
+# --- exportação ----------------------------------------------------------------
+
+def _ler(caminho):
+    try:
+        with open(caminho, encoding="utf-8") as arquivo:
+            return json.load(arquivo)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _gravar(caminho, conteudo):
+    """Grava JSON de forma atômica (arquivo temporário + rename)."""
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        json.dump(conteudo, arquivo, ensure_ascii=False, indent=2)
+    os.replace(temporario, caminho)
+
+
+def _tipo(pa, oid):
+    if oid == 1114:
+        return pa.timestamp("us")
+    nome = _TIPOS.get(oid)
+    return getattr(pa, nome)() if nome else pa.string()
+
+
+def _valores(pa, valores, campo, oid):
+    if oid == 1700:
+        valores = [None if v is None else float(v) for v in valores]
+    elif oid not in _TIPOS:
+        valores = [None if v is None else str(v) for v in valores]
+    return pa.array(valores, type=campo.type)
+
+
+def _exportar_tabela(conn, tabela, arquivo):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    with conn.cursor(name=f"snapshot_{tabela}", cursor_factory=psycopg2.extensions.cursor) as cur:
+        cur.itersize = LOTE
+        ordem = f" ORDER BY {ORDEM[tabela]}" if tabela in ORDEM else ""
+        cur.execute(f"SELECT * FROM {tabela}{ordem}")
+        linhas = cur.fetchmany(LOTE)
+        oids = [coluna.type_code for coluna in cur.description]
+        schema = pa.schema([(coluna.name, _tipo(pa, coluna.type_code)) for coluna in cur.description])
+        total = 0
+        with pq.ParquetWriter(arquivo, schema, compression="zstd") as escritor:
+            while True:
+                colunas = list(zip(*linhas)) if linhas else [[] for _ in oids]
+                escritor.write_table(pa.Table.from_arrays(
+                    [_valores(pa, v, campo, oid) for v, campo, oid in zip(colunas, schema, oids)], schema=schema,
+                ), row_group_size=LOTE)
+                total += len(linhas)
+                if len(linhas) < LOTE:
+                    return total
+                linhas = cur.fetchmany(LOTE)
+
+
+def _limpar(versao):
+    """Remove snapshots antigos (mantém os MANTER mais recentes) e restos de exportações interrompidas."""
+    snapshots = []
+    for nome in os.listdir(config.SNAPSHOT_DIR):
+        caminho = os.path.join(config.SNAPSHOT_DIR, nome)
+        if not os.path.isdir(caminho):
+            continue
+        if nome.startswith("."):
+            shutil.rmtree(caminho, ignore_errors=True)
+        elif nome != versao:
+            snapshots.append((os.path.getmtime(caminho), caminho))
+    for _, caminho in sorted(snapshots, reverse=True)[MANTER - 1:]:
+        shutil.rmtree(caminho, ignore_errors=True)
+
+
+def exportar(forcar=False):
+    """Exporta a tabela fato e as dimensões para o snapshot da versão atual e o torna o atual.
+
+    Lê tudo numa transação REPEATABLE READ (tabelas coerentes entre si e com a versão). Se o
+    snapshot da versão já existe (ex.: outro worker exportou), só o reaproveita. Retorna o manifesto.
+    """
+    os.makedirs(config.SNAPSHOT_DIR, exist_ok=True)
+    with open(os.path.join(config.SNAPSHOT_DIR, TRAVA), "w") as trava:
+        fcntl.flock(trava, fcntl.LOCK_EX)
+        inicio = time.monotonic()
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+                cur.execute(f"SET LOCAL statement_timeout = '{config.EXPORT_TIMEOUT}'")
+                versao = cache.versao_cursor(cur)
+                if versao is None:
+                    raise RuntimeError(f"{FATO} não existe ou não tem estatísticas; nada a exportar")
+                destino = os.path.join(config.SNAPSHOT_DIR, versao)
+                manifesto = _ler(os.path.join(destino, MANIFESTO))
+                if manifesto is not None and not forcar:
+                    _gravar(os.path.join(config.SNAPSHOT_DIR, ATUAL), {"versao": versao})
+                    return manifesto
+                cur.execute("SELECT t AS tabela FROM unnest(%s::text[]) AS t WHERE to_regclass(t) IS NOT NULL",
+                            (TABELAS,))
+                existentes = {row["tabela"] for row in cur.fetchall()}
+
+            temporario = os.path.join(config.SNAPSHOT_DIR, f".{versao}.{os.getpid()}")
+            os.makedirs(temporario)
+            try:
+                linhas = {
+                    tabela: _exportar_tabela(conn, tabela, os.path.join(temporario, f"{tabela}.parquet"))
+                    for tabela in TABELAS if tabela in existentes
+                }
+                manifesto = {
+                    "versao": versao,
+                    "exportado_em": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                    "duracao_s": round(time.monotonic() - inicio, 2),
+                    "linhas": linhas,
+                }
+                _gravar(os.path.join(temporario, MANIFESTO), manifesto)
+                if os.path.isdir(destino):
+                    shutil.rmtree(destino)
+                os.replace(temporario, destino)
+            except BaseException:
+                shutil.rmtree(temporario, ignore_errors=True)
+                raise
+        _gravar(os.path.join(config.SNAPSHOT_DIR, ATUAL), {"versao": versao})
+        _limpar(versao)
+        logger.info("Snapshot colunar %s exportado em %.1f s: %s", versao, manifesto["duracao_s"], linhas)
+        return manifesto
+
+
+# --- consultas -----------------------------------------------------------------
+
+def _abrir(caminho):
+    import duckdb
+
+    con = duckdb.connect(":memory:")
+    if config.DUCKDB_THREADS:
+        con.execute(f"SET threads = {config.DUCKDB_THREADS}")
+    # Metadados dos Parquet (schema e estatísticas dos row groups) lidos uma vez, não a cada consulta
+    con.execute("SET enable_object_cache = true")
+    for arquivo in sorted(os.listdir(caminho)):
+        if arquivo.endswith(".parquet"):
+            tabela = arquivo[:-len(".parquet")]
+            alvo = os.path.join(caminho, arquivo).replace("'", "''")
+            con.execute(f"CREATE VIEW {tabela} AS SELECT * FROM read_parquet('{alvo}')")
+    return con
+
+
+def carregar():
+    """Abre o snapshot apontado por atual.json, se ainda não for o aberto. Retorna a versão aberta."""
+    apontado = _ler(os.path.join(config.SNAPSHOT_DIR, ATUAL))
+    if apontado is None or apontado["versao"] == _motor["versao"]:
+        return _motor["versao"]
+    caminho = os.path.join(config.SNAPSHOT_DIR, apontado["versao"])
+    manifesto = _ler(os.path.join(caminho, MANIFESTO))
+    if manifesto is None:
+        return _motor["versao"]
+    con = _abrir(caminho)
+    with _motor_lock:
+        anterior = _motor["geracao"]
+        geracao = anterior + 1
+        _geracoes[geracao] = {"con": con, "cursores": [], "em_uso": 0}
+        _motor.update(
+            versao=manifesto["versao"], caminho=caminho, con=con, geracao=geracao,
+            manifesto=manifesto, aberto_em=time.time(),
+        )
+        # Consultas em andamento na conexão anterior terminam nela, e _devolver() a fecha depois
+        antiga = None
+        if anterior in _geracoes and _geracoes[anterior]["em_uso"] == 0:
+            antiga = _geracoes.pop(anterior)
+    _fechar(antiga)
+    logger.info("Snapshot colunar %s aberto", manifesto["versao"])
+    return manifesto["versao"]
+
+
+def _fechar(estado):
+    if estado is None:
+        return
+    for cursor in estado["cursores"]:
+        cursor.close()
+    estado["con"].close()
+
+
+def _reservar():
+    """Cursor da thread atual no snapshot aberto, contado como em uso até _devolver()."""
+    atual = getattr(_local, "cursor", None)
+    with _motor_lock:
+        geracao = _motor["geracao"]
+        estado = _geracoes.get(geracao)
+        if estado is None:
+            raise RuntimeError("nenhum snapshot colunar aberto")
+        if atual is None or atual[0] != geracao:
+            # Um cursor por thread: conexões do DuckDB não devem ser usadas por várias threads ao mesmo tempo
+            atual = _local.cursor = (geracao, estado["con"].cursor())
+            estado["cursores"].append(atual[1])
+        estado["em_uso"] += 1
+    return atual
+
+
+def _devolver(geracao):
+    with _motor_lock:
+        estado = _geracoes[geracao]
+        estado["em_uso"] -= 1
+        antiga = None
+        if geracao != _motor["geracao"] and estado["em_uso"] == 0:
+            antiga = _geracoes.pop(geracao)
+    _fechar(antiga)
+
+
+def _traduzir(sql):
+    """Placeholders do psycopg (%s) para os do DuckDB (?); o resto do SQL de consultas.py é comum aos dois."""
+    traduzido = _traduzidas.get(sql)
+    if traduzido is None:
+        traduzido = _traduzidas[sql] = sql.replace("%s", "?")
+    return traduzido
+
+
+def fetch_tuplas(query, params=None):
+    """Como db.fetch_tuplas, mas no snapshot. Bloqueante: rodar no threadpool (o DuckDB solta o GIL)."""
+    geracao, cur = _reservar()
+    try:
+        inicio = time.perf_counter()
+        rows = cur.execute(_traduzir(query), list(params or [])).fetchall()
+    finally:
+        _devolver(geracao)
+    metricas.registrar_consulta(query, params, time.perf_counter() - inicio, len(rows))
+    return rows
+
+
+async def ativo():
+    """True se MOTOR_CONSULTAS=duckdb e o snapshot aberto é da versão atual dos dados."""
+    if config.MOTOR_CONSULTAS != "duckdb" or _motor["con"] is None:
+        return False
+    return _motor["versao"] == await cache.versao_dados()
+
+
+# --- atualização em segundo plano ----------------------------------------------
+
+async def atualizar(versao=None):
+    """Abre o snapshot da versão atual, exportando-o antes se nenhum worker o fez ainda."""
+    versao = versao or await cache.versao_dados()
+    if await run_in_threadpool(carregar) == versao:
+        return
+    _estado.update(estado="exportando", erro=None)
+    inicio = time.monotonic()
+    try:
+        manifesto = await run_in_threadpool(exportar)
+        await run_in_threadpool(carregar)
+        _estado.update(estado="pronto", exportado_em=manifesto["exportado_em"])
+    except Exception as e:
+        _estado.update(estado="falhou", erro=str(e))
+        raise
+    finally:
+        _estado["duracao_s"] = round(time.monotonic() - inicio, 2)
+
+
+async def _vigiar():
+    while True:
+        try:
+            versao = await cache.versao_dados()
+            # None: banco fora do ar ou tabela fato ausente; tenta de novo na próxima volta
+            if versao is not None and versao != _motor["versao"]:
+                await atualizar(versao)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Falha ao atualizar o snapshot colunar")
+        await asyncio.sleep(config.CACHE_CHECK_VERSAO)
+
+
+def disponivel():
+    try:
+        import duckdb  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def iniciar():
+    global _tarefa
+    if _tarefa is not None or config.MOTOR_CONSULTAS != "duckdb":
+        return
+    if not disponivel():
+        _estado.update(estado="indisponivel", erro="duckdb/pyarrow não instalados (requirements-colunar.txt)")
+        logger.error("MOTOR_CONSULTAS=duckdb sem duckdb/pyarrow instalados (requirements-colunar.txt); "
+                     "as consultas seguem no PostgreSQL")
+        return
+    _tarefa = asyncio.get_running_loop().create_task(_vigiar())
+
+
+async def parar():
+    global _tarefa
+    if _tarefa is not None and not _tarefa.done():
+        _tarefa.cancel()
+        try:
+            await _tarefa
+        except asyncio.CancelledError:
+            pass
+    _tarefa = None
+
+
+def status():
+    return {
+        **_estado,
+        "motor": config.MOTOR_CONSULTAS,
+        "versao": _motor["versao"],
+        "caminho": _motor["caminho"],
+        "aberto_em": _motor["aberto_em"],
+        "linhas": (_motor["manifesto"] or {}).get("linhas"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot colunar (Parquet/DuckDB) da tabela fato e das dimensões")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p = sub.add_parser("exportar", help="exporta o snapshot da versão atual dos dados e o torna o atual")
+    p.add_argument("--forcar", action="store_true", help="exporta de novo mesmo se o snapshot da versão já existe")
+    sub.add_parser("status", help="snapshot atual e os disponíveis em SNAPSHOT_DIR")
+    args = parser.parse_args()
+
+    if args.comando == "exportar":
+        resultado = exportar(forcar=args.forcar)
+    else:
+        disponiveis = []
+        if os.path.isdir(config.SNAPSHOT_DIR):
+            for nome in sorted(os.listdir(config.SNAPSHOT_DIR)):
+                manifesto = _ler(os.path.join(config.SNAPSHOT_DIR, nome, MANIFESTO))
+                if manifesto is not None:
+                    disponiveis.append(manifesto)
+        resultado = {
+            "diretorio": config.SNAPSHOT_DIR,
+            "atual": (_ler(os.path.join(config.SNAPSHOT_DIR, ATUAL)) or {}).get("versao"),
+            "snapshots": disponiveis,
+        }
+    print(json.dumps(resultado, indent=2, ensure_ascii=False, default=str))
+
+
+if __name__ == "__main__":
+    main()
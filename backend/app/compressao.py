@@ -0,0 +1,145 @@
+"""Compressão negociada (brotli ou gzip) das respostas grandes.
+
+Só comprime respostas 200 com Content-Length (as exportações em streaming ficam de fora)
+a partir de COMPRESSAO_MIN_BYTES. Quando a resposta tem ETag (endpoints públicos, ver
+http_cache.py), o corpo comprimido fica em cache por (ETag, codificação): a próxima
+requisição igual é respondida sem chamar o endpoint nem comprimir de novo. Como a ETag inclui a
+versão dos dados e a assinatura das dimensões, uma recarga de qualquer uma delas troca a chave.
+Respostas que o endpoint marcou com no-store são comprimidas mas não guardadas.
+
+Bytes economizados e tempo de CPU gasto comprimindo ficam em stats(), por rota.
+"""
+import gzip
+import threading
+import time
+
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import Response
+
+from . import config, http_cache
+from .cache import ResultCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+TIPOS_COMPRIMIVEIS = ("application/json", "application/x-ndjson", "text/")
+
+comprimidos = ResultCache(max_items=config.COMPRESSAO_CACHE_ITENS, ttl=config.CACHE_TTL)
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def escolher_codificacao(accept_encoding):
+    """Codificação preferida pelo cliente entre as suportadas (br antes de gzip em empate)."""
+    aceitas = {}
+    for parte in accept_encoding.split(","):
+        nome, _, parametros = parte.strip().partition(";")
+        nome = nome.strip().lower()
+        q = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith("q="):
+            try:
+                q = float(parametros[2:])
+            except ValueError:
+                q = 0.0
+        if nome:
+            aceitas[nome] = q
+
+    suportadas = (["br"] if brotli is not None else []) + ["gzip"]
+    melhor, melhor_q = None, 0.0
+    for nome in suportadas:
+        q = aceitas.get(nome, aceitas.get("*", 0.0))
+        if q > melhor_q:
+            melhor, melhor_q = nome, q
+    return melhor
+
+
+def comprimir(corpo, codificacao):
+    if codificacao == "br":
+        return brotli.compress(corpo, quality=config.COMPRESSAO_NIVEL_BROTLI)
+    return gzip.compress(corpo, compresslevel=config.COMPRESSAO_NIVEL_GZIP, mtime=0)
+
+
+def _registrar(rota, codificacao, original, enviado, cpu_ms=0.0, cache_hit=False):
+    with _stats_lock:
+        s = _stats.setdefault(rota, {
+            "respostas": 0, "cache_hits": 0, "bytes_originais": 0, "bytes_enviados": 0,
+            "cpu_ms": 0.0, "codificacoes": {},
+        })
+        s["respostas"] += 1
+        s["cache_hits"] += int(cache_hit)
+        s["bytes_originais"] += original
+        s["bytes_enviados"] += enviado
+        s["cpu_ms"] += cpu_ms
+        s["codificacoes"][codificacao] = s["codificacoes"].get(codificacao, 0) + 1
+
+
+def stats():
+    with _stats_lock:
+        rotas = {}
+        for rota, s in _stats.items():
+            comprimidas = s["respostas"] - s["cache_hits"]
+            rotas[rota] = {
+                **s,
+                "codificacoes": dict(s["codificacoes"]),
+                "cpu_ms": round(s["cpu_ms"], 2),
+                "bytes_economizados": s["bytes_originais"] - s["bytes_enviados"],
+                "razao": round(s["bytes_enviados"] / s["bytes_originais"], 3) if s["bytes_originais"] else None,
+                "cpu_ms_por_compressao": round(s["cpu_ms"] / comprimidas, 3) if comprimidas else None,
+            }
+    return {
+        "brotli_disponivel": brotli is not None,
+        "min_bytes": config.COMPRESSAO_MIN_BYTES,
+        "nivel_gzip": config.COMPRESSAO_NIVEL_GZIP,
+        "nivel_brotli": config.COMPRESSAO_NIVEL_BROTLI,
+        "cache": comprimidos.stats(),
+        "rotas": rotas,
+    }
+
+
+class CompressaoMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        codificacao = escolher_codificacao(request.headers.get("accept-encoding", ""))
+        if codificacao is None:
+            return await call_next(request)
+
+        rota = request.url.path
+        # ETag calculada pelo CacheHTTPMiddleware (por fora deste) antes de chegar aqui
+        etag = getattr(request.state, "etag", None)
+        if etag is not None:
+            hit, item = comprimidos.get((etag, codificacao))
+            if hit:
+                corpo, tamanho_original, media_type = item
+                _registrar(rota, codificacao, tamanho_original, len(corpo), cache_hit=True)
+                return Response(
+                    corpo,
+                    media_type=media_type,
+                    headers={"Content-Encoding": codificacao, "Vary": "Accept-Encoding"},
+                )
+
+        response = await call_next(request)
+        tipo = response.headers.get("content-type", "")
+        tamanho = response.headers.get("content-length")
+        if (response.status_code != 200
+                or "content-encoding" in response.headers
+                or tamanho is None
+                or int(tamanho) < config.COMPRESSAO_MIN_BYTES
+                or not tipo.startswith(TIPOS_COMPRIMIVEIS)):
+            return response
+
+        corpo = b"".join([parte async for parte in response.body_iterator])
+        inicio = time.thread_time()
+        comprimido = comprimir(corpo, codificacao)
+        cpu_ms = (time.thread_time() - inicio) * 1000
+        _registrar(rota, codificacao, len(corpo), len(comprimido), cpu_ms=cpu_ms)
+        if etag is not None and http_cache.armazenavel(response):
+            comprimidos.set((etag, codificacao), (comprimido, len(corpo), tipo))
+
+        headers = dict(response.headers)
+        headers.pop("content-length", None)
+        headers["content-encoding"] = codificacao
+        headers["vary"] = "Accept-Encoding"
+        return Response(comprimido, status_code=200, headers=headers)
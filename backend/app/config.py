@@ -0,0 +1,152 @@
+import os
+import tempfile
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _int(nome, padrao):
+    valor = os.getenv(nome)
+    if valor is None or valor.strip() == "":
+        return padrao
+    try:
+        return int(valor)
+    except ValueError:
+        raise RuntimeError(f"Variável de ambiente {nome} deve ser um número inteiro (recebido: {valor!r})")
+
+
+def _float(nome, padrao):
+    valor = os.getenv(nome)
+    if valor is None or valor.strip() == "":
+        return padrao
+    try:
+        return float(valor)
+    except ValueError:
+        raise RuntimeError(f"Variável de ambiente {nome} deve ser numérica (recebido: {valor!r})")
+
+
+def _bool(nome, padrao):
+    valor = os.getenv(nome)
+    if valor is None or valor.strip() == "":
+        return padrao
+    return valor.strip().lower() in ("1", "true", "yes", "sim", "on")
+
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+# Endpoints analíticos usam o pool assíncrono (psycopg 3); com "false" usam o pool
+# síncrono (psycopg2) dentro do threadpool do AnyIO
+DB_ASYNC = _bool("DB_ASYNC", True)
+# Motor dos endpoints analíticos: "postgres" ou "duckdb" (snapshot colunar local da tabela
+# fato, ver colunar.py; requer requirements-colunar.txt). O PostgreSQL segue como fonte da verdade
+MOTOR_CONSULTAS = os.getenv("MOTOR_CONSULTAS", "postgres").strip().lower()
+# Diretório dos snapshots Parquet do modo duckdb e threads do DuckDB por processo (0 = todos os núcleos)
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(tempfile.gettempdir(), "sims-snapshot"))
+DUCKDB_THREADS = _int("DUCKDB_THREADS", 0)
+
+# Processos da API (workers do gunicorn; gunicorn.conf.py define o valor para os workers)
+WEB_CONCURRENCY = max(1, _int("WEB_CONCURRENCY", 1))
+
+# Pool de conexões (por processo): DB_POOL_MAX para o pool síncrono (psycopg2) e
+# DB_POOL_MAX_ASYNC para o assíncrono (psycopg 3); sem DB_POOL_MAX_ASYNC, o mesmo valor
+DB_POOL_MIN = _int("DB_POOL_MIN", 1)
+DB_POOL_MAX = _int("DB_POOL_MAX", 10)
+DB_POOL_MAX_ASYNC = _int("DB_POOL_MAX_ASYNC", DB_POOL_MAX)
+# Total de conexões para todos os workers, os dois pools somados: cada worker recebe
+# DB_POOL_TOTAL / WEB_CONCURRENCY. Com DB_ASYNC, um quarto dessa parte (mín. 1) fica com o pool
+# síncrono (exportações, rotas de usuário) e o resto com o assíncrono dos endpoints; sem
+# DB_ASYNC o pool assíncrono não é aberto e o síncrono fica com tudo.
+# Sem DB_POOL_TOTAL, a mesma divisão de DB_POOL_TOTAL_PADRAO só limita DB_POOL_MAX e
+# DB_POOL_MAX_ASYNC (nunca aumenta): 16 workers não abrem 16 × (10 + 10) conexões
+DB_POOL_TOTAL = _int("DB_POOL_TOTAL", 0)
+# Abaixo do max_connections = 100 padrão do PostgreSQL, com folga para carga, CLIs e admin
+DB_POOL_TOTAL_PADRAO = 80
+_parte = max(1, (DB_POOL_TOTAL if DB_POOL_TOTAL > 0 else DB_POOL_TOTAL_PADRAO) // WEB_CONCURRENCY)
+if DB_ASYNC:
+    _sync = max(1, _parte // 4)
+    _async = max(1, _parte - _sync)
+else:
+    _sync = _async = _parte
+if DB_POOL_TOTAL > 0:
+    DB_POOL_MAX, DB_POOL_MAX_ASYNC = _sync, _async
+else:
+    DB_POOL_MAX, DB_POOL_MAX_ASYNC = min(DB_POOL_MAX, _sync), min(DB_POOL_MAX_ASYNC, _async)
+DB_POOL_MIN = min(DB_POOL_MIN, DB_POOL_MAX, DB_POOL_MAX_ASYNC)
+# Tempo máximo (s) que uma requisição espera por uma conexão livre
+DB_POOL_TIMEOUT = _float("DB_POOL_TIMEOUT", 30.0)
+# Conexões ociosas há mais tempo que isso (s) são testadas com SELECT 1 antes do uso
+DB_POOL_CHECK_IDLE = _float("DB_POOL_CHECK_IDLE", 30.0)
+# Conexões mais velhas que isso (s) são recicladas (0 desativa)
+DB_POOL_MAX_LIFETIME = _float("DB_POOL_MAX_LIFETIME", 1800.0)
+
+# Configurações de sessão aplicadas uma única vez por conexão física
+DB_STATEMENT_TIMEOUT = os.getenv("DB_STATEMENT_TIMEOUT", "600s")
+DB_WORK_MEM = os.getenv("DB_WORK_MEM", "256MB")
+DB_MAINTENANCE_WORK_MEM = os.getenv("DB_MAINTENANCE_WORK_MEM", "512MB")
+
+# Cache de resultados dos endpoints de agregação
+CACHE_MAX_ITENS = _int("CACHE_MAX_ITENS", 512)
+CACHE_TTL = _float("CACHE_TTL", 3600.0)
+# Intervalo (s) entre verificações da versão dos dados da tabela fato
+CACHE_CHECK_VERSAO = _float("CACHE_CHECK_VERSAO", 30.0)
+# Segundo nível compartilhado entre workers: "memoria" (nenhum), "disco" (SQLite local) ou "redis"
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memoria").strip().lower()
+CACHE_DISCO = os.getenv("CACHE_DISCO", os.path.join(tempfile.gettempdir(), "sims-cache.sqlite3"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL") or os.getenv("REDIS_URL", "")
+# Validade (s) da trava de quem calcula um resultado, renovada enquanto o cálculo dura; se o
+# worker morrer, os que esperam o mesmo resultado assumem no máximo este tempo depois
+CACHE_TRAVA = _float("CACHE_TRAVA", 60.0)
+
+# Aquecimento do cache no startup e a cada nova versão dos dados (ver aquecimento.py):
+# consultas simultâneas e quantos dos municípios mais pedidos entram
+AQUECER = _bool("AQUECER", True)
+AQUECER_CONCORRENCIA = _int("AQUECER_CONCORRENCIA", 2)
+AQUECER_MUNICIPIOS = _int("AQUECER_MUNICIPIOS", 20)
+
+# Intervalo (s) de recarga das dimensões mantidas em memória (0 desativa)
+DIM_REFRESH = _float("DIM_REFRESH", 3600.0)
+
+# Verificação local dos JWT do Supabase Auth (sem round-trip ao servidor de auth)
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+# Segredo HS256 do projeto (Settings → API → JWT Secret); projetos com chaves assimétricas usam o JWKS
+AUTH_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+AUTH_JWKS_URL = os.getenv("SUPABASE_JWKS_URL") or (
+    f"{SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json" if SUPABASE_URL else None
+)
+AUTH_ISSUER = os.getenv("AUTH_ISSUER") or (f"{SUPABASE_URL.rstrip('/')}/auth/v1" if SUPABASE_URL else None)
+AUTH_AUDIENCE = os.getenv("AUTH_AUDIENCE", "authenticated")
+# Intervalo (s) de recarga do JWKS; um kid desconhecido força recarga antes disso
+AUTH_JWKS_TTL = _float("AUTH_JWKS_TTL", 3600.0)
+# Tolerância (s) de relógio na verificação de exp/nbf/iat
+AUTH_LEEWAY = _int("AUTH_LEEWAY", 30)
+# Tokens já verificados mantidos em memória até expirarem
+AUTH_CACHE_MAX = _int("AUTH_CACHE_MAX", 1024)
+# Rotas de manutenção (POST /api/debug/...): com ADMIN_TOKEN, só "Authorization: Bearer <ADMIN_TOKEN>";
+# sem ele, qualquer usuário autenticado
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN") or None
+
+# Cabeçalhos HTTP de cache dos endpoints públicos de agregação
+HTTP_CACHE_MAX_AGE = _int("HTTP_CACHE_MAX_AGE", 300)
+HTTP_CACHE_STALE = _int("HTTP_CACHE_STALE", 3600)
+
+# Validade (s) no navegador/CDN das geometrias de /api/geo; revalidadas por ETag depois disso
+GEO_CACHE_MAX_AGE = _int("GEO_CACHE_MAX_AGE", 604800)
+
+# Exportação em streaming: linhas por lote do cursor server-side e timeout da consulta
+EXPORT_LOTE = _int("EXPORT_LOTE", 10000)
+EXPORT_TIMEOUT = os.getenv("EXPORT_TIMEOUT", "30min")
+# Exportações simultâneas por processo: cada uma prende uma conexão do pool enquanto dura
+EXPORT_CONCORRENCIA = _int("EXPORT_CONCORRENCIA", 2)
+
+# Compressão das respostas (brotli quando o cliente aceita e o pacote está instalado, senão gzip)
+COMPRESSAO_MIN_BYTES = _int("COMPRESSAO_MIN_BYTES", 1024)
+COMPRESSAO_NIVEL_GZIP = _int("COMPRESSAO_NIVEL_GZIP", 6)
+COMPRESSAO_NIVEL_BROTLI = _int("COMPRESSAO_NIVEL_BROTLI", 5)
+# Corpos comprimidos guardados por (ETag, codificação)
+COMPRESSAO_CACHE_ITENS = _int("COMPRESSAO_CACHE_ITENS", 256)
+
+# Consultas mais lentas que isso (ms) vão para o log com SQL e parâmetros (ver /metrics)
+SLOW_QUERY_MS = _int("SLOW_QUERY_MS", 1000)
+
+# Captura de planos (app/planos.py): quanto buffers ou tempo podem crescer antes de virar regressão
+PLANO_FATOR_REGRESSAO = _float("PLANO_FATOR_REGRESSAO", 2.0)
@@ -0,0 +1,473 @@
+"""SQL dos endpoints analíticos.
+
+O banco só devolve agregados por id (sem JOIN com dimensões); a tradução de ids em
+descrições, o agrupamento por descrição e a ordenação são feitos em Python com as
+dimensões em memória (app/dimensoes.py).
+
+Cada função recebe a origem escolhida por rollups.origem() e os filtros, e devolve a
+consulta (sql, params, decorar). O texto SQL de cada formato de filtro é montado uma vez
+e reaproveitado.
+
+As linhas chegam como tuplas (sem dict por linha) e as somas já vêm convertidas para bigint
+no SQL, então o driver entrega int direto em vez de um Decimal por valor.
+"""
+from starlette.concurrency import run_in_threadpool
+
+from . import colunar, dimensoes, esquema, rollups
+from .db_async import fetch_tuplas
+
+_compiladas = {}
+
+
+def _compilar(chave, montar):
+    chave = (esquema.geracao(),) + chave
+    sql = _compiladas.get(chave)
+    if sql is None:
+        sql = montar()
+        _compiladas[chave] = sql
+    return sql
+
+
+def limpar():
+    _compiladas.clear()
+
+
+def _filtro_tempo(faixas):
+    """Condição sobre f.id_tempo a partir de dimensoes.faixas_tempo().
+
+    Só faixas e listas de id_tempo (nunca JOIN com dim_tempo): com a tabela fato particionada
+    por ano (particoes.py), o planejador descarta as partições fora do filtro.
+    Retorna (sql, params, forma); a forma (nº de faixas e de ids avulsos) entra na chave do SQL compilado.
+    """
+    if faixas is None:
+        return "", [], None
+    intervalos, avulsos = faixas
+    partes, params = [], []
+    for inicio, fim in intervalos:
+        partes.append("f.id_tempo BETWEEN %s AND %s")
+        params += [inicio, fim]
+    if avulsos:
+        partes.append(f"f.id_tempo IN ({', '.join(['%s'] * len(avulsos))})")
+        params += avulsos
+    if not partes:
+        return " AND FALSE", [], (0, 0)
+    return f" AND ({' OR '.join(partes)})", params, (len(intervalos), len(avulsos))
+
+
+def _em(coluna, valores):
+    if not valores:
+        return " AND FALSE", []
+    return f" AND {coluna} IN ({', '.join(['%s'] * len(valores))})", list(valores)
+
+
+def filtros(id_localidade=None, uf=None, ano_inicio=None, ano_fim=None, mes=None):
+    """Filtros de tempo e localidade sobre a tabela fato, para consultas montadas fora daqui (ex.: exportação).
+
+    Retorna (sql, params) no formato ' AND ...'.
+    """
+    sql, params, _ = _filtro_tempo(dimensoes.faixas_tempo(ano_inicio=ano_inicio, ano_fim=ano_fim, mes=mes))
+    if id_localidade:
+        sql += " AND f.id_localidade = %s"
+        params.append(id_localidade)
+    elif uf:
+        filtro, ids = _em("f.id_localidade", dimensoes.ids_localidade_uf(uf))
+        sql += filtro
+        params += ids
+    return sql, params
+
+
+async def executar(consulta, timeout=None):
+    sql, params, decorar = consulta
+    return decorar(await fetch_tuplas(sql, params, timeout=timeout))
+
+
+async def consultar(montar, *args, localidade=False, tempo=False, anual=False, timeout=None):
+    """Escolhe a origem (rollup ou fato), monta a consulta e executa.
+
+    Com o snapshot colunar em dia (MOTOR_CONSULTAS=duckdb, ver colunar.py), a mesma consulta
+    roda sobre a tabela fato do snapshot, no DuckDB.
+    """
+    await dimensoes.garantir()
+    if await colunar.ativo():
+        sql, params, decorar = montar(rollups.FATO, *args)
+        return decorar(await run_in_threadpool(colunar.fetch_tuplas, sql, params))
+    origem = await rollups.origem(localidade=localidade, tempo=tempo, anual=anual)
+    return await executar(montar(origem, *args), timeout=timeout)
+
+
+def periodo_dados(origem):
+    tabela, nivel = origem
+
+    def montar():
+        # Um probe por id de dim_tempo (via índice em id_tempo) em vez de varrer a tabela fato
+        return f'''
+            SELECT t.id_tempo
+            FROM unnest(%s::int[]) AS t(id_tempo)
+            WHERE EXISTS (
+                SELECT 1
+                FROM {tabela}
+                WHERE f.id_tempo = t.id_tempo{nivel}
+            );
+        '''
+
+    def decorar(rows):
+        periodos = [dimensoes.tempo[id_tempo] for (id_tempo,) in rows if id_tempo in dimensoes.tempo]
+        if not periodos:
+            return {"ano_inicio": None, "ano_fim": None, "mes_inicio": None, "mes_fim": None}
+        ano_inicio = min(a for a, _ in periodos)
+        ano_fim = max(a for a, _ in periodos)
+        return {
+            "ano_inicio": ano_inicio,
+            "ano_fim": ano_fim,
+            "mes_inicio": min(m for a, m in periodos if a == ano_inicio),
+            "mes_fim": max(m for a, m in periodos if a == ano_fim),
+        }
+
+    return _compilar(("periodo_dados", tabela, nivel), montar), [dimensoes.ids_tempo()], decorar
+
+
+def series_mensal(origem, id_localidade=None, ano_inicio=None, ano_fim=None, mes=None, limit=5000):
+    tabela, nivel = origem
+    filtro, params, forma = _filtro_tempo(dimensoes.faixas_tempo(ano_inicio=ano_inicio, ano_fim=ano_fim, mes=mes))
+
+    def montar():
+        # Passagem única: internações (tipo 3) e óbitos (tipo 4) somados na mesma varredura
+        sql = f'''
+            SELECT
+                f.id_tempo,
+                COALESCE(SUM(f.qtd_internacoes) FILTER (WHERE f.id_tipo_evento = 3), 0)::bigint AS internacoes,
+                COALESCE(SUM(f.qtd_obitos) FILTER (WHERE f.id_tipo_evento = 4), 0)::bigint AS obitos
+            FROM {tabela}
+            WHERE f.id_tempo IS NOT NULL
+              AND f.id_tempo != 0
+              AND f.id_tipo_evento IN (3, 4){nivel}
+              AND ((f.id_tipo_evento = 3 AND f.qtd_internacoes > 0)
+                   OR (f.id_tipo_evento = 4 AND f.qtd_obitos > 0)){filtro}
+        '''
+        if id_localidade:
+            sql += ' AND f.id_localidade = %s'
+        sql += '''
+            GROUP BY f.id_tempo;
+        '''
+        return sql
+
+    def decorar(rows):
+        meses = {}
+        for id_tempo, internacoes, obitos in rows:
+            periodo = dimensoes.tempo.get(id_tempo)
+            if periodo is None:
+                continue
+            acc = meses.setdefault(periodo, [0, 0])
+            acc[0] += internacoes
+            acc[1] += obitos
+        return [
+            {
+                "ano": ano,
+                "mes": m,
+                "ano_mes": f"{ano}-{m:02d}",
+                "internacoes": internacoes,
+                "obitos": obitos,
+            }
+            for (ano, m), (internacoes, obitos) in sorted(meses.items())[:limit]
+        ]
+
+    if id_localidade:
+        params.append(id_localidade)
+    sql = _compilar(("series_mensal", tabela, nivel, bool(id_localidade), forma), montar)
+    return sql, params, decorar
+
+
+# Endpoints "por dimensão": um tipo de evento, uma medida, uma dimensão de descrição
+QUEBRAS = {
+    "internacoes_sexo": {
+        "tipo": 5, "dimensao": "dim_sexo", "medida": "qtd_internacoes",
+        "total": "total_internacoes", "alias": "sexo_desc", "ordem": "rotulo",
+    },
+    "internacoes_faixa": {
+        "tipo": 6, "dimensao": "dim_faixa_etaria", "medida": "qtd_internacoes",
+        "total": "total_internacoes", "alias": "faixa_desc", "ordem": "faixa_ordem",
+    },
+    "obitos_raca": {
+        "tipo": 7, "dimensao": "dim_raca_cor", "medida": "qtd_obitos",
+        "total": "total_obitos", "alias": "raca_desc", "ordem": "total",
+    },
+    "obitos_estado_civil": {
+        "tipo": 8, "dimensao": "dim_estado_civil", "medida": "qtd_obitos",
+        "total": "total_obitos", "alias": "estado_civil_desc", "ordem": "total",
+    },
+    "obitos_local": {
+        "tipo": 9, "dimensao": "dim_local_ocorrencia", "medida": "qtd_obitos",
+        "total": "total_obitos", "alias": "local_ocorrencia_desc", "ordem": "total",
+        "padrao": "Não Informado",
+    },
+}
+
+
+def quebra(nome, origem, id_localidade=None):
+    spec = QUEBRAS[nome]
+    tabela, nivel = origem
+    dim = spec["dimensao"]
+    id_col = esquema.DIMENSOES[dim]["id"]
+    medida, alias, total = spec["medida"], spec["alias"], spec["total"]
+
+    def montar():
+        sql = f'''
+            SELECT
+                f.{id_col} AS id,
+                SUM(f.{medida})::bigint AS total
+            FROM {tabela}
+            WHERE f.id_tipo_evento = {spec['tipo']}{nivel}
+              AND f.{medida} > 0
+        '''
+        if id_localidade:
+            sql += ' AND f.id_localidade = %s'
+        sql += f'''
+            GROUP BY f.{id_col};
+        '''
+        return sql
+
+    def decorar(rows):
+        rotulos = dimensoes.rotulos.get(dim, {})
+        somas = {}
+        for id_membro, valor in rows:
+            # Ids fora da dimensão ficam de fora, como no INNER JOIN original
+            if id_membro not in rotulos:
+                continue
+            rotulo = rotulos[id_membro]
+            if rotulo is None:
+                rotulo = spec.get("padrao")
+            chave = (rotulo, dimensoes.faixa_ordem.get(id_membro)) if spec["ordem"] == "faixa_ordem" else (rotulo,)
+            somas[chave] = somas.get(chave, 0) + valor
+
+        itens = [(chave, valor) for chave, valor in somas.items() if valor > 0]
+        if spec["ordem"] == "faixa_ordem":
+            itens.sort(key=lambda item: (item[0][1] is None, item[0][1]))
+        elif spec["ordem"] == "rotulo":
+            itens.sort(key=lambda item: (item[0][0] is None, item[0][0] or ""))
+        else:
+            itens.sort(key=lambda item: item[1], reverse=True)
+        return [{alias: chave[0], total: valor} for chave, valor in itens]
+
+    params = [id_localidade] if id_localidade else []
+    return _compilar((nome, tabela, nivel, bool(id_localidade)), montar), params, decorar
+
+
+CID_CAPITULO = {
+    "internacoes": {"tipo": 10, "medida": "qtd_internacoes", "total": "total_internacoes"},
+    "obitos": {"tipo": 11, "medida": "qtd_obitos", "total": "total_obitos"},
+}
+
+
+def cid_capitulo(evento, origem, id_localidade=None, ano=None, mes=None, ano_inicio=None, ano_fim=None):
+    """Top 10 capítulos CID-10 (evento: 'internacoes' ou 'obitos')."""
+    spec = CID_CAPITULO[evento]
+    tabela, nivel = origem
+    tipo, medida, total = spec["tipo"], spec["medida"], spec["total"]
+    faixas = dimensoes.faixas_tempo(ano=ano, ano_inicio=ano_inicio, ano_fim=ano_fim, mes=mes)
+    filtro, params, forma = _filtro_tempo(faixas)
+
+    def montar():
+        sql = f'''
+            SELECT
+                f.id_capitulo AS id,
+                SUM(f.{medida})::bigint AS total
+            FROM {tabela}
+            WHERE f.id_tipo_evento = {tipo}{nivel}
+              AND f.id_capitulo IS NOT NULL
+              AND f.{medida} > 0{filtro}
+        '''
+        if id_localidade:
+            sql += ' AND f.id_localidade = %s'
+        sql += '''
+            GROUP BY f.id_capitulo;
+        '''
+        return sql
+
+    def decorar(rows):
+        somas = {}
+        for id_capitulo, valor in rows:
+            capitulo = dimensoes.capitulos.get(id_capitulo)
+            if capitulo is None:
+                continue
+            somas[capitulo] = somas.get(capitulo, 0) + valor
+        itens = sorted(((c, v) for c, v in somas.items() if v > 0), key=lambda item: item[1], reverse=True)
+        return [{"capitulo_cod": cod, "capitulo_nome": titulo, total: valor} for (cod, titulo), valor in itens[:10]]
+
+    if id_localidade:
+        params.append(id_localidade)
+    sql = _compilar(("cid_capitulo", evento, tabela, nivel, bool(id_localidade), forma), montar)
+    return sql, params, decorar
+
+
+def _somar_por_uf(rows, medidas):
+    """Soma as `medidas` colunas após id_localidade (primeira coluna) por UF."""
+    somas = {}
+    for id_localidade, *valores in rows:
+        localidade = dimensoes.localidades.get(id_localidade)
+        if localidade is None or localidade[1] is None:
+            continue
+        acc = somas.setdefault(localidade[1], [0] * medidas)
+        for i, valor in enumerate(valores):
+            acc[i] += valor
+    return sorted(somas.items())
+
+
+def dados_por_estado(origem):
+    tabela, nivel = origem
+
+    def montar():
+        return f'''
+            SELECT
+                f.id_localidade,
+                COALESCE(SUM(f.qtd_internacoes) FILTER (WHERE f.id_tipo_evento = 3), 0)::bigint AS total_internacoes,
+                COALESCE(SUM(f.qtd_obitos) FILTER (WHERE f.id_tipo_evento = 4), 0)::bigint AS total_obitos
+            FROM {tabela}
+            WHERE f.id_tipo_evento IN (3, 4){nivel}
+              AND ((f.id_tipo_evento = 3 AND f.qtd_internacoes > 0)
+                   OR (f.id_tipo_evento = 4 AND f.qtd_obitos > 0))
+            GROUP BY f.id_localidade;
+        '''
+
+    def decorar(rows):
+        return [
+            {"uf": uf, "total_internacoes": internacoes, "total_obitos": obitos}
+            for uf, (internacoes, obitos) in _somar_por_uf(rows, 2)
+        ]
+
+    return _compilar(("dados_por_estado", tabela, nivel), montar), [], decorar
+
+
+def internacoes_cid_por_estado(origem, capitulo_cod=None):
+    tabela, nivel = origem
+
+    if capitulo_cod:
+        filtro, params = _em("f.id_capitulo", dimensoes.ids_capitulo(capitulo_cod))
+
+        def montar():
+            return f'''
+                SELECT
+                    f.id_localidade,
+                    f.id_capitulo,
+                    SUM(f.qtd_internacoes)::bigint AS total_internacoes
+                FROM {tabela}
+                WHERE f.id_tipo_evento = 10{nivel}{filtro}
+                GROUP BY f.id_localidade, f.id_capitulo;
+            '''
+
+        def decorar(rows):
+            somas = {}
+            for id_localidade, id_capitulo, valor in rows:
+                localidade = dimensoes.localidades.get(id_localidade)
+                capitulo = dimensoes.capitulos.get(id_capitulo)
+                if localidade is None or localidade[1] is None or capitulo is None or valor is None:
+                    continue
+                chave = (localidade[1],) + capitulo
+                somas[chave] = somas.get(chave, 0) + valor
+            return [
+                {"uf": uf, "capitulo_cod": cod, "capitulo_nome": titulo, "total_internacoes": valor}
+                for (uf, cod, titulo), valor in sorted(somas.items())
+            ]
+
+        chave = ("internacoes_cid_por_estado", tabela, nivel, len(params))
+        return _compilar(chave, montar), params, decorar
+
+    def montar():
+        return f'''
+            SELECT
+                f.id_localidade,
+                SUM(f.qtd_internacoes)::bigint AS total_internacoes
+            FROM {tabela}
+            WHERE f.id_tipo_evento = 10{nivel}
+              AND f.id_capitulo IS NOT NULL
+              AND f.qtd_internacoes > 0
+            GROUP BY f.id_localidade;
+        '''
+
+    def decorar(rows):
+        return [
+            {"uf": uf, "total_internacoes": valor}
+            for uf, (valor,) in _somar_por_uf(rows, 1)
+            if valor > 0
+        ]
+
+    return _compilar(("internacoes_cid_por_estado", tabela, nivel, None), montar), [], decorar
+
+
+# indicador -> tipo do total, tipo por capítulo CID-10 e medida (os mesmos do mapa por UF)
+POR_MUNICIPIO = {
+    "internacoes": {"tipo": 3, "tipo_cid": 10, "medida": "qtd_internacoes"},
+    "obitos": {"tipo": 4, "tipo_cid": 11, "medida": "qtd_obitos"},
+}
+
+
+def por_municipio(origem, indicador, capitulo_cod=None, uf=None, ano=None, ano_inicio=None, ano_fim=None, mes=None):
+    """Total do indicador por município: [(id_localidade, valor)] em ordem de id, só valores > 0.
+
+    No nível localidade_ano do rollup (filtro só de anos inteiros) o tempo é filtrado por
+    f.ano; nas demais origens, pelas faixas de id_tempo.
+    """
+    spec = POR_MUNICIPIO[indicador]
+    tabela, nivel = origem
+    tipo = spec["tipo_cid"] if capitulo_cod else spec["tipo"]
+    medida = spec["medida"]
+
+    if rollups.por_ano(origem):
+        inicio, fim = (ano, ano) if ano else (ano_inicio, ano_fim)
+        filtro, params = "", []
+        if inicio:
+            filtro += " AND f.ano >= %s"
+            params.append(inicio)
+        if fim:
+            filtro += " AND f.ano <= %s"
+            params.append(fim)
+        forma = ("ano", bool(inicio), bool(fim))
+    else:
+        filtro, params, forma = _filtro_tempo(
+            dimensoes.faixas_tempo(ano=ano, ano_inicio=ano_inicio, ano_fim=ano_fim, mes=mes)
+        )
+    capitulos = ""
+    if capitulo_cod:
+        capitulos, ids = _em("f.id_capitulo", dimensoes.ids_capitulo(capitulo_cod))
+        params += ids
+    localidades = ""
+    if uf:
+        localidades, ids = _em("f.id_localidade", dimensoes.ids_localidade_uf(uf))
+        params += ids
+
+    def montar():
+        return f'''
+            SELECT
+                f.id_localidade,
+                SUM(f.{medida})::bigint AS total
+            FROM {tabela}
+            WHERE f.id_tipo_evento = {tipo}{nivel}
+              AND f.{medida} > 0{filtro}{capitulos}{localidades}
+            GROUP BY f.id_localidade
+            ORDER BY f.id_localidade;
+        '''
+
+    def decorar(rows):
+        return [(id_localidade, valor) for id_localidade, valor in rows if id_localidade is not None and valor]
+
+    # bool + nº de placeholders: capítulo/UF sem ids vira " AND FALSE", diferente de sem filtro
+    chave = ("por_municipio", tipo, medida, tabela, nivel, forma,
+             bool(capitulo_cod), capitulos.count("%s"), bool(uf), localidades.count("%s"))
+    return _compilar(chave, montar), params, decorar
+
+
+def quantis(valores, classes):
+    """Limites entre `classes` classes de quantis dos valores; limites repetidos são descartados.
+
+    Um valor v fica na classe bisect_right(limites, v): classe i vai de limites[i-1] (inclusive)
+    a limites[i] (exclusive).
+    """
+    ordenados = sorted(valores)
+    if not ordenados or classes < 2:
+        return []
+    limites = []
+    for k in range(1, classes):
+        limite = ordenados[len(ordenados) * k // classes]
+        # Limite igual ao menor valor deixaria a primeira classe vazia
+        if limite > ordenados[0] and (not limites or limite > limites[-1]):
+            limites.append(limite)
+    return limites
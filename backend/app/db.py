@@ -1,48 +1,73 @@
-import os
-from dotenv import load_dotenv
+import threading
+import time
+import urllib.parse
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
 import psycopg2
+import psycopg2.extensions
 from psycopg2.extras import RealDictCursor
 
-load_dotenv()
+from . import config, metricas
 
-DATABASE_URL = os.getenv("DATABASE_URL")
+DATABASE_URL = config.DATABASE_URL
 
-def get_connection():
+
+def _connection_params():
+    """Monta os parâmetros de conexão a partir da DATABASE_URL (uma única vez por processo)."""
+    parsed_url = urllib.parse.urlparse(DATABASE_URL)
+    params = {
+        'cursor_factory': RealDictCursor,
+        'connect_timeout': 30,
+        # Detecta conexões mortas (ex.: restart do pooler do Supabase) sem esperar o timeout do TCP
+        'keepalives': 1,
+        'keepalives_idle': 30,
+        'keepalives_interval': 10,
+        'keepalives_count': 3,
+    }
+
+    if 'supabase.co' in (parsed_url.hostname or '') or 'supabase' in DATABASE_URL.lower():
+        params.update({
+            'host': parsed_url.hostname,
+            'port': parsed_url.port or 5432,
+            'dbname': parsed_url.path.lstrip('/').split('?')[0],
+            'user': parsed_url.username,
+            'password': parsed_url.password,
+        })
+        query_params = urllib.parse.parse_qs(parsed_url.query)
+        if 'sslmode' in query_params:
+            params['sslmode'] = query_params['sslmode'][0]
+        else:
+            params['sslmode'] = 'require'
+    else:
+        params['dsn'] = DATABASE_URL
+    return params
+
+
+def _session_sql():
+    # Um único round-trip para todas as configurações de sessão
+    return (
+        f"SET statement_timeout = '{config.DB_STATEMENT_TIMEOUT}'; "
+        f"SET work_mem = '{config.DB_WORK_MEM}'; "
+        f"SET maintenance_work_mem = '{config.DB_MAINTENANCE_WORK_MEM}';"
+    )
+
+
+def _connect():
+    """Abre uma conexão física nova e aplica as configurações de sessão."""
     if not DATABASE_URL:
         raise RuntimeError("DATABASE_URL não definida. Verifique as variáveis de ambiente no Railway.")
     try:
-        import urllib.parse
-        parsed_url = urllib.parse.urlparse(DATABASE_URL)
-        
-        if 'supabase.co' in parsed_url.hostname or 'supabase' in DATABASE_URL.lower():
-            conn_params = {
-                'host': parsed_url.hostname,
-                'port': parsed_url.port or 5432,
-                'database': parsed_url.path.lstrip('/').split('?')[0],
-                'user': parsed_url.username,
-                'password': parsed_url.password,
-                'cursor_factory': RealDictCursor,
-                'connect_timeout': 30,
-            }
-            
-            query_params = urllib.parse.parse_qs(parsed_url.query)
-            if 'sslmode' in query_params:
-                conn_params['sslmode'] = query_params['sslmode'][0]
-            else:
-                conn_params['sslmode'] = 'require'
-            
-            conn = psycopg2.connect(**conn_params)
-        else:
-            conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor, connect_timeout=30)
-        
+        conn = psycopg2.connect(**_connection_params())
         with conn.cursor() as cur:
-            cur.execute("SET statement_timeout = '600s'")
-            cur.execute("SET work_mem = '256MB'")
-            cur.execute("SET maintenance_work_mem = '512MB'")
+            cur.execute(_session_sql())
+        # Commit para que os SETs sobrevivam a rollbacks das requisições seguintes
+        conn.commit()
         return conn
     except psycopg2.OperationalError as e:
         error_msg = str(e)
-        if 'network is unreachable' in error_msg.lower() or 'could not connect' in error_msg.lower() or 'network is unreachable' in error_msg:
+        if 'network is unreachable' in error_msg.lower() or 'could not connect' in error_msg.lower():
             raise RuntimeError(
                 f"Erro ao conectar ao banco Supabase: {error_msg}. "
                 f"SOLUÇÃO: No Supabase Dashboard, vá em Settings → Database → Connection Pooling e use a connection string do 'Transaction' mode (porta 6543) ou 'Session' mode (porta 5432). "
@@ -51,3 +76,321 @@ def get_connection():
         raise RuntimeError(f"Erro ao conectar ao banco de dados: {error_msg}")
     except Exception as e:
         raise RuntimeError(f"Erro inesperado ao conectar ao banco: {str(e)}")
+
+
+class PoolTimeout(RuntimeError):
+    pass
+
+
+class ConnectionPool:
+    """Pool de conexões limitado e thread-safe.
+
+    - no máximo `maxconn` conexões físicas abertas ao mesmo tempo;
+    - quem não encontra conexão livre espera até `timeout` segundos;
+    - conexões ociosas há mais de `check_idle` segundos são testadas antes do uso,
+      o que descarta conexões mortas após um restart do pooler;
+    - conexões mais velhas que `max_lifetime` segundos são recicladas.
+    """
+
+    def __init__(self, minconn, maxconn, timeout, check_idle, max_lifetime, connect=_connect):
+        if maxconn < 1:
+            raise ValueError("maxconn deve ser >= 1")
+        self.minconn = max(0, min(minconn, maxconn))
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.check_idle = check_idle
+        self.max_lifetime = max_lifetime
+        self._connect = connect
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, criada_em, ultimo_uso)
+        self._created = {}  # id(conn) -> criada_em
+        self._in_use = 0
+        self._opening = 0
+        self._waiting = 0
+        self._closed = False
+
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+        self._opened = 0
+        self._discarded = 0
+        self._health_failures = 0
+
+    def _size(self):
+        return self._in_use + len(self._idle) + self._opening
+
+    def fill(self):
+        """Abre as `minconn` conexões iniciais (chamado no startup)."""
+        while True:
+            with self._cond:
+                if self._closed or self._size() >= self.minconn:
+                    return
+                self._opening += 1
+            self.putconn(self._open_reserved())
+
+    def _open_reserved(self):
+        # Chamado com uma vaga já reservada em self._opening
+        inicio = time.perf_counter()
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._opening -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._opening -= 1
+            self._in_use += 1
+            self._opened += 1
+            self._created[id(conn)] = time.monotonic()
+        metricas.registrar_conexao(time.perf_counter() - inicio)
+        return conn
+
+    def _healthy(self, conn, created, last_used):
+        now = time.monotonic()
+        if conn.closed:
+            return False
+        if self.max_lifetime and now - created > self.max_lifetime:
+            return False
+        if now - last_used > self.check_idle:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                with self._cond:
+                    self._health_failures += 1
+                return False
+        return True
+
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        while True:
+            candidate = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Pool de conexões encerrado")
+                    if self._idle:
+                        candidate = self._idle.pop()
+                        self._in_use += 1
+                        break
+                    if self._size() < self.maxconn:
+                        self._opening += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"Nenhuma conexão livre no pool após {self.timeout:.0f}s "
+                            f"({self.maxconn} conexões em uso). Aumente DB_POOL_MAX ou verifique consultas lentas."
+                        )
+                    waited = True
+                    self._waiting += 1
+                    self._cond.wait(remaining)
+                    self._waiting -= 1
+
+            if candidate is None:
+                conn = self._open_reserved()
+                break
+            conn, created, last_used = candidate
+            if self._healthy(conn, created, last_used):
+                break
+            self._discard(conn)
+
+        elapsed = time.monotonic() - start
+        with self._cond:
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+            self._wait_total += elapsed
+            self._wait_max = max(self._wait_max, elapsed)
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._in_use -= 1
+            self._discarded += 1
+            self._created.pop(id(conn), None)
+            self._cond.notify()
+
+    def putconn(self, conn, discard=False):
+        if not discard and not conn.closed:
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+        if discard or conn.closed or self._closed:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._in_use -= 1
+            self._idle.append((conn, self._created.get(id(conn), time.monotonic()), time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._cond:
+            return {
+                "tamanho_max": self.maxconn,
+                "em_uso": self._in_use,
+                "ociosas": len(self._idle),
+                "abrindo": self._opening,
+                "aguardando": self._waiting,
+                "checkouts": self._checkouts,
+                "checkouts_com_espera": self._waits,
+                "espera_total_ms": round(self._wait_total * 1000, 2),
+                "espera_media_ms": round(self._wait_total * 1000 / self._checkouts, 3) if self._checkouts else 0.0,
+                "espera_max_ms": round(self._wait_max * 1000, 2),
+                "timeouts": self._timeouts,
+                "conexoes_abertas": self._opened,
+                "conexoes_descartadas": self._discarded,
+                "falhas_health_check": self._health_failures,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    minconn=config.DB_POOL_MIN,
+                    maxconn=config.DB_POOL_MAX,
+                    timeout=config.DB_POOL_TIMEOUT,
+                    check_idle=config.DB_POOL_CHECK_IDLE,
+                    max_lifetime=config.DB_POOL_MAX_LIFETIME,
+                )
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+def pool_stats():
+    if _pool is None:
+        return None
+    return _pool.stats()
+
+
+def _broken(conn, exc):
+    return conn.closed != 0 or isinstance(exc, (psycopg2.OperationalError, psycopg2.InterfaceError))
+
+
+@contextmanager
+def get_connection():
+    """Empresta uma conexão do pool: commit ao sair, rollback em erro, e devolve ao pool.
+
+    Conexões quebradas (ex.: derrubadas pelo pooler) são descartadas em vez de devolvidas.
+    """
+    pool = get_pool()
+    inicio = time.perf_counter()
+    conn = pool.getconn()
+    metricas.registrar_espera(time.perf_counter() - inicio)
+    discard = False
+    try:
+        yield conn
+        conn.commit()
+    except BaseException as e:
+        discard = _broken(conn, e)
+        if not discard:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        raise
+    finally:
+        pool.putconn(conn, discard=discard)
+
+
+def fetch_all(query, params=None, timeout=None):
+    """Executa uma consulta numa conexão do pool e devolve as linhas como dicts.
+
+    `timeout` (ex.: '180s') vale só para esta transação (SET LOCAL).
+    """
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            if timeout:
+                cur.execute(f"SET LOCAL statement_timeout = '{timeout}'")
+            inicio = time.perf_counter()
+            cur.execute(query, params)
+            rows = [dict(row) for row in cur.fetchall()]
+            metricas.registrar_consulta(query, params, time.perf_counter() - inicio, len(rows))
+            return rows
+
+
+def fetch_tuplas(query, params=None, timeout=None):
+    """Como fetch_all, mas com cursor de tuplas: sem dict por linha."""
+    with get_connection() as conn:
+        with conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+            if timeout:
+                cur.execute(f"SET LOCAL statement_timeout = '{timeout}'")
+            inicio = time.perf_counter()
+            cur.execute(query, params)
+            rows = cur.fetchall()
+            metricas.registrar_consulta(query, params, time.perf_counter() - inicio, len(rows))
+            return rows
+
+
+def fetch_one(query, params=None, timeout=None):
+    rows = fetch_all(query, params, timeout)
+    return rows[0] if rows else None
+
+
+def stream(query, params=None, lote=10000, timeout=None):
+    """Itera o resultado em lotes (listas de tuplas) por um cursor nomeado (server-side).
+
+    Só um lote fica em memória por vez. A conexão fica emprestada até o gerador terminar
+    ou ser fechado (close() faz rollback e devolve a conexão ao pool).
+    """
+    with get_connection() as conn:
+        if timeout:
+            with conn.cursor() as cur:
+                cur.execute(f"SET LOCAL statement_timeout = '{timeout}'")
+        with conn.cursor(name=f"stream_{uuid.uuid4().hex}", cursor_factory=psycopg2.extensions.cursor) as cur:
+            cur.itersize = lote
+            # Só o tempo no banco entra na métrica; a espera do consumidor entre lotes, não
+            gasto, total = 0.0, 0
+            try:
+                inicio = time.perf_counter()
+                cur.execute(query, params)
+                while True:
+                    linhas = cur.fetchmany(lote)
+                    gasto += time.perf_counter() - inicio
+                    if not linhas:
+                        return
+                    total += len(linhas)
+                    yield linhas
+                    inicio = time.perf_counter()
+            finally:
+                metricas.registrar_consulta(query, params, gasto, total)
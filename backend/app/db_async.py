@@ -0,0 +1,123 @@
+import asyncio
+import time
+import weakref
+
+from psycopg import AsyncConnection
+from psycopg.rows import dict_row, tuple_row
+from psycopg_pool import AsyncConnectionPool
+from starlette.concurrency import run_in_threadpool
+
+from . import config, db, metricas
+
+_pool = None
+_pool_lock = asyncio.Lock()
+_last_used = weakref.WeakKeyDictionary()
+
+
+def _pool_kwargs():
+    if not config.DATABASE_URL:
+        raise RuntimeError("DATABASE_URL não definida. Verifique as variáveis de ambiente no Railway.")
+    params = dict(db._connection_params())
+    params.pop('cursor_factory', None)
+    conninfo = params.pop('dsn', '')
+    # O pooler do Supabase (modo transaction) não suporta prepared statements nomeados
+    params['prepare_threshold'] = None
+    params['row_factory'] = dict_row
+    return conninfo, params
+
+
+class _Conexao(AsyncConnection):
+    # Abertura de conexão nova no histograma db_connect_seconds, como no pool psycopg2 (db.py)
+    @classmethod
+    async def connect(cls, *args, **kwargs):
+        inicio = time.perf_counter()
+        conn = await super().connect(*args, **kwargs)
+        metricas.registrar_conexao(time.perf_counter() - inicio)
+        return conn
+
+
+async def _configure(conn):
+    await conn.execute(db._session_sql())
+    await conn.commit()
+
+
+async def _check(conn):
+    # Só paga o round-trip de verificação se a conexão ficou ociosa por muito tempo
+    if time.monotonic() - _last_used.get(conn, 0.0) > config.DB_POOL_CHECK_IDLE:
+        await AsyncConnectionPool.check_connection(conn)
+
+
+async def open_pool():
+    global _pool
+    if _pool is not None:
+        return _pool
+    async with _pool_lock:
+        if _pool is None:
+            conninfo, kwargs = _pool_kwargs()
+            pool = AsyncConnectionPool(
+                conninfo,
+                kwargs=kwargs,
+                connection_class=_Conexao,
+                min_size=config.DB_POOL_MIN,
+                max_size=config.DB_POOL_MAX_ASYNC,
+                timeout=config.DB_POOL_TIMEOUT,
+                max_lifetime=config.DB_POOL_MAX_LIFETIME or 3600.0,
+                configure=_configure,
+                check=_check,
+                open=False,
+                name="analytics",
+            )
+            await pool.open(wait=False)
+            _pool = pool
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def pool_stats():
+    if _pool is None:
+        return None
+    return _pool.get_stats()
+
+
+async def _executar(query, params, timeout, row_factory):
+    pool = await open_pool()
+    inicio = time.perf_counter()
+    async with pool.connection() as conn:
+        metricas.registrar_espera(time.perf_counter() - inicio)
+        async with conn.cursor(row_factory=row_factory) as cur:
+            if timeout:
+                await cur.execute(f"SET LOCAL statement_timeout = '{timeout}'")
+            inicio = time.perf_counter()
+            await cur.execute(query, params)
+            rows = await cur.fetchall()
+            metricas.registrar_consulta(query, params, time.perf_counter() - inicio, len(rows))
+        _last_used[conn] = time.monotonic()
+    return rows
+
+
+async def fetch_all(query, params=None, timeout=None):
+    """Versão assíncrona de db.fetch_all.
+
+    Com DB_ASYNC=false delega para o pool síncrono no threadpool (modo antigo).
+    """
+    if not config.DB_ASYNC:
+        return await run_in_threadpool(db.fetch_all, query, params, timeout)
+    return await _executar(query, params, timeout, dict_row)
+
+
+async def fetch_tuplas(query, params=None, timeout=None):
+    """Como fetch_all, mas cada linha é uma tupla (caminho rápido dos endpoints de agregação)."""
+    if not config.DB_ASYNC:
+        return await run_in_threadpool(db.fetch_tuplas, query, params, timeout)
+    return await _executar(query, params, timeout, tuple_row)
+
+
+async def fetch_one(query, params=None, timeout=None):
+    rows = await fetch_all(query, params, timeout)
+    return rows[0] if rows else None
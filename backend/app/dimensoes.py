@@ -0,0 +1,194 @@
+"""Dimensões pequenas carregadas em memória no startup e recarregadas periodicamente.
+
+Os endpoints pedem ao banco só agregados por id (sem JOIN com dimensões) e traduzem os
+ids em descrições aqui. Filtros de ano/mês viram faixas de id_tempo resolvidas localmente.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+
+from . import config, esquema
+from .db_async import fetch_all
+
+logger = logging.getLogger(__name__)
+
+tempo = {}          # id_tempo -> (ano, mes)
+localidades = {}    # id_localidade -> (municipio, uf)
+rotulos = {}        # tabela -> {id: descrição}
+faixa_ordem = {}    # id_faixa -> faixa_ordem
+capitulos = {}      # id_capitulo -> (capitulo_cod, titulo)
+
+_tempo_ids = []
+_localidades_lista = []
+_carregado_em = None
+_assinatura = ""
+_alterado_em = None
+_lock = asyncio.Lock()
+_tarefa = None
+
+
+def _rotulo(tabela, alternativa):
+    """Coluna de descrição de `tabela` pelo registro de esquema; sem ela, `alternativa` e um aviso.
+
+    Uma dimensão sem coluna de descrição reconhecível só perde as descrições (os gráficos
+    mostram o id) em vez de derrubar a carga de todas as dimensões e, com ela, os endpoints.
+    """
+    try:
+        return esquema.rotulo(tabela)
+    except RuntimeError as e:
+        logger.warning("%s; usando %s como descrição", e, alternativa)
+        return alternativa
+
+
+async def carregar():
+    global tempo, localidades, rotulos, faixa_ordem, capitulos
+    global _tempo_ids, _localidades_lista, _carregado_em, _assinatura, _alterado_em
+    async with _lock:
+        await esquema.garantir()
+        titulo = _rotulo("dim_cid10_capitulo", "capitulo_cod")
+        simples = ["dim_sexo", "dim_raca_cor", "dim_estado_civil", "dim_local_ocorrencia"]
+
+        consultas = [
+            fetch_all("SELECT id_tempo, ano, mes FROM dim_tempo WHERE id_tempo IS NOT NULL AND id_tempo != 0"),
+            fetch_all("SELECT id_localidade, municipio, uf FROM dim_localidade ORDER BY municipio"),
+            fetch_all(f"SELECT id_faixa AS id, {_rotulo('dim_faixa_etaria', 'id_faixa::text')} AS rotulo, faixa_ordem "
+                      "FROM dim_faixa_etaria"),
+            fetch_all(f"SELECT id_capitulo AS id, capitulo_cod, {titulo} AS titulo FROM dim_cid10_capitulo"),
+        ]
+        for tabela in simples:
+            id_col = esquema.DIMENSOES[tabela]["id"]
+            rotulo = _rotulo(tabela, f"{id_col}::text")
+            consultas.append(fetch_all(f"SELECT {id_col} AS id, {rotulo} AS rotulo FROM {tabela}"))
+        res = await asyncio.gather(*consultas)
+
+        novo_tempo = {r["id_tempo"]: (r["ano"], r["mes"]) for r in res[0]}
+        novas_localidades = {r["id_localidade"]: (r["municipio"], r["uf"]) for r in res[1]}
+        novos_rotulos = {"dim_faixa_etaria": {r["id"]: r["rotulo"] for r in res[2]}}
+        novos_rotulos.update({tabela: {r["id"]: r["rotulo"] for r in rows} for tabela, rows in zip(simples, res[4:])})
+
+        tempo = novo_tempo
+        _tempo_ids = sorted(novo_tempo)
+        localidades = novas_localidades
+        _localidades_lista = res[1]
+        rotulos = novos_rotulos
+        faixa_ordem = {r["id"]: r["faixa_ordem"] for r in res[2]}
+        capitulos = {r["id"]: (r["capitulo_cod"], r["titulo"]) for r in res[3]}
+        _carregado_em = time.time()
+        nova = _calcular_assinatura()
+        if nova != _assinatura:
+            _assinatura, _alterado_em = nova, _carregado_em
+
+
+def _calcular_assinatura():
+    # Do conteúdo, não de um contador: workers com as mesmas dimensões chegam à mesma assinatura
+    conteudo = repr((
+        sorted(tempo.items()), sorted(localidades.items()), sorted(faixa_ordem.items()), sorted(capitulos.items()),
+        sorted((tabela, sorted(valores.items())) for tabela, valores in rotulos.items()),
+    ))
+    return hashlib.sha1(conteudo.encode()).hexdigest()[:12]
+
+
+def assinatura():
+    """Impressão digital das dimensões em memória; entra na ETag e na chave do cache de resultados.
+
+    Uma recarga que muda descrições ou municípios sem mudar a versão dos dados da tabela fato
+    muda as respostas dos endpoints, e com ela a assinatura.
+    """
+    return _assinatura
+
+
+def alterado_em():
+    """Epoch da última recarga que mudou as dimensões (None antes da primeira carga)."""
+    return _alterado_em
+
+
+async def garantir():
+    if _carregado_em is None:
+        await carregar()
+
+
+async def _recarregar_periodicamente():
+    while True:
+        await asyncio.sleep(config.DIM_REFRESH)
+        try:
+            await carregar()
+        except Exception:
+            logger.exception("Falha ao recarregar dimensões; mantendo a versão anterior")
+
+
+def iniciar_recarga():
+    global _tarefa
+    if _tarefa is None and config.DIM_REFRESH > 0:
+        _tarefa = asyncio.get_running_loop().create_task(_recarregar_periodicamente())
+
+
+async def parar_recarga():
+    global _tarefa
+    if _tarefa is not None:
+        _tarefa.cancel()
+        try:
+            await _tarefa
+        except asyncio.CancelledError:
+            pass
+        _tarefa = None
+
+
+def lista_localidades():
+    """Todas as localidades, já ordenadas por município (mesmo formato de /api/localidades)."""
+    return _localidades_lista
+
+
+def _atende(id_tempo, ano, ano_inicio, ano_fim, mes):
+    a, m = tempo[id_tempo]
+    return ((not ano or a == ano)
+            and (not ano_inicio or a >= ano_inicio)
+            and (not ano_fim or a <= ano_fim)
+            and (not mes or m == mes))
+
+
+def ids_tempo(ano=None, ano_inicio=None, ano_fim=None, mes=None):
+    """ids de dim_tempo que atendem aos filtros, em ordem."""
+    return [i for i in _tempo_ids if _atende(i, ano, ano_inicio, ano_fim, mes)]
+
+
+def faixas_tempo(ano=None, ano_inicio=None, ano_fim=None, mes=None):
+    """Resolve os filtros em faixas contíguas de id_tempo.
+
+    Retorna (faixas, avulsos): faixas [(início, fim)] cobrem sequências de ids consecutivos
+    em dim_tempo que atendem ao filtro; avulsos são ids isolados. Sem filtros retorna None.
+    """
+    if not (ano or ano_inicio or ano_fim or mes):
+        return None
+    faixas, avulsos = [], []
+    sequencia = []
+    for i in _tempo_ids + [None]:
+        if i is not None and _atende(i, ano, ano_inicio, ano_fim, mes):
+            sequencia.append(i)
+            continue
+        if len(sequencia) > 1:
+            faixas.append((sequencia[0], sequencia[-1]))
+        elif sequencia:
+            avulsos.append(sequencia[0])
+        sequencia = []
+    return faixas, avulsos
+
+
+def ids_capitulo(capitulo_cod):
+    return [i for i, (cod, _) in capitulos.items() if cod == capitulo_cod]
+
+
+def ids_localidade_uf(uf):
+    uf = uf.strip().upper()
+    return [i for i, (_, sigla) in localidades.items() if sigla and sigla.strip().upper() == uf]
+
+
+def resumo():
+    return {
+        "carregado_em": _carregado_em,
+        "assinatura": _assinatura,
+        "tempo": len(tempo),
+        "localidades": len(localidades),
+        "capitulos": len(capitulos),
+        "rotulos": {tabela: len(valores) for tabela, valores in rotulos.items()},
+    }
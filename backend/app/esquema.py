@@ -0,0 +1,96 @@
+"""Registro do esquema das dimensões, lido do information_schema uma vez.
+
+Resolve qual coluna de cada tabela de dimensão guarda a descrição (o nome varia entre
+cargas do banco), para que os endpoints não precisem tentar nomes a cada requisição.
+"""
+import asyncio
+
+from .db_async import fetch_all
+
+# tabela -> coluna de id e candidatas à coluna de descrição, em ordem de preferência
+DIMENSOES = {
+    "dim_sexo": {"id": "id_sexo", "rotulo": ["sexo_desc"]},
+    "dim_raca_cor": {"id": "id_raca_cor", "rotulo": ["raca_desc"]},
+    "dim_faixa_etaria": {"id": "id_faixa", "rotulo": ["faixa_desc"]},
+    "dim_estado_civil": {"id": "id_estado_civil", "rotulo": ["estado_civil_desc"]},
+    "dim_local_ocorrencia": {
+        "id": "id_local_ocor",
+        "rotulo": ["local_desc", "local_ocorrencia_desc", "descricao", "local_ocor_desc", "nome"],
+    },
+    "dim_cid10_capitulo": {
+        "id": "id_capitulo",
+        "rotulo": ["titulo", "capitulo_desc", "capitulo_nome", "descricao", "nome"],
+    },
+}
+
+_colunas = {}
+_rotulos = {}
+_geracao = 0
+_carregado = False
+_lock = asyncio.Lock()
+
+
+async def carregar():
+    """Lê as colunas das dimensões e resolve as colunas de descrição."""
+    global _colunas, _rotulos, _geracao, _carregado
+    async with _lock:
+        rows = await fetch_all(
+            '''
+            SELECT table_name, column_name
+            FROM information_schema.columns
+            WHERE table_schema = ANY(current_schemas(false))
+              AND table_name = ANY(%s);
+            ''',
+            (list(DIMENSOES),),
+        )
+        colunas = {}
+        for row in rows:
+            colunas.setdefault(row["table_name"], set()).add(row["column_name"])
+
+        rotulos = {}
+        for tabela, spec in DIMENSOES.items():
+            existentes = colunas.get(tabela, set())
+            for candidata in spec["rotulo"]:
+                if candidata in existentes:
+                    rotulos[tabela] = candidata
+                    break
+
+        _colunas, _rotulos = colunas, rotulos
+        _geracao += 1
+        _carregado = True
+
+
+async def garantir():
+    if not _carregado:
+        await carregar()
+
+
+def invalidar():
+    """Força nova leitura do information_schema na próxima requisição."""
+    global _carregado
+    _carregado = False
+
+
+def geracao():
+    """Muda a cada recarga; usada como parte da chave do SQL compilado."""
+    return _geracao
+
+
+def rotulo(tabela):
+    coluna = _rotulos.get(tabela)
+    if coluna is None:
+        raise RuntimeError(f"Não foi possível encontrar coluna de descrição na tabela {tabela}")
+    return coluna
+
+
+def tem_coluna(tabela, coluna):
+    return coluna in _colunas.get(tabela, set())
+
+
+def resumo():
+    return {
+        "carregado": _carregado,
+        "geracao": _geracao,
+        "rotulos": dict(_rotulos),
+        "colunas": {tabela: sorted(cols) for tabela, cols in _colunas.items()},
+    }
@@ -0,0 +1,226 @@
+"""Exportação de recortes da tabela fato em CSV, NDJSON ou Parquet, em streaming.
+
+As linhas vêm de um cursor nomeado (db.stream) em lotes de EXPORT_LOTE e cada lote é
+convertido e enviado antes de buscar o próximo, então a memória não cresce com o tamanho
+do recorte. Parquet grava um row group por lote e exige o pacote opcional pyarrow.
+
+Cada exportação prende uma conexão do pool síncrono até o fim do arquivo: no máximo
+EXPORT_CONCORRENCIA por processo; além disso, iniciar() levanta Esgotado.
+"""
+import csv
+import io
+import json
+from decimal import Decimal
+
+import anyio
+from starlette.concurrency import run_in_threadpool
+
+from . import config, consultas, db, dimensoes
+from .rollups import COLUNAS_MEMBRO
+
+FORMATOS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+COLUNAS_TEXTO = {"municipio", "uf"}
+
+_em_andamento = 0
+
+
+class Esgotado(Exception):
+    pass
+
+
+def _local_tempo(id_localidade, id_tempo):
+    municipio, uf = dimensoes.localidades.get(id_localidade, (None, None))
+    ano, mes = dimensoes.tempo.get(id_tempo, (None, None))
+    return municipio, uf, ano, mes
+
+
+def municipio_mes(id_localidade=None, uf=None, ano_inicio=None, ano_fim=None, mes=None):
+    """Internações (tipo 3) e óbitos (tipo 4) por município e mês."""
+    filtro, params = consultas.filtros(id_localidade, uf, ano_inicio, ano_fim, mes)
+    sql = f'''
+        SELECT
+            f.id_localidade,
+            f.id_tempo,
+            COALESCE(SUM(f.qtd_internacoes) FILTER (WHERE f.id_tipo_evento = 3 AND f.qtd_internacoes > 0), 0)::bigint,
+            COALESCE(SUM(f.qtd_obitos) FILTER (WHERE f.id_tipo_evento = 4 AND f.qtd_obitos > 0), 0)::bigint
+        FROM fato_saude_mensal f
+        WHERE f.id_tipo_evento IN (3, 4)
+          AND f.id_tempo IS NOT NULL
+          AND f.id_tempo != 0{filtro}
+        GROUP BY f.id_localidade, f.id_tempo
+        ORDER BY f.id_localidade, f.id_tempo
+    '''
+    colunas = ["id_localidade", "municipio", "uf", "ano", "mes", "internacoes", "obitos"]
+
+    def decorar(linhas):
+        return [(loc, *_local_tempo(loc, tempo), internacoes, obitos) for loc, tempo, internacoes, obitos in linhas]
+
+    return sql, params, colunas, decorar
+
+
+def fato(id_tipo_evento, id_localidade=None, uf=None, ano_inicio=None, ano_fim=None, mes=None):
+    """Linhas da tabela fato de um tipo de evento, sem agregação."""
+    filtro, params = consultas.filtros(id_localidade, uf, ano_inicio, ano_fim, mes)
+    membros = ", ".join(f"f.{c}" for c in COLUNAS_MEMBRO)
+    sql = f'''
+        SELECT
+            f.id_localidade,
+            f.id_tempo,
+            {membros},
+            f.qtd_internacoes::bigint,
+            f.qtd_obitos::bigint
+        FROM fato_saude_mensal f
+        WHERE f.id_tipo_evento = %s{filtro}
+    '''
+    colunas = ["id_tipo_evento", "id_localidade", "municipio", "uf", "ano", "mes", *COLUNAS_MEMBRO,
+               "qtd_internacoes", "qtd_obitos"]
+
+    def decorar(linhas):
+        return [(id_tipo_evento, linha[0], *_local_tempo(linha[0], linha[1]), *linha[2:]) for linha in linhas]
+
+    return sql, [id_tipo_evento] + params, colunas, decorar
+
+
+async def _lotes(sql, params):
+    gerador = db.stream(sql, params, lote=config.EXPORT_LOTE, timeout=config.EXPORT_TIMEOUT)
+    try:
+        while True:
+            lote = await run_in_threadpool(next, gerador, None)
+            if lote is None:
+                return
+            yield lote
+    finally:
+        # Cliente desconectou ou erro: fecha o cursor e devolve a conexão mesmo sob cancelamento
+        with anyio.CancelScope(shield=True):
+            await run_in_threadpool(gerador.close)
+
+
+def _json_padrao(valor):
+    if isinstance(valor, Decimal):
+        return int(valor) if valor == valor.to_integral_value() else float(valor)
+    return str(valor)
+
+
+async def _csv(lotes, colunas, decorar):
+    saida = io.StringIO()
+    escritor = csv.writer(saida)
+    escritor.writerow(colunas)
+    async for lote in lotes:
+        escritor.writerows(decorar(lote))
+        yield saida.getvalue().encode("utf-8")
+        saida.seek(0)
+        saida.truncate()
+    if saida.tell():
+        yield saida.getvalue().encode("utf-8")
+
+
+async def _ndjson(lotes, colunas, decorar):
+    async for lote in lotes:
+        yield "".join(
+            json.dumps(dict(zip(colunas, linha)), ensure_ascii=False, default=_json_padrao) + "\n"
+            for linha in decorar(lote)
+        ).encode("utf-8")
+
+
+class _Saida(io.RawIOBase):
+    """Destino do ParquetWriter que acumula bytes até serem enviados, mantendo a posição total."""
+
+    def __init__(self):
+        self._partes = []
+        self._posicao = 0
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._posicao
+
+    def esvaziar(self):
+        dados = b"".join(self._partes)
+        self._partes = []
+        return dados
+
+
+async def _parquet(lotes, colunas, decorar):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(c, pa.string() if c in COLUNAS_TEXTO else pa.int64()) for c in colunas])
+    saida = _Saida()
+    escritor = pq.ParquetWriter(pa.PythonFile(saida, mode="w"), schema, compression="zstd")
+    try:
+        async for lote in lotes:
+            valores = list(zip(*decorar(lote)))
+            tabela = pa.Table.from_arrays(
+                [pa.array(valores[i], type=campo.type) for i, campo in enumerate(schema)], schema=schema
+            )
+            await run_in_threadpool(escritor.write_table, tabela)
+            yield saida.esvaziar()
+    finally:
+        escritor.close()
+    yield saida.esvaziar()
+
+
+def parquet_disponivel():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+async def gerar(formato, consulta):
+    """Bytes no formato pedido para a consulta (sql, params, colunas, decorar), lote a lote.
+
+    Ocupa uma das EXPORT_CONCORRENCIA vagas do processo do primeiro pedaço até ser fechado.
+    """
+    global _em_andamento
+    if _em_andamento >= config.EXPORT_CONCORRENCIA:
+        raise Esgotado(f"{_em_andamento} exportações em andamento neste processo; tente de novo em instantes")
+    _em_andamento += 1
+    try:
+        sql, params, colunas, decorar = consulta
+        escrever = {"csv": _csv, "ndjson": _ndjson, "parquet": _parquet}[formato]
+        lotes = _lotes(sql, params)
+        partes = escrever(lotes, colunas, decorar)
+        try:
+            async for parte in partes:
+                yield parte
+        finally:
+            with anyio.CancelScope(shield=True):
+                await partes.aclose()
+                await lotes.aclose()
+    finally:
+        # Também no fechamento pelo coletor de lixo, se a resposta nunca chegar a ser enviada
+        _em_andamento -= 1
+
+
+async def iniciar(formato, consulta):
+    """Como gerar(), mas já busca o primeiro pedaço: um erro na consulta vira exceção antes
+    de a resposta começar (e pode virar HTTP 500), em vez de cortar o arquivo no meio."""
+    partes = gerar(formato, consulta)
+    try:
+        primeira = await partes.__anext__()
+    except StopAsyncIteration:
+        primeira = b""
+
+    async def continuar():
+        try:
+            yield primeira
+            async for parte in partes:
+                yield parte
+        finally:
+            with anyio.CancelScope(shield=True):
+                await partes.aclose()
+
+    return continuar()
@@ -0,0 +1,539 @@
+"""Geometrias das UFs e dos municípios em TopoJSON simplificado, servidas pela própria API.
+
+O mapa deixava o navegador baixar um GeoJSON de UFs em resolução cheia de um host de
+terceiros, e não havia geometria de municípios. Aqui as malhas do IBGE (ou arquivos GeoJSON
+locais) viram topologias TopoJSON:
+
+- os limites compartilhados entre vizinhos viram um único arco, então a simplificação
+  (Douglas-Peucker por arco, com as junções fixas) não abre buracos nem sobreposições;
+- cada NIVEL simplifica com tolerância de ~1 pixel no zoom correspondente do Leaflet,
+  medida em Web Mercator (a projeção do mapa); as coordenadas continuam em lon/lat;
+- coordenadas quantizadas e em delta (transform do TopoJSON).
+
+As topologias ficam na tabela `geometria`, no mesmo banco dos dados, e a API as serve em
+/api/geo/{camada}?nivel=baixo|medio|alto[&uf=SP] com ETag, Cache-Control de longa duração e
+corpo já comprimido (calculado uma vez por processo).
+
+    python -m app.geometrias gerar --baixar                     # malhas do IBGE
+    python -m app.geometrias gerar --ufs ufs.geojson --municipios municipios.geojson
+    python -m app.geometrias status
+
+Municípios são ligados a dim_localidade pelo código IBGE (7 ou 6 dígitos) e, na falta
+dele, por nome + UF; `id` de cada geometria é o id_localidade.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import math
+import sys
+import time
+import unicodedata
+import urllib.request
+
+import orjson
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+from . import compressao, config, db
+from .cache import ResultCache
+from .db import get_connection
+from .db_async import fetch_one
+
+TABELA = "geometria"
+CAMADAS = ("ufs", "municipios")
+# nível -> zoom do Leaflet em que a simplificação fica abaixo de 1 pixel
+NIVEIS = {"baixo": 4, "medio": 6, "alto": 8}
+# Grade (graus) em que os vértices de vizinhos são identificados como o mesmo ponto (~10 cm)
+GRADE = 1e-6
+
+IBGE_URL = ("https://servicodados.ibge.gov.br/api/v3/malhas/paises/BR"
+            "?formato=application/vnd.geo%2Bjson&qualidade={qualidade}&intrarregiao={divisao}")
+
+# código IBGE da UF -> (sigla, nome)
+UFS_IBGE = {
+    "11": ("RO", "Rondônia"), "12": ("AC", "Acre"), "13": ("AM", "Amazonas"), "14": ("RR", "Roraima"),
+    "15": ("PA", "Pará"), "16": ("AP", "Amapá"), "17": ("TO", "Tocantins"), "21": ("MA", "Maranhão"),
+    "22": ("PI", "Piauí"), "23": ("CE", "Ceará"), "24": ("RN", "Rio Grande do Norte"), "25": ("PB", "Paraíba"),
+    "26": ("PE", "Pernambuco"), "27": ("AL", "Alagoas"), "28": ("SE", "Sergipe"), "29": ("BA", "Bahia"),
+    "31": ("MG", "Minas Gerais"), "32": ("ES", "Espírito Santo"), "33": ("RJ", "Rio de Janeiro"),
+    "35": ("SP", "São Paulo"), "41": ("PR", "Paraná"), "42": ("SC", "Santa Catarina"),
+    "43": ("RS", "Rio Grande do Sul"), "50": ("MS", "Mato Grosso do Sul"), "51": ("MT", "Mato Grosso"),
+    "52": ("GO", "Goiás"), "53": ("DF", "Distrito Federal"),
+}
+UF_POR_SIGLA = {sigla: (codigo, nome) for codigo, (sigla, nome) in UFS_IBGE.items()}
+
+
+# --- leitura das feições ---------------------------------------------------------
+
+def _propriedade(feicao, *nomes):
+    props = feicao.get("properties") or {}
+    for nome in nomes:
+        for chave in (nome, nome.upper(), nome.lower()):
+            valor = props.get(chave)
+            if valor not in (None, ""):
+                return str(valor).strip()
+    return None
+
+
+def _normalizar(texto):
+    texto = unicodedata.normalize("NFKD", texto or "").encode("ascii", "ignore").decode()
+    return " ".join(texto.upper().replace("'", " ").replace("-", " ").split())
+
+
+def _codigo(feicao):
+    codigo = _propriedade(feicao, "codarea", "CD_MUN", "CD_UF", "codigo_ibge", "geocodigo", "id")
+    if codigo is None and feicao.get("id") is not None:
+        codigo = str(feicao["id"])
+    return codigo
+
+
+def _props_uf(feicao):
+    codigo = _codigo(feicao)
+    sigla = _propriedade(feicao, "sigla", "SIGLA_UF", "uf")
+    if sigla is None and codigo in UFS_IBGE:
+        sigla = UFS_IBGE[codigo][0]
+    if sigla is None:
+        raise ValueError(f"Feição de UF sem sigla nem código IBGE reconhecível: {feicao.get('properties')}")
+    sigla = sigla.upper()
+    codigo, nome = UF_POR_SIGLA.get(sigla, (codigo, None))
+    return sigla, {"uf": sigla, "nome": nome or _propriedade(feicao, "nome", "name", "NM_UF") or sigla,
+                   "codigo_ibge": codigo}
+
+
+def _ligar_municipios(localidades):
+    """Índices de dim_localidade por id e por (nome normalizado, UF)."""
+    por_id = {id_localidade: (municipio, uf) for id_localidade, municipio, uf in localidades}
+    por_nome = {(_normalizar(municipio), (uf or "").strip().upper()): id_localidade
+                for id_localidade, municipio, uf in localidades}
+    return por_id, por_nome
+
+
+def _props_municipio(feicao, por_id, por_nome):
+    codigo = _codigo(feicao)
+    uf = _propriedade(feicao, "SIGLA_UF", "sigla_uf", "uf")
+    if uf is None and codigo and codigo[:2] in UFS_IBGE:
+        uf = UFS_IBGE[codigo[:2]][0]
+    nome = _propriedade(feicao, "NM_MUN", "nome", "name")
+    id_localidade = None
+    if codigo and codigo.isdigit():
+        # DATASUS usa o código de 6 dígitos (sem o verificador); o IBGE, o de 7
+        for candidato in (int(codigo), int(codigo[:6])):
+            if candidato in por_id:
+                id_localidade = candidato
+                break
+    if id_localidade is None and nome and uf:
+        id_localidade = por_nome.get((_normalizar(nome), uf.upper()))
+    if id_localidade is not None:
+        nome = nome or por_id[id_localidade][0]
+        uf = uf or por_id[id_localidade][1]
+    return id_localidade, {"nome": nome, "uf": (uf or "").upper() or None, "codigo_ibge": codigo}
+
+
+def _poligonos(geometria):
+    if geometria is None:
+        return []
+    if geometria["type"] == "Polygon":
+        return [geometria["coordinates"]]
+    if geometria["type"] == "MultiPolygon":
+        return geometria["coordinates"]
+    if geometria["type"] == "GeometryCollection":
+        return [p for g in geometria["geometries"] for p in _poligonos(g)]
+    return []
+
+
+def _anel(coordenadas):
+    """Anel na grade GRADE, sem pontos repetidos e sem repetir o primeiro no fim."""
+    pontos = []
+    for lon, lat, *_ in coordenadas:
+        ponto = (round(lon / GRADE), round(lat / GRADE))
+        if not pontos or pontos[-1] != ponto:
+            pontos.append(ponto)
+    if len(pontos) > 1 and pontos[0] == pontos[-1]:
+        pontos.pop()
+    return pontos if len(pontos) >= 3 else None
+
+
+# --- topologia -------------------------------------------------------------------
+
+def _juncoes(aneis):
+    """Pontos em que um limite passa a ser compartilhado com outro anel (ou deixa de ser)."""
+    vizinhos, juncoes = {}, set()
+    for anel in aneis:
+        n = len(anel)
+        for i, ponto in enumerate(anel):
+            antes, depois = anel[i - 1], anel[(i + 1) % n]
+            visto = vizinhos.get(ponto)
+            if visto is None:
+                vizinhos[ponto] = (antes, depois)
+            elif visto != (antes, depois) and visto != (depois, antes):
+                juncoes.add(ponto)
+    return juncoes
+
+
+class _Arcos:
+    def __init__(self):
+        self.lista = []
+        self._indice = {}
+
+    def adicionar(self, pontos):
+        chave = tuple(pontos)
+        i = self._indice.get(chave)
+        if i is not None:
+            return i
+        # O mesmo limite percorrido no sentido contrário pelo vizinho
+        i = self._indice.get(chave[::-1])
+        if i is not None:
+            return ~i
+        self._indice[chave] = len(self.lista)
+        self.lista.append(pontos)
+        return len(self.lista) - 1
+
+
+def _cortar(anel, juncoes, arcos):
+    inicios = [i for i, ponto in enumerate(anel) if ponto in juncoes]
+    if not inicios:
+        # Anel sem junções (ilha, enclave): começa no menor ponto para o enclave e o buraco
+        # do vizinho caírem no mesmo arco
+        k = anel.index(min(anel))
+        rotacionado = anel[k:] + anel[:k]
+        return [arcos.adicionar(rotacionado + [rotacionado[0]])]
+    k = inicios[0]
+    rotacionado = anel[k:] + anel[:k] + [anel[k]]
+    cortes = [i - k for i in inicios] + [len(anel)]
+    return [arcos.adicionar(rotacionado[a:b + 1]) for a, b in zip(cortes, cortes[1:])]
+
+
+def topologia(feicoes):
+    """Arcos compartilhados e geometrias como listas de referências a arcos.
+
+    `feicoes`: [(id, propriedades, geometria GeoJSON)]. Retorna (arcos, geometrias), com
+    geometrias no formato do TopoJSON (anéis = listas de índices; ~i = arco i invertido).
+    """
+    poligonos = []
+    for id_feicao, props, geometria in feicoes:
+        aneis = [[a for a in map(_anel, poligono) if a] for poligono in _poligonos(geometria)]
+        poligonos.append((id_feicao, props, [p for p in aneis if p]))
+
+    juncoes = _juncoes([anel for _, _, aneis in poligonos for poligono in aneis for anel in poligono])
+    arcos = _Arcos()
+    geometrias = []
+    for id_feicao, props, aneis in poligonos:
+        if not aneis:
+            continue
+        refs = [[_cortar(anel, juncoes, arcos) for anel in poligono] for poligono in aneis]
+        geometria = {"type": "Polygon", "arcs": refs[0]} if len(refs) == 1 else {"type": "MultiPolygon", "arcs": refs}
+        if id_feicao is not None:
+            geometria["id"] = id_feicao
+        geometria["properties"] = props
+        geometrias.append(geometria)
+    return arcos.lista, geometrias
+
+
+# --- simplificação e codificação -------------------------------------------------
+
+def _mercator(ponto):
+    lat = max(min(ponto[1] * GRADE, 85.0), -85.0)
+    return ponto[0] * GRADE, math.degrees(math.log(math.tan(math.pi / 4 + math.radians(lat) / 2)))
+
+
+def _distancia2(p, a, b):
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    if dx == 0 and dy == 0:
+        return (p[0] - a[0]) ** 2 + (p[1] - a[1]) ** 2
+    t = max(0.0, min(1.0, ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / (dx * dx + dy * dy)))
+    return (p[0] - a[0] - t * dx) ** 2 + (p[1] - a[1] - t * dy) ** 2
+
+
+def simplificar(pontos, tolerancia):
+    """Douglas-Peucker em Web Mercator; as pontas (junções) sempre ficam."""
+    n = len(pontos)
+    if n <= 2:
+        return pontos
+    xy = [_mercator(p) for p in pontos]
+    manter = [False] * n
+    manter[0] = manter[-1] = True
+    tolerancia2 = tolerancia * tolerancia
+    if pontos[0] == pontos[-1]:
+        # Arco fechado: a reta início-fim não existe; parte no ponto mais distante do início
+        meio = max(range(1, n - 1), key=lambda i: _distancia2(xy[i], xy[0], xy[0]))
+        manter[meio] = True
+        pilha = [(0, meio), (meio, n - 1)]
+        minimo = 4
+    else:
+        pilha = [(0, n - 1)]
+        minimo = 2
+    while pilha:
+        a, b = pilha.pop()
+        maior, indice = tolerancia2, None
+        for i in range(a + 1, b):
+            d = _distancia2(xy[i], xy[a], xy[b])
+            if d > maior:
+                maior, indice = d, i
+        if indice is not None:
+            manter[indice] = True
+            pilha += [(a, indice), (indice, b)]
+    if sum(manter) < minimo:
+        # Anel fechado reduzido a uma reta: mantém o vértice mais distante dela
+        fora = [i for i in range(1, n - 1) if not manter[i]]
+        if fora:
+            extremos = [i for i in range(n) if manter[i]]
+            manter[max(fora, key=lambda i: _distancia2(xy[i], xy[extremos[0]], xy[extremos[1]]))] = True
+    return [p for p, m in zip(pontos, manter) if m]
+
+
+def codificar(arcos, geometrias, nome, zoom):
+    """Topologia TopoJSON do nível `zoom`: arcos simplificados, quantizados e em delta."""
+    tolerancia = 360 / (256 * 2 ** zoom)
+    # Passo da quantização: 1/4 da tolerância (em unidades de GRADE)
+    passo = max(1, round(tolerancia / 4 / GRADE))
+    simplificados = [simplificar(arco, tolerancia) for arco in arcos]
+    xs = [p[0] for arco in simplificados for p in arco]
+    ys = [p[1] for arco in simplificados for p in arco]
+    x0, y0 = min(xs), min(ys)
+
+    codificados = []
+    for arco in simplificados:
+        delta, anterior = [], None
+        for x, y in arco:
+            q = (round((x - x0) / passo), round((y - y0) / passo))
+            if anterior is None:
+                delta.append(list(q))
+            elif q != anterior:
+                delta.append([q[0] - anterior[0], q[1] - anterior[1]])
+            anterior = q
+        if len(delta) == 1:
+            delta.append([0, 0])
+        codificados.append(delta)
+
+    return {
+        "type": "Topology",
+        "bbox": [x0 * GRADE, y0 * GRADE, max(xs) * GRADE, max(ys) * GRADE],
+        "transform": {"scale": [passo * GRADE, passo * GRADE], "translate": [x0 * GRADE, y0 * GRADE]},
+        "objects": {nome: {"type": "GeometryCollection", "geometries": geometrias}},
+        "arcs": codificados,
+    }
+
+
+def recortar(topo, campo, valor):
+    """Só as geometrias com properties[campo] == valor, com os arcos renumerados."""
+    nome, objeto = next(iter(topo["objects"].items()))
+    geometrias = [g for g in objeto["geometries"] if (g.get("properties") or {}).get(campo) == valor]
+    novos = {}
+
+    def renumerar(ref):
+        i = ref if ref >= 0 else ~ref
+        if i not in novos:
+            novos[i] = len(novos)
+        return novos[i] if ref >= 0 else ~novos[i]
+
+    recortadas = []
+    for g in geometrias:
+        if g["type"] == "Polygon":
+            arcos = [[renumerar(r) for r in anel] for anel in g["arcs"]]
+        else:
+            arcos = [[[renumerar(r) for r in anel] for anel in poligono] for poligono in g["arcs"]]
+        recortadas.append({**g, "arcs": arcos})
+    return {
+        "type": "Topology",
+        "transform": topo["transform"],
+        "objects": {nome: {"type": "GeometryCollection", "geometries": recortadas}},
+        "arcs": [topo["arcs"][i] for i in sorted(novos, key=novos.get)],
+    }
+
+
+# --- geração (CLI) -----------------------------------------------------------------
+
+def _ler_geojson(origem):
+    if origem.startswith(("http://", "https://")):
+        requisicao = urllib.request.Request(origem, headers={"Accept": "application/json"})
+        with urllib.request.urlopen(requisicao, timeout=300) as resposta:
+            bruto = resposta.read()
+    else:
+        with open(origem, "rb") as f:
+            bruto = f.read()
+    dados = orjson.loads(bruto)
+    return dados["features"] if dados.get("type") == "FeatureCollection" else [dados], len(bruto)
+
+
+def _criar_tabela(cur):
+    cur.execute(f'''
+        CREATE TABLE IF NOT EXISTS {TABELA} (
+            camada text NOT NULL,
+            nivel text NOT NULL,
+            topojson bytea NOT NULL,
+            etag text NOT NULL,
+            feicoes integer NOT NULL,
+            fonte text,
+            gerado_em timestamptz NOT NULL DEFAULT now(),
+            PRIMARY KEY (camada, nivel)
+        )
+    ''')
+
+
+def _localidades():
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id_localidade, municipio, uf FROM dim_localidade")
+            return [(row["id_localidade"], row["municipio"], row["uf"]) for row in cur.fetchall()]
+
+
+def gerar(camada, origem):
+    """Lê `origem` (arquivo ou URL GeoJSON), monta a topologia e grava todos os níveis."""
+    inicio = time.monotonic()
+    feicoes, bytes_origem = _ler_geojson(origem)
+    entrada, sem_localidade = [], []
+    if camada == "ufs":
+        for feicao in feicoes:
+            sigla, props = _props_uf(feicao)
+            entrada.append((sigla, props, feicao.get("geometry")))
+    else:
+        por_id, por_nome = _ligar_municipios(_localidades())
+        for feicao in feicoes:
+            id_localidade, props = _props_municipio(feicao, por_id, por_nome)
+            if id_localidade is None:
+                sem_localidade.append(props["codigo_ibge"] or props["nome"])
+            entrada.append((id_localidade, props, feicao.get("geometry")))
+
+    arcos, geometrias = topologia(entrada)
+    relatorio = {
+        "camada": camada,
+        "fonte": origem,
+        "feicoes": len(geometrias),
+        "arcos": len(arcos),
+        "pontos": sum(len(a) for a in arcos),
+        "bytes_fonte": bytes_origem,
+        "sem_localidade": sem_localidade[:20],
+        "total_sem_localidade": len(sem_localidade),
+        "niveis": {},
+    }
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            _criar_tabela(cur)
+            for nivel, zoom in NIVEIS.items():
+                corpo = orjson.dumps(codificar(arcos, geometrias, camada, zoom))
+                etag = hashlib.sha1(corpo).hexdigest()[:20]
+                cur.execute(
+                    f'''
+                    INSERT INTO {TABELA} (camada, nivel, topojson, etag, feicoes, fonte)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (camada, nivel) DO UPDATE
+                    SET topojson = EXCLUDED.topojson, etag = EXCLUDED.etag, feicoes = EXCLUDED.feicoes,
+                        fonte = EXCLUDED.fonte, gerado_em = now()
+                    ''',
+                    (camada, nivel, corpo, etag, len(geometrias), origem),
+                )
+                tamanho_gzip = len(gzip.compress(corpo, compresslevel=6, mtime=0))
+                relatorio["niveis"][nivel] = {
+                    "zoom": zoom,
+                    "bytes": len(corpo),
+                    "bytes_gzip": tamanho_gzip,
+                    "reducao": round(bytes_origem / len(corpo), 1),
+                }
+    relatorio["duracao_s"] = round(time.monotonic() - inicio, 1)
+    return relatorio
+
+
+def status():
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL AS existe", (TABELA,))
+            if not cur.fetchone()["existe"]:
+                return []
+            cur.execute(f'''
+                SELECT camada, nivel, octet_length(topojson) AS bytes, etag, feicoes, fonte, gerado_em
+                FROM {TABELA}
+                ORDER BY camada, nivel
+            ''')
+            return [dict(row) for row in cur.fetchall()]
+
+
+# --- servir (API) -------------------------------------------------------------------
+
+class Geometria:
+    """Corpo de uma camada/nível pronto para envio, com as versões comprimidas sob demanda."""
+
+    def __init__(self, corpo, etag):
+        self.corpo = corpo
+        self.etag = f'"{etag}"'
+        self._comprimidos = {}
+
+    async def corpo_para(self, codificacao):
+        if codificacao is None:
+            return self.corpo
+        if codificacao not in self._comprimidos:
+            self._comprimidos[codificacao] = await run_in_threadpool(compressao.comprimir, self.corpo, codificacao)
+        return self._comprimidos[codificacao]
+
+
+_servidas = ResultCache(max_items=64, ttl=config.CACHE_TTL)
+
+
+async def carregar(camada, nivel, uf=None):
+    """Geometria de `camada`/`nivel` (opcionalmente só os municípios de uma UF) ou None."""
+    chave = (camada, nivel, uf)
+    hit, item = _servidas.get(chave)
+    if hit:
+        return item
+    existe = await fetch_one("SELECT to_regclass(%s) IS NOT NULL AS existe", (TABELA,))
+    if not existe["existe"]:
+        return None
+    row = await fetch_one(f"SELECT topojson, etag FROM {TABELA} WHERE camada = %s AND nivel = %s", (camada, nivel))
+    if row is None:
+        return None
+    corpo, etag = bytes(row["topojson"]), row["etag"]
+    if uf:
+        topo = recortar(orjson.loads(corpo), "uf", uf)
+        corpo, etag = orjson.dumps(topo), f"{etag}-{uf}"
+    item = Geometria(corpo, etag)
+    _servidas.set(chave, item)
+    return item
+
+
+def cache_control():
+    return f"public, max-age={config.GEO_CACHE_MAX_AGE}, stale-while-revalidate={config.GEO_CACHE_MAX_AGE}"
+
+
+async def responder(item, cabecalhos):
+    """304 se o cliente já tem a versão atual; senão o corpo, já comprimido se aceito."""
+    headers = {"ETag": item.etag, "Cache-Control": cache_control(), "Vary": "Accept-Encoding"}
+    if_none_match = cabecalhos.get("if-none-match") or ""
+    if item.etag in [etag.strip().removeprefix("W/") for etag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    codificacao = compressao.escolher_codificacao(cabecalhos.get("accept-encoding", ""))
+    if codificacao is not None:
+        headers["Content-Encoding"] = codificacao
+    return Response(await item.corpo_para(codificacao), media_type="application/json", headers=headers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Geometrias (TopoJSON) das UFs e municípios")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p = sub.add_parser("gerar")
+    p.add_argument("--ufs", help="GeoJSON (arquivo ou URL) das UFs")
+    p.add_argument("--municipios", help="GeoJSON (arquivo ou URL) dos municípios")
+    p.add_argument("--baixar", action="store_true", help="usa as malhas da API do IBGE para o que não foi informado")
+    p.add_argument("--qualidade", default="intermediaria", choices=["minima", "intermediaria", "maxima"],
+                   help="qualidade da malha do IBGE com --baixar")
+    sub.add_parser("status")
+    args = parser.parse_args()
+
+    try:
+        if args.comando == "status":
+            print(json.dumps(status(), indent=2, ensure_ascii=False, default=str))
+            return
+        origens = {"ufs": args.ufs, "municipios": args.municipios}
+        if args.baixar:
+            for camada, divisao in (("ufs", "UF"), ("municipios", "municipio")):
+                origens[camada] = origens[camada] or IBGE_URL.format(qualidade=args.qualidade, divisao=divisao)
+        origens = {camada: origem for camada, origem in origens.items() if origem}
+        if not origens:
+            parser.error("informe --ufs, --municipios ou --baixar")
+        for camada, origem in origens.items():
+            print(json.dumps(gerar(camada, origem), indent=2, ensure_ascii=False))
+    finally:
+        db.close_pool()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
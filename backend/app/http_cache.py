@@ -0,0 +1,105 @@
+"""Cache HTTP dos endpoints públicos de agregação.
+
+A ETag depende só da versão dos dados, das dimensões em memória (dimensoes.assinatura) e da
+query normalizada, então é calculada antes de chamar o endpoint: um If-None-Match que bate
+volta 304 sem tocar no banco nem no cache de resultados. As respostas 200 levam ETag,
+Last-Modified e Cache-Control public com stale-while-revalidate, para o navegador e CDNs na
+frente da API reaproveitarem. Uma resposta que o endpoint marcou com Cache-Control: no-store
+(ex.: /api/dashboard com alguma seção em erro) segue sem ETag e não entra em cache nenhum.
+"""
+import hashlib
+from email.utils import formatdate, parsedate_to_datetime
+
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import Response
+
+from . import cache, config, dimensoes
+
+# Rotas anônimas cuja resposta depende só da query, da versão dos dados e das dimensões
+ROTAS_PUBLICAS = (
+    "/api/localidades",
+    "/api/periodo-dados",
+    "/api/series/",
+    "/api/internacoes/",
+    "/api/obitos/",
+    "/api/dados/",
+    "/api/dashboard",
+)
+
+
+# Cabeçalhos de uma resposta que não pode ser reaproveitada (ver armazenavel)
+NAO_ARMAZENAR = {"Cache-Control": "no-store"}
+
+
+def publica(caminho):
+    return caminho.startswith(ROTAS_PUBLICAS)
+
+
+def armazenavel(response):
+    """Se a resposta pode levar a ETag calculada e ficar em cache: 200 e sem no-store do endpoint."""
+    return response.status_code == 200 and "no-store" not in response.headers.get("cache-control", "")
+
+
+def gerar_etag(versao, caminho, query_params, assinatura=""):
+    # Parâmetros vazios são ignorados e a ordem não importa: /x?b=1&a=2 e /x?a=2&b=1&c= têm a mesma ETag
+    query = "&".join(f"{k}={v}" for k, v in sorted(query_params.multi_items()) if v != "")
+    digest = hashlib.sha1(f"{versao}|{assinatura}|{caminho}?{query}".encode()).hexdigest()[:20]
+    # Fraca: o corpo pode variar em bytes (compressão) sem mudar de conteúdo
+    return f'W/"{digest}"'
+
+
+def _etag_corresponde(if_none_match, etag):
+    if not if_none_match:
+        return False
+    alvo = etag.removeprefix("W/")
+    for candidata in if_none_match.split(","):
+        candidata = candidata.strip()
+        if candidata == "*" or candidata.removeprefix("W/") == alvo:
+            return True
+    return False
+
+
+def _nao_modificado(if_modified_since, desde):
+    if not if_modified_since or desde is None:
+        return False
+    try:
+        return parsedate_to_datetime(if_modified_since).timestamp() >= int(desde)
+    except (TypeError, ValueError):
+        return False
+
+
+def cache_control():
+    return f"public, max-age={config.HTTP_CACHE_MAX_AGE}, stale-while-revalidate={config.HTTP_CACHE_STALE}"
+
+
+class CacheHTTPMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        if request.method not in ("GET", "HEAD") or not publica(request.url.path):
+            return await call_next(request)
+
+        versao = await cache.versao_dados()
+        if versao is None:
+            # Sem versão conhecida (banco fora no boot) não há como validar: segue sem cabeçalhos
+            return await call_next(request)
+
+        cabecalhos = {
+            "ETag": gerar_etag(versao, request.url.path, request.query_params, dimensoes.assinatura()),
+            "Cache-Control": cache_control(),
+        }
+        # Recarga das dimensões que mudou respostas também conta como modificação
+        desde = max(filter(None, (cache.versao_desde(), dimensoes.alterado_em())), default=None)
+        if desde is not None:
+            cabecalhos["Last-Modified"] = formatdate(desde, usegmt=True)
+
+        if_none_match = request.headers.get("if-none-match")
+        if _etag_corresponde(if_none_match, cabecalhos["ETag"]) or (
+            not if_none_match and _nao_modificado(request.headers.get("if-modified-since"), desde)
+        ):
+            return Response(status_code=304, headers=cabecalhos)
+
+        # Repassada ao CompressaoMiddleware para reaproveitar o corpo já comprimido
+        request.state.etag = cabecalhos["ETag"]
+        response = await call_next(request)
+        if armazenavel(response):
+            response.headers.update(cabecalhos)
+        return response
@@ -0,0 +1,449 @@
+"""Índices gerenciados de fato_saude_mensal e conselheiro de índices.
+
+INDICES define os índices que as consultas de consultas.py esperam encontrar: parciais por
+id_tipo_evento (cada endpoint lê um ou dois tipos), com as colunas filtradas na chave e as
+medidas em INCLUDE, para que a agregação seja respondida só pelo índice (Index Only Scan).
+
+    python -m app.indices status     # índices de fato_saude_mensal: tamanho, uso, válidos, faltando
+    python -m app.indices criar      # cria os que faltam (CONCURRENTLY, sem bloquear leituras)
+    python -m app.indices sugerir    # índices derivados das consultas que os endpoints emitem
+    python -m app.indices medir      # tempo de cada consulta com e sem índices, por índice usado
+
+`medir` compara o plano normal com o plano obtido desligando index/bitmap scans na
+transação (SET LOCAL), então não bloqueia a tabela nem remove nada.
+"""
+import argparse
+import asyncio
+import json
+import re
+
+from starlette.concurrency import run_in_threadpool
+
+from . import consultas, db, db_async, dimensoes, esquema, planos, rollups
+from .db import get_connection
+
+TABELA = "fato_saude_mensal"
+
+INDICES = {
+    # Caminho geral: qualquer tipo filtrado por município e período
+    "idx_fato_tipo_localidade_tempo": {
+        "colunas": ["id_tipo_evento", "id_localidade", "id_tempo"],
+        "include": ["qtd_internacoes", "qtd_obitos"],
+    },
+    # /api/series/mensal e /api/dados/por-estado (tipos 3 e 4, só valores positivos)
+    "idx_fato_series_internacoes": {
+        "colunas": ["id_localidade", "id_tempo"],
+        "include": ["qtd_internacoes"],
+        "onde": "id_tipo_evento = 3 AND qtd_internacoes > 0",
+    },
+    "idx_fato_series_obitos": {
+        "colunas": ["id_localidade", "id_tempo"],
+        "include": ["qtd_obitos"],
+        "onde": "id_tipo_evento = 4 AND qtd_obitos > 0",
+    },
+    # /api/*/cid-cap e /api/internacoes/cid-por-estado (sem filtro de positivos nesta última)
+    "idx_fato_cid_cap_internacoes": {
+        "colunas": ["id_localidade", "id_tempo", "id_capitulo"],
+        "include": ["qtd_internacoes"],
+        "onde": "id_tipo_evento = 10",
+    },
+    "idx_fato_cid_cap_obitos": {
+        "colunas": ["id_localidade", "id_tempo", "id_capitulo"],
+        "include": ["qtd_obitos"],
+        "onde": "id_tipo_evento = 11",
+    },
+    # Quebras por dimensão (sexo, faixa, raça, estado civil, local de ocorrência)
+    **{
+        f"idx_fato_{nome}": {
+            "colunas": ["id_localidade", esquema.DIMENSOES[spec["dimensao"]]["id"]],
+            "include": [spec["medida"]],
+            "onde": f"id_tipo_evento = {spec['tipo']} AND {spec['medida']} > 0",
+        }
+        for nome, spec in consultas.QUEBRAS.items()
+    },
+}
+
+
+def tipo_do_indice(nome):
+    """Tipo de evento do predicado de um índice parcial ("id_tipo_evento = X ..."), ou None."""
+    encontrado = re.match(r"id_tipo_evento = (\d+)", INDICES[nome].get("onde") or "")
+    return int(encontrado.group(1)) if encontrado else None
+
+
+def definicao(nome, concorrente=True, tabela=TABELA, indice=None, somente=False):
+    """CREATE INDEX do índice gerenciado `nome`.
+
+    `tabela` e `indice` trocam a tabela e o nome do índice (partições e migração, ver particoes.py);
+    `somente` cria o índice só no pai particionado (ON ONLY), para anexar as partições depois.
+    """
+    spec = INDICES[nome]
+    sql = (f"CREATE INDEX {'CONCURRENTLY ' if concorrente else ''}IF NOT EXISTS {indice or nome} "
+           f"ON {'ONLY ' if somente else ''}{tabela} ({', '.join(spec['colunas'])})")
+    if spec.get("include"):
+        sql += f" INCLUDE ({', '.join(spec['include'])})"
+    if spec.get("onde"):
+        sql += f" WHERE {spec['onde']}"
+    return sql
+
+
+# pg_get_indexdef: CREATE [UNIQUE] INDEX nome ON [ONLY] tabela USING método (colunas) [INCLUDE (...)] [WHERE ...]
+_INDEXDEF = re.compile(
+    r"^CREATE (?P<unico>UNIQUE )?INDEX \S+ ON (?:ONLY )?\S+ USING (?P<metodo>\w+) \((?P<colunas>[^()]*)\)"
+    r"(?: INCLUDE \((?P<include>[^()]*)\))?(?: WHERE (?P<onde>.*))?$"
+)
+
+
+def _normalizar(expressao):
+    # pg_get_indexdef põe parênteses em cada termo do predicado: ((a = 3) AND (b > 0))
+    return " ".join((expressao or "").replace("(", " ").replace(")", " ").split()).lower()
+
+
+def _lista(texto):
+    return [c.strip() for c in (texto or "").split(",") if c.strip()]
+
+
+def divergencias(nome, atual):
+    """Partes do índice `nome` existente (definição de pg_get_indexdef) que diferem da declarada em INDICES."""
+    encontrado = _INDEXDEF.match(atual)
+    if not encontrado:
+        return ["definicao"]
+    spec = INDICES[nome]
+    diferencas = []
+    if encontrado["unico"] or encontrado["metodo"] != "btree":
+        diferencas.append("tipo")
+    if _lista(encontrado["colunas"]) != spec["colunas"]:
+        diferencas.append("colunas")
+    if _lista(encontrado["include"]) != spec.get("include", []):
+        diferencas.append("include")
+    if _normalizar(encontrado["onde"]) != _normalizar(spec.get("onde")):
+        diferencas.append("onde")
+    return diferencas
+
+
+# Com a tabela fato particionada (particoes.py), os índices gerenciados ficam no pai ou na partição
+# do tipo de evento; os índices anexados das partições não são listados, só somam no tamanho.
+# pg_partition_tree não devolve linhas para tabela ou índice não particionado: a raiz entra no UNION
+SQL_EXISTENTES = f'''
+    SELECT
+        c.relname AS nome,
+        pg_get_indexdef(i.indexrelid) AS definicao,
+        i.indisvalid AS valido,
+        (SELECT COALESCE(SUM(pg_relation_size(a.relid)), 0)
+         FROM (SELECT relid FROM pg_partition_tree(i.indexrelid) UNION SELECT i.indexrelid) a) AS bytes,
+        COALESCE(s.idx_scan, 0) AS scans
+    FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indexrelid
+    LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = i.indexrelid
+    WHERE i.indrelid IN (
+        SELECT relid FROM pg_partition_tree(to_regclass('{TABELA}')) UNION SELECT to_regclass('{TABELA}')
+    )
+      AND NOT EXISTS (SELECT 1 FROM pg_inherits h WHERE h.inhrelid = i.indexrelid)
+    ORDER BY c.relname;
+'''
+
+
+def existentes():
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(SQL_EXISTENTES)
+            return {row["nome"]: dict(row) for row in cur.fetchall()}
+
+
+def particionada(cur):
+    cur.execute("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)) AS sim",
+                (TABELA,))
+    return cur.fetchone()["sim"]
+
+
+def _alvo(cur, nome):
+    """Onde fica o índice: a partição do tipo de evento do predicado, se houver, ou a própria tabela fato."""
+    tipo = tipo_do_indice(nome)
+    if tipo is None:
+        return TABELA
+    cur.execute(
+        '''
+        SELECT c.relname
+        FROM pg_inherits h
+        JOIN pg_class c ON c.oid = h.inhrelid
+        WHERE h.inhparent = to_regclass(%s) AND pg_get_expr(c.relpartbound, c.oid) = %s
+        ''',
+        (TABELA, f"FOR VALUES IN ({tipo})"),
+    )
+    row = cur.fetchone()
+    return row["relname"] if row else TABELA
+
+
+def _criar_particionado(cur, nome, alvo):
+    """CONCURRENTLY não vale para tabela particionada: cria o índice só no pai (ON ONLY), cada
+    partição folha com CONCURRENTLY e anexa tudo; o índice do pai fica válido ao anexar o último."""
+    cur.execute(definicao(nome, concorrente=False, tabela=alvo, somente=True))
+    cur.execute(
+        '''
+        SELECT relid::regclass::text AS tabela, relid::oid AS oid, parentrelid::oid AS pai, isleaf, level
+        FROM pg_partition_tree(to_regclass(%s))
+        WHERE level > 0
+        ORDER BY level
+        ''',
+        (alvo,),
+    )
+    particoes = cur.fetchall()
+    for row in particoes:
+        cur.execute(definicao(nome, concorrente=row["isleaf"], tabela=row["tabela"], indice=f"{nome}_p{row['oid']}",
+                              somente=not row["isleaf"]))
+    for row in particoes:
+        indice = f"{nome}_p{row['oid']}"
+        pai = nome if row["level"] == 1 else f"{nome}_p{row['pai']}"
+        cur.execute("SELECT EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(%s)) AS anexado", (indice,))
+        if not cur.fetchone()["anexado"]:
+            cur.execute(f"ALTER INDEX {pai} ATTACH PARTITION {indice}")
+
+
+def status():
+    """Índices gerenciados (e os demais de fato_saude_mensal) com tamanho, uso, validade e divergências.
+
+    Um índice com o nome esperado e definição diferente da declarada entra em `divergentes`;
+    criar() não o substitui (IF NOT EXISTS): é preciso removê-lo antes.
+    """
+    atuais = existentes()
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT COALESCE(SUM(pg_relation_size(relid)), 0) AS bytes
+                FROM (SELECT relid FROM pg_partition_tree(to_regclass(%(t)s)) UNION SELECT to_regclass(%(t)s)) a
+                """,
+                {"t": TABELA},
+            )
+            bytes_tabela = cur.fetchone()["bytes"]
+    gerenciados = {}
+    for nome in INDICES:
+        atual = atuais.get(nome)
+        gerenciados[nome] = {
+            "esperado": definicao(nome, concorrente=False),
+            "existe": atual is not None,
+            "valido": atual["valido"] if atual else None,
+            "bytes": atual["bytes"] if atual else None,
+            "scans": atual["scans"] if atual else None,
+            "definicao_atual": atual["definicao"] if atual else None,
+            # Existe com o nome esperado mas não com a definição declarada (ex.: criado à mão)
+            "divergencias": divergencias(nome, atual["definicao"]) if atual else None,
+        }
+    return {
+        "tabela_bytes": bytes_tabela,
+        "indices_bytes": sum(i["bytes"] for i in atuais.values()),
+        "gerenciados": gerenciados,
+        "faltando": [nome for nome, g in gerenciados.items() if not g["existe"] or not g["valido"]],
+        "divergentes": [nome for nome, g in gerenciados.items() if g["divergencias"]],
+        "outros": {nome: atual for nome, atual in atuais.items() if nome not in INDICES},
+    }
+
+
+def criar(nomes=None):
+    """Cria os índices gerenciados que faltam, um por vez, com CREATE INDEX CONCURRENTLY.
+
+    CONCURRENTLY não roda dentro de transação: usa uma conexão própria em autocommit, fora do
+    pool. Um índice que ficou inválido (criação interrompida) é removido e criado de novo.
+    Com a tabela fato particionada, as partições são indexadas uma a uma e anexadas; um índice
+    particionado inválido só tem partições por anexar, então é completado em vez de recriado.
+    """
+    nomes = nomes or list(INDICES)
+    atuais = existentes()
+    criados = []
+    conn = db._connect()
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("SET statement_timeout = 0")
+            em_particoes = particionada(cur)
+            for nome in nomes:
+                atual = atuais.get(nome)
+                if atual and atual["valido"]:
+                    continue
+                if em_particoes:
+                    _criar_particionado(cur, nome, _alvo(cur, nome))
+                else:
+                    if atual:
+                        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {nome}")
+                    cur.execute(definicao(nome))
+                criados.append(nome)
+            if criados:
+                cur.execute(f"ANALYZE {TABELA}")
+    finally:
+        conn.close()
+    return {"criados": criados, "status": status()}
+
+
+# Leitura do SQL gerado por consultas.py (formato conhecido, sempre com o alias f.)
+_RE_TIPO_MEDIDA = re.compile(r"f\.id_tipo_evento = (\d+) AND f\.(qtd_\w+) > 0")
+_RE_TIPO = re.compile(r"f\.id_tipo_evento = (\d+)")
+_RE_TIPOS = re.compile(r"f\.id_tipo_evento IN \(([\d, ]+)\)")
+_RE_POSITIVO = re.compile(r"AND f\.(qtd_\w+) > 0")
+_RE_IGUAL = re.compile(r"f\.(id_\w+) (?:= %s|IN \(%s)")
+_RE_FAIXA = re.compile(r"f\.(id_\w+) BETWEEN")
+_RE_GRUPO = re.compile(r"GROUP BY ([^;]+)")
+_RE_SOMA = re.compile(r"SUM\(f\.(\w+)\)")
+
+
+def _necessidades(sql):
+    """Índices ideais para uma consulta: um por tipo de evento lido.
+
+    Chave: colunas com igualdade/IN, depois a de faixa (id_tempo), depois as do GROUP BY;
+    INCLUDE: medidas somadas. Predicado: o tipo de evento e, se a consulta filtra, medida > 0.
+    """
+    pares = dict(_RE_TIPO_MEDIDA.findall(sql))
+    tipos = _RE_TIPOS.search(sql)
+    if tipos:
+        tipos = [t.strip() for t in tipos.group(1).split(",")]
+    else:
+        tipos = _RE_TIPO.findall(sql)[:1]
+        positivos = _RE_POSITIVO.findall(sql)
+        if tipos and positivos:
+            pares.setdefault(tipos[0], positivos[0])
+
+    chave = []
+    for coluna in _RE_IGUAL.findall(sql) + _RE_FAIXA.findall(sql):
+        if coluna != "id_tipo_evento" and coluna not in chave:
+            chave.append(coluna)
+    grupo = _RE_GRUPO.search(sql)
+    for coluna in re.findall(r"f\.(\w+)", grupo.group(1)) if grupo else []:
+        if coluna not in chave:
+            chave.append(coluna)
+
+    somas = [c for c in dict.fromkeys(_RE_SOMA.findall(sql)) if c not in chave]
+    sugestoes = []
+    for tipo in tipos:
+        medida = pares.get(tipo)
+        onde = f"id_tipo_evento = {tipo}" + (f" AND {medida} > 0" if medida else "")
+        # Em consultas com dois tipos, cada índice parcial só precisa da medida do seu tipo
+        include = [medida] if medida and len(tipos) > 1 else somas
+        sugestoes.append({"onde": onde, "colunas": chave, "include": include})
+    return sugestoes
+
+
+def _atende(spec, necessidade):
+    """O índice gerenciado `spec` responde à necessidade só com o índice (predicado e colunas)?"""
+    onde = spec.get("onde")
+    if onde is not None:
+        # Predicado do índice tem de ser implicado pelo da consulta
+        partes = set(onde.split(" AND "))
+        if not partes <= set(necessidade["onde"].split(" AND ")):
+            return False
+        cobertas = set(spec["colunas"]) | set(spec.get("include", []))
+    else:
+        cobertas = set(spec["colunas"]) | set(spec.get("include", []))
+        if spec["colunas"][0] != "id_tipo_evento":
+            return False
+    return set(necessidade["colunas"]) | set(necessidade["include"]) <= cobertas
+
+
+def _varreduras(plano):
+    raiz = plano[0]["Plan"] if isinstance(plano, list) else plano["Plan"]
+    return [
+        {"no": no["Node Type"], "indice": no.get("Index Name")}
+        for no in planos._percorrer(raiz)
+        # Particionada: os nós de varredura citam as partições (fato_saude_mensal_t10_2020, ...)
+        if (no.get("Relation Name") or "").startswith(TABELA) or (no.get("Index Name") and no.get("Node Type") == "Bitmap Index Scan")
+    ]
+
+
+def _explicar(sql, params, analisar=False, sem_indices=False):
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL statement_timeout = '180s'")
+            if sem_indices:
+                cur.execute("SET LOCAL enable_indexscan = off")
+                cur.execute("SET LOCAL enable_indexonlyscan = off")
+                cur.execute("SET LOCAL enable_bitmapscan = off")
+            opcoes = "ANALYZE, BUFFERS, FORMAT JSON" if analisar else "FORMAT JSON"
+            cur.execute(f"EXPLAIN ({opcoes}) {sql}", params)
+            return cur.fetchone()["QUERY PLAN"]
+
+
+async def _consultas_fato():
+    """(nome, params, sql, sql_params) de cada consulta registrada em planos.CONSULTAS, lendo da tabela fato."""
+    await dimensoes.garantir()
+    for nome, spec in planos.CONSULTAS.items():
+        for params in spec["padrao"]:
+            sql, sql_params, _ = spec["montar"](rollups.FATO, **params)
+            yield nome, params, sql, sql_params
+
+
+async def sugerir():
+    """Para cada consulta dos endpoints: índice ideal, índice gerenciado que o atende e plano atual."""
+    resultado = []
+    async for nome, params, sql, sql_params in _consultas_fato():
+        necessidades = _necessidades(sql)
+        try:
+            plano = await run_in_threadpool(_explicar, sql, sql_params)
+            varreduras = _varreduras(plano)
+        except Exception as e:
+            varreduras = {"erro": str(e)}
+        itens = []
+        for necessidade in necessidades:
+            atendida = [indice for indice, spec in INDICES.items() if _atende(spec, necessidade)]
+            itens.append({
+                **necessidade,
+                "sql": (
+                    f"CREATE INDEX ON {TABELA} ({', '.join(necessidade['colunas'])})"
+                    + (f" INCLUDE ({', '.join(necessidade['include'])})" if necessidade["include"] else "")
+                    + f" WHERE {necessidade['onde']}"
+                ),
+                "atendida_por": atendida,
+            })
+        resultado.append({"consulta": nome, "parametros": params, "necessidades": itens, "plano_atual": varreduras})
+    return resultado
+
+
+async def medir():
+    """Tempo de cada consulta com os índices atuais e sem índice nenhum; agrupado por índice usado."""
+    atuais = existentes()
+    por_indice = {}
+    async for nome, params, sql, sql_params in _consultas_fato():
+        com = await run_in_threadpool(_explicar, sql, sql_params, True)
+        sem = await run_in_threadpool(_explicar, sql, sql_params, True, True)
+        com_ms, sem_ms = com[0]["Execution Time"], sem[0]["Execution Time"]
+        usados = sorted({v["indice"] for v in _varreduras(com) if v["indice"]}) or ["(nenhum)"]
+        for indice in usados:
+            por_indice.setdefault(indice, []).append({
+                "consulta": nome,
+                "parametros": params,
+                "com_indice_ms": round(com_ms, 2),
+                "sem_indice_ms": round(sem_ms, 2),
+                "aceleracao": round(sem_ms / com_ms, 1) if com_ms else None,
+            })
+    return {
+        indice: {
+            "bytes": atuais[indice]["bytes"] if indice in atuais else None,
+            "gerenciado": indice in INDICES,
+            "consultas": medidas,
+        }
+        for indice, medidas in sorted(por_indice.items())
+    }
+
+
+async def _executar_async(funcao):
+    try:
+        return await funcao()
+    finally:
+        await db_async.close_pool()
+        db.close_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=f"Índices de {TABELA}")
+    parser.add_argument("comando", choices=["status", "criar", "sugerir", "medir"])
+    parser.add_argument("--nome", action="append", choices=sorted(INDICES), help="com criar: só estes índices")
+    args = parser.parse_args()
+    if args.comando == "status":
+        resultado = status()
+    elif args.comando == "criar":
+        resultado = criar(args.nome)
+    elif args.comando == "sugerir":
+        resultado = asyncio.run(_executar_async(sugerir))
+    else:
+        resultado = asyncio.run(_executar_async(medir))
+    print(json.dumps(resultado, indent=2, ensure_ascii=False, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,27 @@
-from fastapi import FastAPI, Query, HTTPException, Depends, status
+from fastapi import FastAPI, Query, HTTPException, Depends, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, EmailStr
-from .db import get_connection
+from .db import get_connection, get_pool, close_pool
+from . import config, db, db_async
+from . import cache
+from .cache import cache_resultado
+from . import aquecimento, auth, colunar, compressao, esquema, consultas, dimensoes, exportacao, geometrias, http_cache, indices, metricas, planos
+from .respostas import json_rapido
 from .supabase_client import supabase
 from typing import Optional
+import asyncio
+import bisect
+import hmac
+import json
+import logging
 import psycopg2
-from functools import lru_cache
 from datetime import datetime, timedelta
 
+logger = logging.getLogger(__name__)
+
 def rows_to_dicts(cur):
     # Convert cursor results to plain dicts for JSON serialization
     return [dict(row) for row in cur.fetchall()]
@@ -16,7 +29,15 @@ def rows_to_dicts(cur):
 def row_to_dict(row):
     return dict(row) if row else None
 
-app = FastAPI(title="API Dashboard Saúde - TCC")
+app = FastAPI(title="API Dashboard Saúde - TCC", default_response_class=ORJSONResponse)
+
+# Ordem (de fora para dentro): CORS → métricas → cache HTTP → compressão → endpoint.
+# add_middleware coloca cada um por fora dos anteriores. O cache HTTP fica dentro do CORS
+# para que os 304 também recebam os cabeçalhos CORS, e por fora da compressão para passar a
+# ETag a ela. As métricas envolvem os dois para medir os 304 e os bytes já comprimidos.
+app.add_middleware(compressao.CompressaoMiddleware)
+app.add_middleware(http_cache.CacheHTTPMiddleware)
+app.add_middleware(metricas.MetricasMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,79 +47,199 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def abrir_pool():
+    # Abre as conexões mínimas já no boot; se o banco estiver fora, os pools tentam de novo sob demanda
+    try:
+        if config.DB_ASYNC:
+            await db_async.open_pool()
+        else:
+            await run_in_threadpool(get_pool().fill)
+        await dimensoes.carregar()
+    except Exception:
+        pass
+    dimensoes.iniciar_recarga()
+    colunar.iniciar()
+    aquecimento.iniciar()
+
+@app.on_event("shutdown")
+async def fechar_pool():
+    await aquecimento.parar()
+    await colunar.parar()
+    await dimensoes.parar_recarga()
+    await db_async.close_pool()
+    close_pool()
+
+security = HTTPBearer()
+_bearer_opcional = HTTPBearer(auto_error=False)
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Verifica o token JWT e retorna o usuário autenticado"""
+    try:
+        return await auth.verificar(credentials.credentials)
+    except auth.TokenInvalido:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido ou expirado"
+        )
+
+async def _verificar_admin(credentials):
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Autenticação necessária",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if config.ADMIN_TOKEN is None:
+        return await get_current_user(credentials)
+    if not hmac.compare_digest(credentials.credentials.encode(), config.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Token de administração inválido")
+
+async def exigir_admin(credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer_opcional)):
+    """Rotas de manutenção: Bearer ADMIN_TOKEN ou, sem ADMIN_TOKEN configurado, um usuário autenticado"""
+    await _verificar_admin(credentials)
+
+@app.get("/metrics", include_in_schema=False)
+async def expor_metricas():
+    """Histogramas por rota no formato texto do Prometheus"""
+    return PlainTextResponse(
+        metricas.expor(
+            db.pool_stats(), db_async.pool_stats(), cache.resultados.stats(), metricas.threadpool_stats(),
+            aquecimento.status(),
+        ),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+@app.get("/api/debug/pool")
+async def estatisticas_pool():
+    """Gauges dos pools de conexões e do threadpool: em uso, ociosas, filas, esperas e descartes"""
+    return {
+        "modo": "async" if config.DB_ASYNC else "threadpool",
+        "sync": get_pool().stats(),
+        "async": db_async.pool_stats(),
+        "threadpool": metricas.threadpool_stats(),
+    }
+
+@app.get("/api/debug/cache")
+async def estatisticas_cache():
+    """Estado do cache de resultados e versão atual dos dados"""
+    return {"versao_dados": await cache.versao_dados(), "workers": config.WEB_CONCURRENCY, **cache.stats()}
+
+@app.post("/api/debug/cache/limpar", dependencies=[Depends(exigir_admin)])
+async def limpar_cache():
+    """Descarta resultados (inclusive os compartilhados entre workers) e corpos comprimidos em cache"""
+    cache.resultados.clear()
+    await cache.limpar_compartilhado()
+    compressao.comprimidos.clear()
+    return {"resultados": cache.stats(), "comprimidos": compressao.comprimidos.stats()}
+
+@app.get("/api/debug/aquecimento")
+async def estado_aquecimento():
+    """Andamento do aquecimento do cache e taxa de acerto do cache de resultados"""
+    return {"aquecimento": aquecimento.status(), "cache": cache.stats()}
+
+@app.post("/api/debug/aquecimento", dependencies=[Depends(exigir_admin)])
+async def iniciar_aquecimento():
+    """Aquece o cache agora (ex.: depois de /api/debug/cache/limpar), se nenhum aquecimento estiver em andamento"""
+    aquecimento.disparar(await cache.versao_dados())
+    return aquecimento.status()
+
+@app.get("/api/debug/colunar")
+async def estado_colunar():
+    """Snapshot colunar (MOTOR_CONSULTAS=duckdb): versão aberta, exportação e se está atendendo as consultas"""
+    return {**colunar.status(), "atendendo": await colunar.ativo()}
+
+@app.post("/api/debug/colunar", dependencies=[Depends(exigir_admin)])
+async def atualizar_colunar():
+    """Exporta (se preciso) e abre o snapshot colunar da versão atual dos dados"""
+    await colunar.atualizar(await cache.versao_dados())
+    return {**colunar.status(), "atendendo": await colunar.ativo()}
+
+@app.get("/api/debug/esquema")
+async def registro_esquema():
+    """Colunas das dimensões e colunas de descrição resolvidas no startup"""
+    await esquema.garantir()
+    return esquema.resumo()
+
+@app.post("/api/debug/esquema/recarregar", dependencies=[Depends(exigir_admin)])
+async def recarregar_esquema():
+    """Relê o information_schema (ex.: após renomear colunas de uma dimensão)"""
+    esquema.invalidar()
+    await esquema.carregar()
+    await dimensoes.carregar()
+    consultas.limpar()
+    cache.invalidar()
+    return esquema.resumo()
+
+@app.get("/api/debug/dimensoes")
+async def dimensoes_em_memoria():
+    """Tamanho das dimensões em memória e horário da última recarga"""
+    await dimensoes.garantir()
+    return dimensoes.resumo()
+
+@app.get("/api/debug/compressao")
+def estatisticas_compressao():
+    """Bytes economizados e CPU gasta com compressão, por rota"""
+    return compressao.stats()
+
+@app.get("/api/debug/auth")
+def estatisticas_auth():
+    """Modo de verificação de JWT, tokens em cache e recargas do JWKS"""
+    return auth.stats()
+
 @app.get("/api/debug/indices")
-def verificar_indices():
-    """Endpoint temporário para verificar se os índices foram criados"""
+async def verificar_indices():
+    """Índices gerenciados de fato_saude_mensal (app/indices.py): faltando, inválidos, tamanho e uso"""
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT 
-                        indexname,
-                        indexdef
-                    FROM pg_indexes 
-                    WHERE tablename = 'fato_saude_mensal'
-                      AND indexname LIKE 'idx_fato%'
-                    ORDER BY indexname;
-                """)
-                indices = rows_to_dicts(cur)
-                
-                index_names = [idx['indexname'] for idx in indices]
-                indices_criticos = [
-                    'idx_fato_cid_cap_internacoes',
-                    'idx_fato_cid_cap_obitos',
-                    'idx_fato_series_internacoes',
-                    'idx_fato_series_obitos'
-                ]
-                
-                indices_faltando = [idx for idx in indices_criticos if idx not in index_names]
-                
-                return {
-                    "total_indices": len(indices),
-                    "indices_encontrados": index_names,
-                    "indices_criticos_faltando": indices_faltando,
-                    "todos_indices": indices
-                }
+        return await run_in_threadpool(indices.status)
+    except Exception as e:
+        return {"erro": str(e)}
+
+@app.get("/api/debug/indices/sugestoes")
+async def sugerir_indices():
+    """Índice ideal para cada consulta dos endpoints, qual índice gerenciado a atende e o plano atual"""
+    try:
+        return await indices.sugerir()
     except Exception as e:
         return {"erro": str(e)}
 
 @app.get("/api/debug/query-plan")
-def plano_execucao_cid_cap():
-    """Endpoint temporário para ver o plano de execução da query"""
+async def plano_execucao(
+    consulta: str = Query("cid_capitulo_internacoes", description="Nome da consulta registrada (ver /api/debug/query-plan/consultas)"),
+    parametros: Optional[str] = Query(None, description='Parâmetros em JSON, ex.: {"id_localidade": 3550308}'),
+    analisar: bool = Query(True, description="EXPLAIN ANALYZE: executa a consulta (requer autenticação); false só estima"),
+    salvar: bool = Query(False, description="Guarda a captura no histórico (plano_consultas; requer autenticação)"),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer_opcional),
+):
+    """EXPLAIN (ANALYZE, BUFFERS) de uma consulta de endpoint, comparado com a última captura salva.
+
+    Executar a consulta (analisar) e gravar no histórico (salvar) exigem as credenciais das
+    rotas de manutenção; sem elas, só analisar=false (plano estimado).
+    """
+    if analisar or salvar:
+        await _verificar_admin(credentials)
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                query = """
-                    EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)
-                    SELECT
-                        c.capitulo_cod,
-                        c.titulo AS capitulo_nome,
-                        SUM(f.qtd_internacoes) AS total_internacoes
-                    FROM fato_saude_mensal f
-                    INNER JOIN dim_cid10_capitulo c ON f.id_capitulo = c.id_capitulo
-                    WHERE f.id_tipo_evento = 10 
-                      AND f.id_capitulo IS NOT NULL
-                      AND f.qtd_internacoes > 0
-                    GROUP BY c.capitulo_cod, c.titulo
-                    HAVING SUM(f.qtd_internacoes) > 0
-                    ORDER BY total_internacoes DESC
-                    LIMIT 10;
-                """
-                cur.execute(query)
-                plan = cur.fetchone()[0]
-                return {
-                    "plano": plan,
-                    "resumo": {
-                        "tempo_total": plan[0].get('Execution Time', 0),
-                        "linhas": plan[0].get('Plan', {}).get('Actual Rows', 0)
-                    }
-                }
+        return await planos.capturar(
+            consulta, json.loads(parametros) if parametros else None, salvar=salvar, analisar=analisar
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        # Consulta desconhecida, JSON inválido ou parâmetro que a consulta não aceita
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         return {"erro": str(e)}
-    """Endpoint de health check leve para verificar se o backend está disponível"""
-    return {"status": "healthy", "message": "Backend está respondendo"}
 
-security = HTTPBearer()
+@app.get("/api/debug/query-plan/consultas")
+def consultas_registradas():
+    """Consultas disponíveis para captura de plano e seus parâmetros padrão"""
+    return {nome: spec["padrao"] for nome, spec in planos.CONSULTAS.items()}
+
+@app.get("/api/debug/query-plan/historico")
+async def historico_planos(consulta: Optional[str] = None, limite: int = Query(50, ge=1, le=1000)):
+    """Capturas salvas: impressão digital do plano, tempo e buffers ao longo do tempo"""
+    try:
+        return await run_in_threadpool(planos.historico, consulta, limite)
+    except Exception as e:
+        return {"erro": str(e)}
 
 class LoginRequest(BaseModel):
     email: EmailStr
@@ -122,23 +263,6 @@ class ProfileUpdate(BaseModel):
     organization: Optional[str] = None
     bio: Optional[str] = None
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Verifica o token JWT e retorna o usuário autenticado"""
-    try:
-        token = credentials.credentials
-        response = supabase.auth.get_user(token)
-        if not response or not response.user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token inválido ou expirado"
-            )
-        return response.user
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token inválido ou expirado"
-        )
-
 @app.post("/api/login")
 async def login(credentials: LoginRequest):
     """
@@ -329,7 +453,8 @@ async def update_profile(profile_data: ProfileUpdate, current_user = Depends(get
             profile_data_dict["id"] = current_user.id
             profile_data_dict["email"] = current_user.email
             if "name" not in profile_data_dict:
-                profile_data_dict["name"] = current_user.email.split("@")[0]
+                # O claim email é opcional no token (ex.: login por telefone): sem ele, o id
+                profile_data_dict["name"] = (current_user.email or current_user.id).split("@")[0]
             result = supabase.table("profiles").insert(profile_data_dict).execute()
         
         updated_profile = result.data[0] if result.data else None
@@ -364,65 +489,55 @@ async def delete_account(current_user = Depends(get_current_user)):
         raise HTTPException(status_code=500, detail=f"Erro ao encerrar conta: {str(e)}")
 
 @app.get("/api/localidades")
-def listar_localidades():
+@json_rapido
+async def listar_localidades():
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    '''
-                    SELECT id_localidade, municipio, uf
-                    FROM dim_localidade
-                    ORDER BY municipio;
-                    '''
-                )
-                rows = rows_to_dicts(cur)
-        return rows
+        await dimensoes.garantir()
+        return dimensoes.lista_localidades()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar localidades: {str(e)}")
 
+@app.get("/api/geo/{camada}")
+async def geometria(
+    request: Request,
+    camada: str,
+    nivel: str = Query("baixo", description="Simplificação: baixo (Brasil inteiro), medio ou alto (zoom em UF/região)"),
+    uf: Optional[str] = Query(None, description="Só as geometrias desta UF (ex: SP)"),
+):
+    """Geometria das UFs ou dos municípios em TopoJSON simplificado (ver geometrias.py).
+
+    Servida com ETag e Cache-Control de longa duração; o corpo comprimido é calculado uma vez por processo.
+    """
+    if camada not in geometrias.CAMADAS:
+        raise HTTPException(status_code=404, detail=f"Camada desconhecida: {camada}. Disponíveis: {', '.join(geometrias.CAMADAS)}")
+    if nivel not in geometrias.NIVEIS:
+        raise HTTPException(status_code=400, detail=f"Nível inválido: {nivel}. Use {', '.join(geometrias.NIVEIS)}")
+    try:
+        item = await geometrias.carregar(camada, nivel, uf.strip().upper() if uf else None)
+    except Exception as e:
+        logger.exception("Erro ao carregar geometria")
+        raise HTTPException(status_code=500, detail=f"Erro ao carregar geometria: {str(e)}")
+    if item is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Geometria {camada}/{nivel} não gerada. Rode: python -m app.geometrias gerar --baixar",
+        )
+    return await geometrias.responder(item, request.headers)
+
 @app.get("/api/periodo-dados")
-def periodo_dados():
+@json_rapido
+@cache_resultado("periodo_dados")
+async def periodo_dados():
     """Retorna o período mínimo e máximo dos dados disponíveis"""
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    '''
-                    WITH tempos_com_dados AS (
-                        SELECT DISTINCT t.ano, t.mes
-                        FROM dim_tempo t
-                        WHERE EXISTS (
-                            SELECT 1 
-                            FROM fato_saude_mensal f
-                            WHERE f.id_tempo = t.id_tempo
-                              AND f.id_tempo IS NOT NULL
-                              AND f.id_tempo != 0
-                            LIMIT 1
-                        )
-                    )
-                    SELECT 
-                        MIN(ano) AS ano_inicio,
-                        MAX(ano) AS ano_fim,
-                        MIN(CASE WHEN ano = (SELECT MIN(ano) FROM tempos_com_dados) THEN mes END) AS mes_inicio,
-                        MAX(CASE WHEN ano = (SELECT MAX(ano) FROM tempos_com_dados) THEN mes END) AS mes_fim
-                    FROM tempos_com_dados;
-                    '''
-                )
-                row = row_to_dict(cur.fetchone())
-                
-                if row:
-                    return {
-                        "ano_inicio": row.get("ano_inicio"),
-                        "ano_fim": row.get("ano_fim"),
-                        "mes_inicio": row.get("mes_inicio"),
-                        "mes_fim": row.get("mes_fim")
-                    }
-                return {"ano_inicio": None, "ano_fim": None, "mes_inicio": None, "mes_fim": None}
+        return await consultas.consultar(consultas.periodo_dados, tempo=True)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar período dos dados: {str(e)}")
 
 @app.get("/api/series/mensal")
-def series_mensal(
+@json_rapido
+@cache_resultado("series_mensal")
+async def series_mensal(
     id_localidade: Optional[int] = Query(None, description="ID da localidade para filtrar"),
     ano_inicio: Optional[int] = Query(None, description="Ano inicial para filtrar"),
     ano_fim: Optional[int] = Query(None, description="Ano final para filtrar"),
@@ -430,308 +545,99 @@ def series_mensal(
     limit: Optional[int] = Query(5000, description="Limite de registros (padrão: 5000)")
 ):
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                query = '''
-                    WITH tempo_filtrado AS (
-                        SELECT id_tempo, ano, mes
-                        FROM dim_tempo
-                        WHERE id_tempo IS NOT NULL AND id_tempo != 0
-                '''
-                params = []
-                if ano_inicio:
-                    query += ' AND ano >= %s'
-                    params.append(ano_inicio)
-                if ano_fim:
-                    query += ' AND ano <= %s'
-                    params.append(ano_fim)
-                if mes:
-                    query += ' AND mes = %s'
-                    params.append(mes)
-                
-                query += '''
-                    )
-                    SELECT
-                        COALESCE(i.ano, o.ano) AS ano,
-                        COALESCE(i.mes, o.mes) AS mes,
-                        CONCAT(COALESCE(i.ano, o.ano), '-', LPAD(COALESCE(i.mes, o.mes)::text, 2, '0')) AS ano_mes,
-                        COALESCE(i.internacoes, 0) AS internacoes,
-                        COALESCE(o.obitos, 0) AS obitos
-                    FROM (
-                        SELECT
-                            t.ano,
-                            t.mes,
-                            SUM(f.qtd_internacoes) AS internacoes
-                        FROM fato_saude_mensal f
-                        INNER JOIN tempo_filtrado t ON f.id_tempo = t.id_tempo
-                        WHERE f.id_tempo IS NOT NULL
-                          AND f.id_tempo != 0
-                          AND f.id_tipo_evento = 3
-                          AND f.qtd_internacoes > 0
-                '''
-                if id_localidade:
-                    query += ' AND f.id_localidade = %s'
-                    params.append(id_localidade)
-                
-                query += '''
-                        GROUP BY t.ano, t.mes
-                    ) i
-                    FULL OUTER JOIN (
-                        SELECT
-                            t.ano,
-                            t.mes,
-                            SUM(f.qtd_obitos) AS obitos
-                        FROM fato_saude_mensal f
-                        INNER JOIN tempo_filtrado t ON f.id_tempo = t.id_tempo
-                        WHERE f.id_tempo IS NOT NULL
-                          AND f.id_tempo != 0
-                          AND f.id_tipo_evento = 4
-                          AND f.qtd_obitos > 0
-                '''
-                if id_localidade:
-                    query += ' AND f.id_localidade = %s'
-                    params.append(id_localidade)
-                
-                query += '''
-                        GROUP BY t.ano, t.mes
-                    ) o ON i.ano = o.ano AND i.mes = o.mes
-                    ORDER BY COALESCE(i.ano, o.ano), COALESCE(i.mes, o.mes)
-                    LIMIT %s;
-                '''
-                params.append(limit)
-                
-                cur.execute(query, params)
-                rows = rows_to_dicts(cur)
-        return rows
+        return await consultas.consultar(
+            consultas.series_mensal, id_localidade, ano_inicio, ano_fim, mes, limit,
+            localidade=bool(id_localidade), tempo=True,
+        )
     except Exception as e:
-        import traceback
+        logger.exception("Erro ao buscar dados de série mensal")
         error_msg = str(e)
-        error_trace = traceback.format_exc()
         raise HTTPException(status_code=500, detail=f"Erro ao buscar dados de série mensal. Verifique os logs do backend. Erro: {error_msg}")
 
+async def _quebra(nome, id_localidade):
+    return await consultas.consultar(
+        lambda origem: consultas.quebra(nome, origem, id_localidade), localidade=bool(id_localidade)
+    )
+
 @app.get("/api/internacoes/sexo")
-def internacoes_por_sexo(id_localidade: Optional[int] = Query(None, description="ID da localidade para filtrar")):
+@json_rapido
+@cache_resultado("internacoes_sexo")
+async def internacoes_por_sexo(id_localidade: Optional[int] = Query(None, description="ID da localidade para filtrar")):
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                query = '''
-                    WITH dados_filtrados AS (
-                        SELECT 
-                            f.id_sexo,
-                            f.qtd_internacoes
-                        FROM fato_saude_mensal f
-                        WHERE f.id_tipo_evento = 5
-                          AND f.qtd_internacoes > 0
-                '''
-                params = []
-                if id_localidade:
-                    query += ' AND f.id_localidade = %s'
-                    params.append(id_localidade)
-                
-                query += '''
-                    )
-                    SELECT
-                        s.sexo_desc,
-                        SUM(df.qtd_internacoes) AS total_internacoes
-                    FROM dados_filtrados df
-                    INNER JOIN dim_sexo s ON df.id_sexo = s.id_sexo
-                    GROUP BY s.sexo_desc
-                    HAVING SUM(df.qtd_internacoes) > 0
-                    ORDER BY s.sexo_desc;
-                '''
-                
-                cur.execute(query, params)
-                rows = rows_to_dicts(cur)
-        return rows
+        return await _quebra("internacoes_sexo", id_localidade)
     except Exception as e:
-        import traceback
+        logger.exception("Erro ao buscar dados de internações por sexo")
         error_msg = str(e)
-        error_trace = traceback.format_exc()
         raise HTTPException(status_code=500, detail=f"Erro ao buscar dados de internações por sexo. Verifique os logs do backend. Erro: {error_msg}")
 
 @app.get("/api/obitos/raca")
-def obitos_por_raca(id_localidade: Optional[int] = Query(None, description="ID da localidade para filtrar")):
+@json_rapido
+@cache_resultado("obitos_raca")
+async def obitos_por_raca(id_localidade: Optional[int] = Query(None, description="ID da localidade para filtrar")):
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                query = '''
-                    WITH dados_filtrados AS (
-                        SELECT 
-                            f.id_raca_cor,
-                            f.qtd_obitos
-                        FROM fato_saude_mensal f
-                        WHERE f.id_tipo_evento = 7
-                          AND f.qtd_obitos > 0
-                '''
-                params = []
-                if id_localidade:
-                    query += ' AND f.id_localidade = %s'
-                    params.append(id_localidade)
-                
-                query += '''
-                    )
-                    SELECT
-                        r.raca_desc,
-                        SUM(df.qtd_obitos) AS total_obitos
-                    FROM dados_filtrados df
-                    INNER JOIN dim_raca_cor r ON df.id_raca_cor = r.id_raca_cor
-                    GROUP BY r.raca_desc
-                    HAVING SUM(df.qtd_obitos) > 0
-                    ORDER BY total_obitos DESC;
-                '''
-                
-                cur.execute(query, params)
-                rows = rows_to_dicts(cur)
-        return rows
+        return await _quebra("obitos_raca", id_localidade)
     except Exception as e:
-        import traceback
+        logger.exception("Erro ao buscar dados de óbitos por raça")
         error_msg = str(e)
-        error_trace = traceback.format_exc()
         raise HTTPException(status_code=500, detail=f"Erro ao buscar dados de óbitos por raça. Verifique os logs do backend. Erro: {error_msg}")
 
 
 @app.get("/api/internacoes/faixa")
-def internacoes_por_faixa(id_localidade: Optional[int] = Query(None, description="ID da localidade para filtrar")):
+@json_rapido
+@cache_resultado("internacoes_faixa")
+async def internacoes_por_faixa(id_localidade: Optional[int] = Query(None, description="ID da localidade para filtrar")):
     """Internações por faixa etária (período agregado) para um município.
 
     Usa id_tipo_evento = 6 (SIH_FAIXA_AGG).
     """
-    with get_connection() as conn:
-        with conn.cursor() as cur:
-            query = '''
-                WITH dados_filtrados AS (
-                    SELECT 
-                        f.id_faixa,
-                        f.qtd_internacoes
-                    FROM fato_saude_mensal f
-                    WHERE f.id_tipo_evento = 6
-                      AND f.qtd_internacoes > 0
-            '''
-            params = []
-            if id_localidade:
-                query += ' AND f.id_localidade = %s'
-                params.append(id_localidade)
-            
-            query += '''
-                )
-                SELECT
-                    fxt.faixa_desc,
-                    SUM(df.qtd_internacoes) AS total_internacoes
-                FROM dados_filtrados df
-                INNER JOIN dim_faixa_etaria fxt ON df.id_faixa = fxt.id_faixa
-                GROUP BY fxt.faixa_desc, fxt.faixa_ordem
-                HAVING SUM(df.qtd_internacoes) > 0
-                ORDER BY fxt.faixa_ordem;
-            '''
-            
-            cur.execute(query, params)
-            rows = rows_to_dicts(cur)
-    return rows
+    return await _quebra("internacoes_faixa", id_localidade)
 
 
 @app.get("/api/obitos/estado-civil")
-def obitos_por_estado_civil(id_localidade: Optional[int] = Query(None, description="ID da localidade para filtrar")):
+@json_rapido
+@cache_resultado("obitos_estado_civil")
+async def obitos_por_estado_civil(id_localidade: Optional[int] = Query(None, description="ID da localidade para filtrar")):
     """Óbitos por estado civil (período agregado) para um município.
 
     Usa id_tipo_evento = 8 (SIM_ESTCIV_AGG).
     """
-    with get_connection() as conn:
-        with conn.cursor() as cur:
-            query = '''
-                WITH dados_filtrados AS (
-                    SELECT 
-                        f.id_estado_civil,
-                        f.qtd_obitos
-                    FROM fato_saude_mensal f
-                    WHERE f.id_tipo_evento = 8
-                      AND f.qtd_obitos > 0
-            '''
-            params = []
-            if id_localidade:
-                query += ' AND f.id_localidade = %s'
-                params.append(id_localidade)
-            
-            query += '''
-                )
-                SELECT
-                    ec.estado_civil_desc,
-                    SUM(df.qtd_obitos) AS total_obitos
-                FROM dados_filtrados df
-                INNER JOIN dim_estado_civil ec ON df.id_estado_civil = ec.id_estado_civil
-                GROUP BY ec.estado_civil_desc
-                HAVING SUM(df.qtd_obitos) > 0
-                ORDER BY total_obitos DESC;
-            '''
-            
-            cur.execute(query, params)
-            rows = rows_to_dicts(cur)
-    return rows
+    return await _quebra("obitos_estado_civil", id_localidade)
 
 
 @app.get("/api/obitos/local")
-def obitos_por_local_ocorrencia(id_localidade: Optional[int] = Query(None, description="ID da localidade para filtrar")):
+@json_rapido
+@cache_resultado("obitos_local")
+async def obitos_por_local_ocorrencia(id_localidade: Optional[int] = Query(None, description="ID da localidade para filtrar")):
     """Óbitos por local de ocorrência (período agregado) para um município.
 
-    Usa id_tipo_evento = 9 (SIM_LOCAL_AGG).
+    Usa id_tipo_evento = 9 (SIM_LOCAL_AGG). A coluna de descrição de dim_local_ocorrencia
+    é resolvida pelo registro de esquema.
     """
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                columns_to_try = ['local_desc', 'local_ocorrencia_desc', 'descricao', 'local_ocor_desc', 'nome']
-                
-                for col in columns_to_try:
-                    try:
-                        query = '''
-                            WITH dados_filtrados AS (
-                                SELECT 
-                                    f.id_local_ocor,
-                                    f.qtd_obitos
-                                FROM fato_saude_mensal f
-                                WHERE f.id_tipo_evento = 9
-                                  AND f.qtd_obitos > 0
-                        '''
-                        params = []
-                        if id_localidade:
-                            query += ' AND f.id_localidade = %s'
-                            params.append(id_localidade)
-                        
-                        from psycopg2 import sql
-                        query += f'''
-                            )
-                            SELECT
-                                COALESCE(lo.{col}, 'Não Informado') AS local_ocorrencia_desc,
-                                SUM(df.qtd_obitos) AS total_obitos
-                            FROM dados_filtrados df
-                            INNER JOIN dim_local_ocorrencia lo ON df.id_local_ocor = lo.id_local_ocor
-                            GROUP BY COALESCE(lo.{col}, 'Não Informado')
-                            HAVING SUM(df.qtd_obitos) > 0
-                            ORDER BY total_obitos DESC;
-                        '''
-                        
-                        cur.execute(query, params)
-                        rows = rows_to_dicts(cur)
-                        return rows
-                    except Exception as e:
-                        error_msg = str(e)
-                        if 'column' not in error_msg.lower() and 'does not exist' not in error_msg.lower():
-                            raise
-                        continue
-                
-                raise HTTPException(status_code=500, detail="Não foi possível encontrar coluna de descrição na tabela dim_local_ocorrencia")
-    except HTTPException:
-        raise
+        return await _quebra("obitos_local", id_localidade)
     except Exception as e:
-        import traceback
+        logger.exception("Erro ao buscar dados de local de ocorrência")
         error_msg = str(e)
-        error_trace = traceback.format_exc()
         raise HTTPException(status_code=500, detail=f"Erro ao buscar dados de local de ocorrência. Verifique os logs do backend. Erro: {error_msg}")
 
 
+async def _cid_capitulo(evento, id_localidade, ano, mes, ano_inicio, ano_fim):
+    # Timeout específico para esta query (SET LOCAL: não vaza para a conexão do pool)
+    return await consultas.consultar(
+        lambda origem: consultas.cid_capitulo(evento, origem, id_localidade, ano, mes, ano_inicio, ano_fim),
+        localidade=bool(id_localidade), tempo=bool(ano or mes or ano_inicio or ano_fim), timeout='180s',
+    )
+
+
 @app.get("/api/internacoes/cid-cap")
-def internacoes_por_cid_capitulo(
+@json_rapido
+@cache_resultado("internacoes_cid_cap")
+async def internacoes_por_cid_capitulo(
     id_localidade: Optional[int] = Query(None, description="ID da localidade para filtrar"),
     ano: Optional[int] = Query(None, description="Ano para filtrar"),
-    mes: Optional[int] = Query(None, description="Mês para filtrar (1-12)")
+    mes: Optional[int] = Query(None, description="Mês para filtrar (1-12)"),
+    ano_inicio: Optional[int] = Query(None, description="Ano inicial para filtrar"),
+    ano_fim: Optional[int] = Query(None, description="Ano final para filtrar")
 ):
     """Internações por capítulo CID-10 (Top 10) para um município.
 
@@ -739,161 +645,22 @@ def internacoes_por_cid_capitulo(
     Otimizado para usar índices parciais.
     """
     try:
-        rows = []
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                try:
-                    # Otimizado: usa CTE e índices parciais
-                    # Se não há filtros, usa uma abordagem mais agressiva
-                    if not ano and not mes and not id_localidade:
-                        # Caso sem filtros: agrega primeiro, depois faz JOIN (mais eficiente)
-                        query = '''
-                            WITH capitulos_agregados AS (
-                                SELECT 
-                                    f.id_capitulo,
-                                    SUM(f.qtd_internacoes) AS total_internacoes
-                                FROM fato_saude_mensal f
-                                WHERE f.id_tipo_evento = 10 
-                                  AND f.id_capitulo IS NOT NULL
-                                  AND f.qtd_internacoes > 0
-                                GROUP BY f.id_capitulo
-                                HAVING SUM(f.qtd_internacoes) > 0
-                                ORDER BY total_internacoes DESC
-                                LIMIT 10
-                            )
-                            SELECT
-                                c.capitulo_cod,
-                                c.titulo AS capitulo_nome,
-                                ca.total_internacoes
-                            FROM capitulos_agregados ca
-                            INNER JOIN dim_cid10_capitulo c ON ca.id_capitulo = c.id_capitulo
-                            ORDER BY ca.total_internacoes DESC;
-                        '''
-                        params = []
-                    else:
-                        # Caso com filtros: usa CTE para melhor performance
-                        query = '''
-                            WITH tempo_filtrado AS (
-                                SELECT id_tempo
-                                FROM dim_tempo
-                                WHERE id_tempo IS NOT NULL AND id_tempo != 0
-                        '''
-                        params = []
-                        if ano:
-                            query += ' AND ano = %s'
-                            params.append(ano)
-                        if mes:
-                            query += ' AND mes = %s'
-                            params.append(mes)
-                        
-                        query += '''
-                            ),
-                            dados_filtrados AS (
-                                SELECT 
-                                    f.id_capitulo,
-                                    f.qtd_internacoes
-                                FROM fato_saude_mensal f
-                                INNER JOIN tempo_filtrado t ON f.id_tempo = t.id_tempo
-                                WHERE f.id_tipo_evento = 10 
-                                  AND f.id_capitulo IS NOT NULL
-                                  AND f.id_tempo IS NOT NULL
-                                  AND f.id_tempo != 0
-                                  AND f.qtd_internacoes > 0
-                        '''
-                        if id_localidade:
-                            query += ' AND f.id_localidade = %s'
-                            params.append(id_localidade)
-                        
-                        query += '''
-                            )
-                            SELECT
-                                c.capitulo_cod,
-                                c.titulo AS capitulo_nome,
-                                SUM(df.qtd_internacoes) AS total_internacoes
-                            FROM dados_filtrados df
-                            INNER JOIN dim_cid10_capitulo c ON df.id_capitulo = c.id_capitulo
-                            GROUP BY c.capitulo_cod, c.titulo
-                            HAVING SUM(df.qtd_internacoes) > 0
-                            ORDER BY total_internacoes DESC
-                            LIMIT 10;
-                        '''
-                    
-                    # Adiciona timeout específico para esta query
-                    with conn.cursor() as exec_cur:
-                        exec_cur.execute("SET statement_timeout = '180s'")
-                    
-                    cur.execute(query, params)
-                    rows = rows_to_dicts(cur)
-                except psycopg2.errors.UndefinedColumn as e:
-                    column_alternatives = ['capitulo_desc', 'capitulo_nome', 'descricao', 'nome']
-                    for col_name in column_alternatives:
-                        try:
-                            query = f'''
-                                WITH tempo_filtrado AS (
-                                    SELECT id_tempo
-                                    FROM dim_tempo
-                                    WHERE id_tempo IS NOT NULL AND id_tempo != 0
-                            '''
-                            params = []
-                            if ano:
-                                query += ' AND ano = %s'
-                                params.append(ano)
-                            if mes:
-                                query += ' AND mes = %s'
-                                params.append(mes)
-                            
-                            query += f'''
-                                ),
-                                dados_filtrados AS (
-                                    SELECT 
-                                        f.id_capitulo,
-                                        f.qtd_internacoes
-                                    FROM fato_saude_mensal f
-                                    INNER JOIN tempo_filtrado t ON f.id_tempo = t.id_tempo
-                                    WHERE f.id_tipo_evento = 10 
-                                      AND f.id_capitulo IS NOT NULL
-                                      AND f.id_tempo IS NOT NULL
-                                      AND f.id_tempo != 0
-                                      AND f.qtd_internacoes > 0
-                            '''
-                            if id_localidade:
-                                query += ' AND f.id_localidade = %s'
-                                params.append(id_localidade)
-                            
-                            query += f'''
-                                )
-                                SELECT
-                                    c.capitulo_cod,
-                                    c.{col_name} AS capitulo_nome,
-                                    SUM(df.qtd_internacoes) AS total_internacoes
-                                FROM dados_filtrados df
-                                INNER JOIN dim_cid10_capitulo c ON df.id_capitulo = c.id_capitulo
-                                GROUP BY c.capitulo_cod, c.{col_name}
-                                HAVING SUM(df.qtd_internacoes) > 0
-                                ORDER BY total_internacoes DESC
-                                LIMIT 10;
-                            '''
-                            
-                            cur.execute(query, params)
-                            rows = rows_to_dicts(cur)
-                            break
-                        except psycopg2.errors.UndefinedColumn:
-                            continue
-                    else:
-                        raise
-        return rows
+        return await _cid_capitulo("internacoes", id_localidade, ano, mes, ano_inicio, ano_fim)
     except Exception as e:
-        import traceback
+        logger.exception("Erro ao buscar dados de CID-10 (internações)")
         error_msg = str(e)
-        error_trace = traceback.format_exc()
         raise HTTPException(status_code=500, detail=f"Erro ao buscar dados de CID-10 (internações). Verifique os logs do backend. Erro: {error_msg}")
 
 
 @app.get("/api/obitos/cid-cap")
-def obitos_por_cid_capitulo(
+@json_rapido
+@cache_resultado("obitos_cid_cap")
+async def obitos_por_cid_capitulo(
     id_localidade: Optional[int] = Query(None, description="ID da localidade para filtrar"),
     ano: Optional[int] = Query(None, description="Ano para filtrar"),
-    mes: Optional[int] = Query(None, description="Mês para filtrar (1-12)")
+    mes: Optional[int] = Query(None, description="Mês para filtrar (1-12)"),
+    ano_inicio: Optional[int] = Query(None, description="Ano inicial para filtrar"),
+    ano_fim: Optional[int] = Query(None, description="Ano final para filtrar")
 ):
     """Óbitos por capítulo CID-10 (Top 10) para um município.
 
@@ -901,255 +668,217 @@ def obitos_por_cid_capitulo(
     Otimizado para usar índices parciais.
     """
     try:
-        rows = []
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                try:
-                    # Otimizado: usa CTE e índices parciais
-                    # Se não há filtros, usa uma abordagem mais agressiva
-                    if not ano and not mes and not id_localidade:
-                        # Caso sem filtros: agrega primeiro, depois faz JOIN (mais eficiente)
-                        query = '''
-                            WITH capitulos_agregados AS (
-                                SELECT 
-                                    f.id_capitulo,
-                                    SUM(f.qtd_obitos) AS total_obitos
-                                FROM fato_saude_mensal f
-                                WHERE f.id_tipo_evento = 11 
-                                  AND f.id_capitulo IS NOT NULL
-                                  AND f.qtd_obitos > 0
-                                GROUP BY f.id_capitulo
-                                HAVING SUM(f.qtd_obitos) > 0
-                                ORDER BY total_obitos DESC
-                                LIMIT 10
-                            )
-                            SELECT
-                                c.capitulo_cod,
-                                c.titulo AS capitulo_nome,
-                                ca.total_obitos
-                            FROM capitulos_agregados ca
-                            INNER JOIN dim_cid10_capitulo c ON ca.id_capitulo = c.id_capitulo
-                            ORDER BY ca.total_obitos DESC;
-                        '''
-                        params = []
-                    else:
-                        # Caso com filtros: usa CTE para melhor performance
-                        query = '''
-                            WITH tempo_filtrado AS (
-                                SELECT id_tempo
-                                FROM dim_tempo
-                                WHERE id_tempo IS NOT NULL AND id_tempo != 0
-                        '''
-                        params = []
-                        if ano:
-                            query += ' AND ano = %s'
-                            params.append(ano)
-                        if mes:
-                            query += ' AND mes = %s'
-                            params.append(mes)
-                        
-                        query += '''
-                            ),
-                            dados_filtrados AS (
-                                SELECT 
-                                    f.id_capitulo,
-                                    f.qtd_obitos
-                                FROM fato_saude_mensal f
-                                INNER JOIN tempo_filtrado t ON f.id_tempo = t.id_tempo
-                                WHERE f.id_tipo_evento = 11 
-                                  AND f.id_capitulo IS NOT NULL
-                                  AND f.id_tempo IS NOT NULL
-                                  AND f.id_tempo != 0
-                                  AND f.qtd_obitos > 0
-                        '''
-                        if id_localidade:
-                            query += ' AND f.id_localidade = %s'
-                            params.append(id_localidade)
-                        
-                        query += '''
-                            )
-                            SELECT
-                                c.capitulo_cod,
-                                c.titulo AS capitulo_nome,
-                                SUM(df.qtd_obitos) AS total_obitos
-                            FROM dados_filtrados df
-                            INNER JOIN dim_cid10_capitulo c ON df.id_capitulo = c.id_capitulo
-                            GROUP BY c.capitulo_cod, c.titulo
-                            HAVING SUM(df.qtd_obitos) > 0
-                            ORDER BY total_obitos DESC
-                            LIMIT 10;
-                        '''
-                    
-                    # Adiciona timeout específico para esta query
-                    with conn.cursor() as exec_cur:
-                        exec_cur.execute("SET statement_timeout = '180s'")
-                    
-                    cur.execute(query, params)
-                    rows = rows_to_dicts(cur)
-                except psycopg2.errors.UndefinedColumn as e:
-                    column_alternatives = ['capitulo_desc', 'capitulo_nome', 'descricao', 'nome']
-                    for col_name in column_alternatives:
-                        try:
-                            query = f'''
-                                WITH tempo_filtrado AS (
-                                    SELECT id_tempo
-                                    FROM dim_tempo
-                                    WHERE id_tempo IS NOT NULL AND id_tempo != 0
-                            '''
-                            params = []
-                            if ano:
-                                query += ' AND ano = %s'
-                                params.append(ano)
-                            if mes:
-                                query += ' AND mes = %s'
-                                params.append(mes)
-                            
-                            query += f'''
-                                ),
-                                dados_filtrados AS (
-                                    SELECT 
-                                        f.id_capitulo,
-                                        f.qtd_obitos
-                                    FROM fato_saude_mensal f
-                                    INNER JOIN tempo_filtrado t ON f.id_tempo = t.id_tempo
-                                    WHERE f.id_tipo_evento = 11 
-                                      AND f.id_capitulo IS NOT NULL
-                                      AND f.id_tempo IS NOT NULL
-                                      AND f.id_tempo != 0
-                                      AND f.qtd_obitos > 0
-                            '''
-                            if id_localidade:
-                                query += ' AND f.id_localidade = %s'
-                                params.append(id_localidade)
-                            
-                            query += f'''
-                                )
-                                SELECT
-                                    c.capitulo_cod,
-                                    c.{col_name} AS capitulo_nome,
-                                    SUM(df.qtd_obitos) AS total_obitos
-                                FROM dados_filtrados df
-                                INNER JOIN dim_cid10_capitulo c ON df.id_capitulo = c.id_capitulo
-                                GROUP BY c.capitulo_cod, c.{col_name}
-                                HAVING SUM(df.qtd_obitos) > 0
-                                ORDER BY total_obitos DESC
-                                LIMIT 10;
-                            '''
-                            
-                            cur.execute(query, params)
-                            rows = rows_to_dicts(cur)
-                            break
-                        except psycopg2.errors.UndefinedColumn:
-                            continue
-                    else:
-                        raise
-        return rows
+        return await _cid_capitulo("obitos", id_localidade, ano, mes, ano_inicio, ano_fim)
     except Exception as e:
-        import traceback
+        logger.exception("Erro ao buscar dados de CID-10 (óbitos)")
         error_msg = str(e)
-        error_trace = traceback.format_exc()
         raise HTTPException(status_code=500, detail=f"Erro ao buscar dados de CID-10 (óbitos). Verifique os logs do backend. Erro: {error_msg}")
 
 @app.get("/api/dados/por-estado")
-def dados_por_estado():
+@json_rapido
+@cache_resultado("dados_por_estado")
+async def dados_por_estado():
     """Retorna dados agregados por estado (UF) para visualização no mapa."""
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    '''
-                    SELECT
-                        COALESCE(i.uf, o.uf) AS uf,
-                        COALESCE(i.total_internacoes, 0) AS total_internacoes,
-                        COALESCE(o.total_obitos, 0) AS total_obitos
-                    FROM (
-                        SELECT
-                            l.uf,
-                            SUM(f.qtd_internacoes) AS total_internacoes
-                        FROM fato_saude_mensal f
-                        INNER JOIN dim_localidade l ON f.id_localidade = l.id_localidade
-                        WHERE l.uf IS NOT NULL
-                          AND f.id_tipo_evento = 3
-                          AND f.qtd_internacoes > 0
-                        GROUP BY l.uf
-                    ) i
-                    FULL OUTER JOIN (
-                        SELECT
-                            l.uf,
-                            SUM(f.qtd_obitos) AS total_obitos
-                        FROM fato_saude_mensal f
-                        INNER JOIN dim_localidade l ON f.id_localidade = l.id_localidade
-                        WHERE l.uf IS NOT NULL
-                          AND f.id_tipo_evento = 4
-                          AND f.qtd_obitos > 0
-                        GROUP BY l.uf
-                    ) o ON i.uf = o.uf
-                    ORDER BY COALESCE(i.uf, o.uf);
-                    '''
-                )
-                rows = rows_to_dicts(cur)
-        return rows
+        return await consultas.consultar(consultas.dados_por_estado, localidade=True)
     except Exception as e:
-        import traceback
+        logger.exception("Erro ao buscar dados por estado")
         error_msg = str(e)
-        error_trace = traceback.format_exc()
         raise HTTPException(status_code=500, detail=f"Erro ao buscar dados por estado: {error_msg}")
 
 @app.get("/api/internacoes/cid-por-estado")
-def internacoes_cid_por_estado(capitulo_cod: Optional[str] = Query(None, description="Código do capítulo CID-10 (ex: I, II, III)")):
+@json_rapido
+@cache_resultado("internacoes_cid_por_estado")
+async def internacoes_cid_por_estado(capitulo_cod: Optional[str] = Query(None, description="Código do capítulo CID-10 (ex: I, II, III)")):
     """Retorna dados de internação por CID-10 e estado (UF) para visualização no mapa.
     
     Se capitulo_cod for fornecido, filtra apenas esse capítulo.
     Se não for fornecido, retorna todos os capítulos agregados.
     """
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                if capitulo_cod:
-                    cur.execute(
-                        '''
-                        SELECT
-                            l.uf,
-                            c.capitulo_cod,
-                            c.titulo AS capitulo_nome,
-                            SUM(f.qtd_internacoes) AS total_internacoes
-                        FROM fato_saude_mensal f
-                        INNER JOIN dim_localidade l ON f.id_localidade = l.id_localidade
-                        INNER JOIN dim_cid10_capitulo c ON f.id_capitulo = c.id_capitulo
-                        WHERE f.id_tipo_evento = 10 
-                          AND f.id_capitulo IS NOT NULL
-                          AND l.uf IS NOT NULL
-                          AND c.capitulo_cod = %s
-                        GROUP BY l.uf, c.capitulo_cod, c.titulo
-                        ORDER BY l.uf;
-                        ''',
-                        (capitulo_cod,)
-                    )
-                else:
-                    cur.execute(
-                        '''
-                        SELECT
-                            l.uf,
-                            SUM(f.qtd_internacoes) AS total_internacoes
-                        FROM fato_saude_mensal f
-                        INNER JOIN dim_localidade l ON f.id_localidade = l.id_localidade
-                        WHERE f.id_tipo_evento = 10 
-                          AND f.id_capitulo IS NOT NULL
-                          AND l.uf IS NOT NULL
-                          AND f.qtd_internacoes > 0
-                        GROUP BY l.uf
-                        HAVING SUM(f.qtd_internacoes) > 0
-                        ORDER BY l.uf;
-                        '''
-                    )
-                rows = rows_to_dicts(cur)
-        return rows
+        return await consultas.consultar(consultas.internacoes_cid_por_estado, capitulo_cod, localidade=True)
     except Exception as e:
-        import traceback
+        logger.exception("Erro ao buscar dados de internação por CID-10 e estado")
         error_msg = str(e)
-        error_trace = traceback.format_exc()
         raise HTTPException(status_code=500, detail=f"Erro ao buscar dados de internação por CID-10 e estado: {error_msg}")
 
+@cache_resultado("valores_por_municipio")
+async def _valores_por_municipio(indicador, capitulo_cod, uf, ano, ano_inicio, ano_fim, mes):
+    # Cacheado à parte do formato de saída: valores e classes reaproveitam a mesma consulta
+    return await consultas.consultar(
+        lambda origem: consultas.por_municipio(origem, indicador, capitulo_cod, uf, ano, ano_inicio, ano_fim, mes),
+        localidade=True, tempo=bool(ano or ano_inicio or ano_fim or mes), anual=not mes,
+    )
+
+@app.get("/api/dados/por-municipio")
+@json_rapido
+async def dados_por_municipio(
+    indicador: str = Query("internacoes", description="internacoes ou obitos"),
+    capitulo_cod: Optional[str] = Query(None, description="Capítulo CID-10 (ex: I, II); sem ele, o total do indicador"),
+    uf: Optional[str] = Query(None, description="Só os municípios desta UF (ex: SP)"),
+    ano: Optional[int] = Query(None, description="Ano para filtrar"),
+    ano_inicio: Optional[int] = Query(None, description="Ano inicial para filtrar"),
+    ano_fim: Optional[int] = Query(None, description="Ano final para filtrar"),
+    mes: Optional[int] = Query(None, description="Mês para filtrar (1-12)"),
+    saida: str = Query("valores", description="valores: ids e valores; classes: ids e a classe de quantil de cada um"),
+    classes: int = Query(5, ge=2, le=10, description="Nº de classes de quantis (com saida=classes)"),
+):
+    """Total por município para o mapa coroplético, em arrays paralelos alinhados por posição com "ids" (id_localidade).
+
+    Sem filtro de tempo, ou só com anos inteiros, lê dos níveis localidade e localidade_ano do
+    rollup; com mês, da tabela fato. Municípios sem registro ficam de fora. Com saida=classes,
+    "limites" separa as classes: classe i vai de limites[i-1] (inclusive) a limites[i] (exclusive).
+    """
+    if indicador not in consultas.POR_MUNICIPIO:
+        raise HTTPException(status_code=400, detail=f"Indicador inválido: {indicador}. Use {', '.join(consultas.POR_MUNICIPIO)}")
+    if saida not in ("valores", "classes"):
+        raise HTTPException(status_code=400, detail="saida deve ser 'valores' ou 'classes'")
+    try:
+        pares = await _valores_por_municipio(
+            indicador=indicador, capitulo_cod=capitulo_cod, uf=uf.strip().upper() if uf else None,
+            ano=ano, ano_inicio=ano_inicio, ano_fim=ano_fim, mes=mes,
+        )
+    except Exception as e:
+        logger.exception("Erro ao buscar dados por município")
+        raise HTTPException(status_code=500, detail=f"Erro ao buscar dados por município: {str(e)}")
+
+    ids = [id_localidade for id_localidade, _ in pares]
+    valores = [valor for _, valor in pares]
+    resposta = {
+        "indicador": indicador,
+        "capitulo_cod": capitulo_cod,
+        "municipios": len(ids),
+        "total": sum(valores),
+        "ids": ids,
+    }
+    if saida == "classes":
+        limites = consultas.quantis(valores, classes)
+        resposta["limites"] = limites
+        resposta["classes"] = [bisect.bisect_right(limites, valor) for valor in valores]
+    else:
+        resposta["valores"] = valores
+    return resposta
+
+def _cabecalhos_dashboard(resposta):
+    # Com seção em erro a resposta não ganha ETag nem vai para cache (corpo comprimido, navegador,
+    # CDN): a próxima requisição tenta de novo em vez de receber os null até o fim do TTL
+    return http_cache.NAO_ARMAZENAR if resposta["erros"] else None
+
+@app.get("/api/dashboard")
+@json_rapido(cabecalhos=_cabecalhos_dashboard)
+async def dashboard(
+    id_localidade: Optional[int] = Query(None, description="ID da localidade para filtrar"),
+    ano_inicio: Optional[int] = Query(None, description="Ano inicial para filtrar"),
+    ano_fim: Optional[int] = Query(None, description="Ano final para filtrar"),
+    mes: Optional[int] = Query(None, description="Mês para filtrar (1-12)"),
+    limit: Optional[int] = Query(5000, description="Limite de registros da série mensal (padrão: 5000)")
+):
+    """Todos os gráficos da página inicial numa única requisição.
+
+    As seções chamam os próprios endpoints (e compartilham o cache deles) e rodam em paralelo.
+    Gráficos por dimensão são sempre do período agregado; série mensal e capítulos CID-10
+    respeitam o filtro de ano/mês. Uma seção que falhar volta como null, com a mensagem em
+    "erros", sem derrubar as demais; essa resposta sai com Cache-Control: no-store.
+    """
+    # .dados: o valor Python de cada endpoint (sem renderizar JSON), passando pelo cache dele
+    secoes = {
+        "periodo_dados": periodo_dados.dados(),
+        "series_mensal": series_mensal.dados(
+            id_localidade=id_localidade, ano_inicio=ano_inicio, ano_fim=ano_fim, mes=mes, limit=limit
+        ),
+        "internacoes_sexo": internacoes_por_sexo.dados(id_localidade=id_localidade),
+        "internacoes_faixa": internacoes_por_faixa.dados(id_localidade=id_localidade),
+        "obitos_raca": obitos_por_raca.dados(id_localidade=id_localidade),
+        "obitos_estado_civil": obitos_por_estado_civil.dados(id_localidade=id_localidade),
+        "obitos_local": obitos_por_local_ocorrencia.dados(id_localidade=id_localidade),
+        "internacoes_cid_cap": internacoes_por_cid_capitulo.dados(
+            id_localidade=id_localidade, ano=None, mes=mes, ano_inicio=ano_inicio, ano_fim=ano_fim
+        ),
+        "obitos_cid_cap": obitos_por_cid_capitulo.dados(
+            id_localidade=id_localidade, ano=None, mes=mes, ano_inicio=ano_inicio, ano_fim=ano_fim
+        ),
+        "internacoes_cid_por_estado": internacoes_cid_por_estado.dados(capitulo_cod=None),
+    }
+    resultados = await asyncio.gather(*secoes.values(), return_exceptions=True)
+
+    resposta, erros = {}, {}
+    for nome, resultado in zip(secoes, resultados):
+        if isinstance(resultado, Exception):
+            resposta[nome] = None
+            erros[nome] = resultado.detail if isinstance(resultado, HTTPException) else str(resultado)
+        else:
+            resposta[nome] = resultado
+    resposta["erros"] = erros
+    return resposta
+
+# Pré-calculados no startup e a cada nova carga (ver aquecimento.py); o dashboard reaproveita
+# o cache de cada um. Os sem filtros de localidade/UF só entram na visão nacional; o mapa
+# municipal é aquecido também por UF.
+aquecimento.registrar(
+    periodo_dados,
+    series_mensal,
+    internacoes_por_sexo,
+    internacoes_por_faixa,
+    obitos_por_raca,
+    obitos_por_estado_civil,
+    obitos_por_local_ocorrencia,
+    internacoes_por_cid_capitulo,
+    obitos_por_cid_capitulo,
+    dados_por_estado,
+    internacoes_cid_por_estado,
+    dados_por_municipio,
+)
+
+async def _exportar(nome, formato, montar, *args):
+    if formato not in exportacao.FORMATOS:
+        raise HTTPException(status_code=400, detail=f"Formato inválido: {formato}. Use csv, ndjson ou parquet")
+    if formato == "parquet" and not exportacao.parquet_disponivel():
+        raise HTTPException(status_code=501, detail="Exportação em Parquet requer o pacote pyarrow no backend")
+    try:
+        await dimensoes.garantir()
+        corpo = await exportacao.iniciar(formato, montar(*args))
+    except exportacao.Esgotado as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao exportar dados: {str(e)}")
+    media_type, extensao = exportacao.FORMATOS[formato]
+    return StreamingResponse(
+        corpo,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{nome}.{extensao}"'},
+    )
+
+@app.get("/api/export/municipio-mes", dependencies=[Depends(get_current_user)])
+async def exportar_municipio_mes(
+    formato: str = Query("csv", description="csv, ndjson ou parquet"),
+    id_localidade: Optional[int] = Query(None, description="ID da localidade para filtrar"),
+    uf: Optional[str] = Query(None, description="UF para filtrar (ex: SP)"),
+    ano_inicio: Optional[int] = Query(None, description="Ano inicial para filtrar"),
+    ano_fim: Optional[int] = Query(None, description="Ano final para filtrar"),
+    mes: Optional[int] = Query(None, description="Mês para filtrar (1-12)")
+):
+    """Internações e óbitos por município e mês, sem limite de linhas (streaming)."""
+    return await _exportar(
+        "internacoes_obitos_municipio_mes", formato, exportacao.municipio_mes,
+        id_localidade, uf, ano_inicio, ano_fim, mes,
+    )
+
+@app.get("/api/export/fato", dependencies=[Depends(get_current_user)])
+async def exportar_fato(
+    id_tipo_evento: int = Query(..., description="Tipo de evento (3 a 11)"),
+    formato: str = Query("csv", description="csv, ndjson ou parquet"),
+    id_localidade: Optional[int] = Query(None, description="ID da localidade para filtrar"),
+    uf: Optional[str] = Query(None, description="UF para filtrar (ex: SP)"),
+    ano_inicio: Optional[int] = Query(None, description="Ano inicial para filtrar"),
+    ano_fim: Optional[int] = Query(None, description="Ano final para filtrar"),
+    mes: Optional[int] = Query(None, description="Mês para filtrar (1-12)")
+):
+    """Linhas brutas de fato_saude_mensal de um tipo de evento (streaming)."""
+    return await _exportar(
+        f"fato_saude_mensal_tipo_{id_tipo_evento}", formato, exportacao.fato,
+        id_tipo_evento, id_localidade, uf, ano_inicio, ano_fim, mes,
+    )
+
 @app.get("/api/test-columns/{table_name}")
 def test_columns(table_name: str):
     """Endpoint para testar nomes de colunas em uma tabela."""
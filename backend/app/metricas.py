@@ -0,0 +1,274 @@
+"""Métricas de desempenho por rota, expostas em /metrics no formato texto do Prometheus.
+
+O MetricasMiddleware abre um acumulador por requisição (contextvar); as camadas de banco e
+de serialização somam nele o que gastaram. Ao fim do envio do corpo, tudo vira observação
+nos histogramas com o label `rota` (o template da rota, ex.: /api/series/mensal):
+
+- http_request_duration_seconds: latência total, até o último byte do corpo
+- http_response_bytes: bytes enviados (depois da compressão)
+- db_pool_wait_seconds: espera por conexão do pool (inclui abrir conexão nova, se preciso)
+- db_execute_seconds: execução das consultas + leitura das linhas
+- db_rows: linhas lidas do banco
+- serializacao_seconds: renderização do JSON, só nas rotas com json_rapido (respostas.py); nas
+  demais o FastAPI serializa dentro do endpoint, sem como separar, e a rota não entra
+- db_connect_seconds: abertura de conexão nova, nos dois pools (sem label de rota)
+
+Consultas acima de SLOW_QUERY_MS são registradas no log (logger app.metricas).
+"""
+import contextvars
+import logging
+import threading
+import time
+
+import anyio.to_thread
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.routing import Match
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+BUCKETS_SEGUNDOS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 180)
+BUCKETS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+BUCKETS_LINHAS = (1, 10, 100, 1000, 10000, 100000, 1000000)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                          for k, v in labels) + "}"
+
+
+class Histograma:
+    def __init__(self, nome, ajuda, buckets):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.buckets = buckets
+        self._series = {}  # labels -> [contagens por bucket, soma, total]
+        self._lock = threading.Lock()
+
+    def observe(self, valor, **labels):
+        chave = tuple(sorted(labels.items()))
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [[0] * len(self.buckets), 0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[0][i] += 1
+                    break
+            serie[1] += valor
+            serie[2] += 1
+
+    def expor(self):
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} histogram"]
+        with self._lock:
+            series = [(chave, list(c), soma, total) for chave, (c, soma, total) in self._series.items()]
+        for chave, contagens, soma, total in sorted(series):
+            acumulado = 0
+            for limite, n in zip(self.buckets, contagens):
+                acumulado += n
+                linhas.append(f"{self.nome}_bucket{_labels(chave + (('le', limite),))} {acumulado}")
+            linhas.append(f"{self.nome}_bucket{_labels(chave + (('le', '+Inf'),))} {total}")
+            linhas.append(f"{self.nome}_sum{_labels(chave)} {soma}")
+            linhas.append(f"{self.nome}_count{_labels(chave)} {total}")
+        return linhas
+
+
+class Contador:
+    def __init__(self, nome, ajuda):
+        self.nome = nome
+        self.ajuda = ajuda
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, valor=1, **labels):
+        chave = tuple(sorted(labels.items()))
+        with self._lock:
+            self._series[chave] = self._series.get(chave, 0) + valor
+
+    def expor(self):
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} counter"]
+        with self._lock:
+            series = sorted(self._series.items())
+        linhas += [f"{self.nome}{_labels(chave)} {valor}" for chave, valor in series]
+        return linhas
+
+
+duracao = Histograma("http_request_duration_seconds", "Latência total da requisição até o último byte", BUCKETS_SEGUNDOS)
+bytes_resposta = Histograma("http_response_bytes", "Bytes do corpo enviado", BUCKETS_BYTES)
+espera_pool = Histograma("db_pool_wait_seconds", "Espera por conexão do pool, por requisição", BUCKETS_SEGUNDOS)
+execucao = Histograma("db_execute_seconds", "Execução das consultas e leitura das linhas, por requisição", BUCKETS_SEGUNDOS)
+linhas_lidas = Histograma("db_rows", "Linhas lidas do banco, por requisição", BUCKETS_LINHAS)
+serializacao = Histograma(
+    "serializacao_seconds", "Renderização do JSON da resposta (rotas com json_rapido)", BUCKETS_SEGUNDOS
+)
+conexao = Histograma("db_connect_seconds", "Abertura de conexão nova com o banco", BUCKETS_SEGUNDOS)
+requisicoes = Contador("http_requests_total", "Requisições por rota e status")
+consultas = Contador("db_queries_total", "Consultas executadas por rota")
+consultas_lentas = Contador("db_slow_queries_total", "Consultas acima de SLOW_QUERY_MS por rota")
+
+HISTOGRAMAS = [duracao, bytes_resposta, espera_pool, execucao, linhas_lidas, serializacao, conexao]
+CONTADORES = [requisicoes, consultas, consultas_lentas]
+
+FORA_DE_REQUISICAO = "-"
+
+
+class _Requisicao:
+    __slots__ = ("rota", "espera", "execucao", "linhas", "serializacao")
+
+    def __init__(self, rota):
+        self.rota = rota
+        self.espera = 0.0
+        self.execucao = 0.0
+        self.linhas = 0
+        # None: a rota não passou pelo json_rapido (não vira observação zerada)
+        self.serializacao = None
+
+
+_atual = contextvars.ContextVar("metricas_requisicao", default=None)
+
+
+def _rota_atual():
+    req = _atual.get()
+    return req.rota if req is not None else FORA_DE_REQUISICAO
+
+
+def registrar_espera(segundos):
+    req = _atual.get()
+    if req is not None:
+        req.espera += segundos
+    else:
+        espera_pool.observe(segundos, rota=FORA_DE_REQUISICAO)
+
+
+def registrar_conexao(segundos):
+    conexao.observe(segundos)
+
+
+def registrar_serializacao(segundos):
+    req = _atual.get()
+    if req is not None:
+        req.serializacao = (req.serializacao or 0.0) + segundos
+
+
+def registrar_consulta(sql, params, segundos, linhas):
+    req = _atual.get()
+    rota = _rota_atual()
+    if req is not None:
+        req.execucao += segundos
+        req.linhas += linhas
+    else:
+        execucao.observe(segundos, rota=rota)
+        linhas_lidas.observe(linhas, rota=rota)
+    consultas.inc(rota=rota)
+    if segundos * 1000 >= config.SLOW_QUERY_MS:
+        consultas_lentas.inc(rota=rota)
+        texto = " ".join(sql.split())
+        logger.warning(
+            "Consulta lenta (%.0f ms, %d linhas) em %s: %s | params=%s",
+            segundos * 1000, linhas, rota, texto[:500], params,
+        )
+
+
+def _rota(request):
+    rota = request.scope.get("route")
+    if rota is not None:
+        return rota.path
+    for rota in request.app.router.routes:
+        correspondencia, _ = rota.matches(request.scope)
+        if correspondencia == Match.FULL:
+            return rota.path
+    # Caminhos sem rota (404) agrupados para não explodir a cardinalidade
+    return "(sem rota)"
+
+
+def _observar(req, status, segundos, enviados):
+    duracao.observe(segundos, rota=req.rota)
+    bytes_resposta.observe(enviados, rota=req.rota)
+    espera_pool.observe(req.espera, rota=req.rota)
+    execucao.observe(req.execucao, rota=req.rota)
+    linhas_lidas.observe(req.linhas, rota=req.rota)
+    if req.serializacao is not None:
+        serializacao.observe(req.serializacao, rota=req.rota)
+    requisicoes.inc(rota=req.rota, status=status)
+
+
+class MetricasMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        inicio = time.perf_counter()
+        req = _Requisicao(_rota(request))
+        token = _atual.set(req)
+        try:
+            response = await call_next(request)
+        except Exception:
+            _observar(req, 500, time.perf_counter() - inicio, 0)
+            raise
+        finally:
+            _atual.reset(token)
+
+        original = response.body_iterator
+
+        async def corpo():
+            enviados = 0
+            try:
+                async for parte in original:
+                    enviados += len(parte)
+                    yield parte
+            finally:
+                _observar(req, response.status_code, time.perf_counter() - inicio, enviados)
+
+        response.body_iterator = corpo()
+        return response
+
+
+def threadpool_stats():
+    """Ocupação do threadpool do anyio (endpoints síncronos e o modo DB_ASYNC=false).
+
+    Precisa ser chamada no event loop.
+    """
+    estatisticas = anyio.to_thread.current_default_thread_limiter().statistics()
+    return {
+        "limite": estatisticas.total_tokens,
+        "em_uso": estatisticas.borrowed_tokens,
+        "aguardando": estatisticas.tasks_waiting,
+    }
+
+
+def _gauges(nome, ajuda, valores):
+    linhas = [f"# HELP {nome} {ajuda}", f"# TYPE {nome} gauge"]
+    linhas += [f"{nome}{_labels(labels)} {valor}" for labels, valor in valores]
+    return linhas
+
+
+def expor(pool_sync=None, pool_async=None, cache=None, threadpool=None, aquecimento=None):
+    """Texto no formato de exposição do Prometheus (0.0.4)."""
+    linhas = []
+    for metrica in HISTOGRAMAS + CONTADORES:
+        linhas += metrica.expor()
+    if threadpool:
+        linhas += _gauges("threadpool", "Threadpool do anyio: limite, em uso e tarefas aguardando", [
+            ((("estado", chave),), valor) for chave, valor in sorted(threadpool.items())
+        ])
+    if pool_sync:
+        linhas += _gauges("db_pool_sync", "Estado do pool psycopg2 (ver /api/debug/pool)", [
+            ((("estado", chave),), valor) for chave, valor in sorted(pool_sync.items())
+            if isinstance(valor, (int, float))
+        ])
+    if pool_async:
+        linhas += _gauges("db_pool_async", "Estatísticas do pool psycopg 3 (get_stats)", [
+            ((("estado", chave),), valor) for chave, valor in sorted(pool_async.items())
+            if isinstance(valor, (int, float))
+        ])
+    if cache:
+        linhas += _gauges("cache_resultados", "Cache de resultados dos endpoints", [
+            ((("estado", chave),), valor) for chave, valor in sorted(cache.items())
+            if isinstance(valor, (int, float))
+        ])
+    if aquecimento:
+        linhas += _gauges("cache_aquecimento", "Aquecimento do cache: tarefas, concluídas e falhas da última rodada", [
+            ((("estado", chave),), valor) for chave, valor in sorted(aquecimento.items())
+            if isinstance(valor, (int, float)) and not isinstance(valor, bool)
+        ])
+    return "\n".join(linhas) + "\n"
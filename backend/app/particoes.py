@@ -0,0 +1,290 @@
+"""Particionamento de fato_saude_mensal por tipo de evento e ano.
+
+Toda consulta dos endpoints filtra a tabela fato por id_tipo_evento e, com filtro de
+período, por faixas de id_tempo (dimensoes.faixas_tempo resolve ano/mês em ids, sem JOIN
+com dim_tempo). Com a tabela particionada nessas duas chaves, o planejador descarta as
+partições que não atendem e /api/obitos/cid-cap?ano=2020 lê só a partição de 2020 do tipo 11:
+
+    fato_saude_mensal                      PARTITION BY LIST (id_tipo_evento)
+        fato_saude_mensal_t3               PARTITION BY RANGE (id_tempo)
+            fato_saude_mensal_t3_1996      FOR VALUES FROM (1) TO (13)
+            ...
+            fato_saude_mensal_t3_outros    DEFAULT (id_tempo fora dos anos conhecidos)
+        ...
+        fato_saude_mensal_outros           DEFAULT (tipos de evento novos)
+
+A tabela fato não tem coluna de ano: cada ano vira a faixa de id_tempo dos seus meses em
+dim_tempo, então os ids precisam crescer com (ano, mês), como na carga (carga.py cria os
+meses novos no fim). Os índices gerenciados (indices.py) vão para o pai ou, os parciais por
+tipo, para a partição do tipo.
+
+    python -m app.particoes status
+    python -m app.particoes migrar [--descartar-antiga] [--rollups]
+    python -m app.particoes anos        # partições dos anos novos de dim_tempo (carga.py já chama)
+    python -m app.particoes verificar   # partições lidas por cada consulta dos endpoints (EXPLAIN)
+
+`migrar` copia a tabela atual para a particionada e troca as duas numa transação: os
+endpoints continuam lendo a tabela antiga durante a cópia e só a troca bloqueia (rápida). A
+antiga fica como fato_saude_mensal_antiga até ser removida à mão (ou com --descartar-antiga).
+Requer PostgreSQL 12 ou mais novo.
+"""
+import argparse
+import asyncio
+import json
+import re
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+from . import indices, planos, rollups
+from .db import get_connection
+
+TABELA = indices.TABELA
+NOVA = f"{TABELA}_particionada"
+ANTIGA = f"{TABELA}_antiga"
+
+# Chave do pg_advisory_xact_lock das escritas na tabela fato (carga.py e migração)
+TRAVA = 7310231
+
+# Ids de dim_tempo reservados para um ano ainda incompleto (o último)
+MESES = 12
+
+_RE_FAIXA = re.compile(r"FROM \((\d+)\) TO \((\d+)\)")
+
+
+def particionada(cur):
+    return indices.particionada(cur)
+
+
+def faixas_anos(cur):
+    """[(ano, início, fim)] com as faixas de id_tempo de cada ano (fim exclusivo), contíguas.
+
+    Cada ano vai do seu primeiro id até o primeiro do ano seguinte; o último reserva MESES ids
+    a partir do primeiro mês, para os meses que a carga ainda vai criar.
+    """
+    cur.execute('''
+        SELECT ano, MIN(id_tempo) AS inicio, MAX(id_tempo) AS fim, MIN(mes) AS primeiro_mes
+        FROM dim_tempo
+        WHERE id_tempo IS NOT NULL AND id_tempo != 0
+        GROUP BY ano
+        ORDER BY ano
+    ''')
+    anos = cur.fetchall()
+    faixas = []
+    for atual, seguinte in zip(anos, anos[1:] + [None]):
+        if seguinte is None:
+            fim = max(atual["fim"] + 1, atual["inicio"] - atual["primeiro_mes"] + 1 + MESES)
+        elif seguinte["inicio"] <= atual["fim"]:
+            raise RuntimeError(
+                f"id_tempo de dim_tempo não cresce com o ano ({atual['ano']} e {seguinte['ano']} se sobrepõem); "
+                "não é possível particionar por faixas de id_tempo"
+            )
+        else:
+            fim = seguinte["inicio"]
+        faixas.append((atual["ano"], atual["inicio"], fim))
+    return faixas
+
+
+def _filhas(cur, tabela):
+    """Partições diretas de `tabela`: [(nome, limite, particionada)]."""
+    cur.execute(
+        '''
+        SELECT c.relname AS nome, pg_get_expr(c.relpartbound, c.oid) AS limite, c.relkind = 'p' AS particionada
+        FROM pg_inherits h
+        JOIN pg_class c ON c.oid = h.inhrelid
+        WHERE h.inhparent = to_regclass(%s)
+        ORDER BY c.relname
+        ''',
+        (tabela,),
+    )
+    return cur.fetchall()
+
+
+def garantir_anos(cur):
+    """Cria, em cada tipo de evento, as partições dos anos de dim_tempo além da última existente.
+
+    Precisa rodar antes de inserir linhas desses anos: com linhas já na partição DEFAULT, o
+    PostgreSQL recusa criar a partição que as cobriria. Retorna os nomes criados.
+    """
+    if not particionada(cur):
+        return []
+    cur.execute('''
+        SELECT ano, MIN(id_tempo) AS inicio, MAX(id_tempo) AS fim
+        FROM dim_tempo
+        WHERE id_tempo IS NOT NULL AND id_tempo != 0
+        GROUP BY ano
+        ORDER BY ano
+    ''')
+    anos = cur.fetchall()
+    criadas = []
+    for tipo in _filhas(cur, TABELA):
+        if not tipo["particionada"]:
+            continue
+        limites = [_RE_FAIXA.search(f["limite"]) for f in _filhas(cur, tipo["nome"])]
+        topo = max((int(m.group(2)) for m in limites if m), default=None)
+        if topo is None:
+            continue
+        for ano in anos:
+            if ano["inicio"] < topo:
+                continue
+            fim = max(ano["fim"] + 1, topo + MESES)
+            nome = f"{tipo['nome']}_{ano['ano']}"
+            cur.execute(f"CREATE TABLE {nome} PARTITION OF {tipo['nome']} FOR VALUES FROM ({topo}) TO ({fim})")
+            criadas.append(nome)
+            topo = fim
+    return criadas
+
+
+def migrar(descartar_antiga=False):
+    """Copia a tabela fato para o layout particionado e troca as tabelas numa transação."""
+    inicio = time.monotonic()
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL statement_timeout = 0")
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (TRAVA,))
+            if particionada(cur):
+                raise RuntimeError(f"{TABELA} já é particionada")
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL AS existe", (ANTIGA,))
+            if cur.fetchone()["existe"] and not descartar_antiga:
+                raise RuntimeError(f"{ANTIGA} já existe: remova-a (DROP TABLE {ANTIGA}) ou use --descartar-antiga")
+
+            faixas = faixas_anos(cur)
+            cur.execute(f"SELECT DISTINCT id_tipo_evento FROM {TABELA} WHERE id_tipo_evento IS NOT NULL ORDER BY 1")
+            tipos = [row["id_tipo_evento"] for row in cur.fetchall()]
+
+            cur.execute(f"""
+                CREATE TABLE {NOVA} (LIKE {TABELA} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+                PARTITION BY LIST (id_tipo_evento)
+            """)
+            for tipo in tipos:
+                pai = f"{TABELA}_t{tipo}"
+                cur.execute(f"CREATE TABLE {pai} PARTITION OF {NOVA} FOR VALUES IN ({tipo}) PARTITION BY RANGE (id_tempo)")
+                for ano, de, ate in faixas:
+                    cur.execute(f"CREATE TABLE {pai}_{ano} PARTITION OF {pai} FOR VALUES FROM ({de}) TO ({ate})")
+                cur.execute(f"CREATE TABLE {pai}_outros PARTITION OF {pai} DEFAULT")
+            cur.execute(f"CREATE TABLE {TABELA}_outros PARTITION OF {NOVA} DEFAULT")
+
+            cur.execute(f"INSERT INTO {NOVA} SELECT * FROM {TABELA}")
+            linhas = cur.rowcount
+            # Índices depois da cópia (mais rápido que mantê-los linha a linha); parciais por tipo
+            # só na partição do tipo, em vez de um índice vazio em cada partição dos outros tipos
+            for nome in indices.INDICES:
+                tipo = indices.tipo_do_indice(nome)
+                alvo = f"{TABELA}_t{tipo}" if tipo in tipos else NOVA
+                cur.execute(indices.definicao(nome, concorrente=False, tabela=alvo, indice=f"{nome}_novo"))
+            cur.execute(f"ANALYZE {NOVA}")
+
+            if descartar_antiga:
+                cur.execute(f"DROP TABLE IF EXISTS {ANTIGA}")
+                cur.execute(f"DROP TABLE {TABELA}")
+            else:
+                cur.execute(f"ALTER TABLE {TABELA} RENAME TO {ANTIGA}")
+                for nome in indices.INDICES:
+                    cur.execute(f"ALTER INDEX IF EXISTS {nome} RENAME TO {nome}_antiga")
+            cur.execute(f"ALTER TABLE {NOVA} RENAME TO {TABELA}")
+            for nome in indices.INDICES:
+                cur.execute(f"ALTER INDEX {nome}_novo RENAME TO {nome}")
+    return {
+        "linhas": linhas,
+        "tipos": tipos,
+        "anos": [ano for ano, _, _ in faixas],
+        "particoes_folha": len(tipos) * (len(faixas) + 1) + 1,
+        "antiga": None if descartar_antiga else ANTIGA,
+        "segundos": round(time.monotonic() - inicio, 1),
+    }
+
+
+def anos():
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (TRAVA,))
+            return {"criadas": garantir_anos(cur)}
+
+
+def status():
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            em_particoes = particionada(cur)
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL AS existe", (ANTIGA,))
+            antiga = cur.fetchone()["existe"]
+            cur.execute(
+                '''
+                SELECT
+                    p.relid::regclass::text AS nome,
+                    p.level AS nivel,
+                    p.isleaf AS folha,
+                    pg_get_expr(c.relpartbound, c.oid) AS limite,
+                    GREATEST(c.reltuples, 0)::bigint AS linhas_estimadas,
+                    pg_total_relation_size(p.relid) AS bytes
+                FROM pg_partition_tree(to_regclass(%s)) p
+                JOIN pg_class c ON c.oid = p.relid
+                WHERE p.level > 0
+                ORDER BY p.relid::regclass::text
+                ''',
+                (TABELA,),
+            )
+            particoes = cur.fetchall()
+    folhas = [p for p in particoes if p["folha"]]
+    return {
+        "particionada": em_particoes,
+        "antiga_existe": antiga,
+        "particoes_folha": len(folhas),
+        "bytes": sum(p["bytes"] for p in folhas),
+        # Linhas caídas nas partições DEFAULT: anos/tipos sem partição própria (ver `anos`)
+        "linhas_em_default": {p["nome"]: p["linhas_estimadas"] for p in folhas
+                              if p["limite"] == "DEFAULT" and p["linhas_estimadas"]},
+        "particoes": particoes,
+    }
+
+
+async def verificar():
+    """Quantas partições folha cada consulta dos endpoints lê, pelo plano (EXPLAIN sem executar)."""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) AS total FROM pg_partition_tree(to_regclass(%s)) WHERE isleaf", (TABELA,))
+            total = cur.fetchone()["total"]
+    resultado = []
+    async for nome, params, sql, sql_params in indices._consultas_fato():
+        plano = await run_in_threadpool(indices._explicar, sql, sql_params)
+        nos = list(planos._percorrer(plano[0]["Plan"]))
+        lidas = sorted({no["Relation Name"] for no in nos if (no.get("Relation Name") or "").startswith(TABELA)})
+        resultado.append({
+            "consulta": nome,
+            "parametros": params,
+            "particoes_lidas": len(lidas),
+            "particoes_total": total,
+            # Poda em tempo de execução (parâmetros de nested loop / planos genéricos)
+            "removidas_na_execucao": sum(no.get("Subplans Removed", 0) for no in nos),
+            "tabelas": lidas if len(lidas) <= 5 else lidas[:5] + [f"... (+{len(lidas) - 5})"],
+        })
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=f"Particionamento de {TABELA}")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("status", help="layout atual, partições e linhas nas partições DEFAULT")
+    p = sub.add_parser("migrar", help="converte a tabela atual em particionada (tipo de evento, ano)")
+    p.add_argument("--descartar-antiga", action="store_true", help=f"remove a tabela atual em vez de mantê-la como {ANTIGA}")
+    p.add_argument("--rollups", action="store_true", help="reconstrói os rollups depois da troca")
+    sub.add_parser("anos", help="cria as partições dos anos novos de dim_tempo")
+    sub.add_parser("verificar", help="partições lidas por cada consulta dos endpoints")
+    args = parser.parse_args()
+
+    if args.comando == "status":
+        resultado = status()
+    elif args.comando == "migrar":
+        resultado = migrar(args.descartar_antiga)
+        # Sem o marcador de carga.py, a versão dos dados vem dos contadores da tabela, que mudam
+        # com a troca: o rollup deixa de valer até ser reconstruído
+        if args.rollups:
+            resultado["rollups"] = rollups.atualizar()
+    elif args.comando == "anos":
+        resultado = anos()
+    else:
+        resultado = asyncio.run(indices._executar_async(verificar))
+    print(json.dumps(resultado, indent=2, ensure_ascii=False, default=str))
+
+
+if __name__ == "__main__":
+    main()
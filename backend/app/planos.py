@@ -0,0 +1,348 @@
+"""Captura de planos de execução das consultas dos endpoints e detecção de regressões.
+
+Cada consulta registrada em CONSULTAS é montada exatamente como o endpoint monta (mesma
+origem rollup/fato, mesmos filtros) e executada com EXPLAIN (ANALYZE, BUFFERS). A captura
+guarda a impressão digital do plano (formato da árvore: nós, tabelas e índices), o tempo
+de execução e os buffers lidos em `plano_consultas`, e é comparada com a captura anterior
+da mesma consulta e parâmetros:
+
+- seq_scan:     uma tabela passou a ser lida por Seq Scan (antes era por índice)
+- indice:       um índice usado antes não aparece mais no plano
+- buffers:      buffers lidos (hit + read) cresceram mais que PLANO_FATOR_REGRESSAO vezes
+- tempo:        tempo de execução cresceu mais que PLANO_FATOR_REGRESSAO vezes
+- plano:        a impressão digital mudou (informativo)
+
+Rodar depois de cada carga (e de `python -m app.rollups atualizar`):
+
+    python -m app.planos capturar                      # todas as consultas, parâmetros padrão
+    python -m app.planos capturar --consulta series_mensal --params '{"ano_inicio": 2020}'
+    python -m app.planos historico --consulta series_mensal
+    python -m app.planos listar
+
+`capturar` termina com código 1 se alguma captura falhar ou houver regressão (fora `plano`).
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import sys
+from datetime import datetime
+
+from starlette.concurrency import run_in_threadpool
+
+from . import cache, config, consultas, db, db_async, dimensoes, rollups
+from .db import get_connection
+
+TABELA = "plano_consultas"
+
+NOS_INDICE = ("Index Scan", "Index Only Scan", "Bitmap Index Scan")
+
+
+def _cid(evento):
+    def montar(origem, id_localidade=None, ano=None, mes=None, ano_inicio=None, ano_fim=None):
+        return consultas.cid_capitulo(evento, origem, id_localidade, ano, mes, ano_inicio, ano_fim)
+    return montar
+
+
+def _quebra(nome):
+    def montar(origem, id_localidade=None):
+        return consultas.quebra(nome, origem, id_localidade)
+    return montar
+
+
+def _tem_tempo(p):
+    return bool(p.get("ano") or p.get("mes") or p.get("ano_inicio") or p.get("ano_fim"))
+
+
+# nome -> montagem (origem, **params), se filtra por localidade / por tempo / só por anos inteiros
+# (como no endpoint), timeout da consulta e conjuntos de parâmetros capturados por padrão
+CONSULTAS = {
+    "periodo_dados": {
+        "montar": lambda origem: consultas.periodo_dados(origem),
+        "localidade": lambda p: False, "tempo": lambda p: True,
+        "padrao": [{}],
+    },
+    "series_mensal": {
+        "montar": lambda origem, id_localidade=None, ano_inicio=None, ano_fim=None, mes=None: consultas.series_mensal(
+            origem, id_localidade, ano_inicio, ano_fim, mes
+        ),
+        "localidade": lambda p: bool(p.get("id_localidade")), "tempo": lambda p: True,
+        "padrao": [{}, {"ano_inicio": 2019, "ano_fim": 2023}],
+    },
+    **{
+        nome: {
+            "montar": _quebra(nome),
+            "localidade": lambda p: bool(p.get("id_localidade")), "tempo": lambda p: False,
+            "padrao": [{}],
+        }
+        for nome in consultas.QUEBRAS
+    },
+    **{
+        f"cid_capitulo_{evento}": {
+            "montar": _cid(evento),
+            "localidade": lambda p: bool(p.get("id_localidade")), "tempo": _tem_tempo,
+            "timeout": "180s",
+            "padrao": [{}, {"ano": 2023}],
+        }
+        for evento in consultas.CID_CAPITULO
+    },
+    "dados_por_estado": {
+        "montar": lambda origem: consultas.dados_por_estado(origem),
+        "localidade": lambda p: True, "tempo": lambda p: False,
+        "padrao": [{}],
+    },
+    "internacoes_cid_por_estado": {
+        "montar": lambda origem, capitulo_cod=None: consultas.internacoes_cid_por_estado(origem, capitulo_cod),
+        "localidade": lambda p: True, "tempo": lambda p: False,
+        "padrao": [{}, {"capitulo_cod": "I"}],
+    },
+    "por_municipio": {
+        "montar": lambda origem, indicador="internacoes", capitulo_cod=None, uf=None, ano=None, ano_inicio=None,
+        ano_fim=None, mes=None: consultas.por_municipio(
+            origem, indicador, capitulo_cod, uf, ano, ano_inicio, ano_fim, mes
+        ),
+        "localidade": lambda p: True, "tempo": _tem_tempo, "anual": lambda p: not p.get("mes"),
+        "padrao": [{}, {"ano": 2023}, {"ano": 2023, "capitulo_cod": "I"}, {"indicador": "obitos", "uf": "SP"}],
+    },
+}
+
+
+def _percorrer(no):
+    yield no
+    for filho in no.get("Plans", []):
+        yield from _percorrer(filho)
+
+
+def _forma(no):
+    """Árvore só com o que define o plano (tipo de nó, tabela, índice, estratégia), sem custos nem contagens."""
+    partes = [no.get("Node Type", "")]
+    for campo in ("Relation Name", "Index Name", "Strategy", "Join Type", "Parent Relationship"):
+        if no.get(campo):
+            partes.append(f"{campo}={no[campo]}")
+    filhos = ",".join(_forma(filho) for filho in no.get("Plans", []))
+    return f"{'|'.join(partes)}({filhos})"
+
+
+def resumir(plano):
+    """Resumo comparável de um plano EXPLAIN (FORMAT JSON)."""
+    raiz = plano[0] if isinstance(plano, list) else plano
+    no_raiz = raiz["Plan"]
+    nos = list(_percorrer(no_raiz))
+    seq_scans = sorted({no["Relation Name"] for no in nos if no.get("Node Type") == "Seq Scan" and no.get("Relation Name")})
+    indices = sorted({no["Index Name"] for no in nos if no.get("Node Type") in NOS_INDICE and no.get("Index Name")})
+    return {
+        "fingerprint": hashlib.sha1(_forma(no_raiz).encode()).hexdigest()[:16],
+        "execucao_ms": round(raiz.get("Execution Time", 0.0), 3),
+        "planejamento_ms": round(raiz.get("Planning Time", 0.0), 3),
+        # Os contadores do nó raiz já incluem os dos filhos
+        "buffers_hit": no_raiz.get("Shared Hit Blocks", 0),
+        "buffers_lidos": no_raiz.get("Shared Read Blocks", 0),
+        "linhas": no_raiz.get("Actual Rows", 0),
+        "seq_scans": seq_scans,
+        "indices": indices,
+    }
+
+
+def comparar(atual, anterior, fator=None):
+    """Regressões de `atual` em relação a `anterior` (dois resumos)."""
+    if anterior is None:
+        return []
+    fator = fator or config.PLANO_FATOR_REGRESSAO
+    regressoes = []
+    for tabela in sorted(set(atual["seq_scans"]) - set(anterior["seq_scans"])):
+        regressoes.append({"tipo": "seq_scan", "detalhe": f"{tabela} passou a ser lida por Seq Scan"})
+    for indice in sorted(set(anterior["indices"]) - set(atual["indices"])):
+        regressoes.append({"tipo": "indice", "detalhe": f"{indice} não é mais usado"})
+    buffers_antes = anterior["buffers_hit"] + anterior["buffers_lidos"]
+    buffers_agora = atual["buffers_hit"] + atual["buffers_lidos"]
+    # Pisos absolutos evitam alarme em consultas minúsculas (10 → 25 buffers, 1 → 3 ms)
+    if buffers_agora > buffers_antes * fator and buffers_agora - buffers_antes > 1000:
+        regressoes.append({"tipo": "buffers", "detalhe": f"buffers {buffers_antes} → {buffers_agora}"})
+    if atual["execucao_ms"] > anterior["execucao_ms"] * fator and atual["execucao_ms"] - anterior["execucao_ms"] > 50:
+        regressoes.append({"tipo": "tempo", "detalhe": f"execução {anterior['execucao_ms']} ms → {atual['execucao_ms']} ms"})
+    if atual["fingerprint"] != anterior["fingerprint"]:
+        regressoes.append({"tipo": "plano", "detalhe": f"plano {anterior['fingerprint']} → {atual['fingerprint']}"})
+    return regressoes
+
+
+def _criar_tabela(cur):
+    cur.execute(f'''
+        CREATE TABLE IF NOT EXISTS {TABELA} (
+            id bigserial PRIMARY KEY,
+            consulta text NOT NULL,
+            parametros text NOT NULL,
+            fingerprint text NOT NULL,
+            execucao_ms double precision NOT NULL,
+            planejamento_ms double precision NOT NULL,
+            buffers_hit bigint NOT NULL,
+            buffers_lidos bigint NOT NULL,
+            linhas bigint NOT NULL,
+            seq_scans text[] NOT NULL,
+            indices text[] NOT NULL,
+            origem text NOT NULL,
+            versao_dados text,
+            plano jsonb NOT NULL,
+            capturado_em timestamptz NOT NULL DEFAULT now()
+        )
+    ''')
+    cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABELA}_consulta ON {TABELA} (consulta, parametros, capturado_em DESC)")
+
+
+def _anterior(cur, nome, parametros):
+    cur.execute(
+        f'''
+        SELECT fingerprint, execucao_ms, planejamento_ms, buffers_hit, buffers_lidos, linhas, seq_scans, indices
+        FROM {TABELA}
+        WHERE consulta = %s AND parametros = %s
+        ORDER BY capturado_em DESC
+        LIMIT 1
+        ''',
+        (nome, parametros),
+    )
+    row = cur.fetchone()
+    return dict(row) if row else None
+
+
+def _explicar(nome, parametros, sql, params, timeout, origem, salvar, analisar=True):
+    opcoes = "ANALYZE, BUFFERS, FORMAT JSON" if analisar else "FORMAT JSON"
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            if timeout:
+                cur.execute(f"SET LOCAL statement_timeout = '{timeout}'")
+            cur.execute(f"EXPLAIN ({opcoes}) {sql}", params)
+            plano = cur.fetchone()["QUERY PLAN"]
+            resumo = resumir(plano)
+            if not salvar:
+                return plano, resumo, None
+            _criar_tabela(cur)
+            anterior = _anterior(cur, nome, parametros)
+            versao = cache.versao_cursor(cur)
+            cur.execute(
+                f'''
+                INSERT INTO {TABELA} (consulta, parametros, fingerprint, execucao_ms, planejamento_ms,
+                                      buffers_hit, buffers_lidos, linhas, seq_scans, indices, origem,
+                                      versao_dados, plano)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ''',
+                (
+                    nome, parametros, resumo["fingerprint"], resumo["execucao_ms"], resumo["planejamento_ms"],
+                    resumo["buffers_hit"], resumo["buffers_lidos"], resumo["linhas"], resumo["seq_scans"],
+                    resumo["indices"], origem, versao, json.dumps(plano),
+                ),
+            )
+    return plano, resumo, anterior
+
+
+async def capturar(nome, params=None, salvar=True, analisar=True):
+    """EXPLAIN (ANALYZE, BUFFERS) da consulta `nome` montada com `params`, comparada com a captura anterior.
+
+    Com analisar=False, só o plano estimado (EXPLAIN sem executar), que não pode ser salvo.
+    """
+    if salvar and not analisar:
+        raise ValueError("salvar exige analisar: o histórico compara tempos e buffers reais")
+    if nome not in CONSULTAS:
+        raise KeyError(f"Consulta desconhecida: {nome}. Disponíveis: {', '.join(sorted(CONSULTAS))}")
+    spec = CONSULTAS[nome]
+    params = {k: v for k, v in (params or {}).items() if v is not None}
+    await dimensoes.garantir()
+    origem = await rollups.origem(
+        localidade=spec["localidade"](params), tempo=spec["tempo"](params),
+        anual=spec.get("anual", lambda p: False)(params),
+    )
+    sql, sql_params, _ = spec["montar"](origem, **params)
+    parametros = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    plano, resumo, anterior = await run_in_threadpool(
+        _explicar, nome, parametros, sql, sql_params, spec.get("timeout"), origem[0].split()[0], salvar, analisar
+    )
+    return {
+        "consulta": nome,
+        "parametros": params,
+        "origem": origem[0].split()[0],
+        **resumo,
+        "anterior": anterior,
+        "regressoes": comparar(resumo, anterior),
+        "plano": plano,
+    }
+
+
+async def capturar_todas(salvar=True):
+    resultados = []
+    for nome, spec in CONSULTAS.items():
+        for params in spec["padrao"]:
+            try:
+                resultados.append(await capturar(nome, params, salvar=salvar))
+            except Exception as e:
+                resultados.append({"consulta": nome, "parametros": params, "erro": str(e)})
+    return resultados
+
+
+def historico(nome=None, limite=50):
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL AS existe", (TABELA,))
+            if not cur.fetchone()["existe"]:
+                return []
+            filtro = "WHERE consulta = %s" if nome else ""
+            cur.execute(
+                f'''
+                SELECT consulta, parametros, fingerprint, execucao_ms, planejamento_ms, buffers_hit,
+                       buffers_lidos, linhas, seq_scans, indices, origem, versao_dados, capturado_em
+                FROM {TABELA}
+                {filtro}
+                ORDER BY capturado_em DESC
+                LIMIT %s
+                ''',
+                ([nome] if nome else []) + [limite],
+            )
+            return [dict(row) for row in cur.fetchall()]
+
+
+def _sem_plano(resultado):
+    return {k: v for k, v in resultado.items() if k != "plano"}
+
+
+def _imprimir(valor):
+    def padrao(obj):
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+        return str(obj)
+    print(json.dumps(valor, indent=2, ensure_ascii=False, default=padrao))
+
+
+async def _capturar_cli(args):
+    try:
+        if args.consulta:
+            resultados = [await capturar(args.consulta, json.loads(args.params) if args.params else None)]
+        else:
+            resultados = await capturar_todas()
+    finally:
+        await db_async.close_pool()
+        db.close_pool()
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Planos de execução das consultas dos endpoints")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p = sub.add_parser("capturar")
+    p.add_argument("--consulta", choices=sorted(CONSULTAS))
+    p.add_argument("--params", help="parâmetros da consulta em JSON (com --consulta)")
+    p = sub.add_parser("historico")
+    p.add_argument("--consulta", choices=sorted(CONSULTAS))
+    p.add_argument("--limite", type=int, default=50)
+    sub.add_parser("listar")
+    args = parser.parse_args()
+
+    if args.comando == "listar":
+        _imprimir({nome: spec["padrao"] for nome, spec in CONSULTAS.items()})
+    elif args.comando == "historico":
+        _imprimir(historico(args.consulta, args.limite))
+    else:
+        resultados = asyncio.run(_capturar_cli(args))
+        _imprimir([_sem_plano(r) for r in resultados])
+        if any("erro" in resultado or any(r["tipo"] != "plano" for r in resultado["regressoes"]) for resultado in resultados):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Serialização rápida das respostas dos endpoints de agregação.
+
+O FastAPI passa todo retorno por jsonable_encoder (que percorre a estrutura valor a valor)
+antes do json.dumps. Os endpoints decorados com json_rapido devolvem o ORJSONResponse pronto,
+pulando essa etapa, e aceitam `?formato=colunas` para receber listas como
+{"columns": [...], "rows": [[...], ...]} (sem repetir as chaves em cada linha).
+"""
+import functools
+import inspect
+import time
+from typing import Optional
+
+from fastapi import Query
+from fastapi.responses import ORJSONResponse
+
+from . import metricas
+
+
+def colunar(valor):
+    """Listas de dicts viram {"columns", "rows"}; dicts são convertidos campo a campo."""
+    if isinstance(valor, list) and all(isinstance(item, dict) for item in valor):
+        colunas = list(valor[0]) if valor else []
+        return {"columns": colunas, "rows": [[item.get(c) for c in colunas] for item in valor]}
+    if isinstance(valor, dict):
+        return {chave: colunar(item) for chave, item in valor.items()}
+    return valor
+
+
+def json_rapido(func=None, *, cabecalhos=None):
+    """Renderiza o retorno de `func` com orjson; `func` continua acessível em `.dados` (valor Python).
+
+    `cabecalhos(valor)`, se dado, devolve cabeçalhos extras da resposta (ou None).
+    """
+    if func is None:
+        return functools.partial(json_rapido, cabecalhos=cabecalhos)
+
+    @functools.wraps(func)
+    async def wrapper(formato=None, **kwargs):
+        valor = await func(**kwargs)
+        inicio = time.perf_counter()
+        response = ORJSONResponse(
+            colunar(valor) if formato == "colunas" else valor,
+            headers=cabecalhos(valor) if cabecalhos else None,
+        )
+        metricas.registrar_serializacao(time.perf_counter() - inicio)
+        return response
+
+    assinatura = inspect.signature(func)
+    formato = inspect.Parameter(
+        "formato",
+        inspect.Parameter.KEYWORD_ONLY,
+        default=Query(None, description="'colunas' para {columns, rows} em vez de lista de objetos"),
+        annotation=Optional[str],
+    )
+    wrapper.__signature__ = assinatura.replace(
+        parameters=[p.replace(kind=inspect.Parameter.KEYWORD_ONLY) for p in assinatura.parameters.values()] + [formato]
+    )
+    wrapper.dados = func
+    return wrapper
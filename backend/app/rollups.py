@@ -0,0 +1,217 @@
+"""Tabelas de rollup pré-agregadas a partir de fato_saude_mensal.
+
+Uma única tabela guarda três níveis de agregação por tipo de evento e membro de dimensão
+(sexo, faixa, raça/cor, estado civil, local de ocorrência, capítulo CID-10):
+
+- total:      Brasil inteiro, período inteiro
+- tempo:      Brasil inteiro, por id_tempo
+- localidade: por município, período inteiro
+- localidade_ano: por município e ano (coluna `ano`), só nos tipos do mapa municipal
+  (TIPOS_ANUAIS), para /api/dados/por-municipio com filtro de ano sem ir à tabela fato
+
+Atualizar depois de cada carga:
+
+    python -m app.rollups atualizar
+    python -m app.rollups status
+"""
+import argparse
+import time
+
+from . import cache, config
+from .db import get_connection
+from .db_async import fetch_one
+
+TABELA = "rollup_fato_saude_mensal"
+TABELA_CONTROLE = "rollup_controle"
+
+FATO = ("fato_saude_mensal f", "")
+
+COLUNAS_MEMBRO = ["id_sexo", "id_faixa", "id_raca_cor", "id_estado_civil", "id_local_ocor", "id_capitulo"]
+
+# Totais de internações/óbitos (3, 4) e por capítulo CID-10 (10, 11): os do mapa municipal
+TIPOS_ANUAIS = (3, 4, 10, 11)
+NIVEL_ANUAL = "localidade_ano"
+
+INDICES = {
+    "idx_rollup_nivel_tipo_localidade": "(nivel, id_tipo_evento, id_localidade)",
+    "idx_rollup_nivel_tipo_tempo": "(nivel, id_tipo_evento, id_tempo)",
+    "idx_rollup_nivel_tipo_ano": "(nivel, id_tipo_evento, ano)",
+}
+
+
+def _sql_criar(destino):
+    membros = ", ".join(COLUNAS_MEMBRO)
+    membros_f = ", ".join(f"f.{c}" for c in COLUNAS_MEMBRO)
+    tipos_anuais = ", ".join(map(str, TIPOS_ANUAIS))
+    # SUM ... FILTER (> 0) reproduz o "AND f.qtd_x > 0" dos endpoints: o rollup guarda NULL
+    # quando não há valor positivo, e o mesmo filtro continua funcionando sobre ele.
+    return f'''
+        CREATE TABLE {destino} AS
+        SELECT
+            CASE
+                WHEN GROUPING(id_localidade) = 0 THEN 'localidade'
+                WHEN GROUPING(id_tempo) = 0 THEN 'tempo'
+                ELSE 'total'
+            END::text AS nivel,
+            id_tipo_evento,
+            id_localidade,
+            id_tempo,
+            {membros},
+            SUM(qtd_internacoes) FILTER (WHERE qtd_internacoes > 0) AS qtd_internacoes,
+            SUM(qtd_obitos) FILTER (WHERE qtd_obitos > 0) AS qtd_obitos,
+            NULL::int AS ano
+        FROM fato_saude_mensal
+        WHERE id_tipo_evento IS NOT NULL
+        GROUP BY GROUPING SETS (
+            (id_tipo_evento, {membros}),
+            (id_tipo_evento, id_tempo, {membros}),
+            (id_tipo_evento, id_localidade, {membros})
+        )
+        HAVING SUM(qtd_internacoes) FILTER (WHERE qtd_internacoes > 0) IS NOT NULL
+            OR SUM(qtd_obitos) FILTER (WHERE qtd_obitos > 0) IS NOT NULL
+        UNION ALL
+        SELECT
+            '{NIVEL_ANUAL}',
+            f.id_tipo_evento,
+            f.id_localidade,
+            NULL,
+            {membros_f},
+            SUM(f.qtd_internacoes) FILTER (WHERE f.qtd_internacoes > 0),
+            SUM(f.qtd_obitos) FILTER (WHERE f.qtd_obitos > 0),
+            t.ano
+        FROM fato_saude_mensal f
+        JOIN dim_tempo t ON t.id_tempo = f.id_tempo
+        WHERE f.id_tipo_evento IN ({tipos_anuais})
+        GROUP BY f.id_tipo_evento, f.id_localidade, {membros_f}, t.ano
+        HAVING SUM(f.qtd_internacoes) FILTER (WHERE f.qtd_internacoes > 0) IS NOT NULL
+            OR SUM(f.qtd_obitos) FILTER (WHERE f.qtd_obitos > 0) IS NOT NULL;
+    '''
+
+
+def atualizar():
+    """Reconstrói a tabela de rollup e troca pela antiga numa única transação.
+
+    A transação é REPEATABLE READ e lê a versão dos dados antes de agregar: o rollup e a versão
+    gravada em rollup_controle vêm do mesmo snapshot, e uma carga que termine durante a
+    reconstrução deixa o rollup desatualizado (os endpoints voltam à tabela fato) em vez de
+    marcado como em dia sem as linhas dela.
+    """
+    novo = f"{TABELA}_novo"
+    inicio = time.monotonic()
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            cur.execute("SET LOCAL statement_timeout = 0")
+            versao = cache.versao_cursor(cur)
+            cur.execute(f"DROP TABLE IF EXISTS {novo}")
+            cur.execute(_sql_criar(novo))
+            for nome, colunas in INDICES.items():
+                cur.execute(f"CREATE INDEX {nome}_novo ON {novo} {colunas}")
+            cur.execute(f"ANALYZE {novo}")
+
+            cur.execute(f"DROP TABLE IF EXISTS {TABELA}")
+            cur.execute(f"ALTER TABLE {novo} RENAME TO {TABELA}")
+            for nome in INDICES:
+                cur.execute(f"ALTER INDEX {nome}_novo RENAME TO {nome}")
+
+            cur.execute(f'''
+                CREATE TABLE IF NOT EXISTS {TABELA_CONTROLE} (
+                    tabela text PRIMARY KEY,
+                    versao_dados text,
+                    atualizado_em timestamptz NOT NULL DEFAULT now()
+                )
+            ''')
+            cur.execute(
+                f'''
+                INSERT INTO {TABELA_CONTROLE} (tabela, versao_dados, atualizado_em)
+                VALUES (%s, %s, now())
+                ON CONFLICT (tabela) DO UPDATE
+                SET versao_dados = EXCLUDED.versao_dados, atualizado_em = EXCLUDED.atualizado_em
+                ''',
+                (TABELA, versao),
+            )
+            cur.execute(f"SELECT nivel, COUNT(*) AS linhas FROM {TABELA} GROUP BY nivel ORDER BY nivel")
+            niveis = {row["nivel"]: row["linhas"] for row in cur.fetchall()}
+    return {"versao_dados": versao, "linhas_por_nivel": niveis, "segundos": round(time.monotonic() - inicio, 1)}
+
+
+def status():
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL AS existe", (TABELA_CONTROLE,))
+            if not cur.fetchone()["existe"]:
+                return {"existe": False}
+            cur.execute(f"SELECT versao_dados, atualizado_em FROM {TABELA_CONTROLE} WHERE tabela = %s", (TABELA,))
+            row = cur.fetchone()
+            atual = cache.versao_cursor(cur)
+    if not row:
+        return {"existe": False}
+    return {
+        "existe": True,
+        "atualizado_em": row["atualizado_em"].isoformat(),
+        "versao_rollup": row["versao_dados"],
+        "versao_fato": atual,
+        "em_dia": row["versao_dados"] == atual,
+    }
+
+
+_estado = {"versao": None, "verificado_em": 0.0, "ativo": False}
+
+
+async def ativo():
+    """True se o rollup existe e foi gerado a partir da versão atual da tabela fato.
+
+    Rollup desatualizado (carga nova sem `atualizar`) nunca é usado: os endpoints voltam à tabela fato.
+    """
+    versao = await cache.versao_dados()
+    agora = time.monotonic()
+    if versao == _estado["versao"] and agora - _estado["verificado_em"] < config.CACHE_CHECK_VERSAO:
+        return _estado["ativo"]
+    try:
+        row = await fetch_one("SELECT to_regclass(%s) IS NOT NULL AS existe", (TABELA_CONTROLE,))
+        ok = False
+        if row and row["existe"]:
+            row = await fetch_one(f"SELECT versao_dados FROM {TABELA_CONTROLE} WHERE tabela = %s", (TABELA,))
+            ok = bool(row) and versao is not None and row["versao_dados"] == versao
+    except Exception:
+        ok = False
+    _estado.update(versao=versao, verificado_em=agora, ativo=ok)
+    return ok
+
+
+async def origem(localidade=False, tempo=False, anual=False):
+    """Escolhe de onde um endpoint lê: o nível de rollup que atende aos filtros, ou a tabela fato.
+
+    `localidade`: a consulta filtra/agrupa por município; `tempo`: filtra/agrupa por id_tempo;
+    `anual`: o filtro de tempo é só de anos inteiros, então município + tempo pode usar o nível
+    localidade_ano (a consulta filtra por f.ano; ver por_ano()).
+    Retorna (tabela, condição) para montar `FROM {tabela} WHERE f.id_tipo_evento = X{condição}`.
+    """
+    if localidade and tempo and not anual:
+        return FATO
+    if not await ativo():
+        return FATO
+    if localidade and tempo:
+        nivel = NIVEL_ANUAL
+    else:
+        nivel = "localidade" if localidade else "tempo" if tempo else "total"
+    return f"{TABELA} f", f" AND f.nivel = '{nivel}'"
+
+
+def por_ano(origem):
+    """True se `origem` é o nível localidade_ano (filtro de tempo sobre f.ano, não f.id_tempo)."""
+    return origem[1].endswith(f"'{NIVEL_ANUAL}'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rollups de fato_saude_mensal")
+    parser.add_argument("comando", choices=["atualizar", "status"])
+    args = parser.parse_args()
+    if args.comando == "atualizar":
+        print(atualizar())
+    else:
+        print(status())
+
+
+if __name__ == "__main__":
+    main()
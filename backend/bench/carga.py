@@ -0,0 +1,276 @@
+"""Teste de carga: usuários virtuais repetindo sessões reais do dashboard.
+
+Cada usuário virtual repete, até o fim da rodada, uma sessão como a do frontend:
+
+1. abre a home (App.jsx: GET /api/dashboard?limit=5000);
+2. navega por 1 a 3 páginas de gráfico; cada página pede /api/localidades e o endpoint
+   da página ao mesmo tempo (ex.: InternacoesCidCapPage → /api/internacoes/cid-cap);
+3. em cada página aplica de 0 a 3 filtros (município, ano, mês, conforme a página aceita).
+
+Entre as ações há uma pausa aleatória (exponencial, média `--pausa` s). As escolhas usam
+`--semente`, então duas execuções fazem a mesma sequência de requisições.
+
+Em cada nível de concorrência são medidos throughput, latências (geral e por endpoint) e
+erros; do lado da API, /api/debug/pool é amostrado a cada segundo (conexões em uso e
+filas dos pools, fila do threadpool) e, com --dsn, o pg_stat_activity do banco. O relatório
+aponta a capacidade (maior nível dentro do SLO) e o ponto de saturação (onde o throughput
+para de crescer).
+
+    python -m bench.carga --dsn $BENCH_DATABASE_URL --usuarios 1 5 10 25 50 100 --duracao 60
+    ADMIN_TOKEN=... python -m bench.carga --url http://127.0.0.1:8000 --usuarios 10 20 --pausa 0
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import time
+
+import httpx
+import psycopg2
+
+from .comum import CABECALHO_ADMIN, commit_atual, resumo_latencias, servidor
+
+HOME = ("/api/dashboard", {"limit": 5000})
+
+# página -> (endpoint, filtros que a página envia)
+PAGINAS = {
+    "InternacoesCidCapPage": ("/api/internacoes/cid-cap", ("municipio", "ano", "mes")),
+    "ObitosCidCapPage": ("/api/obitos/cid-cap", ("municipio", "ano", "mes")),
+    "SerieMensalPage": ("/api/series/mensal", ("municipio", "ano_inicio", "ano_fim", "mes")),
+    "InternacoesSexoPage": ("/api/internacoes/sexo", ("municipio",)),
+    "InternacoesFaixaPage": ("/api/internacoes/faixa", ("municipio",)),
+    "ObitosRacaPage": ("/api/obitos/raca", ("municipio",)),
+    "ObitosEstadoCivilPage": ("/api/obitos/estado-civil", ("municipio",)),
+    "ObitosLocalPage": ("/api/obitos/local", ("municipio",)),
+}
+
+ANOS = list(range(1996, 2024))
+
+
+class Rodada:
+    def __init__(self):
+        self.requisicoes = []  # (endpoint, ms, status)
+        self.sessoes = 0
+        self.amostras = []
+        self.banco = []
+
+
+def _filtros(rng, aceitos, municipios):
+    params = {}
+    if "municipio" in aceitos and rng.random() < 0.5:
+        params["id_localidade"] = rng.choice(municipios)
+    if "ano" in aceitos and rng.random() < 0.7:
+        params["ano"] = rng.choice(ANOS)
+    if "ano_inicio" in aceitos and rng.random() < 0.6:
+        inicio = rng.choice(ANOS)
+        params["ano_inicio"] = inicio
+        params["ano_fim"] = rng.choice([a for a in ANOS if a >= inicio])
+    if "mes" in aceitos and rng.random() < 0.3:
+        params["mes"] = rng.randint(1, 12)
+    if not params and "municipio" in aceitos:
+        params["id_localidade"] = rng.choice(municipios)
+    return params
+
+
+async def _pedir(cliente, rodada, caminho, params=None):
+    t0 = time.perf_counter()
+    try:
+        resposta = await cliente.get(caminho, params=params)
+        status = resposta.status_code
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    rodada.requisicoes.append((caminho, (time.perf_counter() - t0) * 1000, status))
+
+
+async def _pausa(rng, media, fim):
+    if media > 0:
+        await asyncio.sleep(min(rng.expovariate(1 / media), max(0.0, fim - time.monotonic())))
+
+
+async def _usuario(cliente, rodada, rng, municipios, pausa, fim):
+    while time.monotonic() < fim:
+        await _pedir(cliente, rodada, *HOME)
+        await _pausa(rng, pausa, fim)
+        for _ in range(rng.randint(1, 3)):
+            if time.monotonic() >= fim:
+                return
+            caminho, aceitos = PAGINAS[rng.choice(list(PAGINAS))]
+            await asyncio.gather(_pedir(cliente, rodada, "/api/localidades"), _pedir(cliente, rodada, caminho))
+            await _pausa(rng, pausa, fim)
+            for _ in range(rng.randint(0, 3)):
+                if time.monotonic() >= fim:
+                    return
+                await _pedir(cliente, rodada, caminho, _filtros(rng, aceitos, municipios))
+                await _pausa(rng, pausa, fim)
+        rodada.sessoes += 1
+
+
+def _conexoes_banco(dsn):
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT COALESCE(state, 'desconhecido'), COUNT(*)
+                FROM pg_stat_activity
+                WHERE datname = current_database() AND pid != pg_backend_pid()
+                GROUP BY 1
+            """)
+            return dict(cur.fetchall())
+    finally:
+        conn.close()
+
+
+async def _amostrar(url, dsn, rodada, parar):
+    async with httpx.AsyncClient(base_url=url, timeout=10) as cliente:
+        while not parar.is_set():
+            try:
+                rodada.amostras.append((await cliente.get("/api/debug/pool")).json())
+            except (httpx.HTTPError, ValueError):
+                pass
+            if dsn:
+                try:
+                    rodada.banco.append(await asyncio.to_thread(_conexoes_banco, dsn))
+                except psycopg2.Error:
+                    pass
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(parar.wait(), timeout=1)
+
+
+def _max_medio(valores):
+    valores = [v for v in valores if v is not None]
+    if not valores:
+        return None
+    return {"max": max(valores), "medio": round(sum(valores) / len(valores), 2)}
+
+
+def _resumo_app(amostras, banco):
+    def campo(secao, chave):
+        return [(a.get(secao) or {}).get(chave) for a in amostras]
+
+    resumo = {
+        "amostras": len(amostras),
+        "threadpool_em_uso": _max_medio(campo("threadpool", "em_uso")),
+        "threadpool_aguardando": _max_medio(campo("threadpool", "aguardando")),
+        "pool_sync_em_uso": _max_medio(campo("sync", "em_uso")),
+        "pool_sync_aguardando": _max_medio(campo("sync", "aguardando")),
+        "pool_async_tamanho": _max_medio(campo("async", "pool_size")),
+        "pool_async_disponiveis": _max_medio(campo("async", "pool_available")),
+        "pool_async_aguardando": _max_medio(campo("async", "requests_waiting")),
+    }
+    if banco:
+        estados = sorted({estado for amostra in banco for estado in amostra})
+        resumo["conexoes_banco"] = {estado: _max_medio([a.get(estado, 0) for a in banco]) for estado in estados}
+        resumo["conexoes_banco"]["total"] = _max_medio([sum(a.values()) for a in banco])
+    return resumo
+
+
+async def _rodada(url, dsn, usuarios, duracao, pausa, semente, municipios):
+    rodada = Rodada()
+    parar = asyncio.Event()
+    limites = httpx.Limits(max_connections=usuarios * 2)
+    async with httpx.AsyncClient(base_url=url, timeout=300, limits=limites) as cliente:
+        # Cada nível começa com o cache de resultados vazio
+        (await cliente.post("/api/debug/cache/limpar", headers=CABECALHO_ADMIN)).raise_for_status()
+        amostrador = asyncio.create_task(_amostrar(url, dsn, rodada, parar))
+        inicio = time.monotonic()
+        fim = inicio + duracao
+        await asyncio.gather(*(
+            _usuario(cliente, rodada, random.Random(f"{semente}-{i}"), municipios, pausa, fim)
+            for i in range(usuarios)
+        ))
+        decorrido = time.monotonic() - inicio
+        parar.set()
+        await amostrador
+
+    ok = [ms for _, ms, status in rodada.requisicoes if status == 200]
+    erros = len(rodada.requisicoes) - len(ok)
+    por_endpoint = {}
+    for caminho, ms, status in rodada.requisicoes:
+        if status == 200:
+            por_endpoint.setdefault(caminho, []).append(ms)
+    return {
+        "usuarios": usuarios,
+        "duracao_s": round(decorrido, 1),
+        "sessoes": rodada.sessoes,
+        "requisicoes": len(rodada.requisicoes),
+        "erros": erros,
+        "taxa_erros": round(erros / len(rodada.requisicoes), 4) if rodada.requisicoes else 0.0,
+        "throughput_rps": round(len(ok) / decorrido, 2),
+        **resumo_latencias(ok),
+        "por_endpoint": {caminho: resumo_latencias(lat) for caminho, lat in sorted(por_endpoint.items())},
+        "app": _resumo_app(rodada.amostras, rodada.banco),
+    }
+
+
+def saturacao(niveis, slo_p95_ms, max_erros, ganho_minimo=0.1):
+    """Capacidade (maior nível dentro do SLO) e primeiro nível em que o throughput parou de crescer."""
+    capacidade, saturado = None, None
+    anterior = None
+    for nivel in niveis:
+        dentro = (nivel["p95_ms"] is not None and nivel["p95_ms"] <= slo_p95_ms
+                  and nivel["taxa_erros"] <= max_erros)
+        if dentro:
+            capacidade = nivel["usuarios"]
+        if saturado is None and anterior is not None:
+            ganho = (nivel["throughput_rps"] - anterior["throughput_rps"]) / anterior["throughput_rps"] if anterior["throughput_rps"] else 0
+            if ganho < ganho_minimo:
+                saturado = {"usuarios": nivel["usuarios"], "motivo": f"throughput cresceu {ganho:.0%} sobre {anterior['usuarios']} usuários"}
+        if saturado is None and not dentro:
+            saturado = {"usuarios": nivel["usuarios"], "motivo": "fora do SLO (p95 ou erros)"}
+        anterior = nivel
+    return {"slo_p95_ms": slo_p95_ms, "max_erros": max_erros, "capacidade_usuarios": capacidade, "saturacao": saturado}
+
+
+@contextlib.contextmanager
+def _alvo(url, dsn, env_extra):
+    if url:
+        yield url
+        return
+    env = dict(env_extra)
+    if dsn:
+        env["DATABASE_URL"] = dsn
+    with servidor(env) as local:
+        yield local
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="API já em execução (padrão: sobe um uvicorn de 1 worker)")
+    parser.add_argument("--dsn", default=os.getenv("BENCH_DATABASE_URL"),
+                        help="banco da API; também usado para amostrar pg_stat_activity")
+    parser.add_argument("--usuarios", type=int, nargs="+", default=[1, 5, 10, 25, 50, 100])
+    parser.add_argument("--duracao", type=float, default=60, help="segundos por nível")
+    parser.add_argument("--pausa", type=float, default=2.0, help="pausa média entre ações (s); 0 = sem pausa")
+    parser.add_argument("--semente", default="sims")
+    parser.add_argument("--slo-p95-ms", type=float, default=1000)
+    parser.add_argument("--max-erros", type=float, default=0.01)
+    parser.add_argument("--env", action="append", default=[], metavar="VAR=VALOR",
+                        help="variável de ambiente extra para a API iniciada aqui (ex.: DB_ASYNC=false)")
+    parser.add_argument("--saida", help="arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args()
+
+    env_extra = dict(item.split("=", 1) for item in args.env)
+    resultado = {
+        "commit": commit_atual(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("dsn", "saida")},
+        "niveis": [],
+    }
+    with _alvo(args.url, args.dsn, env_extra) as url:
+        municipios = [m["id_localidade"] for m in httpx.get(f"{url}/api/localidades", timeout=60).json()]
+        for usuarios in args.usuarios:
+            nivel = asyncio.run(_rodada(url, args.dsn, usuarios, args.duracao, args.pausa, args.semente, municipios))
+            resultado["niveis"].append(nivel)
+    resultado["resumo"] = saturacao(resultado["niveis"], args.slo_p95_ms, args.max_erros)
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Paridade e latência do motor colunar (DuckDB sobre o snapshot Parquet) contra o PostgreSQL.
+
+Exporta o snapshot da versão atual (ou reaproveita o de SNAPSHOT_DIR) e roda cada consulta
+registrada em app/planos.py, com seus parâmetros padrão, nos dois motores:
+
+- postgres: a origem que o endpoint usaria (rollup quando atende, senão a tabela fato)
+- duckdb:   a tabela fato do snapshot, como em MOTOR_CONSULTAS=duckdb
+
+A paridade compara o resultado já decorado (o que o endpoint devolve): `igual`,
+`igual_fora_ordem` (mesmas linhas, empates ordenados de outro jeito) ou `diferente`.
+A latência é da execução + leitura das linhas, em rodadas alternadas entre os motores.
+
+    python -m bench.sintetico --dsn $BENCH_DATABASE_URL --recriar --indices --rollups
+    python -m bench.colunar --dsn $BENCH_DATABASE_URL [--repeticoes 20] [--exportar] --saida colunar.json
+
+Termina com código 1 se algum resultado for `diferente`. Requer requirements-colunar.txt.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from .comum import commit_atual, resumo_latencias
+
+
+def _canonico(valor):
+    return json.dumps(valor, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def paridade(esperado, obtido):
+    if esperado == obtido:
+        return "igual"
+    if isinstance(esperado, list) and isinstance(obtido, list) and \
+            sorted(map(_canonico, esperado)) == sorted(map(_canonico, obtido)):
+        return "igual_fora_ordem"
+    return "diferente"
+
+
+def _diferencas(esperado, obtido, limite=5):
+    if not isinstance(esperado, list) or not isinstance(obtido, list):
+        return {"postgres": esperado, "duckdb": obtido}
+    a, b = set(map(_canonico, esperado)), set(map(_canonico, obtido))
+    return {"so_postgres": sorted(a - b)[:limite], "so_duckdb": sorted(b - a)[:limite]}
+
+
+async def _medir(repeticoes):
+    from app import colunar, db, dimensoes, planos, rollups
+
+    await dimensoes.garantir()
+    resultados = []
+    for nome, spec in planos.CONSULTAS.items():
+        for params in spec["padrao"]:
+            origem = await rollups.origem(
+                localidade=spec["localidade"](params), tempo=spec["tempo"](params),
+                anual=spec.get("anual", lambda p: False)(params),
+            )
+            sql_pg, params_pg, decorar = spec["montar"](origem, **params)
+            sql_duck, params_duck, decorar_duck = spec["montar"](rollups.FATO, **params)
+            motores = {
+                "postgres": lambda: db.fetch_tuplas(sql_pg, params_pg, timeout=spec.get("timeout")),
+                "duckdb": lambda: colunar.fetch_tuplas(sql_duck, params_duck),
+            }
+            # Primeira rodada (fora da medição) serve à paridade e aquece cache do banco e do snapshot
+            esperado, obtido = decorar(motores["postgres"]()), decorar_duck(motores["duckdb"]())
+            latencias = {motor: [] for motor in motores}
+            for _ in range(repeticoes):
+                for motor, executar in motores.items():
+                    inicio = time.perf_counter()
+                    executar()
+                    latencias[motor].append((time.perf_counter() - inicio) * 1000)
+            resumo = {motor: resumo_latencias(valores) for motor, valores in latencias.items()}
+            estado = paridade(esperado, obtido)
+            resultado = {
+                "consulta": nome,
+                "parametros": params,
+                "origem_postgres": origem[0].split()[0],
+                "paridade": estado,
+                **resumo,
+                "aceleracao_p50": round(resumo["postgres"]["p50_ms"] / resumo["duckdb"]["p50_ms"], 2)
+                if resumo["duckdb"]["p50_ms"] else None,
+            }
+            if estado == "diferente":
+                resultado["diferencas"] = _diferencas(esperado, obtido)
+            resultados.append(resultado)
+            print(f"{nome} {json.dumps(params)}: {estado}, p50 postgres {resumo['postgres']['p50_ms']} ms, "
+                  f"duckdb {resumo['duckdb']['p50_ms']} ms", file=sys.stderr)
+    return resultados
+
+
+async def _executar(args):
+    from app import colunar, db, db_async
+
+    try:
+        manifesto = colunar.exportar(forcar=args.exportar)
+        colunar.carregar()
+        return manifesto, await _medir(args.repeticoes)
+    finally:
+        await db_async.close_pool()
+        db.close_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("BENCH_DATABASE_URL"), help="banco (padrão: $BENCH_DATABASE_URL)")
+    parser.add_argument("--repeticoes", type=int, default=20)
+    parser.add_argument("--exportar", action="store_true", help="exporta o snapshot de novo mesmo se já existir")
+    parser.add_argument("--saida", help="arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args()
+
+    if args.dsn:
+        # app.config lê DATABASE_URL na importação
+        os.environ["DATABASE_URL"] = args.dsn
+    manifesto, consultas = asyncio.run(_executar(args))
+    resultado = {
+        "commit": commit_atual(),
+        "repeticoes": args.repeticoes,
+        "snapshot": manifesto,
+        "consultas": consultas,
+        "diferentes": sum(c["paridade"] == "diferente" for c in consultas),
+    }
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(texto)
+    else:
+        print(texto)
+    sys.exit(1 if resultado["diferentes"] else 0)
+
+
+if __name__ == "__main__":
+    main()
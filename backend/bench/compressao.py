@@ -0,0 +1,92 @@
+"""Bytes economizados e custo de CPU da compressão, por endpoint e nível.
+
+Sobe a API, baixa cada resposta da home sem compressão (Accept-Encoding: identity) e mede
+gzip e brotli em vários níveis sobre o mesmo corpo. No fim, repete as requisições com
+compressão e lê /api/debug/compressao para conferir o que o middleware fez de fato
+(incluindo os acertos do cache de corpos comprimidos).
+
+    python -m bench.compressao [--repeticoes 20] [--saida resultado.json]
+"""
+import argparse
+import gzip
+import json
+import statistics
+import time
+
+import httpx
+
+from .comum import ENDPOINTS_HOME, commit_atual, servidor
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENDPOINTS = ENDPOINTS_HOME + ["/api/localidades", "/api/dashboard", "/api/internacoes/cid-por-estado"]
+
+NIVEIS = {
+    "gzip": [1, 6, 9],
+    "br": [1, 5, 9, 11],
+}
+
+
+def _comprimir(codificacao, nivel, corpo):
+    if codificacao == "br":
+        return brotli.compress(corpo, quality=nivel)
+    return gzip.compress(corpo, compresslevel=nivel, mtime=0)
+
+
+def _medir(corpo, repeticoes):
+    resultado = {}
+    for codificacao, niveis in NIVEIS.items():
+        if codificacao == "br" and brotli is None:
+            continue
+        for nivel in niveis:
+            tempos = []
+            for _ in range(repeticoes):
+                inicio = time.process_time()
+                comprimido = _comprimir(codificacao, nivel, corpo)
+                tempos.append(time.process_time() - inicio)
+            resultado[f"{codificacao}-{nivel}"] = {
+                "bytes": len(comprimido),
+                "razao": round(len(comprimido) / len(corpo), 3) if corpo else None,
+                "cpu_ms": round(statistics.median(tempos) * 1000, 3),
+            }
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=20)
+    parser.add_argument("--saida", help="arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args()
+
+    resultado = {"commit": commit_atual(), "endpoints": {}}
+    with servidor() as url:
+        with httpx.Client(base_url=url, timeout=300) as cliente:
+            for endpoint in ENDPOINTS:
+                resposta = cliente.get(endpoint, headers={"Accept-Encoding": "identity"})
+                corpo = resposta.content
+                resultado["endpoints"][endpoint] = {
+                    "status": resposta.status_code,
+                    "bytes_original": len(corpo),
+                    "niveis": _medir(corpo, args.repeticoes),
+                }
+
+            # Servidor de verdade: primeira requisição comprime, as seguintes vêm do cache
+            for codificacao in ("gzip", "br"):
+                for _ in range(3):
+                    for endpoint in ENDPOINTS:
+                        cliente.get(endpoint, headers={"Accept-Encoding": codificacao})
+            resultado["middleware"] = cliente.get("/api/debug/compressao").json()
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Utilitários compartilhados pelos scripts de benchmark (não usados pela API)."""
+import contextlib
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Rotas de manutenção (ex.: POST /api/debug/cache/limpar) exigem ADMIN_TOKEN: o do ambiente
+# (API já em execução, --url) ou um aleatório passado ao servidor que servidor() sobe
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN") or secrets.token_urlsafe(16)
+CABECALHO_ADMIN = {"Authorization": f"Bearer {ADMIN_TOKEN}"}
+
+# Requisições disparadas pela HomePage/App.jsx ao abrir o dashboard
+ENDPOINTS_HOME = [
+    "/api/internacoes/cid-cap",
+    "/api/obitos/cid-cap",
+    "/api/obitos/local",
+    "/api/series/mensal?limit=5000",
+    "/api/internacoes/sexo",
+    "/api/obitos/raca",
+    "/api/internacoes/faixa",
+    "/api/obitos/estado-civil",
+    "/api/periodo-dados",
+    "/api/dados/por-estado",
+]
+
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    k = (len(ordenados) - 1) * p / 100
+    i = int(k)
+    j = min(i + 1, len(ordenados) - 1)
+    return ordenados[i] + (ordenados[j] - ordenados[i]) * (k - i)
+
+
+def resumo_latencias(latencias_ms):
+    return {
+        "n": len(latencias_ms),
+        "p50_ms": _arred(percentil(latencias_ms, 50)),
+        "p95_ms": _arred(percentil(latencias_ms, 95)),
+        "p99_ms": _arred(percentil(latencias_ms, 99)),
+        "max_ms": _arred(max(latencias_ms) if latencias_ms else None),
+    }
+
+
+def _arred(v):
+    return round(v, 2) if v is not None else None
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def servidor(env_extra=None, workers=None, timeout=60):
+    """Sobe `uvicorn app.main:app` num subprocesso e devolve a URL base."""
+    porta = porta_livre()
+    # Medições partem do cache frio: o aquecimento só roda se pedido (AQUECER=true)
+    env = {"AQUECER": "false", **os.environ, "ADMIN_TOKEN": ADMIN_TOKEN, **(env_extra or {})}
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+           "--port", str(porta), "--log-level", "warning"]
+    if workers:
+        cmd += ["--workers", str(workers)]
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env)
+    url = f"http://127.0.0.1:{porta}"
+    try:
+        limite = time.monotonic() + timeout
+        while True:
+            try:
+                if httpx.get(f"{url}/api/health", timeout=2).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if proc.poll() is not None or time.monotonic() > limite:
+                raise RuntimeError(f"Servidor não subiu em {url}")
+            time.sleep(0.3)
+        yield url
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def commit_atual():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except Exception:
+        return None
+
+
+def ler_metricas(texto):
+    """Converte o texto de /metrics em {(nome, (("label", "valor"), ...)): valor}."""
+    valores = {}
+    for linha in texto.splitlines():
+        if not linha or linha.startswith("#"):
+            continue
+        serie, _, valor = linha.rpartition(" ")
+        nome, _, labels = serie.partition("{")
+        pares = []
+        for par in labels.rstrip("}").split('",') if labels else []:
+            chave, _, v = par.partition("=")
+            pares.append((chave, v.strip('"')))
+        valores[(nome, tuple(pares))] = float(valor)
+    return valores
+
+
+def soma_por_rota(metricas, nome, rota):
+    """Valor de `nome` (ex.: db_execute_seconds_sum) para a rota, ou 0."""
+    return metricas.get((nome, (("rota", rota),)), 0.0)
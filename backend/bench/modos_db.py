@@ -0,0 +1,76 @@
+"""Compara o modo assíncrono (psycopg 3) com o modo threadpool (psycopg2) sob carga.
+
+Cada usuário virtual abre o dashboard como a HomePage faz (todas as requisições da
+home em paralelo), repetidamente, durante `--duracao` segundos.
+
+    python -m bench.modos_db --usuarios 10 50 100 --duracao 30
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from .comum import ENDPOINTS_HOME, commit_atual, resumo_latencias, servidor
+
+
+async def _usuario(client, fim, latencias, erros):
+    while time.monotonic() < fim:
+        async def uma(path):
+            t0 = time.perf_counter()
+            try:
+                r = await client.get(path)
+                if r.status_code != 200:
+                    erros.append(r.status_code)
+                    return
+            except httpx.HTTPError as e:
+                erros.append(type(e).__name__)
+                return
+            latencias.append((time.perf_counter() - t0) * 1000)
+        await asyncio.gather(*(uma(p) for p in ENDPOINTS_HOME))
+
+
+async def _rodada(url, usuarios, duracao):
+    latencias, erros = [], []
+    limites = httpx.Limits(max_connections=usuarios * len(ENDPOINTS_HOME))
+    async with httpx.AsyncClient(base_url=url, timeout=300, limits=limites) as client:
+        inicio = time.monotonic()
+        fim = inicio + duracao
+        await asyncio.gather(*(_usuario(client, fim, latencias, erros) for _ in range(usuarios)))
+        decorrido = time.monotonic() - inicio
+        pool = (await client.get("/api/debug/pool")).json()
+    return {
+        "usuarios": usuarios,
+        "requisicoes": len(latencias),
+        "erros": len(erros),
+        "throughput_rps": round(len(latencias) / decorrido, 2),
+        **resumo_latencias(latencias),
+        "pool": pool,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--usuarios", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--duracao", type=float, default=30)
+    parser.add_argument("--saida", help="arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args()
+
+    resultado = {"commit": commit_atual(), "modos": {}}
+    for modo, valor in (("async", "true"), ("threadpool", "false")):
+        with servidor({"DB_ASYNC": valor}) as url:
+            # Aquece conexões antes de medir
+            asyncio.run(_rodada(url, 1, 2))
+            resultado["modos"][modo] = [asyncio.run(_rodada(url, n, args.duracao)) for n in args.usuarios]
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Compara as consultas antigas (duas varreduras + FULL OUTER JOIN) com a passagem única
+(agregação condicional) de /api/series/mensal e /api/dados/por-estado.
+
+Roda direto na tabela fato (sem rollup) com EXPLAIN ANALYZE, em escopo nacional e municipal:
+
+    python -m bench.passagem_unica --repeticoes 5 [--id-localidade 3550308]
+"""
+import argparse
+import json
+import statistics
+
+from app.db import get_connection
+
+from .comum import commit_atual
+
+SERIE_ANTIGA = '''
+    WITH tempo_filtrado AS (
+        SELECT id_tempo, ano, mes FROM dim_tempo WHERE id_tempo IS NOT NULL AND id_tempo != 0
+    )
+    SELECT
+        COALESCE(i.ano, o.ano) AS ano,
+        COALESCE(i.mes, o.mes) AS mes,
+        CONCAT(COALESCE(i.ano, o.ano), '-', LPAD(COALESCE(i.mes, o.mes)::text, 2, '0')) AS ano_mes,
+        COALESCE(i.internacoes, 0) AS internacoes,
+        COALESCE(o.obitos, 0) AS obitos
+    FROM (
+        SELECT t.ano, t.mes, SUM(f.qtd_internacoes) AS internacoes
+        FROM fato_saude_mensal f
+        INNER JOIN tempo_filtrado t ON f.id_tempo = t.id_tempo
+        WHERE f.id_tempo IS NOT NULL AND f.id_tempo != 0
+          AND f.id_tipo_evento = 3 AND f.qtd_internacoes > 0 {filtro}
+        GROUP BY t.ano, t.mes
+    ) i
+    FULL OUTER JOIN (
+        SELECT t.ano, t.mes, SUM(f.qtd_obitos) AS obitos
+        FROM fato_saude_mensal f
+        INNER JOIN tempo_filtrado t ON f.id_tempo = t.id_tempo
+        WHERE f.id_tempo IS NOT NULL AND f.id_tempo != 0
+          AND f.id_tipo_evento = 4 AND f.qtd_obitos > 0 {filtro}
+        GROUP BY t.ano, t.mes
+    ) o ON i.ano = o.ano AND i.mes = o.mes
+    ORDER BY COALESCE(i.ano, o.ano), COALESCE(i.mes, o.mes)
+    LIMIT 5000
+'''
+
+SERIE_NOVA = '''
+    WITH tempo_filtrado AS (
+        SELECT id_tempo, ano, mes FROM dim_tempo WHERE id_tempo IS NOT NULL AND id_tempo != 0
+    )
+    SELECT
+        t.ano, t.mes,
+        CONCAT(t.ano, '-', LPAD(t.mes::text, 2, '0')) AS ano_mes,
+        COALESCE(SUM(f.qtd_internacoes) FILTER (WHERE f.id_tipo_evento = 3), 0) AS internacoes,
+        COALESCE(SUM(f.qtd_obitos) FILTER (WHERE f.id_tipo_evento = 4), 0) AS obitos
+    FROM fato_saude_mensal f
+    INNER JOIN tempo_filtrado t ON f.id_tempo = t.id_tempo
+    WHERE f.id_tempo IS NOT NULL AND f.id_tempo != 0
+      AND f.id_tipo_evento IN (3, 4)
+      AND ((f.id_tipo_evento = 3 AND f.qtd_internacoes > 0) OR (f.id_tipo_evento = 4 AND f.qtd_obitos > 0))
+      {filtro}
+    GROUP BY t.ano, t.mes
+    ORDER BY t.ano, t.mes
+    LIMIT 5000
+'''
+
+ESTADO_ANTIGA = '''
+    SELECT
+        COALESCE(i.uf, o.uf) AS uf,
+        COALESCE(i.total_internacoes, 0) AS total_internacoes,
+        COALESCE(o.total_obitos, 0) AS total_obitos
+    FROM (
+        SELECT l.uf, SUM(f.qtd_internacoes) AS total_internacoes
+        FROM fato_saude_mensal f
+        INNER JOIN dim_localidade l ON f.id_localidade = l.id_localidade
+        WHERE l.uf IS NOT NULL AND f.id_tipo_evento = 3 AND f.qtd_internacoes > 0
+        GROUP BY l.uf
+    ) i
+    FULL OUTER JOIN (
+        SELECT l.uf, SUM(f.qtd_obitos) AS total_obitos
+        FROM fato_saude_mensal f
+        INNER JOIN dim_localidade l ON f.id_localidade = l.id_localidade
+        WHERE l.uf IS NOT NULL AND f.id_tipo_evento = 4 AND f.qtd_obitos > 0
+        GROUP BY l.uf
+    ) o ON i.uf = o.uf
+    ORDER BY COALESCE(i.uf, o.uf)
+'''
+
+ESTADO_NOVA = '''
+    SELECT
+        l.uf,
+        COALESCE(SUM(f.qtd_internacoes) FILTER (WHERE f.id_tipo_evento = 3), 0) AS total_internacoes,
+        COALESCE(SUM(f.qtd_obitos) FILTER (WHERE f.id_tipo_evento = 4), 0) AS total_obitos
+    FROM fato_saude_mensal f
+    INNER JOIN dim_localidade l ON f.id_localidade = l.id_localidade
+    WHERE l.uf IS NOT NULL
+      AND f.id_tipo_evento IN (3, 4)
+      AND ((f.id_tipo_evento = 3 AND f.qtd_internacoes > 0) OR (f.id_tipo_evento = 4 AND f.qtd_obitos > 0))
+    GROUP BY l.uf
+    ORDER BY l.uf
+'''
+
+
+def _medir(cur, sql, params, repeticoes):
+    tempos, buffers = [], []
+    for _ in range(repeticoes):
+        cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, params)
+        row = cur.fetchone()
+        plano = (row["QUERY PLAN"] if isinstance(row, dict) else row[0])[0]
+        tempos.append(plano["Execution Time"])
+        raiz = plano["Plan"]
+        buffers.append(raiz.get("Shared Hit Blocks", 0) + raiz.get("Shared Read Blocks", 0))
+    return {"mediana_ms": round(statistics.median(tempos), 2), "min_ms": round(min(tempos), 2),
+            "buffers": int(statistics.median(buffers))}
+
+
+def _comparar(cur, antiga, params_antiga, nova, params_nova, repeticoes):
+    cur.execute(antiga, params_antiga)
+    r_antiga = [dict(r) for r in cur.fetchall()]
+    cur.execute(nova, params_nova)
+    r_nova = [dict(r) for r in cur.fetchall()]
+    a = _medir(cur, antiga, params_antiga, repeticoes)
+    n = _medir(cur, nova, params_nova, repeticoes)
+    return {
+        "antiga": a,
+        "nova": n,
+        "ganho": round(a["mediana_ms"] / n["mediana_ms"], 2) if n["mediana_ms"] else None,
+        "resultados_iguais": r_antiga == r_nova,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--id-localidade", type=int, help="município do cenário municipal (padrão: o de maior volume)")
+    args = parser.parse_args()
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL statement_timeout = 0")
+            id_localidade = args.id_localidade
+            if id_localidade is None:
+                cur.execute('''
+                    SELECT id_localidade FROM fato_saude_mensal
+                    WHERE id_tipo_evento = 3 GROUP BY id_localidade
+                    ORDER BY SUM(qtd_internacoes) DESC NULLS LAST LIMIT 1
+                ''')
+                id_localidade = cur.fetchone()["id_localidade"]
+
+            filtro = "AND f.id_localidade = %s"
+            resultado = {
+                "commit": commit_atual(),
+                "id_localidade": id_localidade,
+                "series_mensal_nacional": _comparar(
+                    cur, SERIE_ANTIGA.format(filtro=""), [], SERIE_NOVA.format(filtro=""), [], args.repeticoes),
+                "series_mensal_municipio": _comparar(
+                    cur, SERIE_ANTIGA.format(filtro=filtro), [id_localidade, id_localidade],
+                    SERIE_NOVA.format(filtro=filtro), [id_localidade], args.repeticoes),
+                "dados_por_estado_nacional": _comparar(cur, ESTADO_ANTIGA, [], ESTADO_NOVA, [], args.repeticoes),
+            }
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Microbenchmark da serialização das respostas, sem banco.
+
+Compara, com linhas sintéticas do tamanho das respostas reais:
+
+- antigo:  um dict por linha (RealDictCursor) + cópia (rows_to_dicts) + jsonable_encoder
+           sobre somas Decimal + json.dumps (JSONResponse)
+- novo:    tuplas com int (somas ::bigint) + decoração de consultas.py + orjson
+- colunar: o novo com ?formato=colunas ({columns, rows})
+
+    python -m bench.serializacao [--repeticoes 200] [--saida resultado.json]
+"""
+import argparse
+import json
+import random
+import statistics
+import timeit
+from decimal import Decimal
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from app import consultas, dimensoes
+from app.respostas import colunar
+from app.rollups import FATO
+
+from .comum import commit_atual
+
+UFS = ["AC", "AL", "AM", "AP", "BA", "CE", "DF", "ES", "GO", "MA", "MG", "MS", "MT", "PA",
+       "PB", "PE", "PI", "PR", "RJ", "RN", "RO", "RR", "RS", "SC", "SE", "SP", "TO"]
+N_MUNICIPIOS = 5570
+ANOS = range(1996, 2024)
+
+
+def _dimensoes_sinteticas():
+    periodos = [(ano, mes) for ano in ANOS for mes in range(1, 13)]
+    dimensoes.tempo = {i: periodo for i, periodo in enumerate(periodos, start=1)}
+    dimensoes._tempo_ids = sorted(dimensoes.tempo)
+    dimensoes.localidades = {i: (f"Município {i}", UFS[i % len(UFS)]) for i in range(1, N_MUNICIPIOS + 1)}
+    dimensoes._localidades_lista = [
+        {"id_localidade": i, "municipio": municipio, "uf": uf}
+        for i, (municipio, uf) in dimensoes.localidades.items()
+    ]
+    dimensoes.capitulos = {1: ("I", "Algumas doenças infecciosas e parasitárias")}
+
+
+def _antigo(colunas, linhas):
+    rows = [dict(zip(colunas, linha)) for linha in linhas]  # RealDictCursor
+    rows = [dict(row) for row in rows]                       # rows_to_dicts
+    conteudo = jsonable_encoder(rows)
+    return json.dumps(conteudo, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def _cenarios():
+    aleatorio = random.Random(42)
+    cenarios = {}
+
+    # /api/series/mensal: 336 meses
+    valores = {id_tempo: (aleatorio.randint(10**5, 10**6), aleatorio.randint(10**4, 10**5)) for id_tempo in dimensoes.tempo}
+    antigas = [
+        (ano, mes, f"{ano}-{mes:02d}", Decimal(valores[i][0]), Decimal(valores[i][1]))
+        for i, (ano, mes) in dimensoes.tempo.items()
+    ]
+    novas = [(i, internacoes, obitos) for i, (internacoes, obitos) in valores.items()]
+    cenarios["series_mensal"] = (
+        (["ano", "mes", "ano_mes", "internacoes", "obitos"], antigas),
+        (consultas.series_mensal(FATO)[2], novas),
+    )
+
+    # /api/localidades: 5.570 municípios (o novo já está em memória)
+    antigas = [(i, municipio, uf) for i, (municipio, uf) in dimensoes.localidades.items()]
+    cenarios["localidades"] = (
+        (["id_localidade", "municipio", "uf"], antigas),
+        (lambda _: dimensoes.lista_localidades(), None),
+    )
+
+    # /api/dados/por-estado: antigo recebia 27 UFs já somadas; novo recebe 5.570 municípios
+    valores = {i: (aleatorio.randint(0, 10**5), aleatorio.randint(0, 10**4)) for i in dimensoes.localidades}
+    por_uf = {}
+    for i, (internacoes, obitos) in valores.items():
+        acc = por_uf.setdefault(dimensoes.localidades[i][1], [0, 0])
+        acc[0] += internacoes
+        acc[1] += obitos
+    antigas = [(uf, Decimal(a), Decimal(b)) for uf, (a, b) in sorted(por_uf.items())]
+    novas = [(i, a, b) for i, (a, b) in valores.items()]
+    cenarios["dados_por_estado"] = (
+        (["uf", "total_internacoes", "total_obitos"], antigas),
+        (consultas.dados_por_estado(FATO)[2], novas),
+    )
+
+    # /api/internacoes/cid-por-estado?capitulo_cod=I
+    antigas = [(uf, "I", dimensoes.capitulos[1][1], Decimal(a)) for uf, (a, _) in sorted(por_uf.items())]
+    novas = [(i, 1, a) for i, (a, _) in valores.items()]
+    cenarios["internacoes_cid_por_estado"] = (
+        (["uf", "capitulo_cod", "capitulo_nome", "total_internacoes"], antigas),
+        (consultas.internacoes_cid_por_estado(FATO, "I")[2], novas),
+    )
+    return cenarios
+
+
+def _medir(func, repeticoes):
+    tempos = timeit.repeat(func, number=1, repeat=repeticoes)
+    corpo = func()
+    return {"mediana_us": round(statistics.median(tempos) * 1e6, 1), "bytes": len(corpo)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=200)
+    parser.add_argument("--saida", help="arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args()
+
+    _dimensoes_sinteticas()
+    resultado = {"commit": commit_atual(), "cenarios": {}}
+    for nome, ((colunas, antigas), (decorar, novas)) in _cenarios().items():
+        antigo = _medir(lambda: _antigo(colunas, antigas), args.repeticoes)
+        novo = _medir(lambda: orjson.dumps(decorar(novas)), args.repeticoes)
+        colunas_novo = _medir(lambda: orjson.dumps(colunar(decorar(novas))), args.repeticoes)
+        resultado["cenarios"][nome] = {
+            "antigo": antigo,
+            "novo": novo,
+            "colunar": colunas_novo,
+            "aceleracao": round(antigo["mediana_us"] / novo["mediana_us"], 1) if novo["mediana_us"] else None,
+        }
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""Gera um esquema estrela sintético (dimensões + fato_saude_mensal) num PostgreSQL local.
+
+- 5.570 municípios distribuídos pelas 27 UFs como no IBGE, com ids no formato do DATASUS
+  (código da UF + sequencial) e um peso por município (poucos grandes, muitos pequenos);
+- dim_tempo mensal de 1996 a 2023;
+- tipos de evento 3 a 11, cada um com a sua dimensão de quebra (ver consultas.QUEBRAS e
+  consultas.CID_CAPITULO), como na carga real.
+
+O volume é controlado por `--fracao`: a fração das combinações (município, mês, membro)
+que viram linha. Com a mesma `--semente` e a mesma versão do PostgreSQL os dados saem
+idênticos, então resultados do bench.suite de commits diferentes são comparáveis. Os
+parâmetros usados ficam gravados em `bench_sintetico`.
+
+    python -m bench.sintetico --dsn postgresql://postgres@localhost/sims_bench --fracao 0.02 \\
+        [--recriar] [--indices] [--rollups]
+"""
+import argparse
+import json
+import os
+import time
+import urllib.parse
+
+import psycopg2
+
+ANOS = (1996, 2023)
+
+# UF -> (código IBGE, nº de municípios)
+UFS = {
+    "RO": (11, 52), "AC": (12, 22), "AM": (13, 62), "RR": (14, 15), "PA": (15, 144), "AP": (16, 16),
+    "TO": (17, 139), "MA": (21, 217), "PI": (22, 224), "CE": (23, 184), "RN": (24, 167), "PB": (25, 223),
+    "PE": (26, 185), "AL": (27, 102), "SE": (28, 75), "BA": (29, 417), "MG": (31, 853), "ES": (32, 78),
+    "RJ": (33, 92), "SP": (35, 645), "PR": (41, 399), "SC": (42, 295), "RS": (43, 497), "MS": (50, 79),
+    "MT": (51, 141), "GO": (52, 246), "DF": (53, 1),
+}
+
+SEXOS = ["Masculino", "Feminino", "Ignorado"]
+FAIXAS = ["Menor 1 ano", "1 a 4 anos", "5 a 9 anos", "10 a 14 anos", "15 a 19 anos", "20 a 29 anos",
+          "30 a 39 anos", "40 a 49 anos", "50 a 59 anos", "60 a 69 anos", "70 a 79 anos", "80 anos e mais"]
+RACAS = ["Branca", "Preta", "Amarela", "Parda", "Indígena", "Sem informação"]
+ESTADOS_CIVIS = ["Solteiro", "Casado", "Viúvo", "Separado judicialmente", "União estável", "Ignorado"]
+LOCAIS = ["Hospital", "Outro estabelecimento de saúde", "Domicílio", "Via pública", "Outros", None]
+CAPITULOS = [
+    ("I", "Algumas doenças infecciosas e parasitárias"),
+    ("II", "Neoplasias (tumores)"),
+    ("III", "Doenças do sangue e dos órgãos hematopoéticos e alguns transtornos imunitários"),
+    ("IV", "Doenças endócrinas, nutricionais e metabólicas"),
+    ("V", "Transtornos mentais e comportamentais"),
+    ("VI", "Doenças do sistema nervoso"),
+    ("VII", "Doenças do olho e anexos"),
+    ("VIII", "Doenças do ouvido e da apófise mastóide"),
+    ("IX", "Doenças do aparelho circulatório"),
+    ("X", "Doenças do aparelho respiratório"),
+    ("XI", "Doenças do aparelho digestivo"),
+    ("XII", "Doenças da pele e do tecido subcutâneo"),
+    ("XIII", "Doenças do sistema osteomuscular e do tecido conjuntivo"),
+    ("XIV", "Doenças do aparelho geniturinário"),
+    ("XV", "Gravidez, parto e puerpério"),
+    ("XVI", "Algumas afecções originadas no período perinatal"),
+    ("XVII", "Malformações congênitas, deformidades e anomalias cromossômicas"),
+    ("XVIII", "Sintomas, sinais e achados anormais de exames clínicos e de laboratório"),
+    ("XIX", "Lesões, envenenamento e algumas outras consequências de causas externas"),
+    ("XX", "Causas externas de morbidade e de mortalidade"),
+    ("XXI", "Fatores que influenciam o estado de saúde e o contato com os serviços de saúde"),
+    ("XXII", "Códigos para propósitos especiais"),
+]
+
+# tabela -> (coluna id, coluna descrição, valores)
+DIMENSOES = {
+    "dim_sexo": ("id_sexo", "sexo_desc", SEXOS),
+    "dim_raca_cor": ("id_raca_cor", "raca_desc", RACAS),
+    "dim_estado_civil": ("id_estado_civil", "estado_civil_desc", ESTADOS_CIVIS),
+    "dim_local_ocorrencia": ("id_local_ocor", "local_desc", LOCAIS),
+}
+
+# tipo de evento -> (medida, tabela e coluna da quebra ou None)
+TIPOS = {
+    3: ("qtd_internacoes", None),
+    4: ("qtd_obitos", None),
+    5: ("qtd_internacoes", ("dim_sexo", "id_sexo")),
+    6: ("qtd_internacoes", ("dim_faixa_etaria", "id_faixa")),
+    7: ("qtd_obitos", ("dim_raca_cor", "id_raca_cor")),
+    8: ("qtd_obitos", ("dim_estado_civil", "id_estado_civil")),
+    9: ("qtd_obitos", ("dim_local_ocorrencia", "id_local_ocor")),
+    10: ("qtd_internacoes", ("dim_cid10_capitulo", "id_capitulo")),
+    11: ("qtd_obitos", ("dim_cid10_capitulo", "id_capitulo")),
+}
+
+TABELAS = ["fato_saude_mensal", "dim_tempo", "dim_localidade", "dim_faixa_etaria", "dim_cid10_capitulo",
+           *DIMENSOES, "bench_sintetico"]
+
+MEMBROS = ["id_sexo", "id_faixa", "id_raca_cor", "id_estado_civil", "id_local_ocor", "id_capitulo"]
+
+
+def _local(dsn):
+    if "://" in dsn:
+        host = urllib.parse.urlparse(dsn).hostname
+    else:
+        host = next((p.split("=", 1)[1] for p in dsn.split() if p.startswith("host=")), None)
+    return host in (None, "", "localhost", "127.0.0.1", "::1")
+
+
+def _criar_dimensoes(cur):
+    cur.execute("CREATE TABLE dim_tempo (id_tempo int PRIMARY KEY, ano int NOT NULL, mes int NOT NULL)")
+    cur.execute(
+        """
+        INSERT INTO dim_tempo
+        SELECT row_number() OVER (ORDER BY ano, mes), ano, mes
+        FROM generate_series(%s, %s) AS ano, generate_series(1, 12) AS mes
+        """,
+        ANOS,
+    )
+
+    cur.execute("CREATE TABLE dim_localidade (id_localidade int PRIMARY KEY, municipio text NOT NULL, uf text NOT NULL)")
+    linhas = [
+        (codigo * 10000 + n, f"Município {uf} {n:03d}", uf)
+        for uf, (codigo, total) in UFS.items()
+        for n in range(1, total + 1)
+    ]
+    cur.executemany("INSERT INTO dim_localidade VALUES (%s, %s, %s)", linhas)
+
+    for tabela, (id_col, desc_col, valores) in DIMENSOES.items():
+        cur.execute(f"CREATE TABLE {tabela} ({id_col} int PRIMARY KEY, {desc_col} text)")
+        cur.executemany(f"INSERT INTO {tabela} VALUES (%s, %s)", list(enumerate(valores, start=1)))
+
+    cur.execute("CREATE TABLE dim_faixa_etaria (id_faixa int PRIMARY KEY, faixa_desc text, faixa_ordem int)")
+    cur.executemany("INSERT INTO dim_faixa_etaria VALUES (%s, %s, %s)",
+                    [(i, desc, i) for i, desc in enumerate(FAIXAS, start=1)])
+
+    cur.execute("CREATE TABLE dim_cid10_capitulo (id_capitulo int PRIMARY KEY, capitulo_cod text, titulo text)")
+    cur.executemany("INSERT INTO dim_cid10_capitulo VALUES (%s, %s, %s)",
+                    [(i, cod, titulo) for i, (cod, titulo) in enumerate(CAPITULOS, start=1)])
+
+
+def _criar_fato(cur, fracao, semente):
+    cur.execute(f"""
+        CREATE TABLE fato_saude_mensal (
+            id_tipo_evento int,
+            id_tempo int,
+            id_localidade int,
+            {', '.join(f'{m} int' for m in MEMBROS)},
+            qtd_internacoes int,
+            qtd_obitos int
+        )
+    """)
+    # Peso do município (log-uniforme entre 1 e ~150: poucos grandes, muitos pequenos) e sazonalidade por mês
+    cur.execute("SELECT setseed(%s)", (semente,))
+    cur.execute("""
+        CREATE TEMP TABLE _peso AS
+        SELECT id_localidade, exp(random() * 5) AS peso
+        FROM dim_localidade
+        ORDER BY id_localidade
+    """)
+    linhas = {}
+    for tipo, (medida, quebra) in TIPOS.items():
+        # Semente por tipo: gerar só parte dos tipos não muda os demais
+        cur.execute("SELECT setseed(%s)", (((semente * 1000 + tipo) % 2000) / 1000 - 1,))
+        if quebra:
+            tabela, coluna = quebra
+            membro_sql, membro_from = f", {coluna}", f" CROSS JOIN (SELECT {coluna} FROM {tabela} ORDER BY {coluna}) m"
+            colunas = f"id_tipo_evento, id_tempo, id_localidade, {coluna}, {medida}"
+        else:
+            membro_sql, membro_from = "", ""
+            colunas = f"id_tipo_evento, id_tempo, id_localidade, {medida}"
+        cur.execute(f"""
+            INSERT INTO fato_saude_mensal ({colunas})
+            SELECT {tipo}, t.id_tempo, l.id_localidade{membro_sql},
+                   floor(random() * l.peso * (1.2 + sin(t.mes)))::int
+            FROM dim_tempo t CROSS JOIN _peso l{membro_from}
+            WHERE random() < %s
+            ORDER BY t.id_tempo, l.id_localidade{membro_sql}
+        """, (fracao,))
+        linhas[tipo] = cur.rowcount
+    return linhas
+
+
+def gerar(dsn, fracao, semente, recriar=False):
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('fato_saude_mensal') IS NOT NULL")
+            if cur.fetchone()[0] and not recriar:
+                raise SystemExit("fato_saude_mensal já existe; use --recriar para apagar e gerar de novo")
+            # Plano sem paralelismo: a ordem das chamadas a random() (e os dados) fica determinística
+            cur.execute("SET max_parallel_workers_per_gather = 0")
+            cur.execute("SET statement_timeout = 0")
+            for tabela in TABELAS:
+                cur.execute(f"DROP TABLE IF EXISTS {tabela} CASCADE")
+            for extra in ("rollup_fato_saude_mensal", "rollup_controle", "plano_consultas"):
+                cur.execute(f"DROP TABLE IF EXISTS {extra}")
+
+            inicio = time.monotonic()
+            _criar_dimensoes(cur)
+            linhas = _criar_fato(cur, fracao, semente)
+            cur.execute("CREATE TABLE bench_sintetico (parametros jsonb NOT NULL, gerado_em timestamptz NOT NULL DEFAULT now())")
+            parametros = {"fracao": fracao, "semente": semente, "anos": ANOS, "linhas_por_tipo": linhas}
+            cur.execute("INSERT INTO bench_sintetico (parametros) VALUES (%s)", (json.dumps(parametros),))
+        conn.commit()
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("VACUUM ANALYZE")
+        return {**parametros, "linhas": sum(linhas.values()), "segundos": round(time.monotonic() - inicio, 1)}
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("BENCH_DATABASE_URL"), required=not os.getenv("BENCH_DATABASE_URL"),
+                        help="banco de destino (padrão: $BENCH_DATABASE_URL)")
+    parser.add_argument("--fracao", type=float, default=0.02,
+                        help="fração das combinações (município, mês, membro) geradas (1.0 = ~147 milhões de linhas)")
+    parser.add_argument("--semente", type=float, default=0.42, help="semente do random() do PostgreSQL (-1 a 1)")
+    parser.add_argument("--recriar", action="store_true", help="apaga as tabelas existentes")
+    parser.add_argument("--indices", action="store_true", help="cria os índices gerenciados (app.indices)")
+    parser.add_argument("--rollups", action="store_true", help="gera os rollups (app.rollups)")
+    parser.add_argument("--permitir-remoto", action="store_true", help="aceita um host que não seja local")
+    args = parser.parse_args()
+
+    if not _local(args.dsn) and not args.permitir_remoto:
+        raise SystemExit("O gerador apaga e recria tabelas: use um PostgreSQL local ou --permitir-remoto")
+
+    resultado = gerar(args.dsn, args.fracao, args.semente, recriar=args.recriar)
+    if args.indices or args.rollups:
+        # app.config lê DATABASE_URL na importação
+        os.environ["DATABASE_URL"] = args.dsn
+        from app import indices, rollups
+        if args.indices:
+            resultado["indices"] = indices.criar()["criados"]
+        if args.rollups:
+            resultado["rollups"] = rollups.atualizar()
+    print(json.dumps(resultado, indent=2, ensure_ascii=False, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Bench de todos os endpoints de dados, com cenários fixos, contra o banco sintético.
+
+Os endpoints vêm do /openapi.json da própria API (todo GET público de /api, fora debug,
+exportação e rotas de usuário), e cada um roda nos cenários cujos parâmetros aceita:
+
+- nacional:       sem filtros
+- municipio:      id_localidade de um município fixo
+- ano / ano_mes:  ano=2020 (ou ano_inicio=ano_fim=2020) e mês 6
+- municipio_ano:  município + 2018 a 2020
+- capitulo:       capitulo_cod=I
+
+Cada cenário é medido com cache frio (POST /api/debug/cache/limpar antes de cada
+requisição) e quente. Para cada um: p50/p95/p99, throughput sequencial e tempo de banco
+por requisição, lido dos histogramas de /metrics.
+
+    python -m bench.sintetico --dsn $BENCH_DATABASE_URL --recriar --indices --rollups
+    python -m bench.suite --dsn $BENCH_DATABASE_URL [--repeticoes 30] [--frio 5] --saida a.json
+    python -m bench.suite --comparar a.json b.json
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import httpx
+import psycopg2
+
+from .comum import CABECALHO_ADMIN, commit_atual, ler_metricas, resumo_latencias, servidor, soma_por_rota
+
+EXCLUIR = ("/api/debug", "/api/export", "/api/user", "/api/auth", "/api/test-columns", "/api/health")
+
+MUNICIPIO = 350001  # primeiro município de SP no banco sintético
+
+# nome -> alternativas de parâmetros; vale a primeira que o endpoint aceita por inteiro
+CENARIOS = {
+    "nacional": [{}],
+    "municipio": [{"id_localidade": MUNICIPIO}],
+    "ano": [{"ano": 2020}, {"ano_inicio": 2020, "ano_fim": 2020}],
+    "ano_mes": [{"ano": 2020, "mes": 6}, {"ano_inicio": 2020, "ano_fim": 2020, "mes": 6}],
+    "municipio_ano": [{"id_localidade": MUNICIPIO, "ano_inicio": 2018, "ano_fim": 2020}],
+    "capitulo": [{"capitulo_cod": "I"}],
+}
+
+
+def endpoints(cliente):
+    """{caminho: parâmetros de query aceitos} dos endpoints de dados públicos."""
+    openapi = cliente.get("/openapi.json").json()
+    resultado = {}
+    for caminho, metodos in sorted(openapi["paths"].items()):
+        get = metodos.get("get")
+        if not get or not caminho.startswith("/api/") or caminho.startswith(EXCLUIR):
+            continue
+        if get.get("security") or "{" in caminho:
+            continue
+        resultado[caminho] = {p["name"] for p in get.get("parameters", []) if p["in"] == "query"}
+    return resultado
+
+
+def cenarios(aceitos):
+    for nome, alternativas in CENARIOS.items():
+        for params in alternativas:
+            if set(params) <= aceitos:
+                yield nome, params
+                break
+
+
+def _tempos_banco(cliente, caminho):
+    metricas = ler_metricas(cliente.get("/metrics").text)
+    return (
+        soma_por_rota(metricas, "db_execute_seconds_sum", caminho),
+        soma_por_rota(metricas, "db_pool_wait_seconds_sum", caminho),
+    )
+
+
+def _medir(cliente, caminho, params, n, frio):
+    latencias, erros = [], 0
+    execucao_antes, espera_antes = _tempos_banco(cliente, caminho)
+    if not frio:
+        cliente.get(caminho, params=params)
+        execucao_antes, espera_antes = _tempos_banco(cliente, caminho)
+    inicio = time.perf_counter()
+    gasto = 0.0
+    for _ in range(n):
+        if frio:
+            cliente.post("/api/debug/cache/limpar", headers=CABECALHO_ADMIN).raise_for_status()
+        t0 = time.perf_counter()
+        resposta = cliente.get(caminho, params=params)
+        decorrido = time.perf_counter() - t0
+        gasto += decorrido
+        if resposta.status_code != 200:
+            erros += 1
+            continue
+        latencias.append(decorrido * 1000)
+    execucao, espera = _tempos_banco(cliente, caminho)
+    return {
+        **resumo_latencias(latencias),
+        "erros": erros,
+        # Só o tempo das requisições medidas (a limpeza do cache frio fica de fora)
+        "throughput_rps": round(n / gasto, 2) if gasto else None,
+        "db_ms_por_requisicao": round((execucao - execucao_antes) * 1000 / n, 2),
+        "espera_pool_ms_por_requisicao": round((espera - espera_antes) * 1000 / n, 2),
+        "bytes": len(resposta.content),
+        "duracao_s": round(time.perf_counter() - inicio, 2),
+    }
+
+
+def _dados(dsn):
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SHOW server_version")
+            versao = cur.fetchone()[0]
+            cur.execute("SELECT to_regclass('bench_sintetico') IS NOT NULL")
+            parametros = None
+            if cur.fetchone()[0]:
+                cur.execute("SELECT parametros FROM bench_sintetico ORDER BY gerado_em DESC LIMIT 1")
+                row = cur.fetchone()
+                parametros = row[0] if row else None
+            cur.execute("SELECT to_regclass('rollup_controle') IS NOT NULL")
+            rollups = cur.fetchone()[0]
+    finally:
+        conn.close()
+    return {"postgres": versao, "sintetico": parametros, "rollups": rollups}
+
+
+def executar(dsn, repeticoes, frio, filtro=None, env_extra=None):
+    resultado = {
+        "commit": commit_atual(),
+        "gerado_em": datetime.now(timezone.utc).isoformat(),
+        "config": {"repeticoes": repeticoes, "frio": frio, **(env_extra or {})},
+        "dados": _dados(dsn),
+        "resultados": [],
+    }
+    with servidor({"DATABASE_URL": dsn, **(env_extra or {})}) as url:
+        with httpx.Client(base_url=url, timeout=600) as cliente:
+            for caminho, aceitos in endpoints(cliente).items():
+                if filtro and not any(f in caminho for f in filtro):
+                    continue
+                for nome, params in cenarios(aceitos):
+                    linha = {"endpoint": caminho, "cenario": nome, "params": params}
+                    if frio:
+                        linha["frio"] = _medir(cliente, caminho, params, frio, frio=True)
+                    linha["quente"] = _medir(cliente, caminho, params, repeticoes, frio=False)
+                    resultado["resultados"].append(linha)
+    return resultado
+
+
+def comparar(arquivo_a, arquivo_b):
+    """p50/p95 e tempo de banco de b relativos a a, por endpoint, cenário e cache."""
+    with open(arquivo_a, encoding="utf-8") as f:
+        a = json.load(f)
+    with open(arquivo_b, encoding="utf-8") as f:
+        b = json.load(f)
+    if a["dados"]["sintetico"] != b["dados"]["sintetico"]:
+        print("AVISO: os dois resultados foram medidos com bancos sintéticos diferentes")
+    antes = {(r["endpoint"], r["cenario"]): r for r in a["resultados"]}
+    linhas = []
+    for r in b["resultados"]:
+        base = antes.get((r["endpoint"], r["cenario"]))
+        if base is None:
+            continue
+        for modo in ("frio", "quente"):
+            if modo not in r or modo not in base:
+                continue
+            linha = {"endpoint": r["endpoint"], "cenario": r["cenario"], "cache": modo}
+            for campo in ("p50_ms", "p95_ms", "db_ms_por_requisicao"):
+                va, vb = base[modo][campo], r[modo][campo]
+                linha[campo] = [va, vb, round(vb / va, 2) if va and vb is not None else None]
+            linhas.append(linha)
+    return {"a": a["commit"], "b": b["commit"], "comparacao": linhas}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("BENCH_DATABASE_URL"), help="banco sintético (padrão: $BENCH_DATABASE_URL)")
+    parser.add_argument("--repeticoes", type=int, default=30, help="requisições por cenário com cache quente")
+    parser.add_argument("--frio", type=int, default=5, help="requisições por cenário com cache frio (0 desativa)")
+    parser.add_argument("--endpoint", action="append", help="só endpoints que contenham este trecho")
+    parser.add_argument("--env", action="append", default=[], metavar="VAR=VALOR",
+                        help="variável de ambiente extra para a API (ex.: DB_ASYNC=false)")
+    parser.add_argument("--comparar", nargs=2, metavar=("A.json", "B.json"))
+    parser.add_argument("--saida", help="arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args()
+
+    if args.comparar:
+        resultado = comparar(*args.comparar)
+    else:
+        if not args.dsn:
+            parser.error("informe --dsn ou BENCH_DATABASE_URL")
+        env_extra = dict(item.split("=", 1) for item in args.env)
+        resultado = executar(args.dsn, args.repeticoes, args.frio, args.endpoint, env_extra)
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# Na raiz do backend: o pytest põe este diretório no sys.path, e os testes importam app e bench
@@ -0,0 +1,45 @@
+"""Configuração do gunicorn com workers uvicorn (modo multi-processo da API).
+
+    gunicorn app.main:app -c gunicorn.conf.py
+
+- WEB_CONCURRENCY: nº de workers; padrão = CPUs disponíveis ao contêiner (cota do cgroup);
+- DB_POOL_TOTAL: conexões com o banco somando todos os workers e os dois pools de cada um
+  (cada worker recebe a sua parte, dividida entre o pool síncrono e o assíncrono); sem ele,
+  um orçamento de 80 limita os pools de cada worker;
+- com mais de um worker e CACHE_BACKEND não definido, o cache de resultados passa a ser
+  compartilhado em disco (ver app/cache_compartilhado.py).
+
+Os workers não são pré-carregados: cada um importa a aplicação e abre o seu pool depois
+do fork.
+"""
+import os
+
+
+def _cpus():
+    # Cota do cgroup v2 ("max 100000" = sem limite, "200000 100000" = 2 CPUs)
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            cota, periodo = f.read().split()
+        if cota != "max":
+            return max(1, int(int(cota) / int(periodo)))
+    except (OSError, ValueError):
+        pass
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+workers = int(os.getenv("WEB_CONCURRENCY") or _cpus())
+# Os workers herdam o ambiente: app/config.py lê estes valores depois do fork
+os.environ["WEB_CONCURRENCY"] = str(workers)
+if workers > 1:
+    os.environ.setdefault("CACHE_BACKEND", "disco")
+
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+# Consultas de CID-10 podem levar até 180 s (SET LOCAL statement_timeout)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "200"))
+graceful_timeout = 30
+keepalive = 5
+accesslog = "-"
@@ -1,3 +1,4 @@
 #!/bin/bash
-uvicorn app.main:app --host 0.0.0.0 --port ${PORT:-8000}
-
+# Um worker por CPU (WEB_CONCURRENCY para fixar); ver gunicorn.conf.py
+cd "$(dirname "$0")"
+exec gunicorn app.main:app -c gunicorn.conf.py
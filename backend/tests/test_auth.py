@@ -0,0 +1,119 @@
+"""Verificação local dos JWT (app/auth.py), sem rede: chave HS256 de teste e JWKS simulado."""
+import asyncio
+import time
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+from app import auth, config
+
+
+@pytest.fixture(autouse=True)
+def estado_limpo(monkeypatch):
+    # Estado de módulo (chave local, JWKS, tokens em cache) restaurado ao fim de cada teste
+    monkeypatch.setattr(auth, "_chave_local", None)
+    monkeypatch.setattr(auth, "_jwks", {})
+    monkeypatch.setattr(auth, "_jwks_em", float("-inf"))
+    monkeypatch.setattr(auth, "_verificados", type(auth._verificados)())
+    monkeypatch.setattr(auth, "_stats", dict.fromkeys(auth._stats, 0))
+
+
+def _verificar(token):
+    return asyncio.run(auth.verificar(token))
+
+
+def test_token_valido():
+    auth.usar_chave_local()
+    usuario = _verificar(auth.emitir_token("u1", "ana@exemplo.org", user_metadata={"name": "Ana"}))
+    assert (usuario.id, usuario.email, usuario.role) == ("u1", "ana@exemplo.org", "authenticated")
+    assert usuario.user_metadata == {"name": "Ana"}
+
+
+def test_token_sem_email():
+    auth.usar_chave_local()
+    assert _verificar(auth.emitir_token("u1")).email is None
+
+
+def test_token_verificado_fica_em_cache():
+    auth.usar_chave_local()
+    token = auth.emitir_token("u1")
+    _verificar(token)
+    _verificar(token)
+    assert (auth.stats()["verificacoes"], auth.stats()["hits"]) == (1, 1)
+
+
+def test_token_expirado():
+    auth.usar_chave_local()
+    with pytest.raises(auth.TokenInvalido):
+        _verificar(auth.emitir_token("u1", expira_em=-(config.AUTH_LEEWAY + 60)))
+
+
+def test_expiracao_dentro_da_tolerancia():
+    auth.usar_chave_local()
+    assert _verificar(auth.emitir_token("u1", expira_em=-1)).id == "u1"
+
+
+def test_audiencia_errada():
+    auth.usar_chave_local()
+    with pytest.raises(auth.TokenInvalido):
+        _verificar(auth.emitir_token("u1", aud="outra-audiencia"))
+
+
+def test_assinatura_de_outra_chave():
+    auth.usar_chave_local()
+    token = auth.emitir_token("u1")
+    auth.usar_chave_local()
+    with pytest.raises(auth.TokenInvalido):
+        _verificar(token)
+
+
+def test_sem_sub():
+    auth.usar_chave_local()
+    with pytest.raises(auth.TokenInvalido):
+        _verificar(auth.emitir_token(None))
+
+
+@pytest.fixture
+def jwks(monkeypatch):
+    """Chave RSA publicada num JWKS simulado (kid "k1"); devolve a chave privada em PEM."""
+    privada = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = privada.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    publica = privada.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    chave = {**jwk.construct(publica, "RS256").to_dict(), "kid": "k1"}
+    baixados = []
+
+    def baixar():
+        baixados.append(time.monotonic())
+        return {"keys": [chave]}
+
+    monkeypatch.setattr(auth, "_baixar_jwks", baixar)
+    monkeypatch.setattr(config, "AUTH_JWKS_URL", "https://exemplo.invalid/jwks.json")
+    monkeypatch.setattr(config, "AUTH_ISSUER", None)
+    return pem, baixados
+
+
+def _token_rs256(pem, kid, **claims):
+    agora = int(time.time())
+    payload = {"sub": "u2", "aud": config.AUTH_AUDIENCE, "iat": agora, "exp": agora + 3600, **claims}
+    return jwt.encode(payload, pem, algorithm="RS256", headers={"kid": kid})
+
+
+def test_jwks_kid_conhecido(jwks):
+    pem, baixados = jwks
+    assert _verificar(_token_rs256(pem, "k1")).id == "u2"
+    assert len(baixados) == 1
+
+
+def test_jwks_kid_desconhecido(jwks):
+    pem, baixados = jwks
+    _verificar(_token_rs256(pem, "k1"))
+    with pytest.raises(auth.TokenInvalido, match="desconhecida"):
+        _verificar(_token_rs256(pem, "k2"))
+    # Kid desconhecido logo depois de uma recarga não baixa o JWKS de novo (intervalo mínimo)
+    assert len(baixados) == 1
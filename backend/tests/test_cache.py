@@ -0,0 +1,144 @@
+"""Cache de resultados: chave, TTL/LRU e single-flight do cache_resultado, sem banco."""
+import asyncio
+
+import pytest
+
+from app import cache, dimensoes
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 1000.0
+
+    def __call__(self):
+        return self.agora
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    r = Relogio()
+    monkeypatch.setattr(cache.time, "monotonic", r)
+    return r
+
+
+def test_ttl(relogio):
+    c = cache.ResultCache(max_items=10, ttl=60)
+    c.set("a", 1)
+    relogio.agora += 59
+    assert c.get("a") == (True, 1)
+    relogio.agora += 2
+    assert c.get("a") == (False, None)
+    assert (c.hits, c.misses) == (1, 1)
+
+
+def test_lru(relogio):
+    c = cache.ResultCache(max_items=2, ttl=60)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.get("a")  # "a" passa a ser o mais recente
+    c.set("c", 3)
+    assert c.get("b") == (False, None)
+    assert c.get("a") == (True, 1) and c.get("c") == (True, 3)
+    assert c.stats()["evictions"] == 1
+
+
+def test_chave_ignora_none_e_ordem():
+    assert cache.chave("x", {"b": 1, "a": None, "c": 2}) == cache.chave("x", {"c": 2, "b": 1}) == \
+        ("x", (("b", 1), ("c", 2)))
+    assert cache.chave("x", {"a": 1}) != cache.chave("y", {"a": 1})
+
+
+@pytest.fixture
+def ambiente(monkeypatch):
+    """Versão dos dados controlada pelo teste, só o cache em memória e nenhum acesso ao banco."""
+    estado = {"versao": "v1"}
+
+    async def versao_dados():
+        return estado["versao"]
+
+    monkeypatch.setattr(cache, "versao_dados", versao_dados)
+    monkeypatch.setattr(cache, "compartilhado", None)
+    monkeypatch.setattr(cache, "resultados", cache.ResultCache(max_items=10, ttl=60))
+    monkeypatch.setattr(cache, "_em_andamento", {})
+    monkeypatch.setattr(dimensoes, "_assinatura", "d1")
+    return estado
+
+
+def _contado(pausa=0.0, falhar=False):
+    chamadas = []
+
+    @cache.cache_resultado("teste")
+    async def func(a=None):
+        chamadas.append(a)
+        await asyncio.sleep(pausa)
+        if falhar:
+            raise ValueError("falhou")
+        return {"a": a, "n": len(chamadas)}
+
+    return func, chamadas
+
+
+def test_reaproveita_resultado(ambiente):
+    func, chamadas = _contado()
+
+    async def rodar():
+        return await func(a=1), await func(a=1), await func(a=2)
+
+    primeiro, segundo, outro = asyncio.run(rodar())
+    assert primeiro is segundo
+    assert outro["a"] == 2
+    assert chamadas == [1, 2]
+
+
+def test_nova_versao_ou_dimensoes_recalcula(ambiente, monkeypatch):
+    func, chamadas = _contado()
+    asyncio.run(func(a=1))
+    ambiente["versao"] = "v2"
+    asyncio.run(func(a=1))
+    monkeypatch.setattr(dimensoes, "_assinatura", "d2")
+    asyncio.run(func(a=1))
+    assert chamadas == [1, 1, 1]
+
+
+def test_requisicoes_simultaneas_calculam_uma_vez(ambiente):
+    func, chamadas = _contado(pausa=0.05)
+
+    async def rodar():
+        return await asyncio.gather(*(func(a=1) for _ in range(5)))
+
+    resultados = asyncio.run(rodar())
+    assert chamadas == [1]
+    assert all(r is resultados[0] for r in resultados)
+
+
+def test_erro_chega_a_todos_e_nao_fica_em_cache(ambiente):
+    func, chamadas = _contado(pausa=0.05, falhar=True)
+
+    async def rodar():
+        return await asyncio.gather(*(func(a=1) for _ in range(3)), return_exceptions=True)
+
+    erros = asyncio.run(rodar())
+    assert all(isinstance(e, ValueError) for e in erros)
+    assert chamadas == [1]
+    with pytest.raises(ValueError):
+        asyncio.run(func(a=1))
+    assert chamadas == [1, 1]
+
+
+def test_cancelar_quem_calcula_passa_o_calculo_adiante(ambiente):
+    func, chamadas = _contado(pausa=0.05)
+
+    async def rodar():
+        lider = asyncio.create_task(func(a=1))
+        await asyncio.sleep(0.01)
+        esperando = [asyncio.create_task(func(a=1)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        lider.cancel()
+        resultados = await asyncio.gather(*esperando)
+        return lider, resultados
+
+    lider, resultados = asyncio.run(rodar())
+    assert lider.cancelled()
+    # Uma das que esperavam recalcula; as outras recebem o resultado dela
+    assert chamadas == [1, 1]
+    assert all(r is resultados[0] for r in resultados)
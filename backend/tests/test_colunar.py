@@ -0,0 +1,72 @@
+"""Paridade entre os motores: consultas.consultar com e sem o snapshot colunar ativo.
+
+Exporta o snapshot do banco de teste num diretório temporário e roda cada consulta de
+app/planos.py (parâmetros padrão) pelo PostgreSQL (MOTOR_CONSULTAS=postgres, rollups quando
+atendem) e pelo DuckDB (MOTOR_CONSULTAS=duckdb); os resultados decorados têm de ser iguais.
+Pulado sem banco (TEST_DATABASE_URL ou BENCH_DATABASE_URL) ou sem duckdb/pyarrow.
+
+    python -m bench.sintetico --dsn $BENCH_DATABASE_URL --recriar --indices --rollups
+    TEST_DATABASE_URL=$BENCH_DATABASE_URL python -m pytest tests/test_colunar.py
+"""
+import asyncio
+import os
+
+import pytest
+
+DSN = os.getenv("TEST_DATABASE_URL") or os.getenv("BENCH_DATABASE_URL")
+if not DSN:
+    pytest.skip("sem TEST_DATABASE_URL/BENCH_DATABASE_URL", allow_module_level=True)
+pytest.importorskip("duckdb")
+pytest.importorskip("pyarrow")
+
+# app.config lê DATABASE_URL na importação
+os.environ["DATABASE_URL"] = DSN
+
+from app import colunar, config, consultas, db, db_async, planos  # noqa: E402
+from bench.colunar import paridade  # noqa: E402
+
+# Outros testes podem já ter importado app.config (e app.db) sem a variável
+config.DATABASE_URL = db.DATABASE_URL = DSN
+
+CASOS = [(nome, params) for nome, spec in planos.CONSULTAS.items() for params in spec["padrao"]]
+
+
+@pytest.fixture(scope="module")
+def snapshot(tmp_path_factory):
+    diretorio = config.SNAPSHOT_DIR
+    config.SNAPSHOT_DIR = str(tmp_path_factory.mktemp("snapshot"))
+    try:
+        manifesto = colunar.exportar()
+        assert colunar.carregar() == manifesto["versao"]
+        yield manifesto
+    finally:
+        config.SNAPSHOT_DIR = diretorio
+        db.close_pool()
+
+
+async def _consultar(motor, nome, params):
+    spec = planos.CONSULTAS[nome]
+    config.MOTOR_CONSULTAS = motor
+    try:
+        assert await colunar.ativo() == (motor == "duckdb")
+        return await consultas.consultar(
+            lambda origem: spec["montar"](origem, **params),
+            localidade=spec["localidade"](params), tempo=spec["tempo"](params),
+            anual=spec.get("anual", lambda p: False)(params), timeout=spec.get("timeout"),
+        )
+    finally:
+        config.MOTOR_CONSULTAS = "postgres"
+
+
+async def _ambos(nome, params):
+    # O pool assíncrono fica preso ao event loop: abre e fecha dentro do mesmo asyncio.run
+    try:
+        return await _consultar("postgres", nome, params), await _consultar("duckdb", nome, params)
+    finally:
+        await db_async.close_pool()
+
+
+@pytest.mark.parametrize("nome,params", CASOS, ids=[f"{nome}-{params}" for nome, params in CASOS])
+def test_paridade(snapshot, nome, params):
+    esperado, obtido = asyncio.run(_ambos(nome, params))
+    assert paridade(esperado, obtido) != "diferente", (esperado, obtido)
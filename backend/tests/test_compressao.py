@@ -0,0 +1,91 @@
+"""Negociação de Accept-Encoding e o cache de corpos comprimidos do CompressaoMiddleware."""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.responses import JSONResponse
+
+from app import compressao, config, http_cache
+from app.cache import ResultCache
+
+
+@pytest.mark.parametrize("cabecalho, esperada", [
+    ("gzip", "gzip"),
+    ("gzip, deflate", "gzip"),
+    ("gzip;q=0.5, br;q=0.8", "br"),
+    ("gzip;q=1, br;q=0.5", "gzip"),
+    ("br;q=0, *", "gzip"),
+    ("*;q=0.1", "br"),
+    ("identity", None),
+    ("gzip;q=0", None),
+    ("", None),
+])
+def test_escolher_codificacao(monkeypatch, cabecalho, esperada):
+    monkeypatch.setattr(compressao, "brotli", compressao.brotli or object())
+    assert compressao.escolher_codificacao(cabecalho) == esperada
+
+
+def test_sem_brotli_fica_no_gzip(monkeypatch):
+    monkeypatch.setattr(compressao, "brotli", None)
+    assert compressao.escolher_codificacao("br, gzip") == "gzip"
+    assert compressao.escolher_codificacao("br") is None
+
+
+@pytest.fixture
+def cliente(monkeypatch):
+    monkeypatch.setattr(compressao, "comprimidos", ResultCache(max_items=10, ttl=60))
+    monkeypatch.setattr(config, "COMPRESSAO_MIN_BYTES", 1000)
+
+    app = FastAPI()
+    app.add_middleware(compressao.CompressaoMiddleware)
+    chamadas = []
+
+    @app.middleware("http")
+    async def etag(request, call_next):
+        # Faz o papel do CacheHTTPMiddleware, que fica por fora do de compressão
+        request.state.etag = 'W/"fixa"'
+        return await call_next(request)
+
+    @app.get("/grande")
+    def grande(no_store: bool = False):
+        chamadas.append(no_store)
+        corpo = {"itens": list(range(1000))}
+        return JSONResponse(corpo, headers=http_cache.NAO_ARMAZENAR if no_store else None)
+
+    @app.get("/pequena")
+    def pequena():
+        return {"ok": True}
+
+    cliente = TestClient(app)
+    cliente.chamadas = chamadas
+    return cliente
+
+
+GZIP = {"Accept-Encoding": "gzip"}
+
+
+def test_resposta_pequena_nao_e_comprimida(cliente):
+    r = cliente.get("/pequena", headers=GZIP)
+    assert "content-encoding" not in r.headers
+    assert r.json() == {"ok": True}
+
+
+def test_resposta_grande_comprimida_e_reaproveitada(cliente):
+    r = cliente.get("/grande", headers=GZIP)
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.headers["vary"] == "Accept-Encoding"
+    assert r.json()["itens"][-1] == 999
+    segunda = cliente.get("/grande", headers=GZIP)
+    assert segunda.content == r.content
+    assert cliente.chamadas == [False]
+    # Sem Accept-Encoding o endpoint volta a ser chamado e responde sem compressão
+    assert "content-encoding" not in cliente.get("/grande", headers={"Accept-Encoding": "identity"}).headers
+    assert cliente.chamadas == [False, False]
+
+
+def test_no_store_comprime_mas_nao_guarda(cliente):
+    r = cliente.get("/grande?no_store=true", headers=GZIP)
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.json()["itens"][-1] == 999
+    cliente.get("/grande?no_store=true", headers=GZIP)
+    assert cliente.chamadas == [True, True]
+    assert compressao.comprimidos.stats()["itens"] == 0
@@ -0,0 +1,37 @@
+"""Limites das classes de quantis do mapa municipal (consultas.quantis)."""
+import bisect
+
+from app import consultas
+
+
+def _classes(valores, limites):
+    return [bisect.bisect_right(limites, v) for v in valores]
+
+
+def test_quintis():
+    valores = list(range(1, 101))
+    limites = consultas.quantis(valores, 5)
+    assert limites == [21, 41, 61, 81]
+    contagem = [_classes(valores, limites).count(i) for i in range(5)]
+    assert contagem == [20, 20, 20, 20, 20]
+
+
+def test_ordem_de_entrada_nao_importa():
+    assert consultas.quantis([5, 1, 4, 2, 3], 2) == consultas.quantis([1, 2, 3, 4, 5], 2) == [3]
+
+
+def test_limites_repetidos_sao_descartados():
+    # Muitos valores iguais: menos classes, nenhuma vazia
+    valores = [0] * 50 + [1] * 30 + [10] * 20
+    limites = consultas.quantis(valores, 5)
+    assert limites == [1, 10]
+    assert set(_classes(valores, limites)) == {0, 1, 2}
+
+
+def test_limite_igual_ao_menor_valor_e_descartado():
+    assert consultas.quantis([7] * 10, 4) == []
+
+
+def test_sem_valores_ou_uma_classe():
+    assert consultas.quantis([], 5) == []
+    assert consultas.quantis([1, 2, 3], 1) == []
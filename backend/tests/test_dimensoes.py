@@ -0,0 +1,57 @@
+"""Filtros de ano/mês resolvidos em faixas de id_tempo (dimensoes.faixas_tempo), sem banco."""
+import pytest
+
+from app import dimensoes
+
+
+@pytest.fixture(autouse=True)
+def tempo(monkeypatch):
+    # 2019-2021 com ids consecutivos por (ano, mês), exceto um buraco em 2021-01 (id 25 ausente)
+    meses = {}
+    id_tempo = 1
+    for ano in (2019, 2020, 2021):
+        for mes in range(1, 13):
+            if (ano, mes) != (2021, 1):
+                meses[id_tempo] = (ano, mes)
+            id_tempo += 1
+    monkeypatch.setattr(dimensoes, "tempo", meses)
+    monkeypatch.setattr(dimensoes, "_tempo_ids", sorted(meses))
+
+
+def test_sem_filtros():
+    assert dimensoes.faixas_tempo() is None
+
+
+def test_ano_inteiro_vira_uma_faixa():
+    assert dimensoes.faixas_tempo(ano=2020) == ([(13, 24)], [])
+
+
+def test_intervalo_de_anos():
+    assert dimensoes.faixas_tempo(ano_inicio=2019, ano_fim=2020) == ([(1, 24)], [])
+
+
+def test_id_ausente_nao_divide_a_faixa():
+    # 25 não existe em dim_tempo: a faixa pode passar por cima dele
+    assert dimensoes.faixas_tempo(ano_inicio=2020) == ([(13, 36)], [])
+
+
+def test_id_que_nao_atende_divide_a_faixa():
+    assert dimensoes.faixas_tempo(ano_inicio=2019, mes=12) == ([], [12, 24, 36])
+
+
+def test_mes_sozinho_vira_avulsos():
+    assert dimensoes.faixas_tempo(mes=6) == ([], [6, 18, 30])
+
+
+def test_mes_ausente():
+    assert dimensoes.faixas_tempo(ano=2021, mes=1) == ([], [])
+
+
+def test_sequencia_de_um_id_e_avulso():
+    # Só 2021-02 sobra depois do buraco de 2021-01 e antes do fim do filtro
+    assert dimensoes.faixas_tempo(ano=2021, mes=2) == ([], [26])
+
+
+def test_ids_tempo_em_ordem():
+    assert dimensoes.ids_tempo(ano_inicio=2021, mes=3) == [27]
+    assert dimensoes.ids_tempo(ano=2019)[:3] == [1, 2, 3]
@@ -0,0 +1,97 @@
+"""ETag, 304 e no-store do CacheHTTPMiddleware, com a versão dos dados fixada pelo teste."""
+from email.utils import formatdate
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.datastructures import QueryParams
+from starlette.responses import JSONResponse
+
+from app import cache, dimensoes, http_cache
+
+DESDE = 1_700_000_000
+
+
+def test_etag_normaliza_query():
+    a = http_cache.gerar_etag("v1", "/api/x", QueryParams("b=1&a=2"))
+    assert a == http_cache.gerar_etag("v1", "/api/x", QueryParams("a=2&b=1&c="))
+    assert a.startswith('W/"')
+    assert a != http_cache.gerar_etag("v2", "/api/x", QueryParams("a=2&b=1"))
+    assert a != http_cache.gerar_etag("v1", "/api/x", QueryParams("a=2&b=1"), assinatura="d2")
+
+
+def test_etag_corresponde():
+    assert http_cache._etag_corresponde('W/"abc"', 'W/"abc"')
+    assert http_cache._etag_corresponde('"abc"', 'W/"abc"')
+    assert http_cache._etag_corresponde('"x", W/"abc"', 'W/"abc"')
+    assert http_cache._etag_corresponde("*", 'W/"abc"')
+    assert not http_cache._etag_corresponde('W/"abd"', 'W/"abc"')
+    assert not http_cache._etag_corresponde(None, 'W/"abc"')
+
+
+@pytest.fixture
+def cliente(monkeypatch):
+    async def versao_dados():
+        return "v1"
+
+    monkeypatch.setattr(cache, "versao_dados", versao_dados)
+    monkeypatch.setattr(cache, "versao_desde", lambda: DESDE)
+    monkeypatch.setattr(dimensoes, "assinatura", lambda: "d1")
+    monkeypatch.setattr(dimensoes, "alterado_em", lambda: None)
+
+    app = FastAPI()
+    app.add_middleware(http_cache.CacheHTTPMiddleware)
+    chamadas = []
+
+    @app.get("/api/localidades")
+    def localidades(erro: bool = False):
+        chamadas.append(erro)
+        if erro:
+            return JSONResponse({"erro": True}, headers=http_cache.NAO_ARMAZENAR)
+        return {"ok": True}
+
+    @app.get("/api/privada")
+    def privada():
+        return {"ok": True}
+
+    cliente = TestClient(app)
+    cliente.chamadas = chamadas
+    return cliente
+
+
+def test_resposta_publica_leva_cabecalhos(cliente):
+    r = cliente.get("/api/localidades")
+    assert r.status_code == 200
+    assert r.headers["etag"].startswith('W/"')
+    assert r.headers["cache-control"].startswith("public, max-age=")
+    assert r.headers["last-modified"] == formatdate(DESDE, usegmt=True)
+    assert "etag" not in cliente.get("/api/privada").headers
+
+
+def test_if_none_match_responde_304_sem_chamar_o_endpoint(cliente):
+    etag = cliente.get("/api/localidades").headers["etag"]
+    r = cliente.get("/api/localidades", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.headers["etag"] == etag
+    assert cliente.chamadas == [False]
+    # Outra query, outra ETag
+    assert cliente.get("/api/localidades?erro=false", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_if_modified_since(cliente):
+    r = cliente.get("/api/localidades", headers={"If-Modified-Since": formatdate(DESDE, usegmt=True)})
+    assert r.status_code == 304
+    r = cliente.get("/api/localidades", headers={"If-Modified-Since": formatdate(DESDE - 60, usegmt=True)})
+    assert r.status_code == 200
+    # If-None-Match tem precedência: ETag diferente ignora o If-Modified-Since
+    r = cliente.get("/api/localidades", headers={
+        "If-None-Match": 'W/"outra"', "If-Modified-Since": formatdate(DESDE, usegmt=True),
+    })
+    assert r.status_code == 200
+
+
+def test_no_store_segue_sem_etag(cliente):
+    r = cliente.get("/api/localidades?erro=true")
+    assert r.status_code == 200
+    assert r.headers["cache-control"] == "no-store"
+    assert "etag" not in r.headers and "last-modified" not in r.headers
@@ -0,0 +1,57 @@
+"""Faixas de id_tempo por ano das partições (particoes.faixas_anos), com um cursor simulado."""
+import pytest
+
+from app import particoes
+
+
+class Cursor:
+    def __init__(self, anos):
+        self.anos = anos
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchall(self):
+        return [
+            {"ano": ano, "inicio": inicio, "fim": fim, "primeiro_mes": primeiro_mes}
+            for ano, inicio, fim, primeiro_mes in self.anos
+        ]
+
+
+def test_faixas_contiguas():
+    cur = Cursor([(2019, 1, 12, 1), (2020, 13, 24, 1)])
+    assert particoes.faixas_anos(cur) == [(2019, 1, 13), (2020, 13, 25)]
+
+
+def test_buraco_entre_anos_fica_com_o_anterior():
+    # Ids 13 e 14 sem mês: a faixa de 2019 vai até o início de 2020
+    cur = Cursor([(2019, 1, 12, 1), (2020, 15, 26, 1)])
+    assert particoes.faixas_anos(cur) == [(2019, 1, 15), (2020, 15, 27)]
+
+
+def test_ultimo_ano_reserva_os_meses_que_faltam():
+    # 2021 só com janeiro a março: a faixa cobre os 12 meses a partir de janeiro
+    cur = Cursor([(2020, 1, 12, 1), (2021, 13, 15, 1)])
+    assert particoes.faixas_anos(cur)[-1] == (2021, 13, 13 + particoes.MESES)
+
+
+def test_ultimo_ano_comecando_no_meio():
+    # Primeiro mês carregado é junho: a reserva conta a partir de um janeiro virtual
+    cur = Cursor([(2021, 6, 8, 6)])
+    assert particoes.faixas_anos(cur) == [(2021, 6, 6 - 6 + 1 + particoes.MESES)]
+
+
+def test_anos_sobrepostos():
+    cur = Cursor([(2019, 1, 14, 1), (2020, 13, 24, 1)])
+    with pytest.raises(RuntimeError, match="se sobrepõem"):
+        particoes.faixas_anos(cur)
+
+
+def test_ids_que_nao_crescem_com_o_ano():
+    cur = Cursor([(2019, 13, 24, 1), (2020, 1, 12, 1)])
+    with pytest.raises(RuntimeError):
+        particoes.faixas_anos(cur)
+
+
+def test_sem_anos():
+    assert particoes.faixas_anos(Cursor([])) == []
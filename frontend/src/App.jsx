@@ -38,6 +38,7 @@ function Dashboard() {
   const [obitosLocal, setObitosLocal] = useState([])
   const [internacoesCid, setInternacoesCid] = useState([])
   const [obitosCid, setObitosCid] = useState([])
+  const [internacoesCidPorEstado, setInternacoesCidPorEstado] = useState(null)
   const [loading, setLoading] = useState(false)
   const [periodoDados, setPeriodoDados] = useState(null)
   const [isRefreshing, setIsRefreshing] = useState(false)
@@ -127,6 +128,7 @@ function Dashboard() {
           setObitosLocal(parsed.data.obitosLocal || [])
           setInternacoesCid(parsed.data.internacoesCid || [])
           setObitosCid(parsed.data.obitosCid || [])
+          setInternacoesCidPorEstado(parsed.data.internacoesCidPorEstado || null)
           setPeriodoDados(parsed.data.periodoDados || null)
         }
       }
@@ -186,78 +188,36 @@ function Dashboard() {
     const delay = (ms) => new Promise(resolve => setTimeout(resolve, ms))
 
     try {
-      let intCidRes, obCidRes, localRes, seriesRes, sexoRes, racaRes, faixaRes, estCivRes
+      // Uma única requisição traz todos os gráficos; o backend roda as consultas em paralelo
+      const dashboard = await carregarComErro('/api/dashboard?limit=5000', 'Dashboard', 1, 180000)
+      const secao = (nome) => dashboard?.[nome] || []
 
-      const carregarUmVez = async () => {
-        intCidRes = await carregarComErro('/api/internacoes/cid-cap', 'Internações por CID-10', 1, 180000)
-        setInternacoesCid(intCidRes)
-        return intCidRes
-      }
-      const carregarUmVez2 = async () => {
-        obCidRes = await carregarComErro('/api/obitos/cid-cap', 'Óbitos por CID-10', 1, 180000)
-        setObitosCid(obCidRes)
-        return obCidRes
-      }
-      const carregarUmVez3 = async () => {
-        localRes = await carregarComErro('/api/obitos/local', 'Óbitos por Local', 1, 180000)
-        setObitosLocal(localRes)
-        return localRes
-      }
-      const carregarUmVez4 = async () => {
-        seriesRes = await carregarComErro('/api/series/mensal?limit=5000', 'Série Mensal', 1, 180000)
-        setSeriesMensal(seriesRes)
-        return seriesRes
-      }
-      const carregarUmVez5 = async () => {
-        sexoRes = await carregarComErro('/api/internacoes/sexo', 'Internações por Sexo', 1, 180000)
-        setInternacoesSexo(sexoRes)
-        return sexoRes
-      }
-      const carregarUmVez6 = async () => {
-        racaRes = await carregarComErro('/api/obitos/raca', 'Óbitos por Raça', 1, 180000)
-        setObitosRaca(racaRes)
-        return racaRes
-      }
-      const carregarUmVez7 = async () => {
-        faixaRes = await carregarComErro('/api/internacoes/faixa', 'Internações por Faixa', 1, 180000)
-        setInternacoesFaixa(faixaRes)
-        return faixaRes
-      }
-      const carregarUmVez8 = async () => {
-        estCivRes = await carregarComErro('/api/obitos/estado-civil', 'Óbitos por Estado Civil', 1, 180000)
-        setObitosEstadoCivil(estCivRes)
-        return estCivRes
+      const dadosParaCache = {
+        seriesMensal: secao('series_mensal'),
+        internacoesSexo: secao('internacoes_sexo'),
+        obitosRaca: secao('obitos_raca'),
+        internacoesFaixa: secao('internacoes_faixa'),
+        obitosEstadoCivil: secao('obitos_estado_civil'),
+        obitosLocal: secao('obitos_local'),
+        internacoesCid: secao('internacoes_cid_cap'),
+        obitosCid: secao('obitos_cid_cap'),
+        internacoesCidPorEstado: dashboard?.internacoes_cid_por_estado || null,
+        periodoDados: dashboard?.periodo_dados || null
       }
 
-      await Promise.all([
-        carregarUmVez(), 
-        carregarUmVez2(), 
-        carregarUmVez3(), 
-        carregarUmVez4(), 
-        carregarUmVez5(), 
-        carregarUmVez6(), 
-        carregarUmVez7(), 
-        carregarUmVez8()
-      ])
+      setSeriesMensal(dadosParaCache.seriesMensal)
+      setInternacoesSexo(dadosParaCache.internacoesSexo)
+      setObitosRaca(dadosParaCache.obitosRaca)
+      setInternacoesFaixa(dadosParaCache.internacoesFaixa)
+      setObitosEstadoCivil(dadosParaCache.obitosEstadoCivil)
+      setObitosLocal(dadosParaCache.obitosLocal)
+      setInternacoesCid(dadosParaCache.internacoesCid)
+      setObitosCid(dadosParaCache.obitosCid)
+      setInternacoesCidPorEstado(dadosParaCache.internacoesCidPorEstado)
+      setPeriodoDados(dadosParaCache.periodoDados || { ano_inicio: null, ano_fim: null, mes_inicio: null, mes_fim: null })
 
-      let periodoRes = null
-      try {
-        periodoRes = await api.get('/api/periodo-dados', { timeout: 60000 })
-        setPeriodoDados(periodoRes.data)
-      } catch (error) {
-        setPeriodoDados({ ano_inicio: null, ano_fim: null, mes_inicio: null, mes_fim: null })
-      }
-
-      const dadosParaCache = {
-        seriesMensal: seriesRes,
-        internacoesSexo: sexoRes,
-        obitosRaca: racaRes,
-        internacoesFaixa: faixaRes,
-        obitosEstadoCivil: estCivRes,
-        obitosLocal: localRes,
-        internacoesCid: intCidRes,
-        obitosCid: obCidRes,
-        periodoDados: periodoRes?.data || null
+      if (forceRefresh && dashboard?.erros && Object.keys(dashboard.erros).length > 0) {
+        toast.error('Alguns gráficos não puderam ser carregados. Tente novamente mais tarde.')
       }
       
       salvarDadosNoCache(dadosParaCache)
@@ -314,6 +274,7 @@ function Dashboard() {
                   obitosRaca={obitosRaca}
                   internacoesCid={internacoesCid}
                   obitosCid={obitosCid}
+                  internacoesCidPorEstado={internacoesCidPorEstado}
                   loading={loading}
                   periodoDados={periodoDados}
                   isRefreshing={isRefreshing}
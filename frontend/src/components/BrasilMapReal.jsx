@@ -1,5 +1,6 @@
 import { useState, useEffect, useRef } from 'react'
 import { api } from '../services/api'
+import { carregarGeometria } from '../services/geometrias'
 import { formatNumber } from '../utils/formatNumber'
 import L from 'leaflet'
 import 'leaflet/dist/leaflet.css'
@@ -58,78 +59,9 @@ export function BrasilMapReal({ internacoesCid = [] }) {
   const [geoJsonData, setGeoJsonData] = useState(geoJsonFallback)
 
   useEffect(() => {
-    async function carregarGeoJSON() {
-      const cacheKey = 'brasil_geojson_cache'
-      const cacheTimestampKey = 'brasil_geojson_cache_timestamp'
-      const cacheExpiry = 30 * 24 * 60 * 60 * 1000
-
-      const cachedData = localStorage.getItem(cacheKey)
-      const cachedTimestamp = localStorage.getItem(cacheTimestampKey)
-      
-      if (cachedData) {
-        try {
-          const parsed = JSON.parse(cachedData)
-          if (parsed && parsed.type === 'FeatureCollection' && parsed.features && parsed.features.length > 0) {
-            const firstFeature = parsed.features[0]
-            const hasUF = firstFeature?.properties?.uf || firstFeature?.properties?.sigla || firstFeature?.properties?.UF
-            
-            if (hasUF) {
-              if (cachedTimestamp) {
-                const cacheAge = Date.now() - parseInt(cachedTimestamp, 10)
-                if (cacheAge < cacheExpiry) {
-                  setGeoJsonData(parsed)
-                  return
-                }
-              } else {
-                setGeoJsonData(parsed)
-                return
-              }
-            }
-          }
-        } catch (e) {
-          localStorage.removeItem(cacheKey)
-          localStorage.removeItem(cacheTimestampKey)
-        }
-      }
-
-      try {
-        const controller = new AbortController()
-        const timeoutId = setTimeout(() => controller.abort(), 5000)
-        
-        const response = await fetch('https://raw.githubusercontent.com/codeforamerica/click_that_hood/master/public/data/brazil-states.geojson', {
-          headers: { 'Accept': 'application/json' },
-          signal: controller.signal
-        })
-        
-        clearTimeout(timeoutId)
-        
-        if (response.ok) {
-          const data = await response.json()
-          if (data && data.type === 'FeatureCollection' && data.features && data.features.length > 0) {
-            localStorage.setItem(cacheKey, JSON.stringify(data))
-            localStorage.setItem(cacheTimestampKey, Date.now().toString())
-            setGeoJsonData(data)
-            return
-          }
-        }
-        throw new Error(`HTTP ${response.status}`)
-      } catch (error) {
-        if (error.name === 'AbortError' || error.message.includes('429')) {
-          if (cachedData) {
-            try {
-              const parsed = JSON.parse(cachedData)
-              if (parsed && parsed.type === 'FeatureCollection') {
-                setGeoJsonData(parsed)
-                return
-              }
-            } catch (e) {
-            }
-          }
-        }
-        setGeoJsonData(geoJsonFallback)
-      }
-    }
-    carregarGeoJSON()
+    carregarGeometria('ufs')
+      .then(setGeoJsonData)
+      .catch(() => setGeoJsonData(geoJsonFallback))
   }, [])
 
   useEffect(() => {
@@ -2,6 +2,7 @@ import { useEffect, useState, useRef } from 'react'
 import { MapContainer, TileLayer, GeoJSON, useMap } from 'react-leaflet'
 import L from 'leaflet'
 import { api } from '../services/api'
+import { carregarGeometria } from '../services/geometrias'
 import { formatNumber } from '../utils/formatNumber'
 import 'leaflet/dist/leaflet.css'
 import './BrasilMapRealLeaflet.css'
@@ -13,10 +14,6 @@ L.Icon.Default.mergeOptions({
   shadowUrl: 'https://cdnjs.cloudflare.com/ajax/libs/leaflet/1.9.4/images/marker-shadow.png',
 })
 
-const GEOJSON_CACHE_KEY = 'brasil_geojson_cache'
-const GEOJSON_CACHE_EXPIRY = 24 * 60 * 60 * 1000
-const geoUrl = 'https://raw.githubusercontent.com/codeforamerica/click_that_hood/master/public/data/brazil-states.geojson'
-
 function MapController({ bounds }) {
   const map = useMap()
   
@@ -29,7 +26,7 @@ function MapController({ bounds }) {
   return null
 }
 
-export function BrasilMapRealLeaflet({ internacoesCid = [] }) {
+export function BrasilMapRealLeaflet({ internacoesCid = [], internacoesPorEstado = null }) {
   const [estadosData, setEstadosData] = useState({})
   const [loading, setLoading] = useState(true)
   const [selectedCid, setSelectedCid] = useState('')
@@ -41,61 +38,13 @@ export function BrasilMapRealLeaflet({ internacoesCid = [] }) {
   const estadosDataRef = useRef({})
 
   useEffect(() => {
-    async function carregarGeoJSON() {
-      try {
-        const cached = localStorage.getItem(GEOJSON_CACHE_KEY)
-        if (cached) {
-          const { data, timestamp } = JSON.parse(cached)
-          const now = Date.now()
-          if (now - timestamp < GEOJSON_CACHE_EXPIRY) {
-            setGeographyData(data)
-            setGeoLoading(false)
-            return
-          }
-        }
-
-        const response = await fetch(geoUrl, {
-          headers: {
-            'Accept': 'application/json',
-          },
-          cache: 'force-cache'
-        })
-
-        if (!response.ok) {
-          if (response.status === 429 && cached) {
-            const { data } = JSON.parse(cached)
-            setGeographyData(data)
-            setGeoLoading(false)
-            return
-          }
-          throw new Error(`Erro ao carregar mapa: ${response.status}`)
-        }
-
-        const data = await response.json()
-        localStorage.setItem(GEOJSON_CACHE_KEY, JSON.stringify({
-          data,
-          timestamp: Date.now()
-        }))
-        setGeographyData(data)
-      } catch (error) {
-        console.error('Erro ao carregar GeoJSON:', error)
-        const cached = localStorage.getItem(GEOJSON_CACHE_KEY)
-        if (cached) {
-          try {
-            const { data } = JSON.parse(cached)
-            setGeographyData(data)
-          } catch (e) {
-            setError('Erro ao carregar mapa. Tente recarregar a página.')
-          }
-        } else {
-          setError('Erro ao carregar mapa. Tente recarregar a página.')
-        }
-      } finally {
-        setGeoLoading(false)
-      }
-    }
-
-    carregarGeoJSON()
+    carregarGeometria('ufs')
+      .then(setGeographyData)
+      .catch((error) => {
+        console.error('Erro ao carregar geometria das UFs:', error)
+        setError('Erro ao carregar mapa. Tente recarregar a página.')
+      })
+      .finally(() => setGeoLoading(false))
   }, [])
 
   const getEstadoNameFromUF = (uf) => {
@@ -116,15 +65,22 @@ export function BrasilMapRealLeaflet({ internacoesCid = [] }) {
       setError(null)
       setLoading(true)
       try {
-        const url = selectedCid 
-          ? `/api/internacoes/cid-por-estado?capitulo_cod=${encodeURIComponent(selectedCid)}`
-          : '/api/internacoes/cid-por-estado'
-        
-        const res = await api.get(url, { timeout: 60000 })
+        let linhas
+        if (!selectedCid && Array.isArray(internacoesPorEstado)) {
+          // Já veio no /api/dashboard: sem requisição extra
+          linhas = internacoesPorEstado
+        } else {
+          const url = selectedCid 
+            ? `/api/internacoes/cid-por-estado?capitulo_cod=${encodeURIComponent(selectedCid)}`
+            : '/api/internacoes/cid-por-estado'
+          
+          const res = await api.get(url, { timeout: 60000 })
+          linhas = res.data
+        }
         
         const dados = {}
-        if (res.data && Array.isArray(res.data) && res.data.length > 0) {
-          res.data.forEach(item => {
+        if (linhas && Array.isArray(linhas) && linhas.length > 0) {
+          linhas.forEach(item => {
             const uf = item.uf ? item.uf.toUpperCase().trim() : null
             if (!uf) return
             
@@ -167,7 +123,7 @@ export function BrasilMapRealLeaflet({ internacoesCid = [] }) {
     if (!geoLoading) {
       carregarDadosEstados()
     }
-  }, [selectedCid, geoLoading])
+  }, [selectedCid, geoLoading, internacoesPorEstado])
 
   useEffect(() => {
     Object.keys(layersRef.current).forEach(uf => {
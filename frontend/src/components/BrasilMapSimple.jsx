@@ -6,14 +6,10 @@ import {
   ZoomableGroup
 } from 'react-simple-maps'
 import { api } from '../services/api'
+import { carregarGeometria } from '../services/geometrias'
 import { formatNumber } from '../utils/formatNumber'
 import './BrasilMapSimple.css'
 
-const GEOJSON_CACHE_KEY = 'brasil_geojson_cache'
-const GEOJSON_CACHE_EXPIRY = 24 * 60 * 60 * 1000
-const geoUrl = 'https://raw.githubusercontent.com/codeforamerica/click_that_hood/master/public/data/brazil-states.geojson'
-const geoUrlAlternative = 'https://raw.githubusercontent.com/fititnt/gis-dataset-brasil/master/uf/geojson/uf.json'
-
 export function BrasilMapSimple({ internacoesCid = [] }) {
   const [estadosData, setEstadosData] = useState({})
   const [loading, setLoading] = useState(true)
@@ -26,82 +22,13 @@ export function BrasilMapSimple({ internacoesCid = [] }) {
   const [geoLoading, setGeoLoading] = useState(true)
 
   useEffect(() => {
-    async function carregarGeoJSON() {
-      try {
-        const cached = localStorage.getItem(GEOJSON_CACHE_KEY)
-        if (cached) {
-          const { data, timestamp } = JSON.parse(cached)
-          const now = Date.now()
-          if (now - timestamp < GEOJSON_CACHE_EXPIRY) {
-            setGeographyData(data)
-            setGeoLoading(false)
-            return
-          }
-        }
-
-        let response = await fetch(geoUrl, {
-          headers: {
-            'Accept': 'application/json',
-          },
-          cache: 'force-cache'
-        })
-
-        if (!response.ok) {
-          if (response.status === 429) {
-            response = await fetch(geoUrlAlternative, {
-              headers: {
-                'Accept': 'application/json',
-              },
-              cache: 'force-cache'
-            })
-            if (!response.ok && cached) {
-              const { data } = JSON.parse(cached)
-              setGeographyData(data)
-              setGeoLoading(false)
-              return
-            }
-            if (!response.ok) {
-              throw new Error('Muitas requisições. Usando cache se disponível.')
-            }
-          } else {
-            throw new Error(`Erro ao carregar mapa: ${response.status}`)
-          }
-        }
-
-        let data = await response.json()
-        
-        if (data.type === 'FeatureCollection' && data.features) {
-          data = data
-        } else if (Array.isArray(data)) {
-          data = {
-            type: 'FeatureCollection',
-            features: data
-          }
-        }
-        localStorage.setItem(GEOJSON_CACHE_KEY, JSON.stringify({
-          data,
-          timestamp: Date.now()
-        }))
-        setGeographyData(data)
-      } catch (error) {
-        console.error('Erro ao carregar GeoJSON:', error)
-        const cached = localStorage.getItem(GEOJSON_CACHE_KEY)
-        if (cached) {
-          try {
-            const { data } = JSON.parse(cached)
-            setGeographyData(data)
-          } catch (e) {
-            setError('Erro ao carregar mapa. Tente recarregar a página.')
-          }
-        } else {
-          setError('Erro ao carregar mapa. Tente recarregar a página.')
-        }
-      } finally {
-        setGeoLoading(false)
-      }
-    }
-
-    carregarGeoJSON()
+    carregarGeometria('ufs')
+      .then(setGeographyData)
+      .catch((error) => {
+        console.error('Erro ao carregar geometria das UFs:', error)
+        setError('Erro ao carregar mapa. Tente recarregar a página.')
+      })
+      .finally(() => setGeoLoading(false))
   }, [])
 
   useEffect(() => {
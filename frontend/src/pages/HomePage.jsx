@@ -12,6 +12,7 @@ export function HomePage({
   obitosRaca,
   internacoesCid,
   obitosCid,
+  internacoesCidPorEstado = null,
   loading,
   periodoDados,
   isRefreshing,
@@ -129,7 +130,7 @@ export function HomePage({
                     <span>Dados referentes ao período: <strong>{formatarPeriodo()}</strong></span>
                   </div>
                 )}
-                <BrasilMapRealLeaflet internacoesCid={internacoesCid} />
+                <BrasilMapRealLeaflet internacoesCid={internacoesCid} internacoesPorEstado={internacoesCidPorEstado} />
               </div>
             </div>
 
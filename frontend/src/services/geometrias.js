@@ -0,0 +1,29 @@
+import { api } from './api'
+import { topologiaParaGeoJSON } from '../utils/topojson'
+
+// O GeoJSON das UFs vinha de um host externo e ficava no localStorage; agora o navegador
+// guarda a resposta de /api/geo pelo cache HTTP (ETag + Cache-Control)
+localStorage.removeItem('brasil_geojson_cache')
+localStorage.removeItem('brasil_geojson_cache_timestamp')
+
+const carregadas = {}
+
+/**
+ * Geometria de uma camada servida pelo backend, já convertida em GeoJSON.
+ * @param {'ufs'|'municipios'} camada
+ * @param {{nivel?: 'baixo'|'medio'|'alto', uf?: string}} [opcoes] - nível de simplificação e UF
+ * @returns {Promise<object>} - FeatureCollection (properties: uf, nome, codigo_ibge)
+ */
+export function carregarGeometria(camada, { nivel = 'baixo', uf } = {}) {
+  const chave = `${camada}:${nivel}:${uf || ''}`
+  if (!carregadas[chave]) {
+    carregadas[chave] = api
+      .get(`/api/geo/${camada}`, { params: { nivel, uf }, timeout: 60000 })
+      .then((res) => topologiaParaGeoJSON(res.data, camada))
+      .catch((error) => {
+        delete carregadas[chave]
+        throw error
+      })
+  }
+  return carregadas[chave]
+}
@@ -0,0 +1,47 @@
+/**
+ * Converte um objeto de uma topologia TopoJSON (formato servido por /api/geo) em GeoJSON.
+ * Cobre o que o backend gera: arcos quantizados em delta, Polygon e MultiPolygon.
+ * @param {object} topologia - Topologia TopoJSON
+ * @param {string} [nomeObjeto] - Objeto a converter (padrão: o primeiro)
+ * @returns {object} - FeatureCollection
+ */
+export function topologiaParaGeoJSON(topologia, nomeObjeto) {
+  const { scale, translate } = topologia.transform
+  const arcos = topologia.arcs.map((arco) => {
+    let x = 0
+    let y = 0
+    return arco.map(([dx, dy]) => {
+      x += dx
+      y += dy
+      return [x * scale[0] + translate[0], y * scale[1] + translate[1]]
+    })
+  })
+
+  const anel = (referencias) => {
+    const pontos = []
+    referencias.forEach((ref, i) => {
+      const arco = ref >= 0 ? arcos[ref] : arcos[~ref].slice().reverse()
+      // Cada arco começa no ponto em que o anterior terminou
+      for (let j = i > 0 ? 1 : 0; j < arco.length; j++) {
+        pontos.push(arco[j])
+      }
+    })
+    return pontos
+  }
+
+  const objeto = topologia.objects[nomeObjeto || Object.keys(topologia.objects)[0]]
+  return {
+    type: 'FeatureCollection',
+    features: objeto.geometries.map((geometria) => ({
+      type: 'Feature',
+      id: geometria.id,
+      properties: geometria.properties || {},
+      geometry: {
+        type: geometria.type,
+        coordinates: geometria.type === 'Polygon'
+          ? geometria.arcs.map(anel)
+          : geometria.arcs.map((poligono) => poligono.map(anel)),
+      },
+    })),
+  }
+}